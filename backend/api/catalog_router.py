@@ -0,0 +1,198 @@
+# backend/api/catalog_router.py
+"""
+スポットカタログ（フロントの一覧・地図表示用）。
+
+GET /api/pois?lang=ja                 全件
+GET /api/pois/tiles/{z}/{x}/{y}?lang= その XYZ タイル（Web メルカトル）に入るものだけ
+
+- 中身は UI が使う項目だけ: {"v": static_data_version, "lang", "items": [{spot_id, kind, name, lat, lon}]}
+  name は lang → ja → en → zh の順で最初にあるもの
+- 本文は (version, lang, tile) ごとに一度だけ作り、gzip / br（brotli があれば）も作っておく
+  static_data_version が変わったら作り直す
+- ETag は本文のハッシュ（強い ETag）。gzip / br の版は "-gz" / "-br" を付けた別のタグにする
+  （中身のバイト列が違うので同じ強いタグを付けない）。If-None-Match はどの版のタグでも 304
+"""
+from __future__ import annotations
+
+import collections
+import gzip
+import hashlib
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.responses import Response
+
+from backend.api.pack_files import accepted_encodings
+from backend.common.spot_catalog import CatalogEntry, get_catalog
+
+try:  # 任意依存（無ければ gzip のみ事前圧縮）
+    import brotli
+except Exception:
+    brotli = None
+
+router = APIRouter(prefix="/pois", tags=["catalog"])
+
+CATALOG_TILE_ZOOM_MIN = int(os.getenv("CATALOG_TILE_ZOOM_MIN", "8"))
+CATALOG_TILE_ZOOM_MAX = int(os.getenv("CATALOG_TILE_ZOOM_MAX", "16"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+CATALOG_LANGS = ("ja", "en", "zh")
+
+Tile = Tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    etag: str
+    raw: bytes
+    gzip: bytes
+    br: Optional[bytes]
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Content-Encoding（None は無圧縮）ごとの強い ETag。"""
+        suffix = {"gzip": "-gz", "br": "-br"}.get(encoding or "", "")
+        return self.etag[:-1] + suffix + '"' if suffix else self.etag
+
+    @property
+    def etags(self) -> Tuple[str, ...]:
+        return self.etag, self.etag_for("gzip"), self.etag_for("br")
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """XYZ タイル → (west, south, east, north)。"""
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def _in_tile(e: CatalogEntry, bounds: Tuple[float, float, float, float]) -> bool:
+    west, south, east, north = bounds
+    # 境界上の点はどちらか一方のタイルにだけ入れる
+    return west <= e.lon < east and south < e.lat <= north
+
+
+def build_items(entries: List[CatalogEntry], lang: str, tile: Optional[Tile] = None) -> List[dict]:
+    bounds = tile_bounds(*tile) if tile else None
+    items = [
+        {
+            "spot_id": e.spot_id,
+            "kind": e.kind,
+            "name": e.name_for(lang) or e.spot_id,
+            "lat": round(e.lat, 6),
+            "lon": round(e.lon, 6),
+        }
+        for e in entries
+        if bounds is None or _in_tile(e, bounds)
+    ]
+    items.sort(key=lambda d: d["spot_id"])
+    return items
+
+
+def encode_body(doc: dict) -> EncodedBody:
+    raw = orjson.dumps(doc)
+    etag = '"' + hashlib.blake2b(raw, digest_size=12).hexdigest() + '"'
+    return EncodedBody(
+        etag=etag,
+        raw=raw,
+        gzip=gzip.compress(raw, compresslevel=9, mtime=0),
+        br=brotli.compress(raw, quality=11) if brotli is not None else None,
+    )
+
+
+class CatalogBodies:
+    """(version, lang, tile) → EncodedBody の LRU。version が変われば丸ごと捨てる。"""
+
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE) -> None:
+        self.maxsize = max(1, maxsize)
+        self._version: Optional[int] = None
+        self._items: "collections.OrderedDict[Tuple[str, Optional[Tile]], EncodedBody]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, lang: str, tile: Optional[Tile] = None) -> Optional[EncodedBody]:
+        """本文を返す。カタログが一度も読めていなければ None（空の一覧を作らない・キャッシュしない）。"""
+        catalog = get_catalog()
+        entries = catalog.all()  # 必要ならここで static_data_version を確認して読み直す
+        if not catalog.loaded:
+            return None
+        version = catalog.version
+        key = (lang, tile)
+        with self._lock:
+            if version != self._version:
+                self._items.clear()
+                self._version = version
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return body
+            self.misses += 1
+        body = encode_body({"v": version, "lang": lang, "items": build_items(entries, lang, tile)})
+        with self._lock:
+            if version == self._version:
+                self._items[key] = body
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+        return body
+
+
+_bodies = CatalogBodies()
+
+
+def _etag_matches(request: Request, body: EncodedBody) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    tags = {t.strip() for t in inm.split(",")}
+    return "*" in tags or any(tag in tags or f"W/{tag}" in tags for tag in body.etags)
+
+
+def _respond(request: Request, body: EncodedBody) -> Response:
+    accepted = accepted_encodings(request)
+    if "br" in accepted and body.br is not None:
+        encoding, content = "br", body.br
+    elif "gzip" in accepted:
+        encoding, content = "gzip", body.gzip
+    else:
+        encoding, content = None, body.raw
+    headers = {"ETag": body.etag_for(encoding), "Cache-Control": "public, no-cache", "Vary": "Accept-Encoding"}
+    # どの版のタグでも中身は同じなので 304（返すタグは今回選んだ版のもの）
+    if _etag_matches(request, body):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content, media_type="application/json", headers=headers)
+
+
+def _lang(lang: str) -> str:
+    return lang if lang in CATALOG_LANGS else "ja"
+
+
+def _body_or_503(lang: str, tile: Optional[Tile] = None) -> EncodedBody:
+    body = _bodies.get(_lang(lang), tile)
+    if body is None:
+        # DB に繋がらず一度も読めていない
+        raise HTTPException(status_code=503, detail="spot catalog unavailable")
+    return body
+
+
+@router.get("", summary="スポット一覧（UI 用の最小項目・ETag / 事前圧縮）")
+def get_pois(request: Request, lang: str = Query("ja")):
+    return _respond(request, _body_or_503(lang))
+
+
+@router.get("/tiles/{z}/{x}/{y}", summary="スポット一覧（XYZ タイル単位）")
+def get_pois_tile(request: Request, z: int, x: int, y: int, lang: str = Query("ja")):
+    if not CATALOG_TILE_ZOOM_MIN <= z <= CATALOG_TILE_ZOOM_MAX:
+        raise HTTPException(status_code=400, detail=f"z must be {CATALOG_TILE_ZOOM_MIN}..{CATALOG_TILE_ZOOM_MAX}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="tile out of range")
+    return _respond(request, _body_or_503(lang, (z, x, y)))
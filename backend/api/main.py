@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
+from backend.api.catalog_router import router as catalog_router
 from backend.api.nav_router import router as nav_router
 from backend.api.realtime_router import router as rt_router
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="API Gateway", version="0.1.0")
+    app = FastAPI(title="API Gateway", version="0.1.0", default_response_class=ORJSONResponse)
 
     app.include_router(nav_router, prefix="/api")
     app.include_router(rt_router,  prefix="/api")
+    app.include_router(catalog_router, prefix="/api")
 
     @app.get("/health")
     def health():
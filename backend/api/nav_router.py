@@ -4,22 +4,33 @@ import os
 import uuid
 from typing import Any, Dict, Optional, Union
 import json
+import threading
+from collections import OrderedDict
 
 import httpx
-from fastapi import APIRouter, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel, ValidationError
 from celery.result import AsyncResult, GroupResult
 from celery import states
 
 from backend.api.celery_app import celery_app
+from backend.api import plan_cache
+from backend.api import plan_status
+from backend.api import pack_files
+from backend.common.coord_array import ORJSONRoute
+from backend.common import geofence
 from backend.api.schemas import PlanRequest, PlanResponse
 
-router = APIRouter(prefix="/nav", tags=["navigation"])
+router = APIRouter(prefix="/nav", tags=["navigation"], route_class=ORJSONRoute)
 
 NAV_BASE = os.getenv("NAV_BASE", "http://svc-nav:9100")
 REQ_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "25"))
 INCOMPLETE = {states.PENDING, states.RECEIVED, states.STARTED, states.RETRY}
+# 同一プランのキャッシュとして再利用しない状態
+STALE = {states.FAILURE, states.REVOKED}
+# /packs/{pack_id}/match 用に保持する manifest（polyline + geofence）の数
+NAV_MATCH_CACHE_SIZE = int(os.getenv("NAV_MATCH_CACHE_SIZE", "32"))
 
 class TaskAccepted(BaseModel):
     task_id: str
@@ -43,20 +54,64 @@ def _model_to_json(m) -> Dict[str, Any]:
     return m.dict(by_alias=True)            # pydantic v1
 
 
+def _settle_stalled(task_id: str, doc: Dict[str, str]) -> Dict[str, str]:
+    """
+    plan:status が実行中のまま止まっていたら（ハートビートも途絶えていたら）Celery の状態で確かめ直し、
+    ハッシュを確定させる。Celery でも未完了なら、ワーカー停止とみなして FAILURE にする。
+    """
+    if not plan_status.is_stalled(doc):
+        return doc
+    result = AsyncResult(doc.get("result_ref") or task_id, app=celery_app)
+    state, error = result.state, None
+    if state in INCOMPLETE:
+        state = states.FAILURE
+        error = (f"plan stalled: no progress for {plan_status.stale_after_s(doc):.0f}s "
+                 f"(stage: {doc.get('stage') or 'queued'})")
+    elif state in STALE:
+        state, error = states.FAILURE, str(result.info)
+    settled = plan_status.settle(task_id, doc, state, error)
+    return settled if settled is not None else {**doc, "state": state, "error": error or ""}
+
+
+def _unusable(task_id: str) -> bool:
+    """同一プランとして合流させないタスク（失敗・取り消し・止まったまま）か。"""
+    doc = plan_status.read(task_id)
+    if doc is None:
+        return AsyncResult(task_id, app=celery_app).state in STALE
+    return _settle_stalled(task_id, doc).get("state") in STALE
+
+
 # ========== POST /api/nav/plan → タスク投入して 202 ==========
 @router.post("/plan", response_model=TaskAccepted, status_code=status.HTTP_202_ACCEPTED)
 def enqueue_nav_plan(req: PlanRequest, request: Request):
-    # nav.plan タスク投入（nav 側で定義済み）
-    async_res = celery_app.send_task("nav.plan", args=[req.model_dump(by_alias=True)], queue="nav")
+    payload = req.model_dump(by_alias=True)
+
+    # 同一プラン（指紋一致）が実行中・直近完了なら、そのタスクに合流する
+    fingerprint = plan_cache.plan_fingerprint(payload)
+    task_id = str(uuid.uuid4())
+    existing = plan_cache.claim(fingerprint, task_id)
+    if existing is not None and _unusable(existing):
+        existing = None if plan_cache.replace(fingerprint, existing, task_id) else plan_cache.claim(fingerprint, task_id)
+
+    if existing is None:
+        # nav.plan タスク投入（nav 側で定義済み）
+        plan_status.mark_pending(task_id)
+        celery_app.send_task("nav.plan", args=[payload], queue="nav", task_id=task_id)
+    else:
+        task_id = existing
 
     # Location ヘッダ（GET の参照先）を添付
-    task_url = request.url_for("get_nav_plan_task", task_id=async_res.id)
-    headers = {"Location": str(task_url), "Cache-Control": "no-store"}
+    task_url = request.url_for("get_nav_plan_task", task_id=task_id)
+    headers = {
+        "Location": str(task_url),
+        "Cache-Control": "no-store",
+        "X-Plan-Cache": "miss" if existing is None else "hit",
+    }
 
     return JSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         headers=headers,
-        content=TaskAccepted(task_id=async_res.id).model_dump(),
+        content=TaskAccepted(task_id=task_id).model_dump(),
     )
 
 # ========== GET /api/nav/plan/tasks/{task_id} → 状態照会 ==========
@@ -111,12 +166,75 @@ def _as_dict_if_json_string(x: Union[str, dict]) -> Union[dict, None]:
             return None
     return None
 
+def _if_none_match(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or tag in {t.strip() for t in header.split(",")}
+
+def _plan_response(task_id: str, raw: Any, request: Request, headers: Optional[Dict[str, str]] = None) -> Response:
+    doc = _as_dict_if_json_string(raw)
+    if doc is None:
+        raise HTTPException(status_code=500, detail="task returned empty or invalid result")
+    if doc.get("result_by_ref"):
+        # 結果参照モード: 本体は manifest.json（ワーカーが PlanResponse 形で書いたもの）
+        path = pack_files.manifest_path(doc.get("pack_id"))
+        if path is None:
+            raise HTTPException(status_code=500, detail=f"manifest for pack {doc.get('pack_id')} not found")
+        return pack_files.manifest_response(path, request, headers=headers)
+    try:
+        pr = PlanResponse(**doc)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"invalid nav.plan result: {e}")
+    return ORJSONResponse(status_code=status.HTTP_200_OK, headers=headers, content=pr.model_dump(by_alias=True))
+
+def _from_status_store(task_id: str, doc: Dict[str, str], request: Request):
+    """plan:status ハッシュ 1 回の参照で応答する。変化が無ければ 304。"""
+    doc = _settle_stalled(task_id, doc)
+    tag = plan_status.etag(task_id, doc)
+    # no-cache: クライアントは毎回 If-None-Match で再検証する
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if _if_none_match(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    state = doc.get("state") or states.PENDING
+    if state in INCOMPLETE:
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            headers=headers,
+            content={
+                "task_id": task_id,
+                "state": state,
+                "ready": False,
+                "stage": doc.get("stage") or None,
+                "progress": plan_status.progress(doc),
+            },
+        )
+    if state == states.FAILURE:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"task_id": task_id, "state": state, "ready": False, "error": doc.get("error")},
+        )
+    # SUCCESS: manifest.json があればディスクから直接返す（result backend を読まない）
+    path = pack_files.manifest_path(doc.get("pack_id"))
+    if path is not None:
+        return pack_files.manifest_response(path, request, headers=headers)
+    # 無ければ result_ref のタスク結果（replace 後も親 ID に保存される）
+    result = AsyncResult(doc.get("result_ref") or task_id, app=celery_app).result
+    return _plan_response(task_id, result, request, headers)
+
 @router.get("/plan/tasks/{task_id}", name="get_nav_plan_task")
-def get_nav_plan_task(task_id: str):
+def get_nav_plan_task(task_id: str, request: Request):
     """
-    ポーリング: 親(nav.plan)のIDでもOK。チェインの末端(finalize)までフォローして結果(dict)を返す。
+    ポーリング: 親(nav.plan)のIDでもOK。
+    plan:status ハッシュがあればそれだけで状態を返す（ETag / If-None-Match → 304 対応）。
+    無ければ（旧ワーカー・期限切れ）チェインの末端(finalize)までフォローして結果(dict)を返す。
     未完了なら 202、成功なら 200 + PlanResponse、失敗なら 500。
     """
+    doc = plan_status.read(task_id)
+    if doc is not None:
+        return _from_status_store(task_id, doc, request)
+
     root = AsyncResult(task_id, app=celery_app)
 
     # 1) 未完了なら 202
@@ -159,17 +277,59 @@ def get_nav_plan_task(task_id: str):
             # leaf SUCCESS の場合に dict or JSON文字列かを評価
             doc = _as_dict_if_json_string(leaf.result)
 
-    if doc is None:
-        # ここまで来て dict にならない＝タスク側の戻り値が不正
-        raise HTTPException(status_code=500, detail="task returned empty or invalid result")
-
     # 3) スキーマ検証 → 200で返す（alias考慮）
-    try:
-        pr = PlanResponse(**doc)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"invalid nav.plan result: {e}")
+    #    ここまで来て dict にならない＝タスク側の戻り値が不正（500）
+    return _plan_response(task_id, doc, request)
 
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content=pr.model_dump(by_alias=True),
-    )
\ No newline at end of file
+
+# ========== GET /api/nav/packs/{pack_id}/manifest.json → パックの manifest ==========
+@router.get("/packs/{pack_id}/manifest.json", name="get_nav_pack_manifest")
+def get_nav_pack_manifest(pack_id: str, request: Request):
+    path = pack_files.manifest_path(pack_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="pack not found")
+    # bundle.bin が出来ると bundle_url を埋めて書き直すので、キャッシュしたまま使わせない
+    return pack_files.manifest_response(path, request, headers={"Cache-Control": "public, no-cache"})
+
+
+# ========== GET /api/nav/packs/{pack_id}/match → 現在地の距離程と発火中の窓（テスト・検証用） ==========
+_match_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_match_lock = threading.Lock()
+
+def _load_geofence(pack_id: str):
+    """(polyline, geofence 索引)。manifest の更新時刻が変わったら読み直す。"""
+    path = pack_files.manifest_path(pack_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="pack not found")
+    mtime = path.stat().st_mtime_ns
+    with _match_lock:
+        hit = _match_cache.get(pack_id)
+        if hit is not None and hit[0] == mtime:
+            _match_cache.move_to_end(pack_id)
+            return hit[1], hit[2]
+    with open(path, "rb") as f:
+        manifest = json.loads(f.read())
+    polyline = manifest.get("polyline") or []
+    index = manifest.get("geofence")
+    if index is None:
+        # geofence 導入前のパック
+        index = geofence.build_index(polyline, manifest.get("segments") or [],
+                                     manifest.get("waypoints_info") or [], manifest.get("along_pois") or [])
+    with _match_lock:
+        _match_cache[pack_id] = (mtime, polyline, index)
+        _match_cache.move_to_end(pack_id)
+        while len(_match_cache) > max(1, NAV_MATCH_CACHE_SIZE):
+            _match_cache.popitem(last=False)
+    return polyline, index
+
+@router.get("/packs/{pack_id}/match", name="match_nav_pack")
+def match_nav_pack(
+    pack_id: str,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    hint: Optional[int] = Query(None, ge=0, description="前回の seg_idx（その前後だけを探す）"),
+):
+    polyline, index = _load_geofence(pack_id)
+    if len(polyline) < 2:
+        raise HTTPException(status_code=422, detail="pack has no route polyline")
+    return geofence.match(polyline, index, lon, lat, hint_seg=hint)
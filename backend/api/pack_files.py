@@ -0,0 +1,98 @@
+# backend/api/pack_files.py
+"""
+パック（/packs/{pack_id}/）内のファイルをゲートウェイから直接返す。
+
+- nav ワーカーと同じ PACKS_ROOT をマウントして参照する
+- Accept-Encoding を見て事前圧縮版（.br / .gz）があればそれを返す（再圧縮しない）
+- FileResponse は sendfile で返すため、本体を Python 側で読み込まない
+- manifest はコンパクト形（?compact=1）と MessagePack / CBOR 版（Accept）も選べる
+  （いずれも nav ワーカーが書き出したものをそのまま返す。無ければ JSON にフォールバック）
+"""
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse
+
+_PACK_ID_RE = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+# 優先順（先に一致したものを使う）
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Accept → コンパクト形のバイナリ版
+_BINARY_MANIFESTS = (
+    ("application/msgpack", "manifest.compact.msgpack"),
+    ("application/x-msgpack", "manifest.compact.msgpack"),
+    ("application/cbor", "manifest.compact.cbor"),
+)
+
+
+def packs_root() -> Path:
+    return Path(os.getenv("PACKS_ROOT") or "/packs")
+
+
+def manifest_path(pack_id: Optional[str]) -> Optional[Path]:
+    """pack_id が妥当で manifest.json が存在すればそのパス。"""
+    if not pack_id or not _PACK_ID_RE.match(pack_id):
+        return None
+    p = packs_root() / pack_id / "manifest.json"
+    return p if p.is_file() else None
+
+
+def accepted_encodings(request: Request) -> set[str]:
+    header = request.headers.get("accept-encoding") or ""
+    out = set()
+    for part in header.split(","):
+        name, *params = [x.strip() for x in part.split(";")]
+        q = 1.0
+        for prm in params:
+            if prm.startswith("q="):
+                try:
+                    q = float(prm[2:])
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            out.add(name.lower())
+    return out
+
+
+def file_response(
+    path: Path,
+    request: Request,
+    media_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+) -> FileResponse:
+    """path（または事前圧縮版）を返す。"""
+    accepted = accepted_encodings(request)
+    out_headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    for enc, suffix in _ENCODINGS:
+        variant = path.with_name(path.name + suffix)
+        if enc in accepted and variant.is_file():
+            out_headers["Content-Encoding"] = enc
+            return FileResponse(variant, media_type=media_type, headers=out_headers)
+    return FileResponse(path, media_type=media_type, headers=out_headers)
+
+
+def _wants_compact(request: Request) -> bool:
+    return (request.query_params.get("compact") or "").lower() in ("1", "true", "yes")
+
+
+def manifest_response(path: Path, request: Request, headers: Optional[Dict[str, str]] = None) -> FileResponse:
+    """
+    manifest.json（path）を、Accept / ?compact / Accept-Encoding に応じた版で返す。
+    """
+    out_headers = {**(headers or {}), "Vary": "Accept, Accept-Encoding"}
+    accept = (request.headers.get("accept") or "").lower()
+    for media_type, name in _BINARY_MANIFESTS:
+        variant = path.with_name(name)
+        if media_type in accept and variant.is_file():
+            return FileResponse(variant, media_type=media_type, headers=out_headers)
+    if _wants_compact(request) or any(mt in accept for mt, _ in _BINARY_MANIFESTS):
+        compact = path.with_name("manifest.compact.json")
+        if compact.is_file():
+            return file_response(compact, request, headers=out_headers)
+    return file_response(path, request, headers=out_headers)
@@ -0,0 +1,98 @@
+# backend/api/plan_cache.py
+"""
+同一プランの重複実行を防ぐ（single-flight + 直近結果のキャッシュ）。
+
+- 指紋: 言語・spot_id の並び・バッファ・周回有無・グリッドに丸めた出発地
+- Redis に plan:fp:{指紋} → task_id を SET NX で置く
+    * 実行中の同一リクエストは同じ task_id に合流する
+    * 完了後も PLAN_CACHE_TTL_S の間は同じ task_id（= 同じ pack_id の結果）を返す
+- 失敗・取消済みのタスクを指していたら、新しい task_id に付け替える
+- Redis が使えないときはキャッシュなし（毎回投入）で動く
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_URL = os.getenv("PLAN_CACHE_REDIS_URL", "redis://redis:6379/2")
+PLAN_CACHE_TTL_S = int(os.getenv("PLAN_CACHE_TTL_S", "1800"))
+ORIGIN_GRID_M = float(os.getenv("PLAN_ORIGIN_GRID_M", "250"))
+
+# nav 側 PlanRequest.buffer の既定値（未指定のリクエストはこれと同一視する）
+_DEFAULT_BUFFER = {"car": 300, "foot": 10}
+_KEY_PREFIX = "plan:fp:"
+
+# GET が expected と一致するときだけ置き換える（失敗タスクの付け替え用）
+_CAS_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+  return 1
+end
+return 0
+"""
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis  # 遅延 import（キャッシュ無効時に依存させない）
+        _client = redis.Redis.from_url(PLAN_CACHE_URL, decode_responses=True, socket_timeout=1.0)
+    return _client
+
+
+def _snap_origin(lat: float, lon: float, grid_m: float) -> tuple[int, int]:
+    """出発地を grid_m 四方のセル番号に丸める。"""
+    lat_step = grid_m / 111_320.0
+    row = math.floor(lat / lat_step)
+    cos_lat = max(math.cos(math.radians((row + 0.5) * lat_step)), 1e-6)
+    lon_step = grid_m / (111_320.0 * cos_lat)
+    return row, math.floor(lon / lon_step)
+
+
+def plan_fingerprint(payload: Dict[str, Any], grid_m: float = ORIGIN_GRID_M) -> str:
+    origin = payload.get("origin") or {}
+    doc = {
+        "language": payload.get("language"),
+        "spots": [w.get("spot_id") for w in payload.get("waypoints") or []],
+        "buffer": payload.get("buffer") or _DEFAULT_BUFFER,
+        "return_to_origin": payload.get("return_to_origin", True),
+        "origin": _snap_origin(float(origin.get("lat", 0.0)), float(origin.get("lon", 0.0)), grid_m),
+    }
+    raw = json.dumps(doc, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def claim(fingerprint: str, task_id: str) -> Optional[str]:
+    """
+    指紋に task_id を登録する。既に登録済みならその task_id を返す（None = 新規に確保できた）。
+    Redis 障害時も None（呼び出し側はそのまま投入する）。
+    """
+    try:
+        key = _KEY_PREFIX + fingerprint
+        if _redis().set(key, task_id, nx=True, ex=PLAN_CACHE_TTL_S):
+            return None
+        existing = _redis().get(key)
+        if existing is None:
+            # GET までの間に期限切れ → もう一度だけ確保を試みる
+            return None if _redis().set(key, task_id, nx=True, ex=PLAN_CACHE_TTL_S) else _redis().get(key)
+        return existing
+    except Exception:
+        logger.warning("plan cache unavailable; enqueueing without dedup", exc_info=True)
+        return None
+
+
+def replace(fingerprint: str, expected_task_id: str, task_id: str) -> bool:
+    """指紋が expected_task_id を指しているときだけ task_id に付け替える。"""
+    try:
+        return bool(_redis().eval(_CAS_LUA, 1, _KEY_PREFIX + fingerprint, expected_task_id, task_id, PLAN_CACHE_TTL_S))
+    except Exception:
+        logger.warning("plan cache unavailable; enqueueing without dedup", exc_info=True)
+        return True
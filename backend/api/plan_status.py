@@ -0,0 +1,123 @@
+# backend/api/plan_status.py
+"""
+nav ワーカーが書くプラン状態ハッシュ（plan:status:{task_id}）の読み出し側。
+フィールドの意味は backend/worker/app/services/nav/plan_status.py を参照。
+
+- read(): HGETALL 1 回。無ければ None（旧ワーカー・期限切れ・Redis 障害）
+- etag(): rev から弱い ETag を作る（状態が変わらなければ同じ値）
+- is_stalled() / settle(): 実行中（STARTED）のまま updated_at がワーカーの書いた stale_after_s 以上止まった
+  ハッシュを見分け、ゲートウェイが確かめた最終状態で上書きする（ワーカー停止で STARTED のまま残さない）。
+  実行中はワーカーがハートビートで updated_at を進めるので、長い LLM・TTS 呼び出しでは止まらない。
+  キューで待っているプラン（PENDING・queued=1）は、いくら待っても止まったとはみなさない
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PLAN_STATUS_URL = os.getenv("PLAN_STATUS_REDIS_URL", "redis://redis:6379/2")
+PLAN_STATUS_TTL_S = int(os.getenv("PLAN_STATUS_TTL_S", "86400"))
+_KEY_PREFIX = "plan:status:"
+# ワーカーが実行中のはずの状態（PENDING / RECEIVED はまだキューにある）
+_RUNNING = {"STARTED", "RETRY"}
+
+# 見た時から更新されていなければ（ワーカーが先に書いていなければ）状態を上書きする
+# KEYS[1]=plan:status:{id}, ARGV[1]=見た updated_at, ARGV[2]=state, ARGV[3]=error, ARGV[4]=ttl, ARGV[5]=now
+_SETTLE_LUA = """
+if redis.call('HGET', KEYS[1], 'updated_at') ~= ARGV[1] then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[2], 'error', ARGV[3], 'updated_at', ARGV[5])
+redis.call('HINCRBY', KEYS[1], 'rev', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(PLAN_STATUS_URL, decode_responses=True, socket_timeout=1.0)
+    return _client
+
+
+def mark_pending(task_id: str) -> None:
+    """投入直後の状態を置く（ワーカーが拾う前のポーリングも 1 回の参照で返せるように）。"""
+    key = _KEY_PREFIX + task_id
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.hsetnx(key, "state", "PENDING")
+        pipe.hsetnx(key, "updated_at", int(time.time()))
+        pipe.hincrby(key, "rev", 1)
+        pipe.expire(key, PLAN_STATUS_TTL_S)
+        pipe.execute()
+    except Exception:
+        logger.warning("plan status store unavailable", exc_info=True)
+
+
+def read(task_id: str) -> Optional[Dict[str, str]]:
+    try:
+        doc = _redis().hgetall(_KEY_PREFIX + task_id)
+    except Exception:
+        logger.warning("plan status store unavailable", exc_info=True)
+        return None
+    return doc or None
+
+
+def etag(task_id: str, doc: Dict[str, str]) -> str:
+    return f'W/"{task_id}-{doc.get("rev", "0")}"'
+
+
+def progress(doc: Dict[str, str]) -> Dict[str, int]:
+    def _int(v: Optional[str]) -> int:
+        try:
+            return int(v or 0)
+        except ValueError:
+            return 0
+    return {"done": _int(doc.get("done")), "total": _int(doc.get("total"))}
+
+
+def stale_after_s(doc: Dict[str, str]) -> Optional[float]:
+    try:
+        return float(doc["stale_after_s"])
+    except (KeyError, ValueError):
+        return None
+
+
+def is_stalled(doc: Dict[str, str], now: Optional[float] = None) -> bool:
+    """
+    実行中のまま stale_after_s 以上書き込み（ハートビート含む）が無いか。
+    キューで待っているもの・updated_at / stale_after_s の無い旧ハッシュは判定しない。
+    """
+    if doc.get("state") not in _RUNNING or doc.get("queued") == "1":
+        return False
+    stale_s = stale_after_s(doc)
+    if stale_s is None:
+        return False
+    try:
+        updated_at = float(doc["updated_at"])
+    except (KeyError, ValueError):
+        return False
+    return (time.time() if now is None else now) - updated_at >= stale_s
+
+
+def settle(task_id: str, doc: Dict[str, str], state: str, error: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    止まったハッシュ（doc は直前に読んだもの）を state で上書きし、新しい内容を返す。
+    その間にワーカーが書き込んでいたら上書きせず、読み直した内容を返す。
+    """
+    key = _KEY_PREFIX + task_id
+    try:
+        _redis().eval(_SETTLE_LUA, 1, key, doc.get("updated_at", ""), state, error or "",
+                      PLAN_STATUS_TTL_S, int(time.time()))
+    except Exception:
+        logger.warning("plan status store unavailable", exc_info=True)
+        return None
+    return read(task_id)
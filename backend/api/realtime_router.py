@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import socket
 import threading
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from typing_extensions import TypedDict
 import base64  # ★★★ Base64デコードのためにインポート
 
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, ORJSONResponse
 from starlette.responses import Response
 
+from backend.api import rt_codec
+from backend.api.rt_ingest import BatchQueue, DownlinkScheduler
+from backend.api.rt_providers import make_provider_cache
+from backend.api.rt_store import RT_LEADER_TTL_S, get_store
+
 try:
     import paho.mqtt.client as mqtt
 except Exception:
@@ -29,7 +36,10 @@ class RTDoc(TypedDict, total=False):
     w: int
     c: int
 
-_state: Dict[str, RTDoc] = {}
+# 最新の RTDoc と変更シーケンス（bulk API・ロングポーリング用）
+_store = get_store()
+# 天候・混雑度の取得元。定期的にまとめて取得し、変わったスポットはストアにも反映する
+_providers = make_provider_cache(on_refresh=lambda docs: _store.put_many(docs))
 _MQTT_CLIENT: Optional["mqtt.Client"] = None
 _MQTT_STOP = threading.Event()
 
@@ -52,6 +62,24 @@ MQTT_UPLINK_TOPIC = f"v3/{TTN_APP_ID}@ttn/devices/{TTN_DEVICE_ID}/up"
 # MQTT_DOWNLINK_TOPIC = f"v3/{TTN_APP_ID}/devices/{TTN_DEVICE_ID}/down/push"
 MQTT_DOWNLINK_TOPIC = f"v3/{TTN_APP_ID}@ttn/devices/{TTN_DEVICE_ID}/down/push"
 
+
+def _downlink_topic(device_id: Optional[str]) -> str:
+    if not device_id or device_id == TTN_DEVICE_ID:
+        return MQTT_DOWNLINK_TOPIC
+    return f"v3/{TTN_APP_ID}@ttn/devices/{device_id}/down/push"
+
+# ==============================
+# uplink / downlink キュー（paho のスレッドでは積むだけ）
+# ==============================
+RT_UPLINK_QUEUE_MAX = int(os.getenv("RT_UPLINK_QUEUE_MAX", "1000"))
+RT_UPLINK_BATCH = int(os.getenv("RT_UPLINK_BATCH", "100"))
+RT_UPLINK_DROP = os.getenv("RT_UPLINK_DROP", "oldest")
+RT_DOWNLINK_QUEUE_MAX = int(os.getenv("RT_DOWNLINK_QUEUE_MAX", "1000"))
+# 同じ端末への downlink をまとめる時間と 1 フレームの上限（AS923 DR3 の 53 バイトに収まるように）
+RT_DOWNLINK_WINDOW_S = float(os.getenv("RT_DOWNLINK_WINDOW_S", "2.0"))
+RT_DOWNLINK_MAX_BYTES = int(os.getenv("RT_DOWNLINK_MAX_BYTES", "51"))
+
+
 def _status_monitor():
     while True:
         if _MQTT_CLIENT:
@@ -70,64 +98,81 @@ def _on_connect(client, userdata, flags, rc, properties=None):
         print(f"【ERROR】MQTTブローカーへ接続失敗。コード: {rc}")
 
 def _on_message(client, userdata, msg):
-    """ ★★★ TTNからのUplinkメッセージを処理する関数 ★★★ """
-    print(f"【DEBUG】MQTTメッセージ受信コールバック開始")
-    try:
-        decoded_payload = msg.payload.decode("utf-8")
-        print(f"【DEBUG】ペイロードデコード済み: {decoded_payload}")
-        ttn_msg = json.loads(msg.payload.decode("utf-8"))
-        print(f"TTNメッセージ内容: {json.dumps(ttn_msg, indent=2, ensure_ascii=False)}")
-
-        # 'data' キーが存在し、その中に 'uplink_message' があるかチェック
-        if "data" in ttn_msg and "uplink_message" in ttn_msg["data"]:
-            uplink = ttn_msg["data"]["uplink_message"]
-        # 'data' キーがないトップレベルのuplink_messageも念のためチェック
-        elif "uplink_message" in ttn_msg:
-            uplink = ttn_msg["uplink_message"]
-        else:
-            return # 該当するメッセージでなければ終了
+    """ ★★★ TTNからのUplinkメッセージ：キューに積むだけ（paho のネットワークスレッドを塞がない） ★★★ """
+    _uplinks.submit(msg.payload)
 
-        if "frm_payload" not in uplink:
-            return
 
-        # Base64エンコードされたペイロードを取得
-        payload_b64 = uplink["frm_payload"]
+def _decode_uplink(raw: bytes) -> Optional[Tuple[str, List[Tuple[str, Optional[int]]]]]:
+    """
+    TTN の uplink メッセージから (device_id, [(spot_id, 端末の状態バイト or None)]) を取り出す。
+    frm_payload は rt_codec の v1 バイナリ、または従来の spot_id テキスト。
+    """
+    ttn_msg = json.loads(raw)
+    # 'data' キーが存在し、その中に 'uplink_message' があるかチェック
+    if "data" in ttn_msg and "uplink_message" in ttn_msg["data"]:
+        ttn_msg = ttn_msg["data"]
+    # 'data' キーがないトップレベルのuplink_messageも念のためチェック
+    elif "uplink_message" not in ttn_msg:
+        return None # 該当するメッセージでなければ終了
+    uplink = ttn_msg["uplink_message"]
+    if "frm_payload" not in uplink:
+        return None
+    device_id = (ttn_msg.get("end_device_ids") or {}).get("device_id") or TTN_DEVICE_ID or ""
+    payload = base64.b64decode(uplink["frm_payload"])
+    return device_id, rt_codec.decode_uplink(payload, rt_codec.get_spot_codes())
 
-        # payload_b64 = ttn_msg["uplink_message"]["frm_payload"]
-        # Base64デコードして元のspot_idを取得
-        spot_id = base64.b64decode(payload_b64).decode("utf-8")
-        print(f"TTNからUplink受信: spot_id = {spot_id}")
 
-        # --- ここで本来は天候や混雑度をDBなどから取得する ---
-        # 今回はダミーデータを生成する
-        import random
-        dummy_weather = random.randint(0, 2)
-        dummy_congestion = random.randint(0, 4)
-        # ----------------------------------------------------
+def _lookup_rt(spot_id: str) -> Optional[RTDoc]:
+    """天候・混雑度はプロバイダのキャッシュから引くだけ（上流 API は呼ばない）。"""
+    return _providers.get(spot_id)
 
-        response_doc: RTDoc = {"s": spot_id, "w": dummy_weather, "c": dummy_congestion}
-        
-        # 内部状態を更新
-        _state[spot_id] = response_doc
-
-        # ★★★ フロントエンドに応答を返すためにDownlinkを送信 ★★★
-        _publish_downlink(response_doc)
 
-    except Exception as e:
-        print(f"MQTTメッセージの処理中にエラーが発生しました: {e}")
+def _process_uplinks(batch: List[bytes]) -> None:
+    """uplink をまとめて処理する（デコード → 状態を一括更新 → 端末ごとの downlink 予約）。"""
+    docs: Dict[str, RTDoc] = {}
+    requests: Dict[str, Dict[str, Optional[int]]] = {}  # device_id → {spot_id: 端末の状態バイト}
+    for raw in batch:
+        try:
+            decoded = _decode_uplink(raw)
+        except Exception as e:
+            logger.warning("invalid uplink dropped: %s", e)
+            continue
+        if not decoded:
+            continue
+        device_id, spots = decoded
+        for spot_id, etag in spots:
+            # 同じバッチ内の同一スポットは 1 件にまとめる
+            if spot_id not in docs:
+                doc = _lookup_rt(spot_id)
+                if doc is None:
+                    continue  # まだ取得できていない（返せる値が無い）
+                docs[spot_id] = doc
+            requests.setdefault(device_id, {})[spot_id] = etag
+    if not docs:
         return
+    logger.debug("uplinks: %d messages -> %d spots", len(batch), len(docs))
+
+    # 内部状態を更新
+    _store.put_many(docs.values())
+
+    # ★★★ フロントエンドに応答を返すためにDownlinkを予約（端末ごとにまとめて別スレッドで送信） ★★★
+    for device_id, etags in requests.items():
+        _scheduler.offer(device_id, {sid: docs[sid] for sid in etags}, etags)
 
-def _publish_downlink(payload: RTDoc):
-    """ ★★★ TTNへDownlinkメッセージを送信する関数 ★★★ """
+
+def _publish_downlinks(batch: List[Tuple[str, bytes]]) -> None:
+    for device_id, frame in batch:
+        _publish_downlink(device_id, frame)
+
+
+def _publish_downlink(device_id: str, frame: bytes):
+    """ ★★★ TTNへDownlinkメッセージ（rt_codec の v1 フレーム）を送信する関数 ★★★ """
     if not _MQTT_CLIENT:
         print("【ERROR】 MQTTクライアント未初期化のためダウンリンク送信できません")
         return
 
-    # フロントエンドが期待するJSON形式に変換し、UTF-8のバイト列にする
-    payload_json_bytes = json.dumps(payload).encode("utf-8")
-    
     # バイト列を直接Base64エンコードする
-    payload_b64 = base64.b64encode(payload_json_bytes).decode("utf-8")
+    payload_b64 = base64.b64encode(frame).decode("utf-8")
     
     # TTNが要求するDownlinkメッセージの形式でラップする
     downlink_msg = {
@@ -140,8 +185,8 @@ def _publish_downlink(payload: RTDoc):
     
     try:
         downlink_json_for_ttn = json.dumps(downlink_msg)
-        _MQTT_CLIENT.publish(MQTT_DOWNLINK_TOPIC, downlink_json_for_ttn, qos=1)
-        print(f"【DEBUG】ダウンリンク送信成功: {downlink_json_for_ttn}")
+        _MQTT_CLIENT.publish(_downlink_topic(device_id), downlink_json_for_ttn, qos=1)
+        logger.debug("downlink published: %s", downlink_json_for_ttn)
     except Exception as e:
         print(f"【ERROR】ダウンリンク送信失敗: {e}")
 
@@ -183,37 +228,266 @@ def _mqtt_worker():
 
 # (Thread, startup, shutdown, HTTP endpoints... 以下は変更なし)
 
+_uplinks = BatchQueue(
+    "uplink", _process_uplinks,
+    maxsize=RT_UPLINK_QUEUE_MAX, batch_size=RT_UPLINK_BATCH, drop_policy=RT_UPLINK_DROP,
+)
+_downlinks = BatchQueue("downlink", _publish_downlinks, maxsize=RT_DOWNLINK_QUEUE_MAX, batch_size=RT_UPLINK_BATCH)
+_scheduler = DownlinkScheduler(
+    lambda device_id, frame: _downlinks.submit((device_id, frame)),
+    window_s=RT_DOWNLINK_WINDOW_S, max_frame_bytes=RT_DOWNLINK_MAX_BYTES,
+)
+
 _MQTT_THREAD: Optional[threading.Thread] = None
+_LEADER_THREAD: Optional[threading.Thread] = None
+# リース（RT_STORE=redis のとき rt:mqtt:leader）の持ち主識別子
+_LEADER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _start_mqtt_thread() -> None:
+    global _MQTT_THREAD
+    if _MQTT_THREAD and _MQTT_THREAD.is_alive():
+        return
+    print("【DEBUG】MQTTスレッドを新規起動します")
+    _MQTT_THREAD = threading.Thread(target=_mqtt_worker, name="rt-mqtt", daemon=True)
+    _MQTT_THREAD.start()
+
+
+def _leader_loop() -> None:
+    """
+    MQTT の購読は 1 プロセスだけが行う。リースを取れたワーカーが MQTT を起動し、
+    失ったら切断する（他のワーカーは共有ストア経由で状態を受け取る）。
+    """
+    leader = False
+    interval = max(1.0, RT_LEADER_TTL_S / 3)
+    while not _MQTT_STOP.is_set():
+        if _store.acquire_leader(_LEADER_ID):
+            if not leader:
+                logger.info("rt mqtt leader acquired: %s", _LEADER_ID)
+            leader = True
+            # 上流からの定期取得もリーダーだけ（他のワーカーへはストア経由で届く）
+            _providers.start()
+            if _mqtt_enabled():
+                _start_mqtt_thread()
+        elif leader:
+            logger.warning("rt mqtt leader lost: %s", _LEADER_ID)
+            leader = False
+            _providers.stop()
+            if _MQTT_CLIENT:
+                _MQTT_CLIENT.disconnect()
+        _MQTT_STOP.wait(interval)
+    _providers.stop()
+    if leader:
+        _store.release_leader(_LEADER_ID)
+
+
+def _mqtt_enabled() -> bool:
+    return mqtt is not None and all([TTN_APP_ID, TTN_DEVICE_ID])
+
+
 @router.on_event("startup")
 def _startup_mqtt():
     print("【DEBUG】FastAPI startup イベント発火。MQTTワーカー起動中...")
+    # 共有ストア（redis）なら変更通知の購読を始める
+    _store.start()
+    global _LEADER_THREAD
+    if _LEADER_THREAD and _LEADER_THREAD.is_alive():
+        print("【DEBUG】MQTTワーカー既に起動中")
+        return
+    _MQTT_STOP.clear()
+    # MQTT が無効でもプロバイダの定期取得は回す（HTTP / WebSocket 用）
+    _LEADER_THREAD = threading.Thread(target=_leader_loop, name="rt-mqtt-leader", daemon=True)
+    _LEADER_THREAD.start()
     if mqtt is None:
         print("【ERROR】paho-mqttがimportできていません。")
         return
-    global _MQTT_THREAD
-    if _MQTT_THREAD and _MQTT_THREAD.is_alive():
-        print("【DEBUG】MQTTワーカー既に起動中")
+    if not all([TTN_APP_ID, TTN_DEVICE_ID]):
+        print("MQTTクライアントが無効、またはTTNのIDが設定されていません。")
         return
-    print("【DEBUG】MQTTスレッドを新規起動します")
-    _MQTT_STOP.clear()
-    _MQTT_THREAD = threading.Thread(target=_mqtt_worker, name="rt-mqtt", daemon=True)
-    _MQTT_THREAD.start()
+    _uplinks.start()
+    _scheduler.start()
+    _downlinks.start()
     threading.Thread(target=_status_monitor, daemon=True).start()
 
 @router.on_event("shutdown")
 def _shutdown_mqtt():
+    _MQTT_STOP.set()
+    _providers.stop()
+    _uplinks.stop()
+    _scheduler.stop()
+    _downlinks.stop()
+    _store.stop()
+    _store.release_leader(_LEADER_ID)
     if mqtt is None or not _MQTT_CLIENT: return
     _MQTT_CLIENT.disconnect()
 
 @router.get("/spot/{spot_id}", response_class=JSONResponse, summary="最新のリアルタイム情報（極小JSON）")
 def get_spot_rt(spot_id: str):
-    item = _state.get(spot_id)
+    item = _store.get(spot_id)
     if not item:
         return Response(status_code=204)
     return JSONResponse(content=item)
 
+
+# ロングポーリングの上限（プロキシのタイムアウトより短く）
+RT_LONGPOLL_MAX_S = float(os.getenv("RT_LONGPOLL_MAX_S", "30"))
+RT_BULK_MAX_SPOTS = int(os.getenv("RT_BULK_MAX_SPOTS", "200"))
+
+
+def _seq_etag(seq: int) -> str:
+    return f'W/"rt-{seq}"'
+
+
+def _cursor_from(request: Request, since: Optional[int]) -> Optional[int]:
+    """since クエリ、なければ If-None-Match（W/"rt-{seq}"）から cursor を得る。"""
+    if since is not None:
+        return since
+    inm = (request.headers.get("if-none-match") or "").strip()
+    if inm.startswith('W/"rt-') and inm.endswith('"'):
+        try:
+            return int(inm[6:-1])
+        except ValueError:
+            return None
+    return None
+
+
+@router.get("/spots", summary="複数スポットのリアルタイム情報（変更カーソル・ロングポーリング対応）")
+async def get_spots_rt(
+    request: Request,
+    ids: str = Query(..., description="カンマ区切りの spot_id"),
+    since: Optional[int] = Query(None, ge=0, description="前回レスポンスの seq。これより後の変更だけ返す"),
+    wait: float = Query(0.0, ge=0.0, description="変更が無いとき最大何秒待つか（ロングポーリング）"),
+):
+    """
+    200: {"seq": N, "full": bool, "spots": {spot_id: {w, c, ...}}}
+         full=true は cursor なし（またはサーバ再起動で cursor が未来）のスナップショット
+    304: cursor 以降、指定スポットに変化なし（ETag / X-RT-Seq に現在の seq）
+    """
+    spot_ids = list(dict.fromkeys(x for x in ids.split(",") if x))[:RT_BULK_MAX_SPOTS]
+    cursor = _cursor_from(request, since)
+    if cursor is not None and cursor > _store.seq:
+        cursor = None  # 再起動などで seq が巻き戻った → 全件を返し直す
+
+    full = cursor is None
+    seq, docs = _store.changes_since(cursor or 0, spot_ids)
+    if not full and not docs and wait > 0:
+        deadline = time.monotonic() + min(wait, RT_LONGPOLL_MAX_S)
+        while not docs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await _store.wait(seq, remaining):
+                break
+            seq, docs = _store.changes_since(cursor, spot_ids)
+
+    headers = {"ETag": _seq_etag(seq), "X-RT-Seq": str(seq), "Cache-Control": "no-cache"}
+    if not full and not docs:
+        return Response(status_code=304, headers=headers)
+    spots = {sid: {k: v for k, v in doc.items() if k != "s"} for sid, doc in docs.items()}
+    return ORJSONResponse({"seq": seq, "full": full, "spots": spots}, headers=headers)
+
+
+RT_WS_HEARTBEAT_S = float(os.getenv("RT_WS_HEARTBEAT_S", "25"))
+
+
+def _spots_frame(seq: int, full: bool, docs: Dict[str, RTDoc]) -> dict:
+    return {
+        "t": "d",
+        "seq": seq,
+        "full": full,
+        "spots": {sid: {k: v for k, v in doc.items() if k != "s"} for sid, doc in docs.items()},
+    }
+
+
+@router.websocket("/ws")
+async def rt_ws(ws: WebSocket):
+    """
+    リアルタイム情報のプッシュ配信。
+      クライアント → {"op": "sub", "ids": [...], "since": seq | null}（何度でも送り直せる）
+      サーバ       → {"t": "d", "seq", "full", "spots"}  sub への応答と、対象スポットが変わったとき（差分のみ）
+                     {"t": "hb", "seq"}                   RT_WS_HEARTBEAT_S 秒送信が無かったとき
+    再接続時は最後に受け取った seq を since に入れれば、その後の変更だけを受け取れる。
+    待機中の接続はストアの待ち行列に future を 1 つ置くだけ（ポーリングのような負荷は無い）。
+    """
+    await ws.accept()
+    sub: Dict[str, object] = {"ids": [], "since": None}
+    resubscribed = asyncio.Event()
+
+    async def reader() -> None:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            text = message.get("text")
+            if text is None:
+                continue  # バイナリフレームは無視（購読はテキストの JSON だけ）
+            try:
+                msg = json.loads(text)
+            except ValueError:
+                continue  # 壊れたフレームは無視
+            if isinstance(msg, dict) and msg.get("op") == "sub":
+                ids = [str(x) for x in msg.get("ids") or [] if x]
+                since = msg.get("since")
+                sub["ids"] = list(dict.fromkeys(ids))[:RT_BULK_MAX_SPOTS]
+                sub["since"] = since if isinstance(since, int) and since >= 0 else None
+                resubscribed.set()
+
+    reader_task = asyncio.create_task(reader())
+    seq: Optional[int] = None  # このクライアントに届けた seq（未購読なら None）
+    last_sent = time.monotonic()
+    try:
+        while True:
+            if resubscribed.is_set():
+                resubscribed.clear()
+                cursor = sub["since"]
+                if cursor is not None and cursor > _store.seq:
+                    cursor = None  # 再起動などで seq が巻き戻った → 全件
+                seq, docs = _store.changes_since(cursor or 0, sub["ids"])
+                await ws.send_json(_spots_frame(seq, cursor is None, docs))
+                last_sent = time.monotonic()
+                continue
+
+            timeout = max(0.0, last_sent + RT_WS_HEARTBEAT_S - time.monotonic())
+            waits = {asyncio.ensure_future(resubscribed.wait())}
+            if seq is not None:
+                waits.add(asyncio.ensure_future(_store.wait(seq, timeout)))
+            done, pending = await asyncio.wait(
+                waits | {reader_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED,
+            )
+            for t in pending - {reader_task}:
+                t.cancel()
+            if reader_task in done:
+                reader_task.result()  # 切断なら WebSocketDisconnect
+                break
+            if resubscribed.is_set():
+                continue
+
+            if seq is not None and _store.seq > seq:
+                seq, docs = _store.changes_since(seq, sub["ids"])
+                if docs:
+                    await ws.send_json(_spots_frame(seq, False, docs))
+                    last_sent = time.monotonic()
+            if time.monotonic() - last_sent >= RT_WS_HEARTBEAT_S:
+                await ws.send_json({"t": "hb", "seq": seq})
+                last_sent = time.monotonic()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader_task.cancel()
+
+
+@router.get("/_metrics", summary="MQTT 取り込みキュー・プロバイダの状態")
+def get_rt_metrics():
+    return {
+        "seq": _store.seq,
+        "mqtt_connected": bool(_MQTT_CLIENT and _MQTT_CLIENT.is_connected()),
+        "uplink": _uplinks.metrics(),
+        "downlink": _downlinks.metrics(),
+        "downlink_scheduler": _scheduler.metrics(),
+        "providers": _providers.metrics(),
+    }
+
+
 @router.post("/_mock/{spot_id}")
 def _mock_push(spot_id: str, body: RTDoc):
     body["s"] = spot_id
-    _state[spot_id] = body
-    return {"ok": True}
\ No newline at end of file
+    _store.put(body)
+    return {"ok": True}
@@ -0,0 +1,184 @@
+# backend/api/rt_codec.py
+"""
+LoRa 用のバイナリ形式（v1）。フロントの src/lib/loraBridge.js と同じ形にすること。
+
+spot code:
+  POI.json の spot_id を昇順に並べて 0..255 を振ったもの（frontend/src/lib/spotCodes.js の by_id と同じ）。
+  257 件目以降は code なし（バイナリでは送れない）。
+
+状態バイト（= フロントの rt.js _calcEtag と同じビット配置。クライアントの etag そのもの）:
+  [ w(2) | u(2) | c(3) | hbit(1) ]   hbit = (u > 0 かつ h が数値)
+  hbit=1 のときだけ直後に h（0..255）を 1 バイト続ける。
+
+downlink フレーム（サーバ → 端末）:
+  [ 0x10 | n ] + n × [ code, 状態バイト, (h) ]      n = 1..15
+uplink フレーム（端末 → サーバ）:
+  [ 0x10 | n ] + n × [ code, 端末が持っている状態バイト ]
+  まだ値を持っていないスポットは ETAG_NONE（u=0 なのに hbit=1 で、実際の状態には現れない値）。
+  先頭バイトが 0x10..0x1F 以外なら従来のテキスト（spot_id そのもの）として扱う。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+MAX_SPOTS_PER_FRAME = 0x0F
+MAX_CODES = 256
+ETAG_NONE = 0x01
+
+RT_SPOT_CODES_PATH = os.getenv(
+    "RT_SPOT_CODES_PATH", str(Path(__file__).resolve().parents[1] / "worker" / "data" / "POI.json")
+)
+
+RTDocDict = Dict[str, object]
+
+
+def load_spot_ids(path: str = RT_SPOT_CODES_PATH) -> List[str]:
+    """POI.json の spot_id 一覧（ファイル順・重複なし）。"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return list(dict.fromkeys(str(x["spot_id"]) for x in data if isinstance(x, dict) and x.get("spot_id")))
+
+
+class SpotCodes:
+    """spot_id ⇔ 1 バイト code の対応表。"""
+
+    def __init__(self, spot_ids: Iterable[str]) -> None:
+        self._by_id: Dict[str, int] = {}
+        self._by_code: List[str] = []
+        for sid in sorted(dict.fromkeys(str(s) for s in spot_ids if s)):
+            if len(self._by_code) >= MAX_CODES:
+                break
+            self._by_id[sid] = len(self._by_code)
+            self._by_code.append(sid)
+
+    @classmethod
+    def from_poi_json(cls, path: str) -> "SpotCodes":
+        return cls(load_spot_ids(path))
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def code(self, spot_id: str) -> Optional[int]:
+        return self._by_id.get(spot_id)
+
+    def spot_id(self, code: int) -> Optional[str]:
+        return self._by_code[code] if 0 <= code < len(self._by_code) else None
+
+
+_SPOT_CODES: Optional[SpotCodes] = None
+
+
+def get_spot_codes() -> SpotCodes:
+    global _SPOT_CODES
+    if _SPOT_CODES is None:
+        try:
+            _SPOT_CODES = SpotCodes.from_poi_json(RT_SPOT_CODES_PATH)
+        except (OSError, ValueError) as e:
+            logger.warning("spot codes unavailable (%s): %s", RT_SPOT_CODES_PATH, e)
+            _SPOT_CODES = SpotCodes([])
+    return _SPOT_CODES
+
+
+def _field(doc: RTDocDict, key: str, mask: int) -> int:
+    v = doc.get(key)
+    return int(v) & mask if isinstance(v, (int, float)) else 0
+
+
+def pack_state(doc: RTDocDict) -> Tuple[int, Optional[int]]:
+    """RTDoc → (状態バイト, h)。h は hbit=1 のときだけ値を持つ。"""
+    w, u, c = _field(doc, "w", 0b11), _field(doc, "u", 0b11), _field(doc, "c", 0b111)
+    h = doc.get("h")
+    has_h = u > 0 and isinstance(h, (int, float))
+    state = (w << 6) | (u << 4) | (c << 1) | int(has_h)
+    return state, (max(0, min(255, int(h))) if has_h else None)
+
+
+def unpack_state(state: int, h: Optional[int] = None) -> RTDocDict:
+    doc: RTDocDict = {"w": (state >> 6) & 0b11, "u": (state >> 4) & 0b11, "c": (state >> 1) & 0b111}
+    if state & 1 and h is not None:
+        doc["h"] = h
+    return doc
+
+
+def _header(n: int) -> int:
+    return (VERSION << 4) | n
+
+
+def is_binary(payload: bytes) -> bool:
+    return bool(payload) and payload[0] >> 4 == VERSION and 0 < payload[0] & 0x0F
+
+
+def encode_downlinks(docs: Iterable[RTDocDict], codes: SpotCodes, max_bytes: int) -> List[bytes]:
+    """
+    RTDoc 群をフレームに詰める（1 フレーム max_bytes・最大 15 スポット）。
+    code の無いスポットは送れないので飛ばす。
+    """
+    frames: List[bytes] = []
+    body = bytearray()
+    n = 0
+
+    def flush() -> None:
+        nonlocal body, n
+        if n:
+            frames.append(bytes([_header(n)]) + bytes(body))
+        body, n = bytearray(), 0
+
+    for doc in docs:
+        code = codes.code(str(doc.get("s")))
+        if code is None:
+            logger.warning("no spot code for %s; downlink skipped", doc.get("s"))
+            continue
+        state, h = pack_state(doc)
+        entry = bytes([code, state] if h is None else [code, state, h])
+        if n == MAX_SPOTS_PER_FRAME or 1 + len(body) + len(entry) > max_bytes:
+            flush()
+        body += entry
+        n += 1
+    flush()
+    return frames
+
+
+def decode_downlink(frame: bytes, codes: SpotCodes) -> List[RTDocDict]:
+    """encode_downlinks の逆（テスト・デバッグ用。端末側は loraBridge.js が同じことをする）。"""
+    if not is_binary(frame):
+        raise ValueError("not a v1 frame")
+    docs: List[RTDocDict] = []
+    i = 1
+    for _ in range(frame[0] & 0x0F):
+        code, state = frame[i], frame[i + 1]
+        i += 2
+        h = None
+        if state & 1:
+            h = frame[i]
+            i += 1
+        sid = codes.spot_id(code)
+        if sid is not None:
+            docs.append({"s": sid, **unpack_state(state, h)})
+    return docs
+
+
+def decode_uplink(payload: bytes, codes: SpotCodes) -> List[Tuple[str, Optional[int]]]:
+    """
+    uplink ペイロード → [(spot_id, 端末の状態バイト or None)]。
+    従来のテキスト形式（spot_id だけ）は etag なし（= 必ず応答する）として扱う。
+    """
+    if not is_binary(payload):
+        text = payload.decode("utf-8").strip()
+        return [(text, None)] if text else []
+    n = payload[0] & 0x0F
+    if len(payload) < 1 + 2 * n:
+        raise ValueError(f"truncated uplink frame: {payload.hex()}")
+    out: List[Tuple[str, Optional[int]]] = []
+    for k in range(n):
+        code, etag = payload[1 + 2 * k], payload[2 + 2 * k]
+        sid = codes.spot_id(code)
+        if sid is not None:
+            out.append((sid, None if etag == ETAG_NONE else etag))
+    return out
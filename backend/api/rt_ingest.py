@@ -0,0 +1,254 @@
+# backend/api/rt_ingest.py
+"""
+MQTT の受信・送信を paho のネットワークスレッドから切り離すための有界キュー。
+
+- submit() はキューに積むだけ（ブロックしない）。paho のコールバックから呼ぶ
+- 専用スレッドが最大 batch_size 件ずつ取り出して handler(batch) を呼ぶ
+- 満杯時の方針（drop_policy）:
+    oldest: いちばん古い 1 件を捨てて積む（既定。リアルタイム情報は新しい方が価値がある）
+    newest: 今回の 1 件を捨てる
+- metrics(): キュー長・破棄数・処理件数・投入から処理完了までの遅延（直近 LATENCY_WINDOW 件の p50/p95/max）
+
+DownlinkScheduler は端末ごとに window_s 秒だけ downlink を溜めて 1 フレームにまとめる
+（LoRa は送信時間・デューティ比が最も貴重なので、uplink ごとに即返さない）。
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from backend.api import rt_codec
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1024
+DROP_POLICIES = ("oldest", "newest")
+
+
+class BatchQueue:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[List[Any]], None],
+        maxsize: int = 1000,
+        batch_size: int = 100,
+        drop_policy: str = "oldest",
+    ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}: {drop_policy!r}")
+        self.name = name
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.batch_size = max(1, batch_size)
+        self.drop_policy = drop_policy
+        self._items: Deque[Tuple[float, Any]] = collections.deque()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._latency_ms: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def submit(self, item: Any) -> bool:
+        """積む（ブロックしない）。今回の 1 件を捨てたら False。"""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy == "newest":
+                    return False
+                self._items.popleft()
+            self._items.append((time.monotonic(), item))
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify()
+        return True
+
+    def _take(self, timeout: float) -> List[Tuple[float, Any]]:
+        with self._cond:
+            if not self._items and not self._stop:
+                self._cond.wait(timeout)
+            batch = []
+            while self._items and len(batch) < self.batch_size:
+                batch.append(self._items.popleft())
+            return batch
+
+    def drain_once(self, timeout: float = 0.0) -> int:
+        """1 バッチ分を処理する（ワーカースレッドとテストから呼ぶ）。処理件数を返す。"""
+        batch = self._take(timeout)
+        if not batch:
+            return 0
+        try:
+            self.handler([item for _, item in batch])
+        except Exception:
+            self.failed_batches += 1
+            logger.exception("%s: batch of %d failed", self.name, len(batch))
+        done = time.monotonic()
+        self._latency_ms.extend((done - t) * 1000.0 for t, _ in batch)
+        self.processed += len(batch)
+        self.batches += 1
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stop:
+            self.drain_once(timeout=1.0)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name=f"rt-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        lat = sorted(self._latency_ms)
+
+        def pct(p: float) -> Optional[float]:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 2) if lat else None
+
+        return {
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "drop_policy": self.drop_policy,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": round(lat[-1], 2) if lat else None},
+        }
+
+
+class DownlinkScheduler:
+    """
+    offer(device, docs, client_etags) で端末ごとに溜め、最初の offer から window_s 秒後に
+    まとめて rt_codec のフレームにして sink(device, frame) へ渡す。
+    - 同じスポットは最新の値だけ送る
+    - 端末が uplink で伝えてきた状態バイトと同じ値は送らない（端末は既に持っている）
+    - etag が無い（従来のテキスト uplink）スポットは必ず送る
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[str, bytes], Any],
+        window_s: float = 2.0,
+        max_frame_bytes: int = 51,
+        codes: Optional[rt_codec.SpotCodes] = None,
+    ) -> None:
+        self.sink = sink
+        self.window_s = max(0.0, window_s)
+        self.max_frame_bytes = max(4, max_frame_bytes)
+        self._codes = codes
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.offered = 0
+        self.coalesced = 0
+        self.suppressed = 0
+        self.frames = 0
+        self.bytes = 0
+
+    @property
+    def codes(self) -> rt_codec.SpotCodes:
+        return self._codes if self._codes is not None else rt_codec.get_spot_codes()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def offer(
+        self,
+        device: str,
+        docs: Dict[str, Dict[str, Any]],
+        client_etags: Optional[Dict[str, Optional[int]]] = None,
+        now: Optional[float] = None,
+    ) -> None:
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            p = self._pending.get(device)
+            if p is None:
+                p = self._pending[device] = {"due": now + self.window_s, "docs": {}, "etags": {}}
+            for spot_id, doc in docs.items():
+                if spot_id in p["docs"]:
+                    self.coalesced += 1
+                p["docs"][spot_id] = doc
+                p["etags"][spot_id] = (client_etags or {}).get(spot_id)
+                self.offered += 1
+            self._cond.notify()
+
+    def poll(self, now: Optional[float] = None) -> int:
+        """期限の来た端末分を送る（ワーカースレッドとテストから呼ぶ）。送ったフレーム数を返す。"""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            due = [d for d, p in self._pending.items() if p["due"] <= now]
+            ready = [(d, self._pending.pop(d)) for d in due]
+        sent = 0
+        for device, p in ready:
+            docs = []
+            for spot_id, doc in p["docs"].items():
+                etag = p["etags"].get(spot_id)
+                if etag is not None and rt_codec.pack_state(doc)[0] == etag:
+                    self.suppressed += 1
+                    continue
+                docs.append(doc)
+            for frame in rt_codec.encode_downlinks(docs, self.codes, self.max_frame_bytes):
+                try:
+                    self.sink(device, frame)
+                except Exception:
+                    logger.exception("downlink sink failed for %s", device)
+                    continue
+                self.frames += 1
+                self.bytes += len(frame)
+                sent += 1
+        return sent
+
+    def _next_due(self) -> Optional[float]:
+        return min((p["due"] for p in self._pending.values()), default=None)
+
+    def _run(self) -> None:
+        while not self._stop:
+            with self._cond:
+                due = self._next_due()
+                timeout = 1.0 if due is None else max(0.0, due - time.monotonic())
+                if timeout > 0 and not self._stop:
+                    self._cond.wait(timeout)
+            self.poll()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="rt-downlink-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pending_devices": len(self._pending),
+            "window_s": self.window_s,
+            "max_frame_bytes": self.max_frame_bytes,
+            "offered": self.offered,
+            "coalesced": self.coalesced,
+            "suppressed": self.suppressed,
+            "frames": self.frames,
+            "bytes": self.bytes,
+        }
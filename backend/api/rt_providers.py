@@ -0,0 +1,226 @@
+# backend/api/rt_providers.py
+"""
+天候（w）・混雑度（c）などリアルタイム情報の取得元（プロバイダ）と、その TTL キャッシュ。
+
+uplink や HTTP への応答時に外部 API を呼ぶと、応答時間が上流の遅延に引きずられる。
+そこで ProviderCache が RT_PROVIDER_INTERVAL_S ごとに全カタログスポット分をまとめて取得しておき、
+応答側は get(spot_id)（dict 1 回引き）で読むだけにする。
+
+- プロバイダは fetch(spot_ids) -> {spot_id: {field: value}} を実装する（まとめて取得）
+- RT_PROVIDERS はカンマ区切りで優先順（先に書いたものの値が勝つ）:
+    file:<path>  JSON ファイル（{spot_id: {w, c, ...}} または [{s, w, c, ...}]）。更新時刻が変わったら読み直す
+    dummy        乱数（開発用。既定）
+- 取得に失敗したプロバイダは前回の値を使い続け、最後に成功してから RT_PROVIDER_TTL_S 秒で捨てる
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from backend.api import rt_codec
+
+logger = logging.getLogger(__name__)
+
+RT_PROVIDERS = os.getenv("RT_PROVIDERS", "dummy")
+RT_PROVIDER_INTERVAL_S = float(os.getenv("RT_PROVIDER_INTERVAL_S", "60"))
+RT_PROVIDER_TTL_S = float(os.getenv("RT_PROVIDER_TTL_S", "300"))
+
+Values = Dict[str, Dict[str, int]]
+
+
+class RTProvider:
+    name = "base"
+
+    def fetch(self, spot_ids: List[str]) -> Values:
+        raise NotImplementedError
+
+
+class DummyProvider(RTProvider):
+    """従来のダミー値（w: 0..2, c: 0..4）。"""
+
+    name = "dummy"
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self._rng = random.Random(seed)
+
+    def fetch(self, spot_ids: List[str]) -> Values:
+        return {sid: {"w": self._rng.randint(0, 2), "c": self._rng.randint(0, 4)} for sid in spot_ids}
+
+
+class FileProvider(RTProvider):
+    """ローカルの JSON ファイルを上流 API の代わりにする（テスト・デモ用）。"""
+
+    name = "file"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._values: Values = {}
+
+    def _load(self) -> Values:
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.items() if isinstance(data, dict) else ((d.get("s"), d) for d in data if isinstance(d, dict))
+        return {
+            str(sid): {k: int(v) for k, v in doc.items() if k != "s" and isinstance(v, (int, float))}
+            for sid, doc in items
+            if sid and isinstance(doc, dict)
+        }
+
+    def fetch(self, spot_ids: List[str]) -> Values:
+        mtime = os.stat(self.path).st_mtime
+        if mtime != self._mtime:
+            self._values = self._load()
+            self._mtime = mtime
+        wanted = set(spot_ids)
+        return {sid: v for sid, v in self._values.items() if sid in wanted}
+
+
+def build_providers(spec: str = RT_PROVIDERS) -> List[RTProvider]:
+    providers: List[RTProvider] = []
+    for item in (x.strip() for x in spec.split(",")):
+        if not item:
+            continue
+        kind, _, arg = item.partition(":")
+        if kind == "file" and arg:
+            providers.append(FileProvider(arg))
+        elif kind == "dummy":
+            providers.append(DummyProvider())
+        else:
+            raise ValueError(f"unknown RT provider: {item!r}")
+    return providers
+
+
+class ProviderCache:
+    """
+    refresh() で全プロバイダをまとめて取得し、スポットごとに合成した RTDoc を持つ。
+    get() は合成済み dict を引くだけ。start() で RT_PROVIDER_INTERVAL_S ごとの定期取得スレッドを回す。
+    """
+
+    def __init__(
+        self,
+        providers: Iterable[RTProvider],
+        spot_ids: Callable[[], List[str]],
+        ttl_s: float = RT_PROVIDER_TTL_S,
+        interval_s: float = RT_PROVIDER_INTERVAL_S,
+        on_refresh: Optional[Callable[[List[Dict[str, object]]], None]] = None,
+    ) -> None:
+        self.providers = list(providers)
+        self.spot_ids = spot_ids
+        self.ttl_s = ttl_s
+        self.interval_s = max(1.0, interval_s)
+        self.on_refresh = on_refresh
+        self._lock = threading.Lock()
+        # プロバイダごとの最後に成功した取得結果と時刻
+        self._latest: Dict[str, Values] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._view: Dict[str, Dict[str, object]] = {}
+        self._view_expires = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.errors: Dict[str, int] = {}
+        self.last_refresh_ms: Optional[float] = None
+
+    @staticmethod
+    def _key(i: int, p: RTProvider) -> str:
+        return f"{i}:{p.name}"
+
+    def refresh(self, now: Optional[float] = None) -> int:
+        """全プロバイダから取得し直す。合成後のスポット数を返す。"""
+        t0 = time.monotonic()
+        ids = self.spot_ids()
+        for i, p in enumerate(self.providers):
+            key = self._key(i, p)
+            try:
+                values = p.fetch(ids)
+            except Exception:
+                self.errors[key] = self.errors.get(key, 0) + 1
+                logger.warning("rt provider %s failed; keeping previous values", key, exc_info=True)
+                continue
+            with self._lock:
+                self._latest[key] = values
+                self._fetched_at[key] = t0 if now is None else now
+        with self._lock:
+            changed = self._rebuild(t0 if now is None else now)
+        self.refreshes += 1
+        self.last_refresh_ms = round((time.monotonic() - t0) * 1000.0, 2)
+        if changed and self.on_refresh:
+            try:
+                self.on_refresh(changed)
+            except Exception:
+                logger.exception("rt provider on_refresh failed")
+        return len(self._view)
+
+    def _rebuild(self, now: float) -> List[Dict[str, object]]:
+        """TTL 内のプロバイダだけで合成し直す（lock 内で呼ぶ）。変わった RTDoc を返す。"""
+        view: Dict[str, Dict[str, object]] = {}
+        expires = float("inf")
+        # 優先度の低いものから上書きする
+        for i in reversed(range(len(self.providers))):
+            key = self._key(i, self.providers[i])
+            at = self._fetched_at.get(key)
+            if at is None or now - at > self.ttl_s:
+                continue
+            expires = min(expires, at + self.ttl_s)
+            for sid, fields in self._latest[key].items():
+                view.setdefault(sid, {"s": sid}).update(fields)
+        changed = [doc for sid, doc in view.items() if self._view.get(sid) != doc]
+        self._view, self._view_expires = view, expires
+        return changed
+
+    def get(self, spot_id: str, now: Optional[float] = None) -> Optional[Dict[str, object]]:
+        """キャッシュ済みの RTDoc（無い・期限切れなら None）。上流は呼ばない。"""
+        now = time.monotonic() if now is None else now
+        if now > self._view_expires:
+            with self._lock:
+                if now > self._view_expires:
+                    self._rebuild(now)
+        doc = self._view.get(spot_id)
+        return dict(doc) if doc else None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("rt provider refresh failed")
+            self._stop.wait(self.interval_s)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rt-providers", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def metrics(self) -> Dict[str, object]:
+        now = time.monotonic()
+        return {
+            "providers": [self._key(i, p) for i, p in enumerate(self.providers)],
+            "spots": len(self._view),
+            "refreshes": self.refreshes,
+            "last_refresh_ms": self.last_refresh_ms,
+            "age_s": {k: round(now - at, 1) for k, at in self._fetched_at.items()},
+            "errors": dict(self.errors),
+        }
+
+
+def _catalog_spot_ids() -> List[str]:
+    try:
+        return rt_codec.load_spot_ids()
+    except (OSError, ValueError) as e:
+        logger.warning("spot catalog unavailable for rt providers: %s", e)
+        return []
+
+
+def make_provider_cache(on_refresh=None) -> ProviderCache:
+    return ProviderCache(build_providers(), _catalog_spot_ids, on_refresh=on_refresh)
@@ -0,0 +1,378 @@
+# backend/api/rt_store.py
+"""
+リアルタイム情報（RTDoc）の保持と変更シーケンス。
+
+- put() で内容が変わったときだけ全体のシーケンス（seq）を 1 進め、そのスポットに seq を記録する
+- changes_since(cursor, ids) で「cursor より後に変わったスポット」だけを返せる
+- wait() は asyncio から呼ぶロングポーリング用。put() は MQTT スレッドからも呼ばれるので、
+  待機側のイベントループへは call_soon_threadsafe で起こす
+
+バックエンドは RT_STORE で選ぶ:
+  memory（既定）: プロセス内だけ。ゲートウェイ 1 プロセス構成用
+  redis:          状態を Redis（RT_REDIS_URL）に置き、全ゲートウェイワーカーで共有する
+    rt:doc      HASH spot_id → RTDoc(JSON)
+    rt:spotseq  HASH spot_id → そのスポットを最後に変えた seq
+    rt:seq      全体の seq（INCR）
+    rt:changes  変更の pub/sub チャンネル（{"seq", "doc"}）
+  各ワーカーは pub/sub を購読してローカルの MemoryRTStore（読み取り用キャッシュ）に反映する。
+  seq の欠番を見つけたら Redis から全件を読み直す。
+  MQTT の購読は 1 プロセスだけが行う（rt:mqtt:leader のリースを持つワーカー）。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RTDocDict = Dict[str, object]
+
+RT_STORE = os.getenv("RT_STORE", "memory").lower()
+RT_REDIS_URL = os.getenv("RT_REDIS_URL", "redis://redis:6379/3")
+RT_LEADER_TTL_S = int(os.getenv("RT_LEADER_TTL_S", "30"))
+
+
+class MemoryRTStore:
+    def __init__(self) -> None:
+        self._docs: Dict[str, RTDocDict] = {}
+        self._seq_by_spot: Dict[str, int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def get(self, spot_id: str) -> Optional[RTDocDict]:
+        return self._docs.get(spot_id)
+
+    def put(self, doc: RTDocDict) -> int:
+        """doc（"s" に spot_id）を保存し、現在の seq を返す。内容が同じなら seq は進めない。"""
+        # seq の採番と保存は同じロックの中で行う（並行する put が同じ seq を取らないように）
+        return self.put_many((doc,))
+
+    def put_many(self, docs: Iterable[RTDocDict]) -> int:
+        """複数まとめて put する（ロック 1 回・待機者の起床 1 回）。"""
+        with self._lock:
+            changed = False
+            for doc in docs:
+                spot_id = str(doc["s"])
+                if self._docs.get(spot_id) == doc:
+                    continue
+                self._seq += 1
+                self._docs[spot_id] = dict(doc)
+                self._seq_by_spot[spot_id] = self._seq
+                changed = True
+            seq = self._seq
+            waiters, self._waiters = (self._waiters, []) if changed else ([], self._waiters)
+        self._wake(waiters)
+        return seq
+
+    def apply(self, doc: RTDocDict, seq: int) -> None:
+        """seq を指定して doc を反映する（Redis からの変更通知用）。"""
+        spot_id = str(doc["s"])
+        with self._lock:
+            self._docs[spot_id] = dict(doc)
+            self._seq_by_spot[spot_id] = seq
+            self._seq = max(self._seq, seq)
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+
+    def remember(self, doc: RTDocDict, seq: int) -> None:
+        """未保持のスポットだけ覚える（全体の seq は進めない。読み取りキャッシュ用）。"""
+        spot_id = str(doc["s"])
+        with self._lock:
+            if spot_id not in self._docs:
+                self._docs[spot_id] = dict(doc)
+                self._seq_by_spot[spot_id] = seq
+
+    def load(self, seq: int, docs: Dict[str, RTDocDict], seq_by_spot: Dict[str, int]) -> None:
+        """全件を差し替える（Redis からの読み直し用）。"""
+        with self._lock:
+            self._docs = dict(docs)
+            self._seq_by_spot = {sid: seq_by_spot.get(sid, seq) for sid in docs}
+            self._seq = seq
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+
+    def snapshot(self, ids: Iterable[str]) -> Tuple[int, Dict[str, RTDocDict]]:
+        return self.changes_since(0, ids)
+
+    def changes_since(self, cursor: int, ids: Iterable[str]) -> Tuple[int, Dict[str, RTDocDict]]:
+        """(現在の seq, cursor より後に変わった ids のドキュメント)。"""
+        with self._lock:
+            seq = self._seq
+            out = {
+                sid: self._docs[sid]
+                for sid in ids
+                if self._seq_by_spot.get(sid, 0) > cursor and sid in self._docs
+            }
+        return seq, out
+
+    async def wait(self, cursor: int, timeout: float) -> bool:
+        """seq が cursor を超えるまで最大 timeout 秒待つ。超えたら True。"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            if self._seq > cursor:
+                return True
+            self._waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._seq > cursor
+        finally:
+            with self._lock:
+                self._waiters = [w for w in self._waiters if w[1] is not fut]
+
+    @staticmethod
+    def _wake(waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]) -> None:
+        # 待機者（WebSocket 購読者など）が数千いても、ループごとに 1 回だけ起こす
+        by_loop: Dict[asyncio.AbstractEventLoop, List[asyncio.Future]] = {}
+        for loop, fut in waiters:
+            by_loop.setdefault(loop, []).append(fut)
+        for loop, futs in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_wake_all, futs)
+            except RuntimeError:
+                pass  # ループが閉じている（テスト終了後など）
+
+    # --- 共有ストアと同じインターフェース（単一プロセスなので常にリーダー） ---
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def acquire_leader(self, ident: str) -> bool:
+        return True
+
+    def release_leader(self, ident: str) -> None:
+        pass
+
+
+def _wake_all(futs: List[asyncio.Future]) -> None:
+    for fut in futs:
+        if not fut.done():
+            fut.set_result(None)
+
+
+def _dumps(doc: RTDocDict) -> str:
+    # Redis 側で「内容が同じか」を文字列比較するので正規化しておく
+    return json.dumps(doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+# 内容が変わったときだけ seq を進めて保存・通知する。
+# 返り値は {seq, changed}（変化なしなら {現在の seq, 0}。その seq は別の書き込みのもの）
+_PUT_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+  return {tonumber(redis.call('GET', KEYS[3]) or '0'), 0}
+end
+local seq = redis.call('INCR', KEYS[3])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], seq)
+redis.call('PUBLISH', ARGV[3], '{"seq":' .. seq .. ',"doc":' .. ARGV[2] .. '}')
+return {seq, 1}
+"""
+
+# リースを持っているときだけ期限を延ばす
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisRTStore:
+    """
+    Redis を正とし、読み取りはローカルの MemoryRTStore から返す。
+    書き込み（put）は Redis に対して行い、pub/sub 経由で全ワーカーのローカルに反映される。
+    """
+
+    DOC_KEY = "rt:doc"
+    SPOTSEQ_KEY = "rt:spotseq"
+    SEQ_KEY = "rt:seq"
+    CHANNEL = "rt:changes"
+    LEADER_KEY = "rt:mqtt:leader"
+
+    def __init__(self, url: str = RT_REDIS_URL, client=None) -> None:
+        self.url = url
+        self._client = client
+        self._local = MemoryRTStore()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, decode_responses=True, socket_timeout=5.0)
+        return self._client
+
+    # --- 読み取り（ローカル） ---
+    @property
+    def seq(self) -> int:
+        return self._local.seq
+
+    def get(self, spot_id: str) -> Optional[RTDocDict]:
+        doc = self._local.get(spot_id)
+        if doc is not None:
+            return doc
+        # ローカルに無ければ Redis を直接見る（購読開始前・取りこぼし時の保険）
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            pipe.hget(self.DOC_KEY, spot_id)
+            pipe.hget(self.SPOTSEQ_KEY, spot_id)
+            raw, seq = pipe.execute()
+        except Exception:
+            logger.warning("rt store unavailable", exc_info=True)
+            return None
+        if not raw:
+            return None
+        doc = json.loads(raw)
+        # 全体の seq は進めない（間の変更通知を取りこぼさないように）
+        self._local.remember(doc, int(seq or 0))
+        return doc
+
+    def snapshot(self, ids: Iterable[str]) -> Tuple[int, Dict[str, RTDocDict]]:
+        return self._local.snapshot(ids)
+
+    def changes_since(self, cursor: int, ids: Iterable[str]) -> Tuple[int, Dict[str, RTDocDict]]:
+        return self._local.changes_since(cursor, ids)
+
+    async def wait(self, cursor: int, timeout: float) -> bool:
+        return await self._local.wait(cursor, timeout)
+
+    # --- 書き込み（Redis） ---
+    def put(self, doc: RTDocDict) -> int:
+        spot_id = str(doc["s"])
+        seq, changed = self._redis().eval(
+            _PUT_LUA, 3, self.DOC_KEY, self.SPOTSEQ_KEY, self.SEQ_KEY,
+            spot_id, _dumps(doc), self.CHANNEL,
+        )
+        self._apply_own(doc, int(seq), bool(int(changed)))
+        return int(seq)
+
+    def put_many(self, docs: Iterable[RTDocDict]) -> int:
+        """複数まとめて put する（Redis へは 1 往復）。"""
+        docs = list(docs)
+        if not docs:
+            return self._local.seq
+        pipe = self._redis().pipeline(transaction=False)
+        for doc in docs:
+            pipe.eval(
+                _PUT_LUA, 3, self.DOC_KEY, self.SPOTSEQ_KEY, self.SEQ_KEY,
+                str(doc["s"]), _dumps(doc), self.CHANNEL,
+            )
+        seqs = []
+        for doc, (seq, changed) in zip(docs, pipe.execute()):
+            self._apply_own(doc, int(seq), bool(int(changed)))
+            seqs.append(int(seq))
+        return max(seqs)
+
+    def _apply_own(self, doc: RTDocDict, seq: int, changed: bool) -> None:
+        # 自分の書き込みで seq が次の番号になったときだけ、購読を待たずに反映する（同じ seq の通知は後で無視される）。
+        # 変化なしで返った seq は別の書き込みのものなので反映しない。飛んでいる場合は間の変更を
+        # 取りこぼさないよう購読側に任せる
+        if changed and seq == self._local.seq + 1:
+            self._local.apply(doc, seq)
+
+    # --- 同期 ---
+    def resync(self) -> None:
+        """Redis の全件をローカルに読み直す。"""
+        pipe = self._redis().pipeline(transaction=True)
+        pipe.get(self.SEQ_KEY)
+        pipe.hgetall(self.DOC_KEY)
+        pipe.hgetall(self.SPOTSEQ_KEY)
+        seq, docs, seqs = pipe.execute()
+        self._local.load(
+            int(seq or 0),
+            {sid: json.loads(raw) for sid, raw in (docs or {}).items()},
+            {sid: int(v) for sid, v in (seqs or {}).items()},
+        )
+        logger.info("rt store resynced: %d spots (seq=%s)", len(docs or {}), seq)
+
+    def handle_message(self, data: str) -> None:
+        """pub/sub の 1 通を反映する。欠番があれば全件を読み直す。"""
+        msg = json.loads(data)
+        seq = int(msg["seq"])
+        local = self._local.seq
+        if seq <= local:
+            return
+        if seq != local + 1:
+            self.resync()
+            return
+        self._local.apply(msg["doc"], seq)
+
+    def _subscriber(self) -> None:
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                # 購読してから読み直す（間の変更は seq で重複排除される）
+                self.resync()
+                while not self._stop.is_set():
+                    msg = pubsub.get_message(timeout=1.0)
+                    if msg and msg.get("type") == "message":
+                        self.handle_message(msg["data"])
+            except Exception:
+                logger.warning("rt store subscriber error; reconnecting", exc_info=True)
+                self._stop.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._subscriber, name="rt-store-sub", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --- MQTT リーダー（リース） ---
+    def acquire_leader(self, ident: str) -> bool:
+        """リースを取る／延長する。持っていれば True。"""
+        try:
+            r = self._redis()
+            if r.set(self.LEADER_KEY, ident, nx=True, ex=RT_LEADER_TTL_S):
+                return True
+            return bool(r.eval(_RENEW_LUA, 1, self.LEADER_KEY, ident, RT_LEADER_TTL_S))
+        except Exception:
+            logger.warning("rt leader lease check failed", exc_info=True)
+            return False
+
+    def release_leader(self, ident: str) -> None:
+        try:
+            self._redis().eval(_RELEASE_LUA, 1, self.LEADER_KEY, ident)
+        except Exception:
+            logger.warning("rt leader lease release failed", exc_info=True)
+
+
+_store: MemoryRTStore | RedisRTStore | None = None
+
+
+def get_store() -> MemoryRTStore | RedisRTStore:
+    global _store
+    if _store is None:
+        _store = RedisRTStore() if RT_STORE == "redis" else MemoryRTStore()
+    return _store
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
+
+from backend.common.coord_array import CoordArray
 try:
     # pydantic v2
     from pydantic import ConfigDict, model_validator
@@ -102,7 +104,7 @@ class SegmentIndex(BaseModel):
 class PlanResponse(BaseModel):
     pack_id: str
     route: Dict[str, Any]
-    polyline: List[List[float]]
+    polyline: CoordArray  # NumPy で一括検証（数万点でも要素ごとに検証しない）
     segments: List[SegmentIndex]
 
     legs: List[Leg]
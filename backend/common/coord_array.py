@@ -0,0 +1,97 @@
+# backend/common/coord_array.py
+"""
+大きな座標配列（[[lon, lat], ...]）用の pydantic 型と、orjson を使う FastAPI 部品。
+
+- CoordArray: List[List[float]] の代わりに使う。要素ごとの検証をせず、
+  NumPy で「形（N×2）・有限値・経緯度の範囲」を 1 回でまとめて検査する
+  （OSRM の full overview は数万点になり、routing → nav → alongpoi → gateway の各段で検証される）。
+  数値だけの入力はコピーせずそのまま返す（int は int のまま残る）
+- ORJSONRoute: リクエストボディの JSON を orjson で読む APIRoute
+  （レスポンスは FastAPI(default_response_class=ORJSONResponse) で orjson にする）
+
+ベンチマーク: backend/script/bench_coord_array.py
+"""
+from __future__ import annotations
+
+import array
+import itertools
+from typing import Annotated, Any, Callable, List, Tuple
+
+import numpy as np
+import orjson
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from pydantic import PlainSerializer, PlainValidator, WithJsonSchema
+
+
+def _as_matrix(value: Any) -> Tuple[np.ndarray, bool]:
+    """
+    (N×2 の float64 配列, 入力をそのまま返してよいか) を返す。
+    数値だけの 2 重リストは array.array で一括変換し、入力リストを使い回す
+    （ndarray.tolist() で作り直すと検証そのものより高くつく）。
+    """
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float64, copy=False), False
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("coordinates must be an array of [lon, lat]")
+    try:
+        if set(map(len, value)) != {2}:
+            raise ValueError("coordinates must be [lon, lat] pairs")
+        flat = array.array("d", itertools.chain.from_iterable(value))
+        return np.frombuffer(flat, dtype=np.float64).reshape(-1, 2), True
+    except TypeError:
+        pass
+    # 文字列の数値など（pydantic の lax モード相当）。遅い経路
+    try:
+        return np.asarray(value, dtype=np.float64), False
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"coordinates must be numeric [lon, lat] pairs: {e}") from e
+
+
+def validate_coords(value: Any) -> List[List[float]]:
+    """[[lon, lat], ...] を一括検証して返す（数値だけの入力はそのリストをそのまま返す）。"""
+    if isinstance(value, (list, tuple)) and not value:
+        return []
+    arr, reuse = _as_matrix(value)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"coordinates must have shape (N, 2), got {arr.shape}")
+    if not np.isfinite(arr).all():
+        raise ValueError("coordinates must be finite")
+    out_of_range = (np.abs(arr[:, 0]) > 180.0) | (np.abs(arr[:, 1]) > 90.0)
+    if out_of_range.any():
+        bad = int(np.argmax(out_of_range))
+        raise ValueError(f"coordinate out of range at index {bad}: {arr[bad].tolist()}")
+    if reuse and isinstance(value, list):
+        return value
+    return arr.tolist()
+
+
+CoordArray = Annotated[
+    List[List[float]],
+    PlainValidator(validate_coords),
+    PlainSerializer(lambda v: v, return_type=list),
+    WithJsonSchema({
+        "type": "array",
+        "items": {"type": "array", "items": {"type": "number"}, "minItems": 2, "maxItems": 2},
+        "description": "[[lon, lat], ...]",
+    }),
+]
+
+
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """リクエストボディを orjson で読む APIRoute（app.router.route_class / APIRouter(route_class=...) に指定）。"""
+
+    def get_route_handler(self) -> Callable:
+        original = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            return await original(ORJSONRequest(request.scope, request.receive))
+
+        return handler
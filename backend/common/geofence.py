@@ -0,0 +1,224 @@
+# backend/common/geofence.py
+"""
+ルート距離程（chainage: 始点からルートに沿って測った距離 [m]）によるナレーション発火用の索引。
+
+manifest の "geofence":
+  {
+    "version": 1,
+    "length_m": ルート全長,
+    "cum_m": [頂点ごとの距離程（polyline と同じ長さ）],
+    "max_window_m": 発火窓の最大長,
+    "triggers": [  # start_m 昇順（同じなら chainage_m 昇順）
+      {"spot_id", "kind": "waypoint" | "along", "mode", "chainage_m", "start_m", "end_m", "offset_m", "seg_idx"}
+    ]
+  }
+
+クライアントは現在地をルートに射影して距離程 p を求め（前回の線分付近だけを探す）、
+triggers を start_m で二分探索して p 以下の最後の要素から max_window_m 分だけ遡れば、
+発火中（start_m <= p <= end_m）の窓が O(log n) で見つかる。
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+GEOFENCE_VERSION = 1
+
+# 到着前にナレーションを始める距離・通過後も有効にしておく距離（移動モード別）
+TRIGGER_LEAD_M = {
+    "car": float(os.getenv("NAV_TRIGGER_LEAD_M_CAR", "400")),
+    "foot": float(os.getenv("NAV_TRIGGER_LEAD_M_FOOT", "40")),
+}
+TRIGGER_TRAIL_M = {
+    "car": float(os.getenv("NAV_TRIGGER_TRAIL_M_CAR", "100")),
+    "foot": float(os.getenv("NAV_TRIGGER_TRAIL_M_FOOT", "20")),
+}
+# 現在地の射影で、前回の線分からこの頂点数の範囲だけを探す
+MATCH_WINDOW = int(os.getenv("NAV_MATCH_WINDOW", "200"))
+# POI の射影は手掛かりの線分（leg_index / nearest_idx）の前後この数だけを探す
+# （往復・周回で同じ道を 2 度通るとき、別の通過に載せないように）
+POI_PROJECT_WINDOW = int(os.getenv("NAV_POI_PROJECT_WINDOW", "3"))
+# waypoint は前の waypoint より先で、最短距離 + この値以内に入る最初の通過に置く
+WAYPOINT_PASS_TOLERANCE_M = float(os.getenv("NAV_WAYPOINT_PASS_TOLERANCE_M", "30"))
+
+_R = 6371008.8
+
+
+def _xy(coords: np.ndarray, lat0: float) -> np.ndarray:
+    """lon/lat → lat0 まわりの正距円筒（m）。局所的な射影・距離計算用。"""
+    k = math.radians(1.0) * _R
+    return np.column_stack((coords[:, 0] * k * math.cos(math.radians(lat0)), coords[:, 1] * k))
+
+
+def cumulative_m(polyline: Sequence[Sequence[float]]) -> np.ndarray:
+    """頂点ごとの距離程（haversine）。"""
+    pts = np.asarray(polyline, dtype=float).reshape(-1, 2)
+    if len(pts) < 2:
+        return np.zeros(len(pts))
+    lon, lat = np.radians(pts[:, 0]), np.radians(pts[:, 1])
+    dlat, dlon = np.diff(lat), np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    d = 2 * _R * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return np.concatenate(([0.0], np.cumsum(d)))
+
+
+def project(
+    polyline: Sequence[Sequence[float]],
+    cum: np.ndarray,
+    lon: float,
+    lat: float,
+    lo: int = 0,
+    hi: Optional[int] = None,
+    first_within_m: Optional[float] = None,
+) -> Dict[str, float]:
+    """
+    点をルートの線分 [lo, hi) に射影する。
+    first_within_m を渡すと、最短距離 + first_within_m 以内の線分のうち最も手前を選ぶ（同じ道の最初の通過）。
+    戻り値: {"chainage_m", "offset_m"（ルートからの距離）, "seg_idx"}
+    """
+    pts = np.asarray(polyline, dtype=float).reshape(-1, 2)
+    n_seg = len(pts) - 1
+    if n_seg < 1:
+        return {"chainage_m": 0.0, "offset_m": 0.0, "seg_idx": 0}
+    lo = max(0, min(lo, n_seg - 1))
+    hi = n_seg if hi is None else max(lo + 1, min(hi, n_seg))
+
+    xy = _xy(pts[lo:hi + 1], lat)
+    p = _xy(np.array([[lon, lat]]), lat)[0]
+    a, b = xy[:-1], xy[1:]
+    ab = b - a
+    len2 = np.einsum("ij,ij->i", ab, ab)
+    t = np.where(len2 > 0, np.einsum("ij,ij->i", p - a, ab) / np.where(len2 > 0, len2, 1.0), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    foot = a + ab * t[:, None]
+    d = np.hypot(foot[:, 0] - p[0], foot[:, 1] - p[1])
+    i = int(np.argmin(d)) if first_within_m is None else int(np.argmax(d <= d.min() + first_within_m))
+    seg = lo + i
+    chainage = float(cum[seg] + t[i] * (cum[seg + 1] - cum[seg]))
+    return {"chainage_m": chainage, "offset_m": float(d[i]), "seg_idx": seg}
+
+
+def _mode_at(segments: Iterable[dict], vertex_idx: int) -> str:
+    for s in segments or []:
+        if int(s.get("start_idx", 0)) <= vertex_idx <= int(s.get("end_idx", 0)):
+            return s.get("mode") or "car"
+    return "car"
+
+
+def build_index(
+    polyline: Sequence[Sequence[float]],
+    segments: List[dict],
+    waypoints_info: List[dict],
+    along_pois: List[dict],
+) -> Dict[str, object]:
+    """
+    manifest 用の geofence 索引を作る。
+    POI は lon/lat をルートに射影する。lon/lat が無ければ nearest_idx の頂点を使い、どちらも無いものは入れない。
+    - along: leg_index（無ければ nearest_idx）の前後 POI_PROJECT_WINDOW 線分だけに射影する
+    - waypoint: waypoints_info は訪問順。前の waypoint より先の最初の通過に射影する
+    """
+    cum = cumulative_m(polyline)
+    triggers = []
+    for kind, pois in (("waypoint", waypoints_info), ("along", along_pois)):
+        after = 0  # waypoint: 前の waypoint の線分
+        for poi in pois or []:
+            if poi.get("lon") is not None and poi.get("lat") is not None:
+                lon, lat = float(poi["lon"]), float(poi["lat"])
+                anchor = poi.get("leg_index", poi.get("nearest_idx"))
+                if kind == "waypoint":
+                    hit = project(polyline, cum, lon, lat, lo=after, first_within_m=WAYPOINT_PASS_TOLERANCE_M)
+                    after = hit["seg_idx"]
+                elif anchor is not None:
+                    a = int(anchor)
+                    hit = project(polyline, cum, lon, lat, a - POI_PROJECT_WINDOW, a + POI_PROJECT_WINDOW + 1)
+                else:
+                    hit = project(polyline, cum, lon, lat)
+            elif poi.get("nearest_idx") is not None and len(cum):
+                idx = max(0, min(int(poi["nearest_idx"]), len(cum) - 1))
+                hit = {"chainage_m": float(cum[idx]), "offset_m": float(poi.get("distance_m") or 0.0),
+                       "seg_idx": min(idx, max(0, len(cum) - 2))}
+            else:
+                continue
+            mode = poi.get("source_segment_mode") or _mode_at(segments, hit["seg_idx"])
+            mode = mode if mode in TRIGGER_LEAD_M else "car"
+            c = hit["chainage_m"]
+            triggers.append({
+                "spot_id": poi.get("spot_id"),
+                "kind": kind,
+                "mode": mode,
+                "chainage_m": round(c, 1),
+                "start_m": round(max(0.0, c - TRIGGER_LEAD_M[mode]), 1),
+                "end_m": round(c + TRIGGER_TRAIL_M[mode], 1),
+                "offset_m": round(hit["offset_m"], 1),
+                "seg_idx": hit["seg_idx"],
+            })
+    triggers.sort(key=lambda t: (t["start_m"], t["chainage_m"]))
+    return {
+        "version": GEOFENCE_VERSION,
+        "length_m": round(float(cum[-1]) if len(cum) else 0.0, 1),
+        "cum_m": [round(float(x), 1) for x in cum],
+        "max_window_m": max((t["end_m"] - t["start_m"] for t in triggers), default=0.0),
+        "triggers": triggers,
+    }
+
+
+def _upper_bound(triggers: List[dict], progress_m: float) -> int:
+    """start_m > progress_m となる最初の位置（lib/geofence.js の upperBound と同じ）。"""
+    lo, hi = 0, len(triggers)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if triggers[mid]["start_m"] <= progress_m:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def active_triggers(index: Dict[str, object], progress_m: float) -> List[dict]:
+    """距離程 progress_m で発火中の窓（二分探索 + max_window_m 分だけ遡る）。"""
+    triggers: List[dict] = index.get("triggers") or []  # type: ignore[assignment]
+    floor = progress_m - float(index.get("max_window_m") or 0.0)
+    out = []
+    k = _upper_bound(triggers, progress_m) - 1
+    while k >= 0 and triggers[k]["start_m"] >= floor:
+        if triggers[k]["end_m"] >= progress_m:
+            out.append(triggers[k])
+        k -= 1
+    out.reverse()
+    return out
+
+
+def next_trigger(index: Dict[str, object], progress_m: float) -> Optional[dict]:
+    triggers: List[dict] = index.get("triggers") or []  # type: ignore[assignment]
+    hi = _upper_bound(triggers, progress_m)
+    return triggers[hi] if hi < len(triggers) else None
+
+
+def match(
+    polyline: Sequence[Sequence[float]],
+    index: Dict[str, object],
+    lon: float,
+    lat: float,
+    hint_seg: Optional[int] = None,
+    window: int = MATCH_WINDOW,
+) -> Dict[str, object]:
+    """
+    現在地 → 距離程・発火中の窓・次の窓（クライアントの lib/geofence.js と同じ手順。テスト用）。
+    hint_seg（前回の seg_idx）があればその前後 window 頂点だけを探す。
+    """
+    cum = np.asarray(index.get("cum_m") or cumulative_m(polyline), dtype=float)
+    if hint_seg is None:
+        hit = project(polyline, cum, lon, lat)
+    else:
+        hit = project(polyline, cum, lon, lat, hint_seg - window, hint_seg + window)
+    progress = hit["chainage_m"]
+    return {
+        "chainage_m": round(progress, 1),
+        "offset_m": round(hit["offset_m"], 1),
+        "seg_idx": hit["seg_idx"],
+        "active": active_triggers(index, progress),
+        "next": next_trigger(index, progress),
+    }
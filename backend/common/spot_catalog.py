@@ -0,0 +1,210 @@
+# backend/common/spot_catalog.py
+"""
+spots / facilities のインメモリカタログ（nav・routing・ゲートウェイで共有）。
+
+- 起動時に全件（多言語名・説明・md_slug・座標）を読み込み、spot_id をキーに保持
+- init_static_db.py が static_data_version.version を上げたら再読込
+  （バージョン確認は SPOT_CATALOG_REFRESH_S 秒に 1 回だけ）
+- カタログに無い spot_id は SQL で引き、見つかればカタログに追記
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from sqlalchemy import bindparam, text
+
+from backend.common import static_db
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_S = float(os.getenv("SPOT_CATALOG_REFRESH_S", "60"))
+
+_LANG_FALLBACK = ("ja", "en", "zh")
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+    spot_id: str
+    kind: Literal["spot", "facility"]
+    lon: float
+    lat: float
+    name: Dict[str, str]
+    description: Any = None  # {"ja": ..., "en": ...} もしくは文字列
+    md_slug: Optional[str] = None
+
+    def name_for(self, lang: str) -> Optional[str]:
+        if self.name.get(lang):
+            return self.name[lang]
+        for k in _LANG_FALLBACK:
+            if self.name.get(k):
+                return self.name[k]
+        return None
+
+
+# -------------------------
+# SQL
+# -------------------------
+_SQL_ALL = """
+SELECT spot_id::text AS spot_id, 'spot' AS kind, official_name, description, md_slug,
+       ST_X(geom)::float AS lon, ST_Y(geom)::float AS lat
+FROM spots {where_s}
+UNION ALL
+SELECT spot_id::text AS spot_id, 'facility' AS kind, official_name, description, md_slug,
+       ST_X(geom)::float AS lon, ST_Y(geom)::float AS lat
+FROM facilities {where_f}
+"""
+
+_SQL_LOAD_ALL = text(_SQL_ALL.format(where_s="", where_f=""))
+_SQL_LOAD_SOME = text(
+    _SQL_ALL.format(where_s="WHERE spot_id IN :ids", where_f="WHERE spot_id IN :ids")
+).bindparams(bindparam("ids", expanding=True))
+
+
+def _fetch_version() -> Optional[int]:
+    return static_db.fetch_data_version()
+
+
+def _row_to_entry(r) -> CatalogEntry:
+    name = r["official_name"] if isinstance(r["official_name"], dict) else {}
+    return CatalogEntry(
+        spot_id=r["spot_id"],
+        kind=r["kind"],
+        lon=float(r["lon"]),
+        lat=float(r["lat"]),
+        name={k: str(v) for k, v in name.items() if v},
+        description=r["description"],
+        md_slug=r["md_slug"],
+    )
+
+
+def _fetch_entries(ids: Optional[List[str]] = None) -> List[CatalogEntry]:
+    """ids=None なら全件。spots が先に並ぶ（同一 spot_id は spots 優先）。"""
+    with static_db.get_engine().connect() as conn:
+        if ids is None:
+            rows = conn.execute(_SQL_LOAD_ALL).mappings().all()
+        else:
+            rows = conn.execute(_SQL_LOAD_SOME, {"ids": ids}).mappings().all()
+    return [_row_to_entry(r) for r in rows]
+
+
+# -------------------------
+# カタログ本体
+# -------------------------
+class SpotCatalog:
+    def __init__(self, refresh_interval_s: float = REFRESH_INTERVAL_S):
+        self.refresh_interval_s = refresh_interval_s
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._version: Optional[int] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def reload(self) -> None:
+        """全件を読み直して辞書ごと差し替える（読み手はロック不要）。"""
+        version = _fetch_version()
+        entries: Dict[str, CatalogEntry] = {}
+        for e in _fetch_entries():
+            entries.setdefault(e.spot_id, e)
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._loaded = True
+            self._checked_at = time.monotonic()
+        logger.info("spot catalog loaded: %d entries (version=%s)", len(entries), version)
+
+    def warm(self) -> None:
+        """起動時のプリロード。DB 未起動でも落とさない（初回参照時に再試行）。"""
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("spot catalog warm-up failed; will retry lazily")
+
+    def maybe_refresh(self) -> None:
+        """未ロードなら読み込み、ロード済みなら一定間隔でバージョンを確認する。"""
+        if not self._loaded:
+            self.reload()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval_s:
+            return
+        self._checked_at = now
+        version = _fetch_version()
+        if version is not None and version != self._version:
+            logger.info("static data version changed: %s -> %s", self._version, version)
+            self.reload()
+
+    def get(self, spot_id: str) -> Optional[CatalogEntry]:
+        return self.get_many([spot_id]).get(spot_id)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, CatalogEntry]:
+        """
+        {spot_id: CatalogEntry} を返す。見つからない ID は結果に含めない。
+        DB 障害時も例外は投げず、手元のカタログだけで答える。
+        """
+        id_list = [str(i) for i in ids if i]
+        if not id_list:
+            return {}
+        try:
+            self.maybe_refresh()
+        except Exception:
+            logger.exception("spot catalog refresh failed; serving cached entries")
+
+        entries = self._entries
+        out = {sid: entries[sid] for sid in id_list if sid in entries}
+        missing = [sid for sid in dict.fromkeys(id_list) if sid not in out]
+        if missing:
+            out.update(self._fetch_missing(missing))
+        return out
+
+    def all(self) -> List[CatalogEntry]:
+        try:
+            self.maybe_refresh()
+        except Exception:
+            logger.exception("spot catalog refresh failed; serving cached entries")
+        return list(self._entries.values())
+
+    def _fetch_missing(self, ids: List[str]) -> Dict[str, CatalogEntry]:
+        try:
+            found = _fetch_entries(ids)
+        except Exception:
+            logger.exception("spot catalog SQL fallback failed for %s", ids)
+            return {}
+        out: Dict[str, CatalogEntry] = {}
+        for e in found:
+            out.setdefault(e.spot_id, e)
+        if out:
+            with self._lock:
+                merged = dict(self._entries)
+                for sid, e in out.items():
+                    merged.setdefault(sid, e)
+                self._entries = merged
+        return out
+
+
+_catalog: SpotCatalog | None = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> SpotCatalog:
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SpotCatalog()
+    return _catalog
@@ -0,0 +1,144 @@
+# backend/common/static_db.py
+"""
+静的DB（PostGIS: spots / facilities / access_points）への共通接続層。
+
+- DSN は STATIC_DB_* 環境変数から 1 か所で組み立てる（docker-compose と同じ既定値）
+- Engine はプロセスにつき 1 つ（fork 後は作り直す）
+- プールサイズ・オーバーフロー・pre-ping・statement_timeout を ENV で調整可能
+- pool_metrics() でプールの状態とイベント回数を取得できる（/health から参照）
+- fetch_data_version() で静的データの版数を取得できる（インメモリキャッシュの再読込判定用）
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+_engine: Engine | None = None
+_engine_pid: int | None = None
+_lock = threading.Lock()
+
+# プールのイベント回数（connect / checkout / invalidate）
+_counters: Dict[str, int] = {"connects": 0, "checkouts": 0, "invalidations": 0}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def conn_url() -> str:
+    host = os.getenv("STATIC_DB_HOST", "static-db")
+    port = os.getenv("STATIC_DB_PORT", "5432")
+    db   = os.getenv("STATIC_DB_NAME", "static_db")
+    user = os.getenv("STATIC_DB_USER", "static_db")
+    pwd  = os.getenv("STATIC_DB_PASSWORD", "static_db")
+    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
+
+
+def _connect_args() -> Dict[str, Any]:
+    # statement_timeout はサーバ側で長時間クエリを打ち切る（0 で無効）
+    stmt_ms = _env_int("STATIC_DB_STATEMENT_TIMEOUT_MS", 5000)
+    app_name = os.getenv("STATIC_DB_APP_NAME", "guidance-static")
+    options = f"-c statement_timeout={stmt_ms}" if stmt_ms > 0 else ""
+    args: Dict[str, Any] = {
+        "connect_timeout": _env_int("STATIC_DB_CONNECT_TIMEOUT", 5),
+        "application_name": app_name,
+    }
+    if options:
+        args["options"] = options
+    return args
+
+
+def _create_engine() -> Engine:
+    eng = create_engine(
+        conn_url(),
+        future=True,
+        pool_size=_env_int("STATIC_DB_POOL_SIZE", 5),
+        max_overflow=_env_int("STATIC_DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("STATIC_DB_POOL_TIMEOUT", 10),
+        pool_recycle=_env_int("STATIC_DB_POOL_RECYCLE", 1800),
+        pool_pre_ping=True,
+        pool_use_lifo=True,  # アイドル接続を自然に減らす
+        # psycopg2 はサーバサイド PREPARE を持たないため、
+        # SQLAlchemy のコンパイル済み SQL キャッシュで文の再利用を効かせる
+        query_cache_size=_env_int("STATIC_DB_QUERY_CACHE_SIZE", 500),
+        connect_args=_connect_args(),
+    )
+
+    @event.listens_for(eng, "connect")
+    def _on_connect(dbapi_conn, conn_record):  # noqa: ANN001
+        _counters["connects"] += 1
+
+    @event.listens_for(eng, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):  # noqa: ANN001
+        _counters["checkouts"] += 1
+
+    @event.listens_for(eng, "invalidate")
+    def _on_invalidate(dbapi_conn, conn_record, exc):  # noqa: ANN001
+        _counters["invalidations"] += 1
+
+    return eng
+
+
+def get_engine() -> Engine:
+    """
+    プロセス共有の Engine を返す（lazy 生成・スレッドセーフ）。
+    fork（Celery prefork / uvicorn workers）で pid が変わった場合は、
+    親から引き継いだ接続を閉じずに捨てて作り直す。
+    """
+    global _engine, _engine_pid
+    pid = os.getpid()
+    if _engine is not None and _engine_pid == pid:
+        return _engine
+    with _lock:
+        if _engine is not None and _engine_pid != pid:
+            _engine.dispose(close=False)
+            _engine = None
+        if _engine is None:
+            _engine = _create_engine()
+            _engine_pid = pid
+    return _engine
+
+
+def dispose_engine() -> None:
+    """Engine を破棄する（テストや設定変更時用）。"""
+    global _engine, _engine_pid
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _engine_pid = None
+
+
+def fetch_data_version() -> Optional[int]:
+    """
+    init_static_db.py が更新する static_data_version.version を返す。
+    テーブルが無い（古いDB）・DB 未起動の場合は None。
+    """
+    try:
+        with get_engine().connect() as conn:
+            v = conn.execute(text("SELECT version FROM static_data_version WHERE id = 1")).scalar()
+            return int(v) if v is not None else None
+    except Exception:
+        return None
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """
+    プールの現在値とイベント累計を返す。Engine 未生成なら initialized=False。
+    """
+    out: Dict[str, Any] = {"initialized": _engine is not None, **_counters}
+    if _engine is None:
+        return out
+    pool = _engine.pool
+    for key in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, key, None)
+        if callable(fn):
+            out[key] = fn()
+    return out
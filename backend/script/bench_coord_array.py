@@ -0,0 +1,67 @@
+# backend/script/bench_coord_array.py
+"""
+20k 点ルートでの polyline 検証・(de)serialization のベンチマーク。
+
+  List[List[float]] + json（従来） と CoordArray + orjson（現行）を比較する。
+  実行: python -m backend.script.bench_coord_array [点数] [繰り返し]
+"""
+from __future__ import annotations
+
+import json
+import random
+import sys
+import time
+from typing import List
+
+import orjson
+from pydantic import BaseModel
+
+from backend.common.coord_array import CoordArray
+
+
+class _Legacy(BaseModel):
+    polyline: List[List[float]]
+
+
+class _Fast(BaseModel):
+    polyline: CoordArray
+
+
+def _route(n: int) -> List[List[float]]:
+    rnd = random.Random(0)
+    lon, lat = 139.9, 39.2
+    out = []
+    for _ in range(n):
+        lon += rnd.uniform(-1e-4, 1e-4)
+        lat += rnd.uniform(-1e-4, 1e-4)
+        out.append([round(lon, 6), round(lat, 6)])
+    return out
+
+
+def _bench(label: str, fn, repeat: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - t0) / repeat * 1000.0
+    print(f"  {label:<44s} {ms:8.2f} ms")
+    return ms
+
+
+def main(n: int = 20_000, repeat: int = 20) -> None:
+    body = {"polyline": _route(n)}
+    raw = json.dumps(body).encode("utf-8")
+    print(f"polyline: {n} points, body {len(raw) / 1024:.0f} KiB, repeat={repeat}")
+
+    legacy = _bench("json.loads + List[List[float]] + json.dumps",
+                    lambda: json.dumps(_Legacy(**json.loads(raw)).model_dump()), repeat)
+    fast = _bench("orjson.loads + CoordArray + orjson.dumps",
+                  lambda: orjson.dumps(_Fast(**orjson.loads(raw)).model_dump()), repeat)
+    _bench("  (validation only) List[List[float]]", lambda: _Legacy(**body), repeat)
+    _bench("  (validation only) CoordArray", lambda: _Fast(**body), repeat)
+    print(f"speedup per hop: x{legacy / fast:.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,98 @@
+# backend/script/bench_corridor_shards.py
+"""
+長いルートでの回廊 POI 処理（簡略化 + SQL + reduce）の単一プロセス / 分割モード比較。
+
+  実行: python -m backend.script.bench_corridor_shards [--db] [頂点数 ...]
+
+既定では SQL の代わりに合成 POI を返す関数を使う（CPU 側の処理だけを測る）。
+--db を付けると静的 DB（STATIC_DB_URL など）に実際に問い合わせる。
+キャッシュは毎回空にして測る。
+"""
+from __future__ import annotations
+
+import math
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from backend.worker.app.services.alongpoi import corridor, geo_ops
+
+_SPOT_SPACING_M = 200.0  # 合成 POI の間隔（ルート沿い）
+
+
+def _route(n: int) -> List[List[float]]:
+    rnd = random.Random(0)
+    lon, lat, heading = 139.9, 39.2, 0.0
+    out = []
+    for _ in range(n):
+        heading += rnd.uniform(-0.2, 0.2)
+        lon += 0.00012 * math.cos(heading)
+        lat += 0.00009 * math.sin(heading)
+        out.append([round(lon, 6), round(lat, 6)])
+    return out
+
+
+def _segments(n: int, leg_len: int = 4000) -> List[Dict]:
+    out = []
+    for s in range(0, n - 1, leg_len):
+        e = min(s + leg_len, n - 1)
+        out.append({"mode": "car", "start_idx": s, "end_idx": e})
+    return out
+
+
+def synthetic_query(legs: List[Dict]) -> Dict[int, List[Dict]]:
+    """SQL の代わり: 各レッグ沿いに一定間隔で POI を置いて返す。"""
+    out: Dict[int, List[Dict]] = {}
+    for leg in legs:
+        coords = leg["coords"]
+        rnd = random.Random(hash(tuple(coords[0])))
+        xy = geo_ops.project_m(coords)
+        length_m = float(np.hypot(*np.diff(xy, axis=0).T).sum())
+        count = max(1, int(length_m / _SPOT_SPACING_M))
+        hits = []
+        for i in range(count):
+            lon, lat = coords[rnd.randrange(len(coords))]
+            hits.append({
+                "spot_id": f"{lon:.6f},{lat:.6f}", "name": "", "kind": "spot",
+                "lon": lon + rnd.uniform(-0.001, 0.001), "lat": lat + rnd.uniform(-0.001, 0.001),
+            })
+        out[leg["k"]] = hits
+    return out
+
+
+def _bench(label: str, fn) -> float:
+    t0 = time.perf_counter()
+    result = fn()
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(f"  {label:<12s} {ms:9.1f} ms  ({len(result)} POIs)")
+    return ms
+
+
+def main(argv: List[str]) -> None:
+    use_db = "--db" in argv
+    sizes = [int(a) for a in argv if not a.startswith("--")] or [20_000, 100_000, 300_000]
+    query = None if use_db else synthetic_query
+    print(f"workers={corridor.SHARD_WORKERS} shard_size={corridor.SHARD_SIZE} "
+          f"query={'postgis' if use_db else 'synthetic'} cpus={os.cpu_count()}")
+
+    # プールの起動（spawn）は初回だけなので計測から外す
+    corridor._get_pool().submit(int).result()
+
+    for n in sizes:
+        polyline, segments = _route(n), _segments(n)
+        print(f"vertices={n} legs={len(segments)}")
+        single = _bench("single", lambda: corridor.along_pois(
+            polyline, segments, 300, 10, cache=corridor.LegCache(), query=query,
+            shard_threshold=sys.maxsize))
+        sharded = _bench("sharded", lambda: corridor.along_pois(
+            polyline, segments, 300, 10, cache=corridor.LegCache(), query=query,
+            shard_threshold=0))
+        print(f"  speedup      x{single / sharded:.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
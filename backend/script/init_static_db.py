@@ -5,6 +5,13 @@ Static DB 初期化スクリプト（PostGIS 拡張・GIST インデックス・
 - PostGIS 拡張の有効化
 - spots / facilities の geom に GIST インデックス（存在しなければ作成）
 - 観光スポットと施設を統合する VIEW: poi_features_v を作成
+- static_data_version（データ版数）を用意し、データ投入後に version を +1
+  （nav / routing のスポットカタログはこれを見て再読込する）
+- （任意）環境変数 PRECOMPUTE_ROUTING=1 の時、OSRM を使ってルーティング用の事前計算を行う
+    * spot_access_points: 各スポットの k 近傍 access_point と徒歩ルート距離
+    * spot_car_access: 各スポットを OSRM nearest(car) でスナップした距離と車到達可否
+    * route_matrix/: 各地点から車で近い地点への car レッグ（距離・所要・ジオメトリ）
+    地図データ（OSRM の .osrm）を更新したら PRECOMPUTE_ROUTING=1 で再実行すること。
 - （任意）環境変数 LOAD_STATIC_JSON=1 の時のみ、POI.json / facilities.json を軽量投入
     * JSON スキーマ差異に耐えるよう best-effort で挿入（無理せずスキップ）
 """
@@ -15,8 +22,9 @@ import json
 import geojson
 import os
 import sys
+import urllib.request
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine, Connection
@@ -174,6 +182,42 @@ SELECT
 FROM facilities f;
 """
 
+DDL_CREATE_TABLE_DATA_VERSION = """
+CREATE TABLE IF NOT EXISTS static_data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+INSERT INTO static_data_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+"""
+
+DDL_CREATE_TABLE_SPOT_ACCESS_POINTS = """
+CREATE TABLE IF NOT EXISTS spot_access_points (
+    spot_id TEXT NOT NULL,
+    rank SMALLINT NOT NULL,
+    access_point_id BIGINT NOT NULL REFERENCES access_points(id) ON DELETE CASCADE,
+    straight_m DOUBLE PRECISION NOT NULL,
+    foot_distance_m DOUBLE PRECISION,
+    foot_duration_s DOUBLE PRECISION,
+    PRIMARY KEY (spot_id, rank)
+);
+"""
+
+DDL_CREATE_TABLE_SPOT_CAR_ACCESS = """
+CREATE TABLE IF NOT EXISTS spot_car_access (
+    spot_id TEXT PRIMARY KEY,
+    car_reachable BOOLEAN NOT NULL,
+    snap_distance_m DOUBLE PRECISION,
+    map_data_version TEXT,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+SQL_BUMP_DATA_VERSION = """
+UPDATE static_data_version SET version = version + 1, updated_at = NOW() WHERE id = 1
+RETURNING version;
+"""
+
 
 def apply_ddl(conn: Connection) -> None:
     conn.execute(text(DDL_ENABLE_POSTGIS))
@@ -184,6 +228,16 @@ def apply_ddl(conn: Connection) -> None:
     conn.execute(text(DDL_INDEX_FACILITIES))
     conn.execute(text(DDL_INDEX_ACCESS_POINTS))
     conn.execute(text(DDL_VIEW_POI_FEATURES_V))
+    conn.execute(text(DDL_CREATE_TABLE_DATA_VERSION))
+    conn.execute(text(DDL_CREATE_TABLE_SPOT_ACCESS_POINTS))
+    conn.execute(text(DDL_CREATE_TABLE_SPOT_CAR_ACCESS))
+
+
+def bump_data_version(conn: Connection) -> int:
+    """データ版数を +1 する（キャッシュ側の再読込トリガ）。"""
+    version = conn.execute(text(SQL_BUMP_DATA_VERSION)).scalar()
+    print(f"  -> static data version bumped to {version}.")
+    return int(version or 0)
 
 
 # -------------------------
@@ -416,6 +470,240 @@ def load_access_points_from_geojson(conn: Connection, path: Path) -> None:
     print(f"  -> Upserted {count} records.")
 
 
+# -------------------------
+# 任意: ルーティング用の事前計算（OSRM が必要）
+# -------------------------
+SQL_SELECT_POI_POINTS = """
+SELECT spot_id, lon, lat FROM poi_features_v ORDER BY spot_id
+"""
+
+SQL_NEAREST_ACCESS_POINTS = """
+SELECT a.id,
+       ST_X(a.geom)::float AS lon,
+       ST_Y(a.geom)::float AS lat,
+       ST_Distance(a.geom::geography, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography) AS straight_m
+FROM access_points a
+ORDER BY a.geom <-> ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)
+LIMIT :k
+"""
+
+SQL_DELETE_SPOT_ACCESS_POINTS = "DELETE FROM spot_access_points WHERE spot_id = :spot_id"
+
+SQL_INSERT_SPOT_ACCESS_POINT = """
+INSERT INTO spot_access_points (spot_id, rank, access_point_id, straight_m, foot_distance_m, foot_duration_s)
+VALUES (:spot_id, :rank, :access_point_id, :straight_m, :foot_distance_m, :foot_duration_s)
+"""
+
+
+def _osrm_get(base: str, path: str, timeout: float = 30.0) -> Optional[Dict[str, Any]]:
+    """OSRM に GET して JSON を返す（失敗時は None）。"""
+    url = f"{base.rstrip('/')}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            data = json.loads(r.read().decode("utf-8"))
+        return data if data.get("code") == "Ok" else None
+    except Exception as e:
+        print(f"  -> OSRM request failed: {url} ({e})")
+        return None
+
+
+def _osrm_foot_to_target(
+    foot_base: str, sources: List[Tuple[float, float]], target: Tuple[float, float]
+) -> List[Tuple[Optional[float], Optional[float]]]:
+    """
+    OSRM foot の table で sources(lon,lat) → target(lon,lat) の (距離[m], 所要[s]) を返す。
+    取れなければ (None, None) を並べる。
+    """
+    coords = ";".join(f"{lon},{lat}" for lon, lat in [*sources, target])
+    src_idx = ";".join(str(i) for i in range(len(sources)))
+    data = _osrm_get(
+        foot_base,
+        f"/table/v1/foot/{coords}?sources={src_idx}&destinations={len(sources)}&annotations=distance,duration",
+    )
+    if not data:
+        return [(None, None)] * len(sources)
+    dists = data.get("distances") or []
+    durs = data.get("durations") or []
+    out = []
+    for i in range(len(sources)):
+        d = dists[i][0] if i < len(dists) and dists[i] else None
+        t = durs[i][0] if i < len(durs) and durs[i] else None
+        out.append((d, t))
+    return out
+
+
+def precompute_spot_access_points(conn: Connection, k: int, foot_base: str) -> None:
+    """
+    各スポット（spots + facilities）について直線 k 近傍の access_point を取り、
+    OSRM foot で AP→スポットの実徒歩距離を付けて spot_access_points に保存する。
+    rank は徒歩距離の短い順（徒歩ルートが取れない AP は直線距離で後ろに並べる）。
+    """
+    print(f"Precomputing spot_access_points (k={k}, foot={foot_base})")
+    spots = conn.execute(text(SQL_SELECT_POI_POINTS)).mappings().all()
+    count = 0
+    for sp in spots:
+        aps = conn.execute(
+            text(SQL_NEAREST_ACCESS_POINTS), {"lon": sp["lon"], "lat": sp["lat"], "k": k}
+        ).mappings().all()
+        if not aps:
+            continue
+        walks = _osrm_foot_to_target(
+            foot_base, [(a["lon"], a["lat"]) for a in aps], (sp["lon"], sp["lat"])
+        )
+        rows = [
+            {"access_point_id": a["id"], "straight_m": float(a["straight_m"]),
+             "foot_distance_m": w[0], "foot_duration_s": w[1]}
+            for a, w in zip(aps, walks)
+        ]
+        rows.sort(key=lambda r: (r["foot_distance_m"] is None, r["foot_distance_m"] or r["straight_m"]))
+
+        conn.execute(text(SQL_DELETE_SPOT_ACCESS_POINTS), {"spot_id": sp["spot_id"]})
+        for rank, r in enumerate(rows):
+            conn.execute(text(SQL_INSERT_SPOT_ACCESS_POINT), {"spot_id": sp["spot_id"], "rank": rank, **r})
+        count += 1
+    print(f"  -> Precomputed access points for {count} spots.")
+
+
+SQL_UPSERT_SPOT_CAR_ACCESS = """
+INSERT INTO spot_car_access (spot_id, car_reachable, snap_distance_m, map_data_version, computed_at)
+VALUES (:spot_id, :car_reachable, :snap_distance_m, :map_data_version, NOW())
+ON CONFLICT (spot_id) DO UPDATE SET
+    car_reachable = EXCLUDED.car_reachable,
+    snap_distance_m = EXCLUDED.snap_distance_m,
+    map_data_version = EXCLUDED.map_data_version,
+    computed_at = NOW();
+"""
+
+
+def precompute_spot_car_access(conn: Connection, car_base: str, tolerance_m: float) -> None:
+    """
+    各スポットを OSRM nearest(car) で車道網にスナップし、スナップ距離が
+    tolerance_m（routing の CAR_ARRIVAL_TOLERANCE_METERS と同じ値）以下なら車で到達可とする。
+    OSRM が応答しないスポットは保存しない（routing 側は従来どおり car 直行を試す）。
+    """
+    print(f"Precomputing spot_car_access (car={car_base}, tolerance={tolerance_m}m)")
+    spots = conn.execute(text(SQL_SELECT_POI_POINTS)).mappings().all()
+    reachable = unreachable = 0
+    for sp in spots:
+        data = _osrm_get(car_base, f"/nearest/v1/car/{sp['lon']},{sp['lat']}?number=1")
+        if not data or not data.get("waypoints"):
+            continue
+        snap_m = float(data["waypoints"][0].get("distance", 0.0))
+        ok = snap_m <= tolerance_m
+        conn.execute(
+            text(SQL_UPSERT_SPOT_CAR_ACCESS),
+            {
+                "spot_id": sp["spot_id"],
+                "car_reachable": ok,
+                "snap_distance_m": snap_m,
+                "map_data_version": data.get("data_version"),
+            },
+        )
+        if ok:
+            reachable += 1
+        else:
+            unreachable += 1
+    print(f"  -> Classified {reachable} car-reachable / {unreachable} off-road spots.")
+
+
+def _osrm_table_block(
+    base: str, profile: str, src: List[Tuple[float, float]], dst: List[Tuple[float, float]], same: bool
+) -> Optional[Dict[str, Any]]:
+    """src × dst（いずれも (lon,lat)）の table。same=True なら src と dst は同一集合。"""
+    pts = src if same else [*src, *dst]
+    coords = ";".join(f"{lon},{lat}" for lon, lat in pts)
+    s_idx = ";".join(str(i) for i in range(len(src)))
+    d_idx = ";".join(str(i) for i in range(len(src))) if same else ";".join(
+        str(len(src) + j) for j in range(len(dst))
+    )
+    return _osrm_get(
+        base,
+        f"/table/v1/{profile}/{coords}?sources={s_idx}&destinations={d_idx}&annotations=distance,duration",
+        timeout=120.0,
+    )
+
+
+def precompute_route_matrix(
+    conn: Connection,
+    out_dir: Path,
+    car_base: str,
+    block: int,
+    geom_k: int,
+    car_tolerance_m: float,
+) -> None:
+    """
+    各地点（poi_features_v）から所要の短い geom_k 地点への car レッグ（距離・所要・ジオメトリ）を
+    car_geometries.json に保存する（周遊で連続しやすいのは近いスポット同士のため）。
+    近い順の判定に全地点間の所要（OSRM table）を使うが、レッグはジオメトリが無いと組めないので
+    行列そのものは保存しない。routing 側は meta.json の座標と突き合わせて添字を引く。
+    """
+    import numpy as np  # pandas の依存として入っている
+
+    points = conn.execute(text(SQL_SELECT_POI_POINTS)).mappings().all()
+    n = len(points)
+    if n == 0:
+        print("  -> No points; skipping route matrix.")
+        return
+    lonlat = [(float(p["lon"]), float(p["lat"])) for p in points]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Precomputing car legs between {n} points into {out_dir}")
+
+    dur = np.full((n, n), np.inf, dtype=np.float32)
+    data_version = None
+    # OSRM の --max-table-size を超えないようブロックに分けて埋める
+    for i0 in range(0, n, block):
+        for j0 in range(0, n, block):
+            src = lonlat[i0:i0 + block]
+            dst = lonlat[j0:j0 + block]
+            data = _osrm_table_block(car_base, "car", src, dst, same=(i0 == j0))
+            if not data:
+                continue
+            data_version = data_version or data.get("data_version")
+            for a, trow in enumerate(data.get("durations") or []):
+                for b, tv in enumerate(trow):
+                    if tv is not None:
+                        dur[i0 + a, j0 + b] = tv
+    np.fill_diagonal(dur, np.inf)
+
+    geometries: Dict[str, Any] = {}
+    for i in range(n if geom_k > 0 else 0):
+        row = dur[i]
+        for j in np.argsort(row)[:geom_k]:
+            if not np.isfinite(row[j]):
+                break
+            (lon1, lat1), (lon2, lat2) = lonlat[i], lonlat[int(j)]
+            data = _osrm_get(car_base, f"/route/v1/car/{lon1},{lat1};{lon2},{lat2}?overview=full&geometries=geojson")
+            if not data or not data.get("routes"):
+                continue
+            # routing の osrm_route と同じく、到着点が遠すぎるルートは保存しない
+            wps = data.get("waypoints") or []
+            if len(wps) < 2 or float(wps[-1].get("distance", 0.0)) > car_tolerance_m:
+                continue
+            rt = data["routes"][0]
+            geometries[f"{i},{int(j)}"] = {
+                "distance": rt.get("distance"),
+                "duration": rt.get("duration"),
+                "coordinates": rt["geometry"]["coordinates"],
+            }
+    print(f"  -> Stored {len(geometries)} car leg geometries.")
+    with open(out_dir / "car_geometries.json", "w", encoding="utf-8") as f:
+        json.dump(geometries, f, ensure_ascii=False, separators=(",", ":"))
+    # 以前の版が書いた行列は使わないので消す
+    for stale in out_dir.glob("*.npy"):
+        stale.unlink()
+
+    meta = {
+        "spot_ids": [p["spot_id"] for p in points],
+        "coords": [[lat, lon] for lon, lat in lonlat],
+        "map_data_versions": {"car": data_version},
+    }
+    # meta.json は最後に置き換える（routing はその mtime を見て読み直す）
+    tmp = out_dir / "meta.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, out_dir / "meta.json")
+
+
 # -------------------------
 # main
 # -------------------------
@@ -429,6 +717,7 @@ def main() -> int:
             apply_ddl(conn)
             print("--- DDL application finished. ---") # ★追加
 
+            data_changed = False
             load_json_env = os.getenv("LOAD_STATIC_JSON", "0")
             print(f"--- Checking LOAD_STATIC_JSON flag: {load_json_env} ---") # ★追加
 
@@ -461,8 +750,29 @@ def main() -> int:
                     load_access_points_from_geojson(conn, ap_path)
                 else:
                     print(f"File not found: {ap_path}") # ★追加
+                data_changed = True
             else:
                 print("--- Skipping data loading because LOAD_STATIC_JSON is not '1'. ---") # ★追加
+
+            # 任意: ルーティング用の事前計算（OSRM 起動後に実行）
+            if os.getenv("PRECOMPUTE_ROUTING", "0") == "1":
+                foot_base = os.getenv("OSRM_FOOT_URL", "http://osrm-foot:5000")
+                car_base = os.getenv("OSRM_CAR_URL", "http://osrm-car:5000")
+                precompute_spot_access_points(conn, int(os.getenv("ACCESS_POINT_K", "5")), foot_base)
+                car_tol = float(os.getenv("CAR_ARRIVAL_TOLERANCE_METERS", "50"))
+                precompute_spot_car_access(conn, car_base, car_tol)
+                precompute_route_matrix(
+                    conn,
+                    Path(os.getenv("ROUTE_MATRIX_DIR", str(Path(__file__).resolve().parents[1] / "worker" / "data" / "route_matrix"))),
+                    car_base,
+                    block=int(os.getenv("ROUTE_MATRIX_BLOCK", "50")),
+                    geom_k=int(os.getenv("ROUTE_MATRIX_GEOM_K", "5")),
+                    car_tolerance_m=car_tol,
+                )
+                data_changed = True
+
+            if data_changed:
+                bump_data_version(conn)
         print("--- DB initialization script finished successfully. ---") # ★追加
         return 0
     except Exception as e: # ★追加: エラーを明示的に出力
@@ -0,0 +1,156 @@
+import pytest
+
+from backend.worker.app.services.alongpoi import corridor, poi_repo
+from backend.common import static_db
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """query_pois_near_legs を差し替え、呼ばれたレッグを記録する。"""
+    calls = []
+    pois = {
+        # レッグ 0（car, 0-1）の近く
+        "D": {"spot_id": "D", "name": "Spot D", "lon": 139.9100, "lat": 39.2100, "kind": "spot", "distance_m": 5.0},
+        # レッグ 1（foot, 1-3）の近く
+        "F": {"spot_id": "F", "name": "Spot F", "lon": 139.9600, "lat": 39.2600, "kind": "spot", "distance_m": 3.0},
+    }
+
+    def fake_query(legs):
+        calls.append([l["radius_m"] for l in legs])
+        out = {}
+        for l in legs:
+            (lon0, lat0), (lon1, lat1) = l["coords"][0], l["coords"][-1]
+            out[l["k"]] = [
+                dict(p) for p in pois.values()
+                if min(lon0, lon1) <= p["lon"] <= max(lon0, lon1)
+            ]
+        return out
+
+    monkeypatch.setattr(poi_repo, "query_pois_near_legs", fake_query)
+    version = {"v": 1}
+    monkeypatch.setattr(static_db, "fetch_data_version", lambda: version["v"])
+    return calls, version
+
+
+def test_along_pois__rebases_leg_index_and_reuses_cached_legs(fake_db, simple_polyline, simple_segments):
+    calls, _ = fake_db
+    cache = corridor.LegCache(refresh_interval_s=0)
+
+    first = corridor.along_pois(simple_polyline, simple_segments, 300, 10, cache=cache)
+    by_id = {p["spot_id"]: p for p in first}
+    assert by_id["D"]["leg_index"] == 0 and by_id["D"]["source_segment_mode"] == "car"
+    # foot レッグは polyline の 1 番目から始まるので、レッグ内 index に 1 を足した値になる
+    assert by_id["F"]["leg_index"] == 2 and by_id["F"]["source_segment_mode"] == "foot"
+    assert calls == [[300.0, 10.0]]
+
+    # 同じレッグを含む別のプラン: foot レッグだけ先頭側にずれても DB は引かない
+    shifted = [[139.8800, 39.1800]] + simple_polyline
+    segments = [
+        {"mode": "car", "start_idx": 1, "end_idx": 2},
+        {"mode": "foot", "start_idx": 2, "end_idx": 4},
+    ]
+    second = {p["spot_id"]: p for p in corridor.along_pois(shifted, segments, 300, 10, cache=cache)}
+    assert len(calls) == 1
+    assert second["D"]["leg_index"] == 1 and second["F"]["leg_index"] == 3
+    assert cache.metrics()["hits"] == 2
+
+
+def test_along_pois__only_uncached_legs_are_queried(fake_db, simple_polyline, simple_segments):
+    calls, _ = fake_db
+    cache = corridor.LegCache(refresh_interval_s=0)
+    corridor.along_pois(simple_polyline, simple_segments[:1], 300, 10, cache=cache)
+    corridor.along_pois(simple_polyline, simple_segments, 300, 10, cache=cache)
+    assert calls == [[300.0], [10.0]]
+
+    # 半径が変われば別キー
+    corridor.along_pois(simple_polyline, simple_segments, 200, 10, cache=cache)
+    assert calls[-1] == [200.0]
+
+
+def test_leg_cache__cleared_on_static_data_version_change(fake_db, simple_polyline, simple_segments):
+    calls, version = fake_db
+    cache = corridor.LegCache(refresh_interval_s=0)
+    corridor.along_pois(simple_polyline, simple_segments, 300, 10, cache=cache)
+    version["v"] = 2
+    corridor.along_pois(simple_polyline, simple_segments, 300, 10, cache=cache)
+    assert len(calls) == 2
+
+
+def test_along_pois__db_failure_is_not_cached(monkeypatch, simple_polyline, simple_segments):
+    monkeypatch.setattr(static_db, "fetch_data_version", lambda: None)
+    monkeypatch.setattr(poi_repo, "query_pois_near_legs", lambda legs: None)
+    cache = corridor.LegCache(refresh_interval_s=0)
+    assert corridor.along_pois(simple_polyline, simple_segments, 300, 10, cache=cache) == []
+    assert len(cache) == 0
+
+
+def test_leg_cache__lru_eviction():
+    cache = corridor.LegCache(max_entries=2)
+    keys = [corridor.leg_key([[0, 0], [i, 1]], "car", 300, 30) for i in range(3)]
+    for k in keys:
+        cache.put(k, [])
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == ()
+
+
+def test_split__pieces_share_boundary_vertex():
+    coords = [[i, 0] for i in range(10)]
+    pieces = corridor._split(coords, 4)
+    assert [off for off, _ in pieces] == [0, 3, 6]
+    assert [len(p) for _, p in pieces] == [4, 4, 4]
+    assert pieces[-1][1][-1] == coords[-1]
+
+
+def test_along_pois__sharded_matches_single_query(monkeypatch):
+    import math
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    from backend.worker.app.services.alongpoi import geo_ops
+
+    monkeypatch.setattr(static_db, "fetch_data_version", lambda: None)
+    polyline = [
+        [139.90 + i * 0.0001, 39.20 + 0.003 * math.sin(i / 80.0)] for i in range(1200)
+    ]
+    segments = [
+        {"mode": "car", "start_idx": 0, "end_idx": 700},
+        {"mode": "foot", "start_idx": 700, "end_idx": 900},
+        {"mode": "car", "start_idx": 900, "end_idx": 1199},
+    ]
+    rng = np.random.default_rng(1)
+    spots = [
+        {"spot_id": f"S{i}", "name": "", "kind": "spot",
+         "lon": polyline[j][0], "lat": polyline[j][1] + float(rng.uniform(-0.0004, 0.0004))}
+        for i, j in enumerate(rng.integers(0, len(polyline), 80))
+    ]
+
+    def fake_query(legs):
+        # 簡略化後のラインから半径以内のスポットを返す（distance_m は reducer に計算させる）
+        out = {}
+        for l in legs:
+            xy = geo_ops.project_m(l["coords"])
+            hits = []
+            for s in spots:
+                p = geo_ops.project_m([[s["lon"], s["lat"]]])[0]
+                if geo_ops.point_segment_distances(p, xy[:-1], xy[1:]).min() <= l["radius_m"]:
+                    hits.append(dict(s))
+            out[l["k"]] = hits
+        return out
+
+    single = corridor.along_pois(polyline, segments, 300, 10, cache=corridor.LegCache(), query=fake_query)
+    assert len(single) > 10
+
+    pool = ThreadPoolExecutor(max_workers=3)
+    monkeypatch.setattr(corridor, "_get_pool", lambda: pool)
+    sharded = corridor.along_pois(
+        polyline, segments, 300, 10, cache=corridor.LegCache(), query=fake_query,
+        shard_threshold=100, shard_size=150,
+    )
+    pool.shutdown()
+
+    key = lambda p: p["spot_id"]
+    assert [p["spot_id"] for p in sorted(sharded, key=key)] == [p["spot_id"] for p in sorted(single, key=key)]
+    for a, b in zip(sorted(sharded, key=key), sorted(single, key=key)):
+        assert a["leg_index"] == b["leg_index"]
+        assert a["source_segment_mode"] == b["source_segment_mode"]
+        assert math.isclose(a["distance_m"], b["distance_m"], rel_tol=1e-9)
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+from backend.worker.app.services.alongpoi import geo_ops
+from backend.worker.app.services.alongpoi.reducer import reduce_hits_to_along_pois
+
+
+def _wiggly_polyline(n=2000):
+    # 東西に延びる道路に小さな揺れ（数 m）と大きな曲がり（数百 m）を混ぜた折れ線
+    out = []
+    for i in range(n):
+        lon = 139.90 + i * 0.00005
+        lat = 39.20 + 0.002 * math.sin(i / 150.0) + 0.00001 * math.sin(i * 1.7)
+        out.append([lon, lat])
+    return out
+
+
+def test_simplify_indices__collinear_points_collapse_to_endpoints():
+    xy = np.column_stack([np.arange(100.0), np.zeros(100)])
+    assert geo_ops.simplify_indices(xy, 1.0).tolist() == [0, 99]
+    # 許容誤差 0 なら何も落とさない
+    assert len(geo_ops.simplify_indices(xy, 0.0)) == 100
+
+
+def test_simplify_indices__error_bounded_per_leg():
+    # corridor.run_pieces と同じく、レッグ（ピース）ごとにそのモードの許容誤差で簡略化する
+    pl = _wiggly_polyline()
+    tol = geo_ops.simplify_tolerances(300, 10)
+    for coords, mode in ((pl[:1501], "car"), (pl[1500:], "foot")):
+        xy = geo_ops.project_m(coords)
+        keep = geo_ops.simplify_indices(xy, tol[mode]).tolist()
+
+        assert keep[0] == 0 and keep[-1] == len(coords) - 1
+        assert keep == sorted(set(keep))
+        # 元の各頂点は、対応する簡略化辺から許容誤差以内
+        for s, e in zip(keep, keep[1:]):
+            inner = xy[s:e + 1]
+            d = geo_ops.point_segment_distances(
+                inner, np.broadcast_to(xy[s], inner.shape), np.broadcast_to(xy[e], inner.shape),
+            )
+            assert d.max() <= tol[mode] + 1e-6
+    car_keep = geo_ops.simplify_indices(geo_ops.project_m(pl[:1501]), tol["car"])
+    assert len(car_keep) < 1501 // 4
+
+
+def test_simplify_indices__disabled_when_ratio_zero(simple_polyline):
+    tol = geo_ops.simplify_tolerances(300, 10, ratio=0.0)
+    keep = geo_ops.simplify_indices(geo_ops.project_m(simple_polyline), tol["car"])
+    assert keep.tolist() == list(range(len(simple_polyline)))
+
+
+def test_reduce_hits__index_map_gives_same_leg_index_as_full_scan():
+    pl = _wiggly_polyline()
+    tol = geo_ops.simplify_tolerances(300, 10)
+    index_map = geo_ops.simplify_indices(geo_ops.project_m(pl), tol["car"]).tolist()
+
+    rng = np.random.default_rng(0)
+    hits = []
+    for i, j in enumerate(rng.integers(0, len(pl), 50)):
+        lon, lat = pl[int(j)]
+        hits.append({"spot_id": f"S{i}", "name": "", "lon": lon + rng.normal(0, 0.001), "lat": lat + rng.normal(0, 0.001)})
+
+    full = reduce_hits_to_along_pois(hits, pl)
+    fast = reduce_hits_to_along_pois(hits, pl, index_map=index_map, tolerance_m=tol["car"])
+    assert [p["leg_index"] for p in fast] == [p["leg_index"] for p in full]
+    for f, s in zip(full, fast):
+        assert math.isclose(f["distance_m"], s["distance_m"], rel_tol=1e-9)
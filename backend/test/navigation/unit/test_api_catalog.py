@@ -0,0 +1,109 @@
+import gzip
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import catalog_router
+from backend.common import spot_catalog as sc
+from backend.common.spot_catalog import CatalogEntry, SpotCatalog
+
+
+def _entry(sid, lon, lat, kind="spot"):
+    return CatalogEntry(spot_id=sid, kind=kind, lon=lon, lat=lat,
+                        name={"ja": f"名{sid}", "en": f"Name {sid}"},
+                        description={"ja": "長い説明"}, md_slug=f"slug_{sid}")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    state = {"version": 1, "entries": [_entry("B", 139.91, 39.21), _entry("A", 140.5, 38.0, "facility")]}
+    monkeypatch.setattr(sc, "_fetch_entries", lambda ids=None: list(state["entries"]))
+    monkeypatch.setattr(sc, "_fetch_version", lambda: state["version"])
+    monkeypatch.setattr(sc, "_catalog", SpotCatalog(refresh_interval_s=0))
+    monkeypatch.setattr(catalog_router, "_bodies", catalog_router.CatalogBodies())
+    return state
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(catalog_router.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_pois__compact_list_in_requested_language(client, db):
+    r = client.get("/api/pois", params={"lang": "en"}, headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.json() == {
+        "v": 1,
+        "lang": "en",
+        "items": [
+            {"spot_id": "A", "kind": "facility", "name": "Name A", "lat": 38.0, "lon": 140.5},
+            {"spot_id": "B", "kind": "spot", "name": "Name B", "lat": 39.21, "lon": 139.91},
+        ],
+    }
+    assert r.headers["etag"].startswith('"') and "content-encoding" not in r.headers
+
+
+def test_pois__revalidates_with_304_until_version_changes(client, db):
+    etag = client.get("/api/pois").headers["etag"]
+    r = client.get("/api/pois", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+    assert client.get("/api/pois", params={"lang": "en"}, headers={"If-None-Match": etag}).status_code == 200
+
+    db["version"] = 2
+    db["entries"] = db["entries"][:1]
+    r = client.get("/api/pois", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert [i["spot_id"] for i in r.json()["items"]] == ["B"]
+
+
+def test_pois__serves_precompressed_gzip(client, db):
+    r = client.get("/api/pois", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    body = catalog_router._bodies.get("ja")
+    assert gzip.decompress(body.gzip) == body.raw
+    assert orjson.loads(body.raw)["items"][0]["name"] == "名A"
+
+
+def test_pois__etag_differs_per_encoding_and_any_variant_revalidates(client, db):
+    raw = client.get("/api/pois", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    gz = client.get("/api/pois", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    assert len({raw, gz}) == 2 and gz == raw[:-1] + '-gz"'
+    if catalog_router.brotli is not None:
+        br = client.get("/api/pois", headers={"Accept-Encoding": "br"}).headers["etag"]
+        assert br == raw[:-1] + '-br"'
+
+    # 圧縮の有無が変わっても、どの版のタグでも 304（今回の版のタグを返す）
+    r = client.get("/api/pois", headers={"Accept-Encoding": "gzip", "If-None-Match": raw})
+    assert r.status_code == 304 and r.headers["etag"] == gz
+    assert client.get("/api/pois", headers={"Accept-Encoding": "identity", "If-None-Match": gz}).status_code == 304
+
+
+def test_pois_tiles__split_by_xyz_tile(client, db):
+    # z=10 で B（139.91, 39.21）を含むタイル
+    z = 10
+    x, y = 909, 390
+    west, south, east, north = catalog_router.tile_bounds(z, x, y)
+    assert west <= 139.91 < east and south < 39.21 <= north
+
+    r = client.get(f"/api/pois/tiles/{z}/{x}/{y}")
+    assert [i["spot_id"] for i in r.json()["items"]] == ["B"]
+    assert client.get(f"/api/pois/tiles/{z}/{x + 1}/{y}").json()["items"] == []
+    assert client.get("/api/pois/tiles/3/1/1").status_code == 400
+    assert client.get(f"/api/pois/tiles/{z}/{2 ** z}/0").status_code == 404
+
+
+def test_pois__503_when_catalog_never_loaded(client, monkeypatch):
+    def down(ids=None):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(sc, "_fetch_entries", down)
+    monkeypatch.setattr(sc, "_fetch_version", lambda: None)
+    monkeypatch.setattr(sc, "_catalog", SpotCatalog(refresh_interval_s=0))
+    monkeypatch.setattr(catalog_router, "_bodies", catalog_router.CatalogBodies())
+    assert client.get("/api/pois").status_code == 503
+    # 空の一覧は作らない・キャッシュしない
+    assert catalog_router._bodies.misses == 0 and not catalog_router._bodies._items
@@ -0,0 +1,48 @@
+from backend.api import plan_cache
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def eval(self, script, numkeys, key, expected, value, ttl):
+        if self.data.get(key) == expected:
+            self.data[key] = value
+            return 1
+        return 0
+
+
+def _payload(lat=39.2000, lon=139.9000, spots=("A", "B"), language="ja"):
+    return {"language": language, "origin": {"lat": lat, "lon": lon},
+            "return_to_origin": True, "waypoints": [{"spot_id": s} for s in spots]}
+
+
+def test_fingerprint__snaps_origin_and_keeps_spot_order():
+    base = plan_cache.plan_fingerprint(_payload())
+    # 数十 m 以内の出発地は同一視（グリッド 250m、セル境界から離れた点）
+    assert plan_cache.plan_fingerprint(_payload(lat=39.20005, lon=139.90005)) == base
+    assert plan_cache.plan_fingerprint(_payload(lat=39.25)) != base
+    assert plan_cache.plan_fingerprint(_payload(spots=("B", "A"))) != base
+    assert plan_cache.plan_fingerprint(_payload(language="en")) != base
+    # buffer 未指定は nav の既定値と同じ扱い
+    assert plan_cache.plan_fingerprint({**_payload(), "buffer": {"car": 300, "foot": 10}}) == base
+
+
+def test_claim__joins_in_flight_task_and_replaces_stale(monkeypatch):
+    monkeypatch.setattr(plan_cache, "_client", _FakeRedis())
+    fp = plan_cache.plan_fingerprint(_payload())
+
+    assert plan_cache.claim(fp, "t1") is None
+    assert plan_cache.claim(fp, "t2") == "t1"
+    assert plan_cache.replace(fp, "t1", "t3") is True
+    assert plan_cache.replace(fp, "t1", "t4") is False
+    assert plan_cache.claim(fp, "t5") == "t3"
@@ -0,0 +1,254 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import nav_router
+from backend.api import plan_status as api_status
+from backend.worker.app.services.nav import plan_status as worker_status
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipe(self)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def eval(self, script, numkeys, key, seen, state, error, ttl, now):
+        # _SETTLE_LUA と同じ: 見た時から updated_at が変わっていなければ上書き
+        h = self.hashes.get(key, {})
+        if h.get("updated_at") != str(seen):
+            return 0
+        h.update({"state": state, "error": error, "updated_at": str(now)})
+        h["rev"] = str(int(h.get("rev", 0)) + 1)
+        return 1
+
+
+class _FakePipe:
+    def __init__(self, r):
+        self.r, self.ops = r, []
+
+    def hset(self, key, mapping):
+        self.ops.append(lambda h: h.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()}))
+
+    def hsetnx(self, key, field, value):
+        self.ops.append(lambda h: h.setdefault(key, {}).setdefault(field, str(value)))
+
+    def hincrby(self, key, field, n):
+        def op(h):
+            d = h.setdefault(key, {})
+            d[field] = str(int(d.get(field, 0)) + n)
+        self.ops.append(op)
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        for op in self.ops:
+            op(self.r.hashes)
+
+
+def _client(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(api_status, "_client", fake)
+    monkeypatch.setattr(worker_status, "_client", fake)
+    app = FastAPI()
+    app.include_router(nav_router.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_poll__reads_status_hash_and_supports_etag(monkeypatch):
+    client = _client(monkeypatch)
+    api_status.mark_pending("t1")
+    worker_status.update("t1", state="STARTED", stage="narrate", total=3, done=0)
+    worker_status.advance("t1")
+
+    r = client.get("/api/nav/plan/tasks/t1")
+    assert r.status_code == 202
+    assert r.json()["stage"] == "narrate" and r.json()["progress"] == {"done": 1, "total": 3}
+    tag = r.headers["etag"]
+
+    # 変化が無ければ 304
+    assert client.get("/api/nav/plan/tasks/t1", headers={"If-None-Match": tag}).status_code == 304
+    # 進捗が進めば ETag が変わる
+    worker_status.advance("t1")
+    r2 = client.get("/api/nav/plan/tasks/t1", headers={"If-None-Match": tag})
+    assert r2.status_code == 202 and r2.headers["etag"] != tag
+
+
+def test_poll__failure_state_returns_500(monkeypatch):
+    client = _client(monkeypatch)
+    worker_status.update("t2", state="STARTED", stage="route")
+    worker_status.fail("t2", RuntimeError("routing down"))
+
+    r = client.get("/api/nav/plan/tasks/t2")
+    assert r.status_code == 500
+    assert r.json()["error"] == "RuntimeError: routing down"
+
+
+def test_poll__success_serves_precompressed_manifest_from_disk(monkeypatch, tmp_path):
+    import gzip
+    import json
+
+    from backend.worker.app.services.nav import tasks
+
+    client = _client(monkeypatch)
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    fc = {"type": "FeatureCollection", "features": []}
+    tasks._write_manifest("p1", "ja", fc, [[139.9, 39.2], [139.95, 39.3]],
+                          [{"mode": "car", "start_idx": 0, "end_idx": 1}], [], [], [], [], strict=True)
+    worker_status.update("t3", state="SUCCESS", stage="done", pack_id="p1", result_ref="t3")
+    # result backend は読まない
+    monkeypatch.setattr(nav_router, "AsyncResult", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+
+    r = client.get("/api/nav/plan/tasks/t3", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json()["polyline"] == [[139.9, 39.2], [139.95, 39.3]]
+    assert gzip.decompress((tmp_path / "p1" / "manifest.json.gz").read_bytes()) == (tmp_path / "p1" / "manifest.json").read_bytes()
+
+    r2 = client.get("/api/nav/plan/tasks/t3", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r2.headers
+    assert json.loads(r2.content)["manifest_url"] == "/packs/p1/manifest.json"
+
+
+def test_manifest_endpoint__negotiates_compact_and_msgpack(monkeypatch, tmp_path):
+    import msgpack
+
+    from backend.worker.app.services.nav import tasks
+
+    client = _client(monkeypatch)
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    tasks._write_manifest("p2", "ja", {"type": "FeatureCollection", "features": []}, [[139.9, 39.2], [139.95, 39.3]],
+                          [{"mode": "car", "start_idx": 0, "end_idx": 1}], [], [], [], [], strict=True)
+
+    r = client.get("/api/nav/packs/p2/manifest.json?compact=1")
+    assert r.json()["format"] == "compact-v1" and "route" not in r.json()
+    assert "Accept" in r.headers["vary"]
+
+    r2 = client.get("/api/nav/packs/p2/manifest.json", headers={"Accept": "application/msgpack"})
+    assert r2.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(r2.content)["polyline"]["len"] == 2
+
+    assert client.get("/api/nav/packs/p2/manifest.json").json()["route"]["type"] == "FeatureCollection"
+    assert client.get("/api/nav/packs/..%2Fetc/manifest.json").status_code == 404
+
+
+class _FakeResult:
+    def __init__(self, state, info=None):
+        self.state, self.info = state, info
+
+
+def _stall(key, seconds=None):
+    # 最後の書き込み（ハートビート含む）を stale_after_s より前にずらす
+    h = api_status._client.hashes[api_status._KEY_PREFIX + key]
+    h["updated_at"] = str(int(h["updated_at"]) - int(seconds or float(h["stale_after_s"])) - 1)
+
+
+def test_poll__stalled_hash_falls_back_to_celery_state(monkeypatch):
+    client = _client(monkeypatch)
+    celery = {"t4": _FakeResult("STARTED"), "t5": _FakeResult("FAILURE", RuntimeError("worker lost"))}
+    monkeypatch.setattr(nav_router, "AsyncResult", lambda tid, app=None: celery[tid])
+
+    # 書き込みが新しいうちは Celery を見ない
+    worker_status.update("t4", state="STARTED", stage="narrate", result_ref="t4", stale_after_s=60, queued=0)
+    assert client.get("/api/nav/plan/tasks/t4").status_code == 202
+
+    # 止まったまま Celery でも未完了 → ワーカー停止とみなして失敗にする
+    _stall("t4")
+    r = client.get("/api/nav/plan/tasks/t4")
+    assert r.status_code == 500 and "plan stalled" in r.json()["error"]
+    assert api_status.read("t4")["state"] == "FAILURE"
+
+    # Celery 側で失敗していればその理由を返す
+    api_status.mark_pending("t5")
+    worker_status.update("t5", state="STARTED", stage="route", stale_after_s=60, queued=0)
+    _stall("t5")
+    r = client.get("/api/nav/plan/tasks/t5")
+    assert r.status_code == 500 and r.json()["error"] == "worker lost"
+
+
+def test_settle__does_not_overwrite_newer_worker_write(monkeypatch):
+    _client(monkeypatch)
+    worker_status.update("t6", state="STARTED", stage="route", stale_after_s=60)
+    _stall("t6")
+    seen = api_status.read("t6")
+    assert api_status.is_stalled(seen)
+    worker_status.update("t6", state="SUCCESS", stage="done")
+    assert api_status.settle("t6", seen, "FAILURE", "stalled")["state"] == "SUCCESS"
+
+
+def test_is_stalled__never_for_queued_plans(monkeypatch):
+    _client(monkeypatch)
+    # ゲートウェイが積んだだけ（ワーカーがまだ拾っていない）
+    api_status.mark_pending("q1")
+    _stall("q1", seconds=10 ** 6)
+    assert not api_status.is_stalled(api_status.read("q1"))
+
+    # NAV_STAGED のステージ間でキューに積まれている
+    worker_status.update("q2", state="STARTED", stage="narrate", stale_after_s=60, queued=1)
+    _stall("q2")
+    assert not api_status.is_stalled(api_status.read("q2"))
+    worker_status.touch("q2", queued=0)
+    _stall("q2")
+    assert api_status.is_stalled(api_status.read("q2"))
+
+
+def test_heartbeat__keeps_running_plan_fresh_without_changing_etag(monkeypatch):
+    import time
+
+    _client(monkeypatch)
+    worker_status.update("h1", state="STARTED", stage="narrate", stale_after_s=60, queued=0)
+    _stall("h1")
+    before = api_status.read("h1")
+    assert api_status.is_stalled(before)
+
+    with worker_status.heartbeat("h1", interval_s=0.01):
+        time.sleep(0.05)
+    after = api_status.read("h1")
+    assert not api_status.is_stalled(after)
+    assert api_status.etag("h1", after) == api_status.etag("h1", before)
+
+
+def test_stale_after_s__covers_longest_downstream_timeout(monkeypatch):
+    from backend.worker.app.services.nav import http_pool
+
+    monkeypatch.setenv("NAV_VOICE_TIMEOUT_S", "5000")
+    assert http_pool.max_timeout_s() == 5000
+    assert worker_status.stale_after_s() >= 5000 + worker_status.PLAN_STATUS_HEARTBEAT_S
+
+
+def test_plan_workflow__invalid_payload_is_recorded_as_failure(monkeypatch):
+    import pytest
+
+    from backend.worker.app.services.nav import tasks
+
+    _client(monkeypatch)
+    with pytest.raises(Exception):
+        tasks.plan_workflow.apply(args=[{"language": "ja"}], task_id="t7", throw=True)
+    doc = api_status.read("t7")
+    assert doc["state"] == "FAILURE" and "ValidationError" in doc["error"]
+
+
+def test_enqueue__does_not_join_stalled_task(monkeypatch):
+    from backend.api import plan_cache
+
+    client = _client(monkeypatch)
+    joined = {}
+    monkeypatch.setattr(plan_cache, "claim", lambda fp, tid: joined.get(fp) if joined.setdefault(fp, tid) != tid else None)
+    monkeypatch.setattr(plan_cache, "replace", lambda fp, old, new: joined.update({fp: new}) or True)
+    monkeypatch.setattr(nav_router, "AsyncResult", lambda tid, app=None: _FakeResult("PENDING"))
+    sent = []
+    monkeypatch.setattr(nav_router.celery_app, "send_task", lambda name, **kw: sent.append(kw["task_id"]))
+
+    body = {"language": "ja", "origin": {"lat": 39.2, "lon": 139.9}, "waypoints": [{"spot_id": "A"}]}
+    first = client.post("/api/nav/plan", json=body).json()["task_id"]
+    assert client.post("/api/nav/plan", json=body).json()["task_id"] == first  # 実行中には合流する
+
+    worker_status.update(first, state="STARTED", stage="narrate", stale_after_s=60, queued=0)
+    _stall(first)
+    third = client.post("/api/nav/plan", json=body)
+    assert third.headers["x-plan-cache"] == "miss" and third.json()["task_id"] != first
+    assert sent == [first, third.json()["task_id"]]
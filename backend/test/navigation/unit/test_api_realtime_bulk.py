@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import realtime_router
+from backend.api.rt_store import MemoryRTStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    s = MemoryRTStore()
+    monkeypatch.setattr(realtime_router, "_store", s)
+    return s
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(realtime_router.router, prefix="/api")
+    return TestClient(app)  # with を使わない（startup の MQTT を起こさない）
+
+
+def test_store__seq_advances_only_on_change(store):
+    assert store.put({"s": "A", "w": 0, "c": 1}) == 1
+    assert store.put({"s": "A", "w": 0, "c": 1}) == 1
+    assert store.put({"s": "B", "w": 2, "c": 0}) == 2
+    assert store.changes_since(1, ["A", "B"]) == (2, {"B": {"s": "B", "w": 2, "c": 0}})
+
+
+
+def test_store__concurrent_puts_get_distinct_seqs(store):
+    # MQTT スレッドと HTTP 側から同時に put されても seq は重複しない
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        for j in range(200):
+            store.put({"s": f"S{i}", "w": j, "c": 0})
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.seq == 8 * 200
+    seqs = [store._seq_by_spot[f"S{i}"] for i in range(8)]
+    assert len(set(seqs)) == 8 and max(seqs) == store.seq
+
+def test_bulk__snapshot_then_changes_since_cursor(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    store.put({"s": "B", "w": 1, "c": 2})
+
+    r = client.get("/api/rt/spots", params={"ids": "A,B,X"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body == {"seq": 2, "full": True, "spots": {"A": {"w": 0, "c": 1}, "B": {"w": 1, "c": 2}}}
+    assert r.headers["etag"] == 'W/"rt-2"'
+
+    # 変化なし → 304（本文なし）
+    r = client.get("/api/rt/spots", params={"ids": "A,B", "since": 2})
+    assert r.status_code == 304 and r.content == b""
+    # If-None-Match でも同じ
+    r = client.get("/api/rt/spots", params={"ids": "A,B"}, headers={"If-None-Match": 'W/"rt-2"'})
+    assert r.status_code == 304
+
+    # 対象外スポットの変化では 304 のまま。対象スポットの変化は差分だけ
+    store.put({"s": "Z", "w": 0, "c": 0})
+    assert client.get("/api/rt/spots", params={"ids": "A,B", "since": 2}).status_code == 304
+    store.put({"s": "B", "w": 2, "c": 2})
+    r = client.get("/api/rt/spots", params={"ids": "A,B", "since": 2})
+    assert r.json() == {"seq": 4, "full": False, "spots": {"B": {"w": 2, "c": 2}}}
+
+
+def test_bulk__cursor_from_the_future_returns_full_snapshot(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    r = client.get("/api/rt/spots", params={"ids": "A", "since": 99})
+    assert r.status_code == 200 and r.json()["full"] is True
+
+
+def test_bulk__long_poll_wakes_on_put_from_another_thread(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    timer = threading.Timer(0.2, lambda: store.put({"s": "A", "w": 1, "c": 1}))
+    timer.start()
+    r = client.get("/api/rt/spots", params={"ids": "A", "since": 1, "wait": 5})
+    timer.join()
+    assert r.status_code == 200
+    assert r.json()["spots"] == {"A": {"w": 1, "c": 1}}
+
+
+def test_bulk__long_poll_times_out_with_304(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    r = client.get("/api/rt/spots", params={"ids": "A", "since": 1, "wait": 0.2})
+    assert r.status_code == 304
+    assert r.headers["x-rt-seq"] == "1"
+
+
+def test_store__wait_returns_immediately_when_already_ahead():
+    s = MemoryRTStore()
+    s.put({"s": "A", "w": 0})
+    assert asyncio.run(s.wait(0, 1.0)) is True
+    assert asyncio.run(s.wait(1, 0.05)) is False
+
+
+def test_ws__subscribe_snapshot_then_push_diffs(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    store.put({"s": "B", "w": 1, "c": 1})
+    with client.websocket_connect("/api/rt/ws") as ws:
+        ws.send_json({"op": "sub", "ids": ["A", "B"]})
+        assert ws.receive_json() == {
+            "t": "d", "seq": 2, "full": True,
+            "spots": {"A": {"w": 0, "c": 1}, "B": {"w": 1, "c": 1}},
+        }
+        store.put({"s": "Z", "w": 0, "c": 0})  # 購読外 → 何も届かない
+        store.put({"s": "B", "w": 2, "c": 1})
+        assert ws.receive_json() == {"t": "d", "seq": 4, "full": False, "spots": {"B": {"w": 2, "c": 1}}}
+
+
+def test_ws__resume_from_sequence(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    store.put({"s": "B", "w": 1, "c": 1})
+    store.put({"s": "A", "w": 2, "c": 1})
+    with client.websocket_connect("/api/rt/ws") as ws:
+        ws.send_json({"op": "sub", "ids": ["A", "B"], "since": 2})
+        assert ws.receive_json() == {"t": "d", "seq": 3, "full": False, "spots": {"A": {"w": 2, "c": 1}}}
+
+
+def test_ws__ignores_binary_and_malformed_frames(client, store):
+    store.put({"s": "A", "w": 0, "c": 1})
+    with client.websocket_connect("/api/rt/ws") as ws:
+        ws.send_bytes(b"\x00\x01")
+        ws.send_text("not json")
+        ws.send_json({"op": "sub", "ids": ["A"]})
+        assert ws.receive_json() == {"t": "d", "seq": 1, "full": True, "spots": {"A": {"w": 0, "c": 1}}}
+
+
+def test_ws__heartbeat_when_idle(client, store, monkeypatch):
+    monkeypatch.setattr(realtime_router, "RT_WS_HEARTBEAT_S", 0.2)
+    store.put({"s": "A", "w": 0, "c": 1})
+    with client.websocket_connect("/api/rt/ws") as ws:
+        ws.send_json({"op": "sub", "ids": ["A"], "since": 1})
+        assert ws.receive_json()["spots"] == {}
+        assert ws.receive_json() == {"t": "hb", "seq": 1}
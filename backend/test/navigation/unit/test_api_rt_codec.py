@@ -0,0 +1,85 @@
+import pytest
+
+from backend.api import rt_codec
+from backend.api.rt_codec import ETAG_NONE, SpotCodes
+from backend.api.rt_ingest import DownlinkScheduler
+
+CODES = SpotCodes(["spot_003", "spot_001", "spot_002", "spot_001"])
+
+
+def test_spot_codes__sorted_by_id_and_deduplicated():
+    assert [CODES.spot_id(i) for i in range(len(CODES))] == ["spot_001", "spot_002", "spot_003"]
+    assert CODES.code("spot_003") == 2 and CODES.code("nope") is None
+    assert len(SpotCodes(f"s{i:04d}" for i in range(300))) == 256
+
+
+def test_spot_codes__match_frontend_poi():
+    codes = rt_codec.get_spot_codes()
+    assert len(codes) > 0 and codes.spot_id(0) == "spot_001"
+
+
+def test_state_byte_matches_client_etag_layout():
+    # rt.js _calcEtag: [ w(2) | u(2) | c(3) | hbit(1) ]
+    assert rt_codec.pack_state({"w": 2, "u": 1, "c": 4, "h": 7}) == (0b10_01_100_1, 7)
+    assert rt_codec.pack_state({"w": 1, "c": 3, "h": 7}) == (0b01_00_011_0, None)  # u=0 なら h は送らない
+    assert rt_codec.pack_state({"s": "x"})[0] != ETAG_NONE
+
+
+def test_downlink_round_trip_and_frame_size():
+    docs = [{"s": "spot_001", "w": 1, "u": 0, "c": 2}, {"s": "spot_003", "w": 0, "u": 2, "c": 1, "h": 30}]
+    (frame,) = rt_codec.encode_downlinks(docs, CODES, max_bytes=51)
+    assert len(frame) == 1 + 2 + 3
+    assert rt_codec.decode_downlink(frame, CODES) == docs
+
+    many = [{"s": f"s{i:02d}", "w": 1, "c": 1} for i in range(20)]
+    codes = SpotCodes(d["s"] for d in many)
+    frames = rt_codec.encode_downlinks(many, codes, max_bytes=11)
+    assert all(len(f) <= 11 for f in frames)
+    assert [d["s"] for f in frames for d in rt_codec.decode_downlink(f, codes)] == [d["s"] for d in many]
+    frames = rt_codec.encode_downlinks(many, codes, max_bytes=200)
+    assert [f[0] & 0x0F for f in frames] == [15, 5]
+
+
+def test_uplink_binary_and_legacy_text():
+    assert rt_codec.decode_uplink(b"spot_002", CODES) == [("spot_002", None)]
+    assert rt_codec.decode_uplink(bytes([0x12, 0, 0x4A, 2, ETAG_NONE]), CODES) == [
+        ("spot_001", 0x4A),
+        ("spot_003", None),
+    ]
+    with pytest.raises(ValueError):
+        rt_codec.decode_uplink(bytes([0x12, 0, 0x4A]), CODES)
+
+
+def test_scheduler__coalesces_per_device_within_window():
+    sent = []
+    s = DownlinkScheduler(lambda d, f: sent.append((d, f)), window_s=2.0, codes=CODES)
+    s.offer("dev1", {"spot_001": {"s": "spot_001", "w": 0, "c": 1}}, now=0.0)
+    s.offer("dev1", {"spot_001": {"s": "spot_001", "w": 2, "c": 1}}, now=1.0)
+    s.offer("dev1", {"spot_002": {"s": "spot_002", "w": 1, "c": 0}}, now=1.5)
+    s.offer("dev2", {"spot_002": {"s": "spot_002", "w": 1, "c": 0}}, now=1.5)
+    assert s.poll(now=1.9) == 0
+    assert s.poll(now=2.0) == 1
+    (device, frame), = sent
+    assert device == "dev1"
+    assert rt_codec.decode_downlink(frame, CODES) == [
+        {"s": "spot_001", "w": 2, "u": 0, "c": 1},
+        {"s": "spot_002", "w": 1, "u": 0, "c": 0},
+    ]
+    assert s.poll(now=3.5) == 1 and sent[-1][0] == "dev2"
+    assert s.metrics()["coalesced"] == 1
+
+
+def test_scheduler__suppresses_values_the_client_already_has():
+    sent = []
+    s = DownlinkScheduler(lambda d, f: sent.append(f), window_s=0, codes=CODES)
+    doc = {"s": "spot_001", "w": 1, "c": 2}
+    etag = rt_codec.pack_state(doc)[0]
+    s.offer("dev", {"spot_001": doc}, {"spot_001": etag}, now=0.0)
+    assert s.poll(now=0.0) == 0 and sent == []
+    assert s.metrics()["suppressed"] == 1
+
+    # etag が違う・無い（従来のテキスト uplink）なら送る
+    s.offer("dev", {"spot_001": doc}, {"spot_001": etag ^ 0b10}, now=1.0)
+    s.offer("dev", {"spot_002": {"s": "spot_002", "w": 0, "c": 0}}, now=1.0)
+    assert s.poll(now=1.0) == 1
+    assert [d["s"] for d in rt_codec.decode_downlink(sent[0], CODES)] == ["spot_001", "spot_002"]
@@ -0,0 +1,97 @@
+import base64
+import json
+import time
+
+import pytest
+
+from backend.api import realtime_router, rt_codec
+from backend.api.rt_ingest import BatchQueue, DownlinkScheduler
+from backend.api.rt_providers import DummyProvider, ProviderCache
+from backend.api.rt_store import MemoryRTStore
+
+
+def _uplink(spot_id: str, wrapped: bool = True) -> bytes:
+    up = {"uplink_message": {"frm_payload": base64.b64encode(spot_id.encode()).decode()}}
+    return json.dumps({"data": up} if wrapped else up).encode()
+
+
+def test_batch_queue__drains_in_batches_and_records_latency():
+    seen = []
+    q = BatchQueue("t", seen.append, maxsize=10, batch_size=3)
+    for i in range(7):
+        assert q.submit(i)
+    assert q.drain_once() == 3 and q.drain_once() == 3 and q.drain_once() == 1
+    assert seen == [[0, 1, 2], [3, 4, 5], [6]]
+    m = q.metrics()
+    assert m["processed"] == 7 and m["batches"] == 3 and m["depth"] == 0
+    assert m["latency_ms"]["p50"] is not None
+
+
+@pytest.mark.parametrize("policy, kept, accepted", [("oldest", [2, 3, 4], True), ("newest", [0, 1, 2], False)])
+def test_batch_queue__drop_policy_when_full(policy, kept, accepted):
+    seen = []
+    q = BatchQueue("t", seen.extend, maxsize=3, batch_size=10, drop_policy=policy)
+    results = [q.submit(i) for i in range(5)]
+    assert results[-1] is accepted
+    q.drain_once()
+    assert seen == kept
+    assert q.metrics()["dropped"] == 2
+
+
+def test_batch_queue__handler_error_does_not_stop_the_queue():
+    def boom(batch):
+        raise RuntimeError("x")
+
+    q = BatchQueue("t", boom)
+    q.submit(1)
+    assert q.drain_once() == 1
+    assert q.metrics()["failed_batches"] == 1
+
+
+def test_batch_queue__worker_thread():
+    seen = []
+    q = BatchQueue("t", seen.extend)
+    q.start()
+    try:
+        q.submit("a")
+        deadline = time.monotonic() + 2
+        while not seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert seen == ["a"]
+    finally:
+        q.stop()
+
+
+def test_on_message_only_enqueues_and_batch_updates_state(monkeypatch):
+    store = MemoryRTStore()
+    published = []
+    monkeypatch.setattr(realtime_router, "_store", store)
+    monkeypatch.setattr(realtime_router, "_publish_downlink", lambda device, frame: published.append((device, frame)))
+    monkeypatch.setattr(rt_codec, "_SPOT_CODES", rt_codec.SpotCodes(["A", "B"]))
+    providers = ProviderCache([DummyProvider(seed=1)], lambda: ["A", "B"])
+    providers.refresh()
+    monkeypatch.setattr(realtime_router, "_providers", providers)
+    uplinks = BatchQueue("uplink", realtime_router._process_uplinks)
+    downlinks = BatchQueue("downlink", realtime_router._publish_downlinks)
+    scheduler = DownlinkScheduler(lambda d, f: downlinks.submit((d, f)), window_s=0)
+    monkeypatch.setattr(realtime_router, "_uplinks", uplinks)
+    monkeypatch.setattr(realtime_router, "_downlinks", downlinks)
+    monkeypatch.setattr(realtime_router, "_scheduler", scheduler)
+
+    class Msg:
+        def __init__(self, payload):
+            self.payload = payload
+
+    for payload in (_uplink("A"), _uplink("B", wrapped=False), b"not json", _uplink("A")):
+        realtime_router._on_message(None, None, Msg(payload))
+    # コールバックでは何も処理しない
+    assert store.seq == 0 and len(uplinks) == 4
+
+    uplinks.drain_once()
+    assert set(store.snapshot(["A", "B"])[1]) == {"A", "B"}
+    assert len(scheduler) == 1  # 同じ端末宛ては 1 件にまとめる
+    scheduler.poll()
+    downlinks.drain_once()
+    assert len(published) == 1  # A・B が 1 フレームに入る
+    _device, frame = published[0]
+    assert sorted(d["s"] for d in rt_codec.decode_downlink(frame, rt_codec.get_spot_codes())) == ["A", "B"]
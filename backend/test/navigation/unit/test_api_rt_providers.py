@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from backend.api import realtime_router
+from backend.api.rt_providers import (
+    DummyProvider,
+    FileProvider,
+    ProviderCache,
+    RTProvider,
+    build_providers,
+)
+
+
+class _Failing(RTProvider):
+    name = "failing"
+
+    def __init__(self, values):
+        self.values, self.fail = values, False
+
+    def fetch(self, spot_ids):
+        if self.fail:
+            raise TimeoutError("upstream")
+        return self.values
+
+
+def test_file_provider__reads_both_layouts_and_reloads_on_change(tmp_path):
+    path = tmp_path / "rt.json"
+    path.write_text(json.dumps({"A": {"w": 1, "c": 2}, "X": {"w": 0}}))
+    p = FileProvider(str(path))
+    assert p.fetch(["A", "B"]) == {"A": {"w": 1, "c": 2}}
+
+    path.write_text(json.dumps([{"s": "B", "w": 2, "c": 0, "note": "x"}]))
+    os.utime(path, (1, 1))  # 書き込みが同じ秒でも更新時刻を変える
+    assert p.fetch(["A", "B"]) == {"B": {"w": 2, "c": 0}}
+
+
+def test_build_providers__spec():
+    ps = build_providers("file:/tmp/rt.json, dummy")
+    assert [p.name for p in ps] == ["file", "dummy"]
+    with pytest.raises(ValueError):
+        build_providers("nope")
+
+
+def test_cache__merges_by_priority_and_reports_changes():
+    weather = _Failing({"A": {"w": 2}, "B": {"w": 1}})
+    fallback = DummyProvider(seed=0)
+    changed = []
+    cache = ProviderCache([weather, fallback], lambda: ["A", "B"], ttl_s=100, on_refresh=changed.extend)
+    assert cache.get("A", now=0.0) is None  # 取得前は値なし（上流は呼ばない）
+
+    cache.refresh(now=0.0)
+    a = cache.get("A", now=1.0)
+    assert a["s"] == "A" and a["w"] == 2 and 0 <= a["c"] <= 4  # w は先頭のプロバイダ、c は dummy
+    assert {d["s"] for d in changed} == {"A", "B"}
+
+
+def test_cache__failed_provider_keeps_values_until_ttl():
+    up = _Failing({"A": {"w": 2, "c": 3}})
+    cache = ProviderCache([up], lambda: ["A"], ttl_s=10)
+    cache.refresh(now=0.0)
+    up.fail = True
+    cache.refresh(now=5.0)
+    assert cache.get("A", now=9.0) == {"s": "A", "w": 2, "c": 3}
+    assert cache.get("A", now=11.0) is None
+    assert cache.metrics()["errors"] == {"0:failing": 1}
+
+
+def test_uplink_for_spot_without_data_is_not_answered(monkeypatch):
+    monkeypatch.setattr(realtime_router, "_providers", ProviderCache([], lambda: []))
+    assert realtime_router._lookup_rt("A") is None
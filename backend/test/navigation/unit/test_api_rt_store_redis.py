@@ -0,0 +1,157 @@
+import json
+
+from backend.api import rt_store
+from backend.api.rt_store import RedisRTStore
+
+
+class _FakeRedis:
+    """RedisRTStore が使う分だけ（Lua は Python で同じ動きをさせる）。"""
+
+    def __init__(self):
+        self.kv, self.hashes, self.published = {}, {}, []
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == rt_store._PUT_LUA:
+            doc_key, seq_key_by_spot, seq_key = keys
+            spot_id, raw, channel = argv
+            if self.hashes.get(doc_key, {}).get(spot_id) == raw:
+                return [int(self.kv.get(seq_key, 0)), 0]
+            seq = int(self.kv.get(seq_key, 0)) + 1
+            self.kv[seq_key] = str(seq)
+            self.hashes.setdefault(doc_key, {})[spot_id] = raw
+            self.hashes.setdefault(seq_key_by_spot, {})[spot_id] = str(seq)
+            self.published.append((channel, f'{{"seq":{seq},"doc":{raw}}}'))
+            return [seq, 1]
+        if script == rt_store._RENEW_LUA:
+            return 1 if self.kv.get(keys[0]) == argv[0] else 0
+        if script == rt_store._RELEASE_LUA:
+            if self.kv.get(keys[0]) == argv[0]:
+                del self.kv[keys[0]]
+                return 1
+            return 0
+        raise AssertionError("unexpected script")
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    def pipeline(self, transaction=True):
+        return _FakePipe(self)
+
+
+class _FakePipe:
+    def __init__(self, r):
+        self.r, self.ops = r, []
+
+    def get(self, key):
+        self.ops.append(lambda: self.r.kv.get(key))
+
+    def hget(self, key, field):
+        self.ops.append(lambda: self.r.hashes.get(key, {}).get(field))
+
+    def hgetall(self, key):
+        self.ops.append(lambda: dict(self.r.hashes.get(key, {})))
+
+    def eval(self, *args):
+        self.ops.append(lambda: self.r.eval(*args))
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+def _deliver(fake, stores, start=0):
+    # pub/sub の代わり: 発行済みメッセージを各ワーカーに配る
+    for _channel, data in fake.published[start:]:
+        for s in stores:
+            s.handle_message(data)
+
+
+def test_put_on_one_worker_is_visible_on_others():
+    fake = _FakeRedis()
+    a, b = RedisRTStore(client=fake), RedisRTStore(client=fake)
+
+    assert a.put({"s": "A", "w": 1, "c": 2}) == 1
+    assert a.put({"s": "A", "w": 1, "c": 2}) == 1  # 変化なしは seq を進めない・発行しない
+    assert len(fake.published) == 1
+    assert a.changes_since(0, ["A"]) == (1, {"A": {"s": "A", "w": 1, "c": 2}})
+
+    _deliver(fake, [a, b])
+    assert b.changes_since(0, ["A"]) == (1, {"A": {"s": "A", "w": 1, "c": 2}})
+    assert a.seq == b.seq == 1
+
+
+def test_gap_in_sequence_triggers_resync():
+    fake = _FakeRedis()
+    leader, follower = RedisRTStore(client=fake), RedisRTStore(client=fake)
+    leader.put({"s": "A", "w": 0, "c": 0})
+    leader.put({"s": "B", "w": 1, "c": 1})
+    leader.put({"s": "A", "w": 2, "c": 0})
+
+    # 1 通目と 2 通目を取りこぼし、3 通目だけ届いた
+    follower.handle_message(fake.published[2][1])
+    assert follower.seq == 3
+    assert follower.changes_since(0, ["A", "B"])[1] == {
+        "A": {"s": "A", "w": 2, "c": 0},
+        "B": {"s": "B", "w": 1, "c": 1},
+    }
+    assert follower.changes_since(2, ["A", "B"])[1] == {"A": {"s": "A", "w": 2, "c": 0}}
+
+
+def test_read_through_does_not_skip_pending_changes():
+    fake = _FakeRedis()
+    leader, follower = RedisRTStore(client=fake), RedisRTStore(client=fake)
+    leader.put({"s": "A", "w": 0, "c": 0})
+    leader.put({"s": "B", "w": 1, "c": 1})
+
+    # 通知が届く前の単発 GET は Redis から読む（全体の seq は進めない）
+    assert follower.get("B") == {"s": "B", "w": 1, "c": 1}
+    assert follower.seq == 0
+    _deliver(fake, [follower])
+    assert follower.seq == 2
+    assert set(follower.changes_since(0, ["A", "B"])[1]) == {"A", "B"}
+
+
+def test_mqtt_leader_lease_is_exclusive():
+    fake = _FakeRedis()
+    a, b = RedisRTStore(client=fake), RedisRTStore(client=fake)
+    assert a.acquire_leader("a") is True
+    assert b.acquire_leader("b") is False
+    assert a.acquire_leader("a") is True  # 延長
+    a.release_leader("a")
+    assert b.acquire_leader("b") is True
+
+
+def test_published_message_is_valid_json():
+    fake = _FakeRedis()
+    RedisRTStore(client=fake).put({"s": "A", "w": 1, "c": 0})
+    msg = json.loads(fake.published[0][1])
+    assert msg == {"seq": 1, "doc": {"s": "A", "w": 1, "c": 0}}
+
+
+def test_put_many_uses_one_round_trip_and_keeps_order():
+    fake = _FakeRedis()
+    a, b = RedisRTStore(client=fake), RedisRTStore(client=fake)
+    seq = a.put_many([{"s": "A", "w": 0, "c": 0}, {"s": "B", "w": 1, "c": 0}, {"s": "A", "w": 0, "c": 0}])
+    assert seq == 2 and a.seq == 2
+    _deliver(fake, [b])
+    assert b.changes_since(1, ["A", "B"]) == (2, {"B": {"s": "B", "w": 1, "c": 0}})
+
+
+def test_unchanged_put_does_not_take_another_writers_seq():
+    fake = _FakeRedis()
+    a, b = RedisRTStore(client=fake), RedisRTStore(client=fake)
+    a.put({"s": "A", "w": 0, "c": 0})
+    _deliver(fake, [b])
+    b.put({"s": "B", "w": 1, "c": 0})  # seq 2 は B（a にはまだ届いていない）
+
+    # a が A を同じ内容で put すると現在の seq（2）が返るが、2 番は A の変更ではない
+    assert a.put({"s": "A", "w": 0, "c": 0}) == 2
+    assert a.put_many([{"s": "A", "w": 0, "c": 0}]) == 2
+    assert a.seq == 1
+
+    _deliver(fake, [a], start=1)
+    assert a.seq == 2
+    assert a.changes_since(1, ["A", "B"]) == (2, {"B": {"s": "B", "w": 1, "c": 0}})
@@ -0,0 +1,43 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, ValidationError
+
+from backend.common.coord_array import CoordArray, ORJSONRoute
+
+
+class _Body(BaseModel):
+    polyline: CoordArray
+
+
+def test_coord_array__accepts_pairs_and_coerces_to_float():
+    assert _Body(polyline=[[139, 39], ["139.5", 39.5]]).polyline == [[139.0, 39.0], [139.5, 39.5]]
+    assert _Body(polyline=[]).polyline == []
+
+
+@pytest.mark.parametrize("bad", [
+    [[139.0, 39.0, 10.0]],          # 3 次元
+    [[139.0]],                      # 要素不足
+    [[139.0, 39.0], [139.0]],       # 不揃い
+    [[181.0, 39.0]],                # 経度範囲外
+    [[139.0, float("nan")]],        # 非有限
+    [["x", 39.0]],                  # 数値でない
+    "139,39",
+])
+def test_coord_array__rejects_malformed(bad):
+    with pytest.raises(ValidationError):
+        _Body(polyline=bad)
+
+
+def test_orjson_route__parses_body_and_reports_422():
+    app = FastAPI()
+    app.router.route_class = ORJSONRoute
+
+    @app.post("/echo")
+    def echo(body: _Body):
+        return {"n": len(body.polyline)}
+
+    client = TestClient(app)
+    assert client.post("/echo", json={"polyline": [[139.9, 39.2]] * 3}).json() == {"n": 3}
+    assert client.post("/echo", content=b"{not json", headers={"content-type": "application/json"}).status_code == 422
+    assert client.post("/echo", json={"polyline": [[200.0, 39.2]]}).status_code == 422
@@ -0,0 +1,45 @@
+import httpx
+import respx
+
+from backend.worker.app.services.nav import http_pool
+from backend.worker.app.services.nav import tasks
+from backend.worker.app.services.nav.http_pool import ServiceConfig
+
+
+def _configs():
+    return {name: ServiceConfig(base_url=f"http://{name}", timeout_s=5, concurrency=2)
+            for name in ("routing", "alongpoi", "llm", "voice")}
+
+
+@respx.mock
+def test_plan_async__runs_pipeline_on_shared_loop_with_pooled_clients(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_pool, "_default_configs", _configs)
+    monkeypatch.setattr(http_pool, "_runner", http_pool._LoopRunner())
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    monkeypatch.setattr(tasks, "_build_spot_refs", lambda ids, lang: [
+        {"spot_id": sid, "name": sid, "description": "", "md_slug": None, "lon": 139.95, "lat": 39.3} for sid in ids
+    ])
+
+    respx.post("http://routing/route").mock(return_value=httpx.Response(200, json={
+        "feature_collection": {"type": "FeatureCollection", "features": []},
+        "polyline": [[139.9, 39.2], [139.95, 39.3]],
+        "segments": [{"mode": "car", "start_idx": 0, "end_idx": 1}],
+        "legs": [{"mode": "car", "from_idx": 0, "to_idx": 1, "distance": 100.0, "duration": 10.0}],
+    }))
+    respx.post("http://alongpoi/along").mock(return_value=httpx.Response(200, json={"pois": []}))
+    respx.post("http://llm/describe").mock(return_value=httpx.Response(200, json={
+        "items": [{"spot_id": "A", "text": "hello"}]}))
+    respx.post("http://voice/synthesize_and_save").mock(return_value=httpx.Response(200, json={
+        "items": [{"spot_id": "A", "audio_url": "/packs/p1/A.mp3", "format": "mp3"}]}))
+
+    req = tasks.PlanRequest(language="ja", origin={"lat": 39.2, "lon": 139.9}, waypoints=[{"spot_id": "A"}])
+    res = http_pool.run_coroutine(tasks._plan_async(req, "p1"))
+
+    assert res["pack_id"] == "p1"
+    assert res["assets"][0]["audio_url"] == "/packs/p1/A.mp3" and res["assets"][0]["text"] == "hello"
+    assert (tmp_path / "p1" / "manifest.json").exists()
+
+    # 2 回目のプランも同じ AsyncClient（keep-alive プール）を使う
+    client = http_pool.get_pool("routing")._client
+    http_pool.run_coroutine(tasks._plan_async(req, "p2"))
+    assert http_pool._runner._pools["routing"]._client is client
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import nav_router
+from backend.common import geofence
+from backend.worker.app.services.nav import tasks
+
+# 東へまっすぐ約 8.6km（緯度 39.2 で 0.001° ≒ 86m）
+ROUTE = [[139.80 + i * 0.001, 39.2] for i in range(101)]
+SEGMENTS = [{"mode": "car", "start_idx": 0, "end_idx": 60}, {"mode": "foot", "start_idx": 60, "end_idx": 100}]
+M_PER_IDX = 86.2
+
+
+def _pois():
+    waypoints = [{"spot_id": "wp1", "lon": 139.85, "lat": 39.2005, "nearest_idx": 50}]
+    along = [
+        {"spot_id": "a1", "lon": 139.802, "lat": 39.1998},
+        {"spot_id": "a2", "lon": 139.87, "lat": 39.2002, "source_segment_mode": "foot"},
+        {"spot_id": "a3", "nearest_idx": 30, "distance_m": 12.0},  # lon/lat 無し
+        {"spot_id": "a4"},  # 位置が分からない → 入れない
+    ]
+    return waypoints, along
+
+
+def test_cumulative_m__monotonic_and_matches_length():
+    cum = geofence.cumulative_m(ROUTE)
+    assert len(cum) == len(ROUTE) and cum[0] == 0
+    assert all(b > a for a, b in zip(cum, cum[1:]))
+    assert cum[-1] == pytest.approx(100 * M_PER_IDX, rel=0.01)
+
+
+def test_build_index__chainage_and_windows_sorted():
+    wps, along = _pois()
+    index = geofence.build_index(ROUTE, SEGMENTS, wps, along)
+    by_id = {t["spot_id"]: t for t in index["triggers"]}
+
+    assert set(by_id) == {"wp1", "a1", "a2", "a3"}
+    assert by_id["wp1"]["chainage_m"] == pytest.approx(50 * M_PER_IDX, rel=0.01)
+    assert by_id["wp1"]["offset_m"] == pytest.approx(55.6, abs=1.0)
+    assert by_id["a3"]["chainage_m"] == pytest.approx(30 * M_PER_IDX, rel=0.01)
+    # 窓の長さはモード別（a2 は徒歩区間）
+    assert by_id["a1"]["mode"] == "car"
+    assert by_id["a1"]["end_m"] - by_id["a1"]["chainage_m"] == pytest.approx(geofence.TRIGGER_TRAIL_M["car"], abs=0.2)
+    assert by_id["a2"]["mode"] == "foot"
+    assert by_id["a2"]["chainage_m"] - by_id["a2"]["start_m"] == pytest.approx(geofence.TRIGGER_LEAD_M["foot"], abs=0.2)
+    # 始点より前には延ばさない
+    assert by_id["a1"]["start_m"] == 0.0
+
+    starts = [(t["start_m"], t["chainage_m"]) for t in index["triggers"]]
+    assert starts == sorted(starts)
+    assert len(index["cum_m"]) == len(ROUTE)
+    assert index["max_window_m"] == max(t["end_m"] - t["start_m"] for t in index["triggers"])
+
+
+def test_active_triggers__same_as_linear_scan():
+    wps, along = _pois()
+    index = geofence.build_index(ROUTE, SEGMENTS, wps, along)
+    for p in range(0, 9000, 25):
+        expected = [t for t in index["triggers"] if t["start_m"] <= p <= t["end_m"]]
+        assert geofence.active_triggers(index, p) == expected
+        upcoming = [t for t in index["triggers"] if t["start_m"] > p]
+        assert geofence.next_trigger(index, p) == (upcoming[0] if upcoming else None)
+
+
+def test_match__projects_position_and_uses_hint_window():
+    wps, along = _pois()
+    index = geofence.build_index(ROUTE, SEGMENTS, wps, along)
+    # wp1 の 200m 手前、ルートの北 20m
+    res = geofence.match(ROUTE, index, 139.85 - 200 / 86200, 39.20018)
+    assert res["chainage_m"] == pytest.approx(50 * M_PER_IDX - 200, abs=5)
+    assert res["offset_m"] == pytest.approx(20, abs=1.0)
+    assert [t["spot_id"] for t in res["active"]] == ["wp1"]
+
+    hinted = geofence.match(ROUTE, index, 139.85 - 200 / 86200, 39.20018, hint_seg=res["seg_idx"], window=3)
+    assert hinted["seg_idx"] == res["seg_idx"]
+    assert hinted["chainage_m"] == res["chainage_m"]
+
+
+def test_write_manifest__includes_geofence_and_match_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    wps, along = _pois()
+    tasks._write_manifest("g1", "ja", {"type": "FeatureCollection", "features": []}, ROUTE, SEGMENTS,
+                          [], wps, along, [])
+    manifest = json.loads((tmp_path / "g1" / "manifest.json").read_text())
+    assert manifest["geofence"] == geofence.build_index(ROUTE, SEGMENTS, wps, along)
+
+    app = FastAPI()
+    app.include_router(nav_router.router, prefix="/api")
+    client = TestClient(app)
+    r = client.get("/api/nav/packs/g1/match", params={"lat": 39.2, "lon": 139.80 + 0.001 * 70})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["chainage_m"] == pytest.approx(70 * M_PER_IDX, abs=5)
+    assert [t["spot_id"] for t in body["active"]] == ["a2"]
+
+    assert client.get("/api/nav/packs/nope/match", params={"lat": 39.2, "lon": 139.8}).status_code == 404
+
+
+def test_build_index__out_and_back_keeps_pois_on_their_own_pass():
+    # 東へ 50 頂点進んで同じ道を戻る（頂点 20 と 80 は同じ地点）
+    out_back = ROUTE[:51] + ROUTE[:50][::-1]
+    segs = [{"mode": "car", "start_idx": 0, "end_idx": 100}]
+    here = {"lon": 139.82, "lat": 39.2001}
+    along = [{"spot_id": "go", **here, "leg_index": 20}, {"spot_id": "back", **here, "leg_index": 79}]
+    # 折り返し地点（頂点 50）を先に訪ね、帰り道で here に寄る
+    wps = [{"spot_id": "turn", "lon": 139.85, "lat": 39.2, "nearest_idx": 50},
+           {"spot_id": "wp_back", **here, "nearest_idx": 20}]
+
+    by_id = {t["spot_id"]: t for t in geofence.build_index(out_back, segs, wps, along)["triggers"]}
+    assert by_id["go"]["chainage_m"] == pytest.approx(20 * M_PER_IDX, abs=5)
+    assert by_id["back"]["chainage_m"] == pytest.approx(80 * M_PER_IDX, abs=5)
+    assert by_id["turn"]["chainage_m"] == pytest.approx(50 * M_PER_IDX, abs=5)
+    assert by_id["wp_back"]["chainage_m"] == pytest.approx(80 * M_PER_IDX, abs=5)
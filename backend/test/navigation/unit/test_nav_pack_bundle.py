@@ -0,0 +1,137 @@
+import json
+import math
+
+from backend.worker.app.services.nav import pack_bundle
+from backend.worker.app.services.nav.pack_bundle import TileSource, corridor_tiles, read_index, write_bundle
+
+# 斜めに 20km ほど走るルート
+ROUTE = [[139.80 + i * 0.002, 39.10 + i * 0.0015] for i in range(101)]
+
+
+def _bbox_tile_count(z, margin_deg=0.05):
+    def tx(lon):
+        return int((lon + 180) / 360 * 2 ** z)
+
+    def ty(lat):
+        r = math.radians(lat)
+        return int((1 - math.asinh(math.tan(r)) / math.pi) / 2 * 2 ** z)
+
+    lons, lats = [p[0] for p in ROUTE], [p[1] for p in ROUTE]
+    return (tx(max(lons) + margin_deg) - tx(min(lons) - margin_deg) + 1) * (
+        ty(min(lats) - margin_deg) - ty(max(lats) + margin_deg) + 1
+    )
+
+
+def test_corridor_tiles__cover_route_and_skip_far_tiles():
+    tiles = corridor_tiles(ROUTE, zooms=[12, 15], buffer_m=300, max_tiles=100000)
+    by_z = {z: {(x, y) for zz, x, y in tiles if zz == z} for z in (12, 15)}
+    # 各頂点のタイルは必ず含まれる
+    for lon, lat in ROUTE:
+        x = int((lon + 180) / 360 * 2 ** 15)
+        y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * 2 ** 15)
+        assert (x, y) in by_z[15]
+    # 外接矩形（＋0.05°）よりずっと少ない
+    assert len(by_z[15]) < _bbox_tile_count(15) / 5
+    assert tiles == sorted(tiles)
+
+
+def test_corridor_tiles__drops_whole_zoom_over_budget():
+    small = corridor_tiles(ROUTE, zooms=[12, 13], buffer_m=300, max_tiles=100000)
+    tiles = corridor_tiles(ROUTE, zooms=[12, 13, 16], buffer_m=300, max_tiles=len(small))
+    assert tiles == small
+
+
+def test_write_bundle__packs_manifest_audio_and_tiles(tmp_path, monkeypatch):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path / "packs"))
+    pack_dir = tmp_path / "packs" / "p1"
+    pack_dir.mkdir(parents=True)
+    (pack_dir / "manifest.json").write_text(json.dumps({"pack_id": "p1"}))
+    (pack_dir / "spot_001.mp3").write_bytes(b"ID3" + b"\x00" * 50)
+
+    src = tmp_path / "src"
+    for z, x, y in corridor_tiles(ROUTE, zooms=[12], buffer_m=300)[:-1]:  # 最後の 1 枚は欠けている
+        (src / str(z) / str(x)).mkdir(parents=True, exist_ok=True)
+        (src / str(z) / str(x) / f"{y}.png").write_bytes(f"png{z}/{x}/{y}".encode())
+    source = TileSource(f"file://{src}/{{z}}/{{x}}/{{y}}.png", cache_dir=str(tmp_path / "cache"))
+
+    assets = [{"spot_id": "spot_001", "audio_url": "/packs/p1/spot_001.mp3", "text_url": "/packs/p1/none.txt"}]
+    out = write_bundle("p1", ROUTE, assets, tile_source=source, zooms=[12], buffer_m=300)
+    assert out == pack_dir / pack_bundle.BUNDLE_NAME
+
+    index, base = read_index(out)
+    raw = out.read_bytes()
+    by_path = {e["path"]: e for e in index["entries"]}
+    assert [e["type"] for e in index["entries"]][:2] == ["manifest", "audio"]
+
+    def body(path):
+        e = by_path[path]
+        return raw[base + e["offset"]: base + e["offset"] + e["length"]]
+
+    assert json.loads(body("manifest.json")) == {"pack_id": "p1"}
+    assert body("spot_001.mp3").startswith(b"ID3")
+    tile_paths = [p for p in by_path if p.startswith("tiles/")]
+    assert len(tile_paths) == index["tiles"]["count"] and index["tiles"]["missing"] == 1
+    z, x, y = tile_paths[0][len("tiles/"):-len(".png")].split("/")
+    assert body(tile_paths[0]) == f"png{z}/{x}/{y}".encode()
+    assert by_path[tile_paths[0]]["content_type"] == "image/png"
+    # 取得したタイルはキャッシュに残る
+    assert (tmp_path / "cache" / z / x / f"{y}.png").is_file()
+
+
+def test_write_bundle__without_tile_source(tmp_path, monkeypatch):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    (tmp_path / "p2").mkdir()
+    (tmp_path / "p2" / "manifest.json").write_text("{}")
+    out = write_bundle("p2", ROUTE, [], tile_source=TileSource(""))
+    index, _ = read_index(out)
+    assert [e["path"] for e in index["entries"]] == ["manifest.json"]
+    assert index["tiles"]["zooms"] == []
+
+
+def test_build_pack_bundle__advertises_bundle_url_only_once_written(tmp_path, monkeypatch):
+    from backend.worker.app.services.nav import tasks
+
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    monkeypatch.setattr(pack_bundle, "PACK_TILE_SOURCE", "")
+    (tmp_path / "p3").mkdir()
+    (tmp_path / "p3" / "spot_001.mp3").write_bytes(b"ID3" + b"\x00" * 50)
+    assets = [{"spot_id": "spot_001", "audio_url": "/packs/p3/spot_001.mp3"}]
+    tasks._write_manifest("p3", "ja", {"type": "FeatureCollection", "features": []}, ROUTE, [], [], [], [], assets)
+    # プラン完了時点ではまだ bundle.bin が無いので載せない
+    assert json.loads((tmp_path / "p3" / "manifest.json").read_text())["bundle_url"] is None
+
+    assert tasks.build_pack_bundle("p3") == "/packs/p3/bundle.bin"
+    index, _ = read_index(tmp_path / "p3" / pack_bundle.BUNDLE_NAME)
+    assert [e["path"] for e in index["entries"]] == ["manifest.json", "spot_001.mp3"]
+    assert json.loads((tmp_path / "p3" / "manifest.json").read_text())["bundle_url"] == "/packs/p3/bundle.bin"
+    assert json.loads((tmp_path / "p3" / "manifest.compact.json").read_text())["bundle_url"] == "/packs/p3/bundle.bin"
+
+    assert tasks.build_pack_bundle("missing") is None
+
+
+def test_tile_source__remote_fetches_are_rate_limited_per_host(tmp_path):
+    waited = []
+
+    class _Limiter:
+        def wait(self, host):
+            waited.append(host)
+
+    class _Client:
+        def get(self, url, timeout):
+            return type("R", (), {"status_code": 200, "content": url.encode()})()
+
+    source = TileSource("http://tile-mirror:8080/{z}/{x}/{y}.png", cache_dir=str(tmp_path), limiter=_Limiter())
+    assert source.get((12, 1, 2), _Client()) == b"http://tile-mirror:8080/12/1/2.png"
+    assert source.get((12, 1, 2), _Client()) is not None  # 2 回目はキャッシュから（待たない）
+    assert waited == ["tile-mirror:8080"]
+
+
+def test_host_rate_limiter__spaces_requests_per_host():
+    import time
+
+    limiter = pack_bundle.HostRateLimiter(rate=20)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("a")
+    limiter.wait("b")  # 別ホストは待たない
+    assert 0.1 <= time.monotonic() - start < 0.5
@@ -0,0 +1,34 @@
+from backend.worker.app.services.nav import route_codec
+
+
+def _manifest(simple_polyline, simple_segments):
+    return {
+        "pack_id": "p1",
+        "route": {"type": "FeatureCollection", "features": []},
+        "polyline": simple_polyline,
+        "segments": simple_segments,
+        "legs": [],
+        "assets": [],
+    }
+
+
+def test_compact__roundtrips_polyline_and_rebuilds_route(simple_polyline, simple_segments):
+    compact = route_codec.to_compact(_manifest(simple_polyline, simple_segments), precision=6)
+
+    assert compact["format"] == "compact-v1" and "route" not in compact
+    assert isinstance(compact["polyline"]["data"], str) and compact["polyline"]["len"] == len(simple_polyline)
+    assert all(isinstance(s, list) and len(s) == 3 for s in compact["segments"])
+
+    full = route_codec.from_compact(compact)
+    assert full["polyline"] == simple_polyline
+    assert full["segments"] == [{"mode": s["mode"], "start_idx": s["start_idx"], "end_idx": s["end_idx"]}
+                                for s in simple_segments]
+    feats = full["route"]["features"]
+    assert len(feats) == len(simple_segments)
+    seg0 = simple_segments[0]
+    assert feats[0]["geometry"]["coordinates"] == simple_polyline[seg0["start_idx"]:seg0["end_idx"] + 1]
+
+
+def test_compact__precision_controls_rounding():
+    coords = [[139.1234567, 39.7654321]]
+    assert route_codec.decode_polyline(route_codec.encode_polyline(coords, 5), 5) == [[139.12346, 39.76543]]
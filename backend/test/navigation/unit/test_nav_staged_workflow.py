@@ -0,0 +1,85 @@
+import pytest
+
+from backend.worker.app.services.nav import pack_bundle, tasks
+from backend.worker.app.services.nav.celery_app import celery_app
+
+
+@pytest.fixture
+def eager(monkeypatch):
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_eager_propagates", True)
+    monkeypatch.setattr(celery_app.conf, "result_backend", "cache+memory://")
+    monkeypatch.setattr(tasks, "NAV_STAGED", True)
+    # eager では後続の bundle タスクも同期で走るので、タイルは取りに行かない
+    monkeypatch.setattr(pack_bundle, "PACK_TILE_SOURCE", "")
+
+
+def test_staged_plan__describes_per_plan_synthesizes_per_spot_and_finalizes(eager, monkeypatch, tmp_path):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    monkeypatch.setattr(tasks, "post_route", lambda req: {
+        "feature_collection": {"type": "FeatureCollection", "features": []},
+        "polyline": [[139.9, 39.2], [139.95, 39.3]],
+        "segments": [{"mode": "car", "start_idx": 0, "end_idx": 1}],
+        "legs": [{"mode": "car", "from_idx": 0, "to_idx": 1, "distance": 100.0, "duration": 10.0}],
+    })
+    monkeypatch.setattr(tasks, "post_along", lambda req: {"pois": [{"spot_id": "B", "lon": 139.93, "lat": 39.25}]})
+    monkeypatch.setattr(tasks, "_build_spot_refs", lambda ids, lang: [
+        {"spot_id": sid, "name": sid, "description": "", "md_slug": None, "lon": 139.95, "lat": 39.3} for sid in ids
+    ])
+    describe_calls, voice_calls = [], []
+
+    def fake_describe(req):
+        describe_calls.append([s["spot_id"] for s in req["spots"]])
+        return {"items": [{"spot_id": s["spot_id"], "text": f"about {s['spot_id']}"} for s in req["spots"]]}
+
+    def fake_voice(req):
+        voice_calls.append([it["spot_id"] for it in req["items"]])
+        return {"items": [{"spot_id": it["spot_id"], "audio_url": f"/packs/{req['pack_id']}/{it['spot_id']}.mp3"}
+                          for it in req["items"]]}
+
+    monkeypatch.setattr(tasks, "post_describe", fake_describe)
+    monkeypatch.setattr(tasks, "post_synthesize_and_save", fake_voice)
+
+    payload = {"language": "ja", "origin": {"lat": 39.2, "lon": 139.9}, "waypoints": [{"spot_id": "A"}]}
+    res = tasks.plan_workflow.apply(args=[payload]).get()
+
+    # LLM はプラン単位で 1 回、TTS は 1 スポット 1 タスク
+    assert describe_calls == [["A", "B"]]
+    assert voice_calls == [["A"], ["B"]]
+    assert [a["spot_id"] for a in res["assets"]] == ["A", "B"]
+    assert res["assets"][1]["text"] == "about B"
+    assert (tmp_path / res["pack_id"] / "manifest.json").exists()
+
+
+def test_staged_plan__describe_batches_and_counts_skipped_spots(eager, monkeypatch, tmp_path):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    monkeypatch.setattr(tasks, "NAV_DESCRIBE_BATCH", 2)
+    advanced = []
+    monkeypatch.setattr(tasks.plan_status, "advance", lambda plan_id, done=1: advanced.append(done))
+    monkeypatch.setattr(tasks, "post_route", lambda req: {
+        "feature_collection": {"type": "FeatureCollection", "features": []},
+        "polyline": [[139.9, 39.2], [139.95, 39.3]],
+        "segments": [{"mode": "car", "start_idx": 0, "end_idx": 1}],
+        "legs": [{"mode": "car", "from_idx": 0, "to_idx": 1, "distance": 100.0, "duration": 10.0}],
+    })
+    monkeypatch.setattr(tasks, "post_along", lambda req: {"pois": [{"spot_id": s} for s in ("B", "C", "D", "E")]})
+    monkeypatch.setattr(tasks, "_build_spot_refs", lambda ids, lang: [
+        {"spot_id": sid, "name": sid, "description": "", "md_slug": None, "lon": 139.95, "lat": 39.3} for sid in ids
+    ])
+    describe_calls = []
+
+    def fake_describe(req):
+        describe_calls.append([s["spot_id"] for s in req["spots"]])
+        # E の説明文は返らない
+        return {"items": [{"spot_id": s["spot_id"], "text": "t"} for s in req["spots"] if s["spot_id"] != "E"]}
+
+    monkeypatch.setattr(tasks, "post_describe", fake_describe)
+    monkeypatch.setattr(tasks, "post_synthesize_and_save", lambda req: {"items": [
+        {"spot_id": it["spot_id"], "audio_url": f"/packs/{req['pack_id']}/{it['spot_id']}.mp3"} for it in req["items"]]})
+
+    payload = {"language": "ja", "origin": {"lat": 39.2, "lon": 139.9}, "waypoints": [{"spot_id": "A"}]}
+    res = tasks.plan_workflow.apply(args=[payload]).get()
+
+    assert describe_calls == [["A", "B"], ["C", "D"], ["E"]]
+    assert sorted(a["spot_id"] for a in res["assets"]) == ["A", "B", "C", "D"]
+    assert sum(advanced) == 5  # 合成した 4 件 + 説明文の無い 1 件
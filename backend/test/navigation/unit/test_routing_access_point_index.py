@@ -0,0 +1,91 @@
+import math
+import random
+
+from backend.worker.app.services.routing import access_point_index as api
+from backend.worker.app.services.routing import logic as rlogic
+from backend.worker.app.services.routing import osrm_client as oc
+from backend.worker.app.services.routing.access_point_index import (
+    AccessPointIndex,
+    IndexedAccessPoint,
+    _KDTree,
+)
+
+
+def _aps(n=200, seed=7):
+    rnd = random.Random(seed)
+    return [IndexedAccessPoint(id=i, lat=39.0 + rnd.random() * 0.4, lon=139.8 + rnd.random() * 0.4)
+            for i in range(n)]
+
+
+def test_kdtree_nearest__matches_brute_force():
+    aps = _aps()
+    tree = _KDTree(aps)
+    q = (39.21, 139.95)
+    got = [ap.id for _, ap in tree.nearest(*q, k=5)]
+
+    cos0 = math.cos(math.radians(sum(a.lat for a in aps) / len(aps)))
+    brute = sorted(aps, key=lambda a: ((a.lon - q[1]) * cos0) ** 2 + (a.lat - q[0]) ** 2)
+    assert got == [a.id for a in brute[:5]]
+
+
+def _loaded_index(monkeypatch, aps, spot_rows, spot_coords, car_access=None):
+    monkeypatch.setattr(api, "_fetch_access_points", lambda: aps, raising=True)
+    monkeypatch.setattr(api, "_fetch_spot_access_rows", lambda: spot_rows, raising=True)
+    monkeypatch.setattr(api, "_fetch_spot_car_access", lambda: dict(car_access or {}), raising=True)
+    monkeypatch.setattr(api, "_fetch_spot_coords", lambda: spot_coords, raising=True)
+    monkeypatch.setattr(api.static_db, "fetch_data_version", lambda: 1, raising=True)
+    idx = AccessPointIndex(refresh_interval_s=3600)
+    idx.reload()
+    monkeypatch.setattr(api, "get_index", lambda: idx, raising=True)
+    return idx
+
+
+def test_nearest_access_point__uses_precomputed_shortest_walk_for_spots(monkeypatch):
+    aps = [IndexedAccessPoint(id=1, lat=39.30, lon=139.949), IndexedAccessPoint(id=2, lat=39.31, lon=139.96)]
+    # 直線では AP1 が近いが、徒歩距離は AP2 の方が短い
+    rows = [
+        {"spot_id": "A", "access_point_id": 1, "straight_m": 90.0, "foot_distance_m": 2500.0, "foot_duration_s": 1800.0},
+        {"spot_id": "A", "access_point_id": 2, "straight_m": 1400.0, "foot_distance_m": 1500.0, "foot_duration_s": 1100.0},
+    ]
+    _loaded_index(monkeypatch, aps, rows, {(39.3, 139.95): "A"})
+    monkeypatch.setattr(oc, "osrm_table", lambda *a, **k: (_ for _ in ()).throw(AssertionError("no live call")))
+
+    assert rlogic.nearest_access_point((39.3, 139.95)) == (39.31, 139.96)
+
+
+def test_nearest_access_point__ranks_kdtree_candidates_by_live_foot_table(monkeypatch):
+    aps = [IndexedAccessPoint(id=1, lat=39.2001, lon=139.9001),
+           IndexedAccessPoint(id=2, lat=39.2030, lon=139.9030),
+           IndexedAccessPoint(id=3, lat=39.3500, lon=139.9900)]
+    _loaded_index(monkeypatch, aps, [], {})
+
+    def fake_table(profile, coords, sources=None, destinations=None):
+        assert profile == "foot" and len(sources) == 2
+        return oc.OsrmTableResult(ok=True, distances=[[900.0], [400.0]])
+
+    monkeypatch.setattr(rlogic, "ACCESS_POINT_CANDIDATES", 2)
+    monkeypatch.setattr(oc, "osrm_table", fake_table)
+    assert rlogic.nearest_access_point((39.2, 139.9)) == (39.2030, 139.9030)
+
+    # OSRM が使えなければ直線最寄り
+    monkeypatch.setattr(oc, "osrm_table", lambda *a, **k: oc.OsrmTableResult(ok=False))
+    assert rlogic.nearest_access_point((39.2, 139.9)) == (39.2001, 139.9001)
+
+
+def test_build_legs__skips_car_direct_for_precomputed_off_road_spot(monkeypatch):
+    aps = [IndexedAccessPoint(id=1, lat=39.30, lon=139.94)]
+    rows = [{"spot_id": "A", "access_point_id": 1, "straight_m": 900.0, "foot_distance_m": 1200.0, "foot_duration_s": 900.0}]
+    _loaded_index(monkeypatch, aps, rows, {(39.3, 139.95): "A"}, car_access={"A": False})
+
+    calls = []
+
+    def fake_route(profile, src, dst):
+        calls.append((profile, src, dst))
+        return oc.OsrmRouteResult(ok=True, distance=100.0, duration=10.0,
+                                  geometry={"type": "LineString", "coordinates": [[src[1], src[0]], [dst[1], dst[0]]]})
+
+    monkeypatch.setattr(oc, "osrm_route", fake_route)
+    legs = rlogic.build_legs_with_switch([(39.2, 139.9), (39.3, 139.95)])
+
+    assert [l["mode"] for l in legs] == ["car", "foot"]
+    assert calls == [("car", (39.2, 139.9), (39.30, 139.94)), ("foot", (39.30, 139.94), (39.3, 139.95))]
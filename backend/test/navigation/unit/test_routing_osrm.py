@@ -17,3 +17,12 @@ def test_build_osrm_url__orders_lonlat_and_params():
     # 余計な二重 ? や ;; がないこと
     assert re.search(r"\?.+=.+", url) is not None
     assert ";;" not in url
+
+
+def test_build_osrm_table_url__lonlat_and_source_destination_indices():
+    from backend.worker.app.services.routing.osrm_client import build_osrm_table_url
+    url = build_osrm_table_url("foot", [(39.2, 139.9), (39.25, 139.96), (39.3, 139.95)],
+                               sources=[0, 1], destinations=[2])
+    assert "/table/v1/foot/139.9,39.2;139.96,39.25;139.95,39.3?" in url
+    assert "sources=0;1" in url and "destinations=2" in url
+    assert "annotations=distance,duration" in url
@@ -0,0 +1,50 @@
+import json
+
+from backend.worker.app.services.routing import logic as rlogic
+from backend.worker.app.services.routing import osrm_client as oc
+from backend.worker.app.services.routing import route_matrix as rm
+from backend.worker.app.services.routing.route_matrix import RouteMatrix
+
+
+def _write_matrix(d, coords, geometries):
+    (d / "car_geometries.json").write_text(json.dumps(geometries))
+    (d / "meta.json").write_text(json.dumps({"spot_ids": [f"S{i}" for i in range(len(coords))], "coords": coords}))
+
+
+def test_route_matrix__geometry_lookup(tmp_path):
+    coords = [[39.1, 139.9], [39.2, 139.95], [39.3, 140.0]]
+    _write_matrix(tmp_path, coords, {"1,2": {"distance": 1234.0, "duration": 99.0,
+                                             "coordinates": [[139.95, 39.2], [140.0, 39.3]]}})
+    m = RouteMatrix(base_dir=tmp_path)
+    m.reload()
+
+    assert len(m) == 3 and m.geometry_count == 1
+    leg = m.car_leg((39.2, 139.95), (39.3, 140.0))
+    assert leg["distance"] == 1234.0 and leg["duration"] == 99.0
+    assert leg["geometry"]["coordinates"][0] == [139.95, 39.2]
+    assert m.car_leg((39.3, 140.0), (39.2, 139.95)) is None  # ジオメトリ未保存
+    assert m.car_leg((35.0, 135.0), (39.3, 140.0)) is None  # 行列外
+
+
+def test_build_legs__uses_matrix_for_spot_pairs_and_osrm_for_origin_legs(tmp_path, monkeypatch):
+    coords = [[39.2, 139.95], [39.3, 140.0]]
+    _write_matrix(tmp_path, coords, {"0,1": {"distance": 5000.0, "duration": 400.0,
+                                             "coordinates": [[139.95, 39.2], [140.0, 39.3]]}})
+    m = RouteMatrix(base_dir=tmp_path)
+    m.reload()
+    monkeypatch.setattr(rm, "get_matrix", lambda: m)
+    monkeypatch.setattr(rlogic, "_known_off_road", lambda dest: False)
+
+    calls = []
+
+    def fake_route(profile, src, dst):
+        calls.append((src, dst))
+        return oc.OsrmRouteResult(ok=True, distance=1.0, duration=1.0,
+                                  geometry={"type": "LineString", "coordinates": [[src[1], src[0]], [dst[1], dst[0]]]})
+
+    monkeypatch.setattr(oc, "osrm_route", fake_route)
+    origin = (39.0, 139.8)
+    legs = rlogic.build_legs_with_switch([origin, (39.2, 139.95), (39.3, 140.0), origin])
+
+    assert [l["distance"] for l in legs] == [1.0, 5000.0, 1.0]
+    assert calls == [(origin, (39.2, 139.95)), ((39.3, 140.0), origin)]
@@ -0,0 +1,65 @@
+from backend.common import spot_catalog as sc
+from backend.common.spot_catalog import CatalogEntry, SpotCatalog
+
+
+def _entry(sid, kind="spot", lon=139.9, lat=39.2):
+    return CatalogEntry(spot_id=sid, kind=kind, lon=lon, lat=lat,
+                        name={"ja": f"名{sid}", "en": f"Name {sid}"},
+                        description={"ja": "説明"}, md_slug=f"slug_{sid}")
+
+
+def test_get_many__serves_from_memory_and_falls_back_to_sql_on_miss(monkeypatch):
+    calls = []
+
+    def fake_fetch_entries(ids=None):
+        calls.append(ids)
+        if ids is None:
+            return [_entry("A"), _entry("B", kind="facility"), _entry("B", kind="spot")]
+        return [_entry(i) for i in ids if i == "Z"]
+
+    monkeypatch.setattr(sc, "_fetch_entries", fake_fetch_entries, raising=True)
+    monkeypatch.setattr(sc, "_fetch_version", lambda: 1, raising=True)
+
+    cat = SpotCatalog(refresh_interval_s=3600)
+    got = cat.get_many(["A", "B"])
+    assert set(got) == {"A", "B"}
+    assert got["B"].kind == "facility"  # 読込順で先勝ち
+    assert calls == [None]
+
+    # 2回目は DB を叩かない
+    cat.get_many(["A"])
+    assert calls == [None]
+
+    # 未登録は SQL フォールバックし、以後はメモリから返す
+    got = cat.get_many(["A", "Z", "missing"])
+    assert set(got) == {"A", "Z"}
+    assert calls == [None, ["Z", "missing"]]
+    cat.get_many(["Z"])
+    assert len(calls) == 2
+
+
+def test_maybe_refresh__reloads_when_data_version_changes(monkeypatch):
+    version = {"v": 1}
+    loads = []
+
+    def fake_fetch_entries(ids=None):
+        loads.append(ids)
+        return [_entry("A", lon=139.0 + version["v"])]
+
+    monkeypatch.setattr(sc, "_fetch_entries", fake_fetch_entries, raising=True)
+    monkeypatch.setattr(sc, "_fetch_version", lambda: version["v"], raising=True)
+
+    cat = SpotCatalog(refresh_interval_s=0)
+    assert cat.get("A").lon == 140.0
+    cat.get("A")
+    assert len(loads) == 1  # 版数が同じなら再読込しない
+
+    version["v"] = 2
+    assert cat.get("A").lon == 141.0
+    assert cat.version == 2
+    assert len(loads) == 2
+
+
+def test_name_for__falls_back_across_languages():
+    e = CatalogEntry(spot_id="A", kind="spot", lon=0.0, lat=0.0, name={"en": "Only EN"})
+    assert e.name_for("zh") == "Only EN"
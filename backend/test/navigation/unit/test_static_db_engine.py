@@ -0,0 +1,27 @@
+from backend.common import static_db
+
+
+def test_get_engine__single_engine_per_process_with_tuned_pool(monkeypatch):
+    monkeypatch.setenv("STATIC_DB_HOST", "db.local")
+    monkeypatch.setenv("STATIC_DB_POOL_SIZE", "7")
+    monkeypatch.setenv("STATIC_DB_MAX_OVERFLOW", "3")
+    static_db.dispose_engine()
+    try:
+        eng1 = static_db.get_engine()
+        eng2 = static_db.get_engine()
+        assert eng1 is eng2
+        assert "db.local" in str(eng1.url)
+        assert eng1.url.database == "static_db"
+        assert eng1.pool.size() == 7
+        assert eng1.pool._pre_ping is True
+
+        m = static_db.pool_metrics()
+        assert m["initialized"] is True
+        assert {"size", "checkedin", "checkedout", "overflow", "connects", "checkouts"} <= set(m.keys())
+    finally:
+        static_db.dispose_engine()
+
+
+def test_pool_metrics__before_init():
+    static_db.dispose_engine()
+    assert static_db.pool_metrics()["initialized"] is False
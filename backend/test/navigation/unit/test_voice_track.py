@@ -0,0 +1,118 @@
+import io
+import json
+import wave
+
+import numpy as np
+import pytest
+
+from backend.worker.app.services.nav import tasks
+from backend.worker.app.services.voice import track
+
+SR = 22050
+
+
+def _wav(seconds, amp, sr=SR):
+    t = np.arange(int(seconds * sr)) / sr
+    pcm = (np.sin(2 * np.pi * 440 * t) * amp * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def _mp3_frame(fill=0):
+    # MPEG2 Layer III / 24kHz / 64kbps / mono → 72 * 64000 / 24000 = 192 バイト
+    return bytes([0xFF, 0xF3, 0x84, 0xC0]) + bytes([fill]) * 188
+
+
+def _mp3(n_frames, fill=1, xing=True, id3=True):
+    data = b""
+    if id3:
+        data += b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+    if xing:
+        data += bytes([0xFF, 0xF3, 0x84, 0xC0]) + b"\x00" * 17 + b"Xing" + b"\x00" * 167
+    return data + _mp3_frame(fill) * n_frames
+
+
+def _rms_dbfs(pcm):
+    x = pcm.astype(np.float64) / 32768.0
+    return 20 * np.log10(np.sqrt(np.mean(x * x)))
+
+
+def test_build_track__wav_chapters_in_route_order_and_normalized(tmp_path):
+    (tmp_path / "s1.ja.wav").write_bytes(_wav(1.0, 0.05))
+    (tmp_path / "s2.ja.wav").write_bytes(_wav(0.5, 0.8))
+    (tmp_path / "s3.ja.mp3").write_bytes(_mp3(3))  # 形式違い（ffmpeg 無しでは混ぜられない）
+
+    info = track.build_track(tmp_path, "p1", "ja", ["s2", "missing", "s1", "s2", "s3"], fmt="mp3", use_ffmpeg=False)
+
+    assert info["url"] == "/packs/p1/narration.ja.wav"
+    assert info["format"] == "wav" and info["normalized"] is True
+    assert [c["spot_id"] for c in info["chapters"]] == ["s2", "s1"]
+    c2, c1 = info["chapters"]
+    assert c2["start_s"] == 0 and c2["duration_s"] == pytest.approx(0.5, abs=1e-3)
+    assert c1["start_s"] == pytest.approx(0.5, abs=1e-3) and c1["duration_s"] == pytest.approx(1.0, abs=1e-3)
+    assert info["duration_s"] == pytest.approx(1.5, abs=1e-3)
+
+    data = (tmp_path / "narration.ja.wav").read_bytes()
+    assert len(data) == info["bytes"]
+    assert c1["offset_bytes"] == c2["offset_bytes"] + c2["length_bytes"]
+    assert c1["offset_bytes"] + c1["length_bytes"] == len(data)
+    # 章ごとのラウドネスが揃っている（元は 24dB 差）
+    pcm = {c["spot_id"]: np.frombuffer(data[c["offset_bytes"]:c["offset_bytes"] + c["length_bytes"]], dtype="<i2")
+           for c in info["chapters"]}
+    assert abs(_rms_dbfs(pcm["s1"]) - _rms_dbfs(pcm["s2"])) < 0.5
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        assert wf.getframerate() == SR and wf.getnframes() == int(1.5 * SR)
+
+
+def test_build_track__mp3_concatenates_frames_without_tags(tmp_path):
+    (tmp_path / "a.en.mp3").write_bytes(_mp3(5, fill=1))
+    (tmp_path / "b.en.mp3").write_bytes(_mp3(3, fill=2, xing=False, id3=False))
+
+    info = track.build_track(tmp_path, "p2", "en", ["a", "b"], use_ffmpeg=False)
+
+    data = (tmp_path / "narration.en.mp3").read_bytes()
+    assert data == _mp3_frame(1) * 5 + _mp3_frame(2) * 3
+    a, b = info["chapters"]
+    assert (a["offset_bytes"], a["length_bytes"]) == (0, 5 * 192)
+    assert (b["offset_bytes"], b["length_bytes"]) == (5 * 192, 3 * 192)
+    assert a["duration_s"] == pytest.approx(5 * 576 / 24000, abs=1e-3)
+    assert b["start_s"] == a["duration_s"]
+    assert info["sample_rate"] == 24000 and info["normalized"] is False
+
+
+def test_build_track__none_without_audio(tmp_path):
+    assert track.build_track(tmp_path, "p3", "ja", ["x"], use_ffmpeg=False) is None
+
+
+def test_finalize_track__route_order_and_manifest(monkeypatch, tmp_path):
+    monkeypatch.setenv("PACKS_ROOT", str(tmp_path))
+    monkeypatch.setattr(tasks, "NAV_NARRATION_TRACK", True)
+    sent = {}
+
+    def fake_build(payload):
+        sent.update(payload)
+        return {"url": "/packs/p4/narration.ja.mp3", "format": "mp3", "bytes": 10, "duration_s": 1.0,
+                "sample_rate": 24000, "normalized": True, "chapters": []}
+
+    monkeypatch.setattr(tasks, "post_build_track", fake_build)
+    assets = [{"spot_id": s, "audio_url": f"/packs/p4/{s}.ja.mp3"} for s in ("far", "near", "mid")]
+    assets.append({"spot_id": "textonly", "audio_url": None})
+    index = {"triggers": [{"spot_id": "mid", "chainage_m": 500}, {"spot_id": "near", "chainage_m": 100},
+                          {"spot_id": "textonly", "chainage_m": 50}]}
+
+    track_info = tasks._build_narration_track("p4", "ja", assets, index, [{"spot_id": "far"}])
+    assert sent["spot_ids"] == ["near", "mid", "far"]
+
+    route = [[139.8, 39.2], [139.81, 39.2]]
+    tasks._write_manifest("p4", "ja", {"type": "FeatureCollection", "features": []}, route, [], [], [], [], assets,
+                          narration_track=track_info)
+    manifest = json.loads((tmp_path / "p4" / "manifest.json").read_text())
+    assert manifest["narration_track"]["url"] == "/packs/p4/narration.ja.mp3"
+
+    monkeypatch.setattr(tasks, "NAV_NARRATION_TRACK", False)
+    assert tasks._build_narration_track("p4", "ja", assets, index, []) is None
@@ -0,0 +1,324 @@
+# backend/worker/app/services/alongpoi/corridor.py
+"""
+レッグ（segments の 1 区間）単位の回廊 POI 検索とそのキャッシュ。
+
+- キー: (レッグ座標のハッシュ, mode, バッファ半径, 簡略化の許容誤差)
+- 値:   そのレッグ内で見つかった POI（leg_index はレッグ先頭からの相対 index）
+- /along はキャッシュ済みレッグを使い回し、未キャッシュのレッグだけを 1 回の SQL でまとめて引く。
+  leg_index は最後に連結後の polyline の index に付け替える
+- static_data_version が変わったら全消去（spot_catalog と同じ確認間隔の方式）
+- LRU（ALONGPOI_LEG_CACHE_SIZE 件）。DB 障害時の空結果はキャッシュしない
+- 未キャッシュ部分の頂点数が ALONGPOI_SHARD_THRESHOLD を超えたら分割モード:
+  レッグを ALONGPOI_SHARD_SIZE 頂点以下のピース（隣り合うピースは境界の頂点を共有）に切り、
+  レッグ境界に沿ってチャンクにまとめ、チャンクごとに「SQL + reduce」をプロセスプールで並列に回す
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.common import static_db
+from backend.worker.app.services.alongpoi import geo_ops, poi_repo, reducer
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.getenv("ALONGPOI_LEG_CACHE_SIZE", "4096"))
+REFRESH_INTERVAL_S = float(os.getenv("ALONGPOI_LEG_CACHE_REFRESH_S", "60"))
+SHARD_THRESHOLD = int(os.getenv("ALONGPOI_SHARD_THRESHOLD", "50000"))
+SHARD_SIZE = int(os.getenv("ALONGPOI_SHARD_SIZE", "10000"))
+SHARD_WORKERS = int(os.getenv("ALONGPOI_SHARD_WORKERS", "0")) or (os.cpu_count() or 1)
+
+LegKey = Tuple[str, str, float, float]
+
+
+def leg_key(coords: List[List[float]], mode: str, radius_m: float, tolerance_m: float) -> LegKey:
+    """レッグ座標（~10cm に丸め）のハッシュ + 検索条件。"""
+    arr = np.round(np.asarray(coords, dtype=np.float64), 6)
+    digest = hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+    return (digest, mode, float(radius_m), float(tolerance_m))
+
+
+class LegCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, refresh_interval_s: float = REFRESH_INTERVAL_S):
+        self.max_entries = max_entries
+        self.refresh_interval_s = refresh_interval_s
+        self._entries: "OrderedDict[LegKey, Tuple[Dict, ...]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def maybe_refresh(self) -> None:
+        """一定間隔で static_data_version を確認し、変わっていたら全消去する。"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.refresh_interval_s:
+            return
+        self._checked_at = now
+        version = static_db.fetch_data_version()
+        if version is None or version == self._version:
+            return
+        if self._version is not None:
+            logger.info("static data version changed: %s -> %s; clearing leg cache", self._version, version)
+        with self._lock:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: LegKey) -> Optional[Tuple[Dict, ...]]:
+        with self._lock:
+            val = self._entries.get(key)
+            if val is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def put(self, key: LegKey, pois: List[Dict]) -> None:
+        with self._lock:
+            self._entries[key] = tuple(pois)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "static_data_version": self._version,
+        }
+
+
+_cache: LegCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_leg_cache() -> LegCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LegCache()
+    return _cache
+
+
+def _dedup(coords: List[List[float]]) -> List[List[float]]:
+    out: List[List[float]] = []
+    for c in coords:
+        if not out or c != out[-1]:
+            out.append(c)
+    return out
+
+
+def _merge(found: List[Dict]) -> List[Dict]:
+    """
+    複数レッグで見つかった同じ POI を 1 件にまとめる。
+    距離が最短のレッグを採用し、どれかが car レッグなら source_segment_mode は car
+    （単一 SQL で car を優先していた従来の判定と同じ）。
+    """
+    best: Dict[object, Dict] = {}
+    car: set = set()
+    for p in found:
+        sid = p.get("spot_id")
+        if p.get("source_segment_mode") == "car":
+            car.add(sid)
+        cur = best.get(sid)
+        if cur is None or p["distance_m"] < cur["distance_m"]:
+            best[sid] = p
+    out = []
+    for sid, p in best.items():
+        if sid in car:
+            p = {**p, "source_segment_mode": "car"}
+        out.append(p)
+    return out
+
+
+# (piece_id, coords, mode, radius_m, tolerance_m)
+Piece = Tuple[int, List[List[float]], str, float, float]
+QueryFn = Callable[[List[Dict]], Optional[Dict[int, List[Dict]]]]
+
+
+def run_pieces(pieces: List[Piece], query: Optional[QueryFn] = None) -> Optional[Dict[int, List[Dict]]]:
+    """
+    ピース群を簡略化して 1 回の SQL で引き、ピースごとに reduce する（leg_index はピース内の相対 index）。
+    プロセスプールからも呼ぶのでモジュール直下に置く。DB 障害時は None。
+    """
+    query = query or poi_repo.query_pois_near_legs
+    simplified: Dict[int, List[int]] = {}
+    queries = []
+    for pid, coords, _mode, radius_m, tol in pieces:
+        idx = geo_ops.simplify_indices(geo_ops.project_m(coords), tol).tolist()
+        simplified[pid] = idx
+        queries.append({"k": pid, "radius_m": radius_m, "coords": _dedup([coords[i] for i in idx])})
+    rows = query(queries)
+    if rows is None:
+        return None
+    out: Dict[int, List[Dict]] = {}
+    for pid, coords, mode, _radius_m, tol in pieces:
+        hits = rows.get(pid, [])
+        for h in hits:
+            h["source_segment_mode"] = mode
+        out[pid] = reducer.reduce_hits_to_along_pois(hits, coords, index_map=simplified[pid], tolerance_m=tol)
+    return out
+
+
+def _split(coords: List[List[float]], size: int) -> List[Tuple[int, List[List[float]]]]:
+    """(レッグ内の開始 index, 座標) のピースに切る。隣り合うピースは境界の頂点を共有する。"""
+    size = max(2, size)
+    if len(coords) <= size:
+        return [(0, coords)]
+    out = []
+    start = 0
+    while start < len(coords) - 1:
+        end = min(start + size - 1, len(coords) - 1)
+        out.append((start, coords[start:end + 1]))
+        start = end
+    return out
+
+
+def _chunks(pieces: List[Piece], size: int) -> List[List[Piece]]:
+    """ピースを順に詰めて、頂点数の合計が size 程度のチャンクにする（ピースは分けない）。"""
+    out: List[List[Piece]] = []
+    cur: List[Piece] = []
+    count = 0
+    for p in pieces:
+        if cur and count + len(p[1]) > size:
+            out.append(cur)
+            cur, count = [], 0
+        cur.append(p)
+        count += len(p[1])
+    if cur:
+        out.append(cur)
+    return out
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # uvicorn のスレッドを抱えたまま fork しないよう spawn で起こす
+                _pool = ProcessPoolExecutor(
+                    max_workers=SHARD_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _query_legs(
+    pending: List[Tuple[int, List[List[float]], LegKey]],
+    query: Optional[QueryFn],
+    shard_threshold: int,
+    shard_size: int,
+) -> Dict[int, Optional[List[Dict]]]:
+    """
+    未キャッシュのレッグを引き、{レッグ番号: POI（レッグ内の相対 index）| None（DB 障害）} を返す。
+    """
+    total = sum(len(coords) for _k, coords, _key in pending)
+    sharded = total > shard_threshold
+    pieces: List[Piece] = []
+    owner: Dict[int, Tuple[int, int]] = {}  # piece_id -> (レッグ番号, レッグ内の開始 index)
+    for k, coords, key in pending:
+        for offset, part in (_split(coords, shard_size) if sharded else [(0, coords)]):
+            pid = len(pieces)
+            pieces.append((pid, part, key[1], key[2], key[3]))
+            owner[pid] = (k, offset)
+
+    if sharded:
+        chunks = _chunks(pieces, shard_size)
+        logger.info("corridor sharded: %d vertices, %d pieces, %d chunks", total, len(pieces), len(chunks))
+        outputs = list(_get_pool().map(run_pieces, chunks, [query] * len(chunks)))
+    else:
+        chunks, outputs = [pieces], [run_pieces(pieces, query)]
+
+    found: Dict[int, List[Dict]] = {k: [] for k, _coords, _key in pending}
+    failed = set()
+    for chunk, output in zip(chunks, outputs):
+        for pid, *_rest in chunk:
+            k, offset = owner[pid]
+            if output is None:
+                failed.add(k)
+                continue
+            found[k].extend({**p, "leg_index": p["leg_index"] + offset} for p in output.get(pid, []))
+    # 同じレッグの隣り合うピースで見つかった POI は 1 件に
+    return {k: (None if k in failed else _merge(v)) for k, v in found.items()}
+
+
+def along_pois(
+    polyline: List[List[float]],
+    segments: List[Dict],
+    car_m: float,
+    foot_m: float,
+    cache: Optional[LegCache] = None,
+    query: Optional[QueryFn] = None,
+    shard_threshold: int = SHARD_THRESHOLD,
+    shard_size: int = SHARD_SIZE,
+) -> List[Dict]:
+    """
+    segments（レッグ）ごとに回廊内の POI を集め、leg_index を polyline の線分 index で返す。
+    query は回廊 SQL の差し替え口（既定は poi_repo.query_pois_near_legs。分割モードでは pickle できること）。
+    """
+    if cache is None:
+        cache = get_leg_cache()
+    try:
+        cache.maybe_refresh()
+    except Exception:
+        logger.exception("leg cache refresh failed; serving cached legs")
+
+    n = len(polyline)
+    tolerances = geo_ops.simplify_tolerances(car_m, foot_m)
+    radius = {"car": float(car_m), "foot": float(foot_m)}
+
+    found: List[Dict] = []
+    pending: List[Tuple[int, List[List[float]], LegKey]] = []
+    starts: Dict[int, int] = {}
+    for k, seg in enumerate(segments):
+        mode = "car" if seg.get("mode") == "car" else "foot"
+        s_idx = max(0, min(int(seg.get("start_idx", 0)), n - 1))
+        e_idx = max(0, min(int(seg.get("end_idx", 0)), n - 1))
+        if e_idx < s_idx:
+            s_idx, e_idx = e_idx, s_idx
+        coords = polyline[s_idx:e_idx + 1]
+        if len(_dedup(coords)) < 2:
+            continue
+        key = leg_key(coords, mode, radius[mode], tolerances[mode])
+        cached = cache.get(key)
+        if cached is None:
+            pending.append((k, coords, key))
+            starts[k] = s_idx
+        else:
+            found.extend({**p, "leg_index": p["leg_index"] + s_idx} for p in cached)
+
+    if pending:
+        results = _query_legs(pending, query, shard_threshold, shard_size)
+        for k, _coords, key in pending:
+            pois = results.get(k)
+            if pois is None:
+                continue
+            cache.put(key, pois)
+            found.extend({**p, "leg_index": p["leg_index"] + starts[k]} for p in pois)
+
+    return _merge(found)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Dict, Iterable, Tuple
+import os
+from typing import List, Dict, Iterable, Optional, Tuple
 
+import numpy as np
 from shapely.geometry import LineString, Polygon, mapping, MultiLineString
 from shapely.validation import make_valid
 from shapely.ops import transform
@@ -10,6 +12,9 @@ from pyproj import Transformer
 
 LonLat = Tuple[float, float]  # (lon, lat)
 
+# 簡略化の許容誤差 = バッファ半径 × この比率（0 で簡略化しない）
+SIMPLIFY_RATIO = float(os.getenv("ALONGPOI_SIMPLIFY_RATIO", "0.1"))
+
 def _proj() -> Transformer:
     # EPSG:4326 → EPSG:3857（メートル系）
     return Transformer.from_crs(4326, 3857, always_xy=True)
@@ -111,56 +116,53 @@ def build_mode_buffers(
         cleaned.append(pp)
     return cleaned
 
-def build_mode_multilines(
-    polyline: List[List[float]],
-    segments: List[Dict],
-) -> Dict[str, dict | None]:
-    """
-    segmentsの各区間をmodeごとに切り出し，
-    car/footのMultiLineString(GeoJSON dict)を返す．
-    ShapelyのMultiLineStringは使わない．
-    """
-    if not polyline or len(polyline) < 2:
-        return {"car": None, "foot": None}
+# =================================================================
+# ==== 簡略化（Douglas-Peucker, EPSG:3857 のメートル系で判定） ====
+# =================================================================
 
-    # 正規化
-    pl: List[LonLat] = [(float(lon), float(lat)) for lon, lat in polyline]
+def project_m(polyline: List[List[float]]) -> np.ndarray:
+    """[[lon, lat], ...] → EPSG:3857 の (N, 2) 配列（一括変換）。"""
+    arr = np.asarray(polyline, dtype=np.float64).reshape(-1, 2)
+    x, y = _proj().transform(arr[:, 0], arr[:, 1])
+    return np.column_stack([x, y])
 
-    car_coords: List[List[LonLat]] = []
-    foot_coords: List[List[LonLat]] = []
 
-    for seg in segments:
-        mode = seg.get("mode")
-        s_idx = int(seg.get("start_idx", 0))
-        e_idx = int(seg.get("end_idx", 0))
-
-        # インデックスの健全化
-        n = len(pl)
-        s_idx = max(0, min(s_idx, n - 1))
-        e_idx = max(0, min(e_idx, n - 1))
-        if e_idx < s_idx:
-            s_idx, e_idx = e_idx, s_idx
-
-        coords = pl[s_idx:e_idx + 1]
-        # 連続重複点の除去（ゼロ長ライン回避）
-        dedup: List[LonLat] = []
-        prev = None
-        for c in coords:
-            if c != prev:
-                dedup.append(c)
-                prev = c
-        if len(dedup) < 2:
-            continue
-
-        if mode == "car":
-            car_coords.append(dedup)
-        else:
-            foot_coords.append(dedup)
+def point_segment_distances(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """点 p から線分群 a[i]–b[i] への距離（3857 系）。"""
+    ab = b - a
+    denom = np.einsum("ij,ij->i", ab, ab)
+    t = np.einsum("ij,ij->i", p - a, ab)
+    t = np.divide(t, denom, out=np.zeros_like(t), where=denom > 0).clip(0.0, 1.0)
+    d = p - (a + t[:, None] * ab)
+    return np.hypot(d[:, 0], d[:, 1])
 
-    def to_geojson_mls(lines: List[List[LonLat]]):
-        return {"type": "MultiLineString", "coordinates": lines} if lines else None
 
-    return {
-        "car":  to_geojson_mls(car_coords),
-        "foot": to_geojson_mls(foot_coords),
-    }
\ No newline at end of file
+def simplify_indices(xy: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker で残す頂点の index（昇順、両端を含む）を返す。
+    元の各頂点は、簡略化後の対応する辺から tolerance_m 以内に収まる。
+    """
+    n = len(xy)
+    if n <= 2 or tolerance_m <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        s, e = stack.pop()
+        if e - s < 2:
+            continue
+        inner = xy[s + 1:e]
+        d = point_segment_distances(inner, np.broadcast_to(xy[s], inner.shape), np.broadcast_to(xy[e], inner.shape))
+        i = int(np.argmax(d))
+        if d[i] > tolerance_m:
+            m = s + 1 + i
+            keep[m] = True
+            stack.append((s, m))
+            stack.append((m, e))
+    return np.flatnonzero(keep)
+
+
+def simplify_tolerances(car_m: float, foot_m: float, ratio: float = SIMPLIFY_RATIO) -> Dict[str, float]:
+    """モード別の許容誤差 [m]（バッファ半径に比例させる）。"""
+    return {"car": max(0.0, float(car_m) * ratio), "foot": max(0.0, float(foot_m) * ratio)}
@@ -2,13 +2,15 @@ from __future__ import annotations
 
 from typing import List, Literal, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
-from backend.worker.app.services.alongpoi import geo_ops
-from backend.worker.app.services.alongpoi import reducer
-from backend.worker.app.services.alongpoi import poi_repo
+from backend.worker.app.services.alongpoi import corridor
+from backend.common import static_db
+from backend.common.coord_array import CoordArray, ORJSONRoute
 
-app = FastAPI(title="alongpoi service")
+app = FastAPI(title="alongpoi service", default_response_class=ORJSONResponse)
+app.router.route_class = ORJSONRoute
 
 class Segment(BaseModel):
     mode: Literal["car","foot"]
@@ -16,7 +18,7 @@ class Segment(BaseModel):
     end_idx: int
 
 class AlongRequest(BaseModel):
-    polyline: List[List[float]]   # [[lon,lat], ...]
+    polyline: CoordArray   # [[lon,lat], ...]（NumPy で一括検証）
     segments: List[Segment]
     buffer: dict = Field(default_factory=lambda: {"car":300,"foot":10})
     waypoints: List[str] = Field(default_factory=list) # spot_id のリストを受け取る
@@ -27,27 +29,28 @@ class AlongResponse(BaseModel):
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "static_db_pool": static_db.pool_metrics(),
+        "leg_cache": corridor.get_leg_cache().metrics(),
+    }
 
-# 分離しておく（integration テストで monkeypatch される）
-def query_pois_in_buffers(polys) -> list[dict]:
-    return poi_repo.query_pois(polys)
+# 回廊 SQL の差し替え口（None なら corridor 既定の poi_repo.query_pois_near_legs）
+corridor_query: Optional[corridor.QueryFn] = None
 
 @app.post("/along", response_model=AlongResponse)
 def along(payload: AlongRequest):
     if not payload.polyline:
         raise HTTPException(status_code=400, detail="polyline required")
 
-    lines = geo_ops.build_mode_multilines(
-    payload.polyline,
-    [s.model_dump() for s in payload.segments],
+    # レッグ単位でキャッシュした回廊 POI を集める（未キャッシュのレッグだけ DB に投げる）
+    pois = corridor.along_pois(
+        payload.polyline,
+        [s.model_dump() for s in payload.segments],
+        car_m=payload.buffer.get("car", 300.0),
+        foot_m=payload.buffer.get("foot", 10.0),
+        query=corridor_query,
     )
-    hits = poi_repo.query_pois_near_route(
-        lines,
-        car_m = payload.buffer.get("car", 300.0),
-        foot_m = payload.buffer.get("foot", 10.0),
-    )
-    pois = reducer.reduce_hits_to_along_pois(hits, payload.polyline)
     waypoint_id_set = set(payload.waypoints or [])
 
     if waypoint_id_set:
@@ -4,7 +4,7 @@ import os
 from typing import List, Dict, Iterable, Any
 import json
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 from shapely.ops import unary_union
 from shapely.geometry import Polygon, MultiPolygon, MultiLineString, mapping
@@ -12,10 +12,11 @@ from shapely.geometry.base import BaseGeometry
 from shapely.validation import make_valid
 import logging
 
+from backend.common import static_db
+
 # print文が見つけやすいように、目立つセパレータを使います
 SEPARATOR = "■■■ DEBUG ■■■"
 log = logging.getLogger(__name__)
-_engine: Engine | None = None
 
 def _clean_and_extract_polygons(geoms: Iterable[BaseGeometry]) -> List[Polygon]:
     cleaned_polygons: List[Polygon] = []
@@ -51,20 +52,8 @@ def _clean_and_extract_polygons(geoms: Iterable[BaseGeometry]) -> List[Polygon]:
     return cleaned_polygons
 
 
-def _conn_url() -> str:
-    host = os.getenv("STATIC_DB_HOST", "static-db")
-    port = os.getenv("STATIC_DB_PORT", "5432")
-    db   = os.getenv("STATIC_DB_NAME", "nav_static")
-    user = os.getenv("STATIC_DB_USER", "nav_static")
-    pwd  = os.getenv("STATIC_DB_PASSWORD", "nav_static")
-    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-
-
 def _get_engine() -> Engine:
-    global _engine
-    if _engine is None:
-        _engine = create_engine(_conn_url(), future=True)
-    return _engine
+    return static_db.get_engine()
 
 def _build_geometry_collection_wkt(polys: List[BaseGeometry]) -> str | None:
     """
@@ -147,71 +136,50 @@ def query_pois(polys: List[BaseGeometry]) -> List[Dict]:
     except Exception:
         return []
 
-_SQL_NEARBY = text("""
-WITH car_line AS (
-  SELECT CASE WHEN :car_geojson IS NOT NULL
-              THEN ST_GeomFromGeoJSON(:car_geojson)::geometry END AS g
-),
-foot_line AS (
-  SELECT CASE WHEN :foot_geojson IS NOT NULL
-              THEN ST_GeomFromGeoJSON(:foot_geojson)::geometry END AS g
-),
-car_geog  AS (SELECT CASE WHEN g IS NOT NULL THEN g::geography END AS gg FROM car_line),
-foot_geog AS (SELECT CASE WHEN g IS NOT NULL THEN g::geography END AS gg FROM foot_line)
+
+# レッグごとの回廊検索（1 往復で複数レッグをまとめて引く）
+# :legs は [{"k": レッグ番号, "r": 半径[m], "g": GeoJSON LineString}, ...] の JSON
+_SQL_NEAR_LEGS = text("""
+WITH legs AS (
+  SELECT (l->>'k')::int AS k,
+         (l->>'r')::float AS radius_m,
+         ST_GeomFromGeoJSON((l->'g')::text)::geography AS gg
+  FROM jsonb_array_elements(CAST(:legs AS jsonb)) AS l
+)
 SELECT
-  p.spot_id, p.name, p.lon, p.lat, p.kind,
-  LEAST(
-    COALESCE(ST_Distance(p.geom::geography, (SELECT gg FROM car_geog)),  1e15),
-    COALESCE(ST_Distance(p.geom::geography, (SELECT gg FROM foot_geog)), 1e15)
-  ) AS distance_m,
-  CASE
-    WHEN (SELECT gg FROM car_geog)  IS NOT NULL
-     AND ST_DWithin(p.geom::geography, (SELECT gg FROM car_geog),  :car_m)  THEN 'car'
-    WHEN (SELECT gg FROM foot_geog) IS NOT NULL
-     AND ST_DWithin(p.geom::geography, (SELECT gg FROM foot_geog), :foot_m) THEN 'foot'
-    ELSE NULL
-  END AS source_segment_mode
-FROM poi_features_v p
-WHERE
-  ( (SELECT gg FROM car_geog)  IS NOT NULL AND ST_DWithin(p.geom::geography, (SELECT gg FROM car_geog),  :car_m) )
-  OR
-  ( (SELECT gg FROM foot_geog) IS NOT NULL AND ST_DWithin(p.geom::geography, (SELECT gg FROM foot_geog), :foot_m) )
+  legs.k, p.spot_id, p.name, p.lon, p.lat, p.kind,
+  ST_Distance(p.geom::geography, legs.gg) AS distance_m
+FROM legs
+JOIN poi_features_v p ON ST_DWithin(p.geom::geography, legs.gg, legs.radius_m)
 """)
 
-def _to_geojson_or_none(geom: Any) -> str | None:
-    if geom is None:
-        return None
-    # すでにGeoJSON辞書ならそのままdump
-    if isinstance(geom, dict) and "type" in geom and "coordinates" in geom:
-        return json.dumps(geom, ensure_ascii=False)
-    # 念のためShapelyも許容（将来の流用に備え）
-    try:
-        from shapely.geometry import mapping as shp_mapping
-        return json.dumps(shp_mapping(geom), ensure_ascii=False)
-    except Exception:
-        # 最後の砦：想定外の型はNone扱いにして落とさない
-        return None
 
-def query_pois_near_route(
-    lines: dict,  # {"car": MultiLineString|None, "foot": MultiLineString|None}
-    car_m: float,
-    foot_m: float,
-) -> List[Dict]:
+def query_pois_near_legs(legs: List[Dict]) -> Dict[int, List[Dict]] | None:
+    """
+    legs: [{"k": int, "radius_m": float, "coords": [[lon, lat], ...]}, ...]
+    返り値は {k: [ヒット, ...]}（ヒットの無いレッグも空リストで含む）。
+    DB 障害時は None（呼び出し側でキャッシュしないように区別する）。
+    """
+    if not legs:
+        return {}
     try:
         eng = _get_engine()
     except Exception:
-        return []
-
-    params = {
-        "car_geojson":  _to_geojson_or_none(lines.get("car")),
-        "foot_geojson": _to_geojson_or_none(lines.get("foot")),
-        "car_m": float(car_m),
-        "foot_m": float(foot_m),
-    }
+        return None
 
+    payload = [
+        {"k": int(l["k"]), "r": float(l["radius_m"]),
+         "g": {"type": "LineString", "coordinates": l["coords"]}}
+        for l in legs
+    ]
+    out: Dict[int, List[Dict]] = {int(l["k"]): [] for l in legs}
     try:
         with eng.connect() as conn:
-            rows = conn.execute(_SQL_NEARBY, params).mappings().all()
-            return [dict(r) for r in rows]
+            rows = conn.execute(_SQL_NEAR_LEGS, {"legs": json.dumps(payload)}).mappings().all()
     except Exception:
-        return []
+        log.exception("corridor query failed for %d legs", len(legs))
+        return None
+    for r in rows:
+        d = dict(r)
+        out[int(d.pop("k"))].append(d)
+    return out
@@ -1,55 +1,66 @@
 from __future__ import annotations
 
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Sequence
 
-from shapely.geometry import Point, LineString
-from shapely.ops import transform
-from pyproj import Transformer
+import numpy as np
 
+from backend.worker.app.services.alongpoi.geo_ops import point_segment_distances, project_m
 
-def _proj() -> Transformer:
-    return Transformer.from_crs(4326, 3857, always_xy=True)
 
+def _candidate_segments(
+    p: np.ndarray,
+    xy: np.ndarray,
+    index_map: Sequence[int],
+    tolerance_m: float,
+) -> np.ndarray:
+    """
+    簡略化後の辺で当たりを付け、最近線分になり得る元の線分 index だけを返す。
+    元の区間は対応する簡略化辺から tolerance_m 以内にあるので、
+    簡略化辺までの距離が (最小値 + 2 × tolerance_m) を超える区間は候補にならない。
+    """
+    idx = np.asarray(index_map)
+    d = point_segment_distances(p, xy[idx[:-1]], xy[idx[1:]])
+    spans = np.flatnonzero(d <= d.min() + 2.0 * tolerance_m)
+    return np.concatenate([np.arange(idx[k], idx[k + 1]) for k in spans])
 
-def reduce_hits_to_along_pois(hits: List[Dict], polyline: List[List[float]]) -> List[Dict]:
+
+def reduce_hits_to_along_pois(
+    hits: List[Dict],
+    polyline: List[List[float]],
+    index_map: Optional[Sequence[int]] = None,
+    tolerance_m: float = 0.0,
+) -> List[Dict]:
     """
     DB等から得たヒット（少なくとも spot_id, lon, lat を含む dict 群）を、
     ルート polyline に基づいて
       - ルート最近距離 [m]
       - 属する線分 index（leg_index）
     を付与して返す。
+
+    index_map / tolerance_m（geo_ops.simplify_indices で残した頂点と許容誤差。corridor.run_pieces が渡す）を渡すと、
+    簡略化後の辺で候補区間を絞ってから元の線分だけを調べる。
+    leg_index は常に元の polyline の線分 index。
     """
     if not hits or not polyline or len(polyline) < 2:
         return []
 
-    to3857 = _proj().transform
+    xy = project_m(polyline)
+    a, b = xy[:-1], xy[1:]
+    use_map = index_map is not None and 2 <= len(index_map) < len(polyline)
 
-    # ルートを 3857 に写像
-    line_lonlat = [(p[0], p[1]) for p in polyline]
-    line_3857 = transform(to3857, LineString(line_lonlat))
-
-    # 各「線分」（2点間） 3857 表現を準備
-    segs_3857 = []
-    for i in range(len(line_lonlat) - 1):
-        seg = LineString([line_lonlat[i], line_lonlat[i + 1]])
-        segs_3857.append(transform(to3857, seg))
+    pts = project_m([[float(h["lon"]), float(h["lat"])] for h in hits])
 
     out: List[Dict] = []
-    for h in hits:
-        lon, lat = float(h["lon"]), float(h["lat"])
-        pt_3857 = transform(to3857, Point(lon, lat))
-
-        # 最近距離 [m]
-        dist_m = float(line_3857.distance(pt_3857))
-
-        # 最近線分の index
-        best_idx = 0
-        best_d = float("inf")
-        for i, seg in enumerate(segs_3857):
-            d = seg.distance(pt_3857)
-            if d < best_d:
-                best_d = d
-                best_idx = i
+    for h, p in zip(hits, pts):
+        if use_map:
+            cand = _candidate_segments(p, xy, index_map, tolerance_m)
+            d = point_segment_distances(p, a[cand], b[cand])
+            best = int(np.argmin(d))
+            best_idx, dist_m = int(cand[best]), float(d[best])
+        else:
+            d = point_segment_distances(p, a, b)
+            best_idx = int(np.argmin(d))
+            dist_m = float(d[best_idx])
 
         distance_m = float(h.get("distance_m", dist_m))  # SQLの値があれば優先
         out.append(
@@ -59,7 +70,7 @@ def reduce_hits_to_along_pois(hits: List[Dict], polyline: List[List[float]]) ->
                 "lon": float(h.get("lon")) if "lon" in h else None,
                 "lat": float(h.get("lat")) if "lat" in h else None,
                 "kind": h.get("kind"),
-                "leg_index": int(best_idx),
+                "leg_index": best_idx,
                 "distance_m": distance_m,
                 "source_segment_mode": h.get("source_segment_mode"),
             }
@@ -3,11 +3,14 @@ from __future__ import annotations
 import re
 from typing import List, Literal, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
 from backend.worker.app.services.llm import generator, prompt
+from backend.common.coord_array import ORJSONRoute
 
-app = FastAPI(title="llm service")
+app = FastAPI(title="llm service", default_response_class=ORJSONResponse)
+app.router.route_class = ORJSONRoute
 
 class SpotRef(BaseModel):
     spot_id: str
@@ -1,6 +1,7 @@
 # services/nav/celery_app.py
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 celery_app = Celery(
     "nav",
@@ -21,6 +22,22 @@ celery_app.conf.update(
 
 celery_app.autodiscover_tasks(["backend.worker.app.services.nav"], force=True)
 
+# ステージ別キュー（NAV_STAGED=1）。LLM / TTS のワーカーは -Q nav_describe / nav_synthesize で
+# 別ノードに分けてスケールできる。完全一致のルートが "nav.*" より優先される。
 celery_app.conf.task_routes = {
+    "nav.step.route": {"queue": "nav_route"},
+    "nav.step.along": {"queue": "nav_along"},
+    "nav.step.describe": {"queue": "nav_describe"},
+    "nav.step.synthesize_spot": {"queue": "nav_synthesize"},
+    "nav.step.finalize": {"queue": "nav_finalize"},
+    # プラン完了後の bundle.bin 作成（タイル取得が長いので、プランを捌くスロットとは分ける）
+    "nav.pack.bundle": {"queue": "nav_bundle"},
     "nav.*": {"queue": "nav"},
-}
\ No newline at end of file
+}
+
+
+@worker_init.connect
+def _warm_static_caches(**_):
+    # spot 解決を DB 往復なしで行うため、ワーカー起動時にカタログを読み込む
+    from backend.common.spot_catalog import get_catalog
+    get_catalog().warm()
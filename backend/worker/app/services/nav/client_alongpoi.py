@@ -1,6 +1,8 @@
 import os
 import httpx
 
+from backend.worker.app.services.nav import http_pool
+
 ALONGPOI_BASE = os.getenv("ALONGPOI_BASE", "http://svc-alongpoi:9102")
 
 def post_along(payload: dict) -> dict:
@@ -8,3 +10,8 @@ def post_along(payload: dict) -> dict:
         r = client.post(f"{ALONGPOI_BASE.rstrip('/')}/along", json=payload)
     r.raise_for_status()
     return r.json()
+
+
+async def apost_along(payload: dict) -> dict:
+    """post_along の非同期版（共有の AsyncClient プールを使う）"""
+    return await http_pool.post_json("alongpoi", "/along", payload)
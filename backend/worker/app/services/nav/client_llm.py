@@ -6,6 +6,8 @@ import os
 import httpx
 import logging
 
+from backend.worker.app.services.nav import http_pool
+
 logger = logging.getLogger(__name__)
 
 # LLMサービスのベースURLを設定 (環境変数 or デフォルト値)
@@ -28,4 +30,16 @@ def post_describe(payload: dict) -> dict:
     except httpx.HTTPStatusError as e:
         logger.error(f"LLM service returned an error: {e.response.status_code} - {e.response.text}")
         # エラーの詳細をラップして再送出
-        raise RuntimeError(f"LLM service error: {e.response.status_code}, detail: {e.response.text}") from e
\ No newline at end of file
+        raise RuntimeError(f"LLM service error: {e.response.status_code}, detail: {e.response.text}") from e
+
+
+async def apost_describe(payload: dict) -> dict:
+    """post_describe の非同期版。例外の包み方は同期版と同じ。"""
+    try:
+        return await http_pool.post_json("llm", "/describe", payload)
+    except httpx.RequestError as e:
+        logger.exception(f"LLM service request failed: {e.request.method} {e.request.url}")
+        raise RuntimeError(f"Could not connect to LLM service at {LLM_BASE}/describe") from e
+    except httpx.HTTPStatusError as e:
+        logger.error(f"LLM service returned an error: {e.response.status_code} - {e.response.text}")
+        raise RuntimeError(f"LLM service error: {e.response.status_code}, detail: {e.response.text}") from e
@@ -1,10 +1,17 @@
 import os
 import httpx
 
+from backend.worker.app.services.nav import http_pool
+
 ROUTING_BASE = os.getenv("ROUTING_BASE", "http://svc-routing:9101")
 
 def post_route(payload: dict) -> dict:
     with httpx.Client(timeout=30) as client:
         r = client.post(f"{ROUTING_BASE.rstrip('/')}/route", json=payload)
     r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    return r.json()
+
+
+async def apost_route(payload: dict) -> dict:
+    """post_route の非同期版（共有の AsyncClient プールを使う）"""
+    return await http_pool.post_json("routing", "/route", payload)
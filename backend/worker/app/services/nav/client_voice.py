@@ -1,6 +1,8 @@
 import os
 import httpx
 
+from backend.worker.app.services.nav import http_pool
+
 VOICE_BASE = os.getenv("VOICE_BASE", "http://svc-voice:9104")
 
 def post_synthesize(payload: dict) -> dict:
@@ -18,4 +20,17 @@ def post_synthesize_and_save(payload: dict) -> dict:
     with httpx.Client(timeout=3000) as client: # タイムアウトを長めに設定
         r = client.post(f"{VOICE_BASE.rstrip('/')}/synthesize_and_save", json=payload)
     r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    return r.json()
+
+
+def post_build_track(payload: dict) -> dict:
+    """保存済みの音声をルート順に 1 本へまとめ、章表（spot_id ごとのバイト・時間位置）を返す。"""
+    with httpx.Client(timeout=600) as client:
+        r = client.post(f"{VOICE_BASE.rstrip('/')}/build_track", json=payload)
+    r.raise_for_status()
+    return r.json()
+
+
+async def apost_synthesize_and_save(payload: dict) -> dict:
+    """post_synthesize_and_save の非同期版（共有の AsyncClient プールを使う）"""
+    return await http_pool.post_json("voice", "/synthesize_and_save", payload)
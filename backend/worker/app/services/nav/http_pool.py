@@ -0,0 +1,123 @@
+# backend/worker/app/services/nav/http_pool.py
+"""
+nav ワーカー用の非同期 HTTP 基盤（NAV_ASYNC=1 のときに使用）。
+
+- プロセスに 1 本だけイベントループ用スレッドを立て、全プランのコルーチンをそこで動かす
+  （Celery の threads プールの各スロットは run_coroutine() で結果を待つだけ）
+- 下流サービスごとに長寿命の httpx.AsyncClient（keep-alive）を持つ
+- サービスごとに同時リクエスト数（Semaphore）・接続数・タイムアウトを ENV で調整可能
+    NAV_{SERVICE}_CONCURRENCY / NAV_{SERVICE}_TIMEOUT_S  （SERVICE = ROUTING / ALONGPOI / LLM / VOICE）
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ServiceConfig:
+    base_url: str
+    timeout_s: float
+    concurrency: int
+
+
+def _service_config(name: str, base_env: str, default_base: str, timeout_s: float, concurrency: int) -> ServiceConfig:
+    prefix = f"NAV_{name.upper()}"
+    return ServiceConfig(
+        base_url=os.getenv(base_env, default_base).rstrip("/"),
+        timeout_s=float(os.getenv(f"{prefix}_TIMEOUT_S", str(timeout_s))),
+        concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+    )
+
+
+def _default_configs() -> Dict[str, ServiceConfig]:
+    # タイムアウトの既定値は同期クライアントと揃える
+    return {
+        "routing": _service_config("routing", "ROUTING_BASE", "http://svc-routing:9101", 30, 32),
+        "alongpoi": _service_config("alongpoi", "ALONGPOI_BASE", "http://svc-alongpoi:9102", 30, 32),
+        "llm": _service_config("llm", "LLM_BASE", "http://svc-llm:9103",
+                               float(os.getenv("REQUEST_TIMEOUT_SECONDS", "300")), 4),
+        "voice": _service_config("voice", "VOICE_BASE", "http://svc-voice:9104", 3000, 2),
+    }
+
+
+def max_timeout_s() -> float:
+    """下流サービスのタイムアウトのうち最長のもの（プランが 1 回の呼び出しで止まりうる最長時間）。"""
+    return max(cfg.timeout_s for cfg in _default_configs().values())
+
+
+class ServicePool:
+    """1 サービス分の AsyncClient と同時実行制限。ループスレッド上でのみ使う。"""
+
+    def __init__(self, cfg: ServiceConfig):
+        self.cfg = cfg
+        self._client = httpx.AsyncClient(
+            base_url=cfg.base_url,
+            timeout=cfg.timeout_s,
+            limits=httpx.Limits(
+                max_connections=cfg.concurrency,
+                max_keepalive_connections=cfg.concurrency,
+                keepalive_expiry=60.0,
+            ),
+        )
+        self._sem = asyncio.Semaphore(cfg.concurrency)
+
+    async def post_json(self, path: str, payload: dict) -> dict:
+        async with self._sem:
+            r = await self._client.post(path, json=payload)
+        r.raise_for_status()
+        return r.json()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class _LoopRunner:
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._pools: Dict[str, ServicePool] = {}
+        self._lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        pid = os.getpid()
+        if self._loop is not None and self._pid == pid:
+            return self._loop
+        with self._lock:
+            # fork 後は親のループ（スレッド）は存在しないので作り直す
+            if self._loop is None or self._pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="nav-async-loop", daemon=True).start()
+                self._loop, self._pid, self._pools = loop, pid, {}
+        return self._loop
+
+    def pool(self, service: str) -> ServicePool:
+        # ループスレッド上から呼ばれる前提（Semaphore / AsyncClient をこのループに結び付ける）
+        p = self._pools.get(service)
+        if p is None:
+            p = self._pools[service] = ServicePool(_default_configs()[service])
+        return p
+
+
+_runner = _LoopRunner()
+
+
+def get_pool(service: str) -> ServicePool:
+    return _runner.pool(service)
+
+
+def run_coroutine(coro: Awaitable[T]) -> T:
+    """同期コード（Celery タスク）から、共有ループ上でコルーチンを実行して結果を待つ。"""
+    fut = asyncio.run_coroutine_threadsafe(coro, _runner.loop())
+    return fut.result()
+
+
+async def post_json(service: str, path: str, payload: dict) -> Any:
+    return await get_pool(service).post_json(path, payload)
@@ -0,0 +1,287 @@
+# backend/worker/app/services/nav/pack_bundle.py
+"""
+オフライン用のパック一括ファイル（/packs/{pack_id}/bundle.bin）。
+
+圏外に入る前に、manifest・音声・ルート沿いの地図タイルを 1 ファイルでまとめて取れるようにする。
+クライアントは先頭 8 バイト → 索引 → 本体の順に HTTP Range で取得する（途中で切れても続きから取り直せる）。
+
+形式（v1）:
+  b"GPK1"              4 バイト
+  索引の長さ           uint32 big-endian
+  索引                 JSON（UTF-8）
+      {"format": 1, "pack_id", "generated_at",
+       "entries": [{"path", "type", "offset", "length", "content_type"}],
+       "tiles": {"zooms": [...], "buffer_m", "count", "missing"}}
+  本体                 各 entry を連結したもの。offset は「本体の先頭」からの位置
+                       （ファイル上の位置 = 8 + 索引の長さ + offset）
+
+タイルはルート全体の外接矩形ではなく、ルートを buffer_m だけ太らせた回廊にかかるものだけを入れる
+（ズームごと。Web メルカトル上で回廊ポリゴンとタイル行の交差から x 範囲を求める）。
+取得元は PACK_TILE_SOURCE（{z}/{x}/{y} を含む http(s):// か file:// のテンプレート）。
+既定は空で、タイル無しで manifest と音声だけをまとめる（プランのたびに外部のタイルサーバへ
+数千枚を取りに行かないように）。タイルを入れるなら、地図画面（frontend/src/lib/tiles.js の TILE_TEMPLATE、
+地理院タイル標準地図）と同じ地図の手元のミラーか、事前に埋めたキャッシュを指す:
+    file:///tiles/{z}/{x}/{y}.png            ローカルのミラー
+    file:///packs/_tiles/{z}/{x}/{y}.png     PACK_TILE_CACHE_DIR（同じ {z}/{x}/{y}.png の並び）
+    http://tile-mirror/{z}/{x}/{y}.png       社内のタイルサーバ
+http(s) のテンプレートはホストごとに PACK_TILE_RATE_PER_HOST 件/秒までに抑える（0 で無制限）。
+取得したタイルは PACK_TILE_CACHE_DIR に保存し、次のパックからはそこを使う。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from shapely.geometry import LineString, Point, box
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GPK1"
+FORMAT = 1
+BUNDLE_NAME = "bundle.bin"
+
+NAV_PACK_BUNDLE = os.getenv("NAV_PACK_BUNDLE", "1") == "1"
+# 空ならタイル無し（手元のミラーかキャッシュを指すこと。モジュールの説明を参照）
+PACK_TILE_SOURCE = os.getenv("PACK_TILE_SOURCE", "")
+PACK_TILE_CACHE_DIR = os.getenv("PACK_TILE_CACHE_DIR", "")
+PACK_TILE_ZOOMS = tuple(int(z) for z in os.getenv("PACK_TILE_ZOOMS", "12,13,14,15").split(",") if z.strip())
+PACK_TILE_BUFFER_M = float(os.getenv("PACK_TILE_BUFFER_M", "300"))
+PACK_TILE_MAX = int(os.getenv("PACK_TILE_MAX", "4000"))
+PACK_TILE_WORKERS = int(os.getenv("PACK_TILE_WORKERS", "8"))
+PACK_TILE_TIMEOUT_S = float(os.getenv("PACK_TILE_TIMEOUT_S", "10"))
+PACK_TILE_RATE_PER_HOST = float(os.getenv("PACK_TILE_RATE_PER_HOST", "2"))
+
+_R = 6378137.0
+_WORLD = 2 * math.pi * _R  # Web メルカトルの全幅（m）
+
+Tile = Tuple[int, int, int]
+
+_CONTENT_TYPES = {".json": "application/json", ".mp3": "audio/mpeg", ".wav": "audio/wav", ".txt": "text/plain; charset=utf-8"}
+
+
+def _merc(lon: float, lat: float) -> Tuple[float, float]:
+    lat = max(-85.05112878, min(85.05112878, lat))
+    return _R * math.radians(lon), _R * math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def corridor_tiles(
+    polyline: Sequence[Sequence[float]],
+    zooms: Iterable[int] = PACK_TILE_ZOOMS,
+    buffer_m: float = PACK_TILE_BUFFER_M,
+    max_tiles: int = PACK_TILE_MAX,
+) -> List[Tile]:
+    """
+    ルート（[[lon, lat], ...]）の回廊にかかるタイル。ズームの小さい順に並べ、max_tiles を超える
+    ズームは丸ごと入れない（途中で切れて穴あきの地図になるより、粗いズームだけの方が使える）。
+    """
+    pts = [_merc(float(p[0]), float(p[1])) for p in polyline or []]
+    if not pts:
+        return []
+    # メルカトル上の距離は実距離の 1/cos(lat) 倍
+    mean_lat = sum(float(p[1]) for p in polyline) / len(polyline)
+    buf = buffer_m / max(0.01, math.cos(math.radians(mean_lat)))
+    geom = (LineString(pts) if len(pts) > 1 else Point(pts[0])).buffer(buf, resolution=4)
+    minx, miny, maxx, maxy = geom.bounds
+
+    out: List[Tile] = []
+    for z in sorted(set(zooms)):
+        n = 2 ** z
+        size = _WORLD / n
+        origin = _WORLD / 2
+
+        def col(x: float) -> int:
+            return max(0, min(n - 1, int((x + origin) // size)))
+
+        def row(y: float) -> int:
+            return max(0, min(n - 1, int((origin - y) // size)))
+
+        tiles: Set[Tile] = set()
+        for ty in range(row(maxy), row(miny) + 1):
+            top = origin - ty * size
+            strip = geom.intersection(box(minx, top - size, maxx, top))
+            if strip.is_empty:
+                continue
+            for part in getattr(strip, "geoms", [strip]):
+                x0, _, x1, _ = part.bounds
+                tiles.update((z, tx, ty) for tx in range(col(x0), col(x1) + 1))
+        if len(out) + len(tiles) > max_tiles:
+            logger.info("corridor tiles: z%d skipped (%d tiles would exceed %d)", z, len(tiles), max_tiles)
+            break
+        out.extend(sorted(tiles))
+    return out
+
+
+class HostRateLimiter:
+    """
+    ホストごとに rate 件/秒まで（リクエストの開始時刻を 1/rate 秒ずつずらす）。
+    スレッド間で共有し、同じプロセスで並行して作る bundle 同士でも合計で抑える。
+    """
+
+    def __init__(self, rate: float = PACK_TILE_RATE_PER_HOST) -> None:
+        self.rate = rate
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_host_limiter = HostRateLimiter()
+
+
+class TileSource:
+    """PACK_TILE_SOURCE のテンプレートからタイルを取り、PACK_TILE_CACHE_DIR に保存する。"""
+
+    def __init__(self, template: Optional[str] = None, cache_dir: Optional[str] = None,
+                 timeout_s: float = PACK_TILE_TIMEOUT_S, limiter: Optional[HostRateLimiter] = None) -> None:
+        self.template = PACK_TILE_SOURCE if template is None else template
+        root = cache_dir or PACK_TILE_CACHE_DIR or str(Path(os.getenv("PACKS_ROOT") or "/packs") / "_tiles")
+        self.cache_dir = Path(root)
+        self.timeout_s = timeout_s
+        self.limiter = limiter or _host_limiter
+        self.ext = Path(self.template.split("?")[0]).suffix or ".png"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.template)
+
+    def _cache_path(self, z: int, x: int, y: int) -> Path:
+        return self.cache_dir / str(z) / str(x) / f"{y}{self.ext}"
+
+    def get(self, tile: Tile, client: Optional[httpx.Client] = None) -> Optional[bytes]:
+        z, x, y = tile
+        cached = self._cache_path(z, x, y)
+        if cached.is_file():
+            return cached.read_bytes()
+        url = self.template.format(z=z, x=x, y=y)
+        try:
+            if url.startswith("file://"):
+                data = Path(url[len("file://"):]).read_bytes()
+            else:
+                self.limiter.wait(urlsplit(url).netloc)
+                res = (client or httpx).get(url, timeout=self.timeout_s)
+                if res.status_code != 200:
+                    return None
+                data = res.content
+        except (OSError, httpx.HTTPError) as e:
+            logger.debug("tile fetch failed %s: %s", url, e)
+            return None
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_name(cached.name + f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cached)
+        except OSError:
+            logger.warning("tile cache write failed: %s", cached, exc_info=True)
+        return data
+
+    def get_many(self, tiles: List[Tile], workers: int = PACK_TILE_WORKERS) -> Dict[Tile, bytes]:
+        if not tiles:
+            return {}
+        with httpx.Client(headers={"User-Agent": "guidance-pack-bundler"}) as client:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+                results = list(ex.map(lambda t: self.get(t, client), tiles))
+        return {t: data for t, data in zip(tiles, results) if data is not None}
+
+
+def _asset_files(pack_dir: Path, assets: List[dict]) -> List[str]:
+    """assets の audio_url / text_url（/packs/{pack_id}/名前）のうち、パック内に実在するファイル名。"""
+    names: List[str] = []
+    for a in assets or []:
+        for url in (a.get("audio_url"), a.get("text_url")):
+            if not url:
+                continue
+            name = url.rsplit("/", 1)[-1]
+            if name and (pack_dir / name).is_file() and name not in names:
+                names.append(name)
+    return names
+
+
+def write_bundle(
+    pack_id: str,
+    polyline: Sequence[Sequence[float]],
+    assets: List[dict],
+    tile_source: Optional[TileSource] = None,
+    zooms: Iterable[int] = PACK_TILE_ZOOMS,
+    buffer_m: float = PACK_TILE_BUFFER_M,
+    max_tiles: int = PACK_TILE_MAX,
+) -> Optional[Path]:
+    """manifest.json・音声・回廊タイルを bundle.bin にまとめる（manifest を書いた後に呼ぶ）。"""
+    pack_dir = Path(os.getenv("PACKS_ROOT") or "/packs") / pack_id
+    manifest = pack_dir / "manifest.json"
+    if not manifest.is_file():
+        logger.warning("bundle skipped: manifest.json not found for pack_id=%s", pack_id)
+        return None
+
+    blobs: List[Tuple[str, str, bytes]] = [("manifest.json", "manifest", manifest.read_bytes())]
+    for name in _asset_files(pack_dir, assets):
+        kind = "text" if name.endswith(".txt") else "audio"
+        blobs.append((name, kind, (pack_dir / name).read_bytes()))
+
+    source = tile_source if tile_source is not None else TileSource()
+    zooms = sorted(set(zooms))
+    wanted = corridor_tiles(polyline, zooms, buffer_m, max_tiles) if source.enabled else []
+    got = source.get_many(wanted) if wanted else {}
+    for (z, x, y) in wanted:
+        data = got.get((z, x, y))
+        if data is not None:
+            blobs.append((f"tiles/{z}/{x}/{y}{source.ext}", "tile", data))
+
+    entries = []
+    offset = 0
+    for path, kind, data in blobs:
+        ext = Path(path).suffix
+        ctype = "image/png" if kind == "tile" and ext == ".png" else _CONTENT_TYPES.get(ext, "application/octet-stream")
+        entries.append({"path": path, "type": kind, "offset": offset, "length": len(data), "content_type": ctype})
+        offset += len(data)
+    index = {
+        "format": FORMAT,
+        "pack_id": pack_id,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "entries": entries,
+        "tiles": {"zooms": zooms if source.enabled else [], "buffer_m": buffer_m,
+                  "count": len(got), "missing": len(wanted) - len(got)},
+    }
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    out = pack_dir / BUNDLE_NAME
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack(">I", len(index_bytes)))
+        f.write(index_bytes)
+        for _, _, data in blobs:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, out)
+    logger.info("NAV wrote bundle: %s (%d entries, %d tiles, %d missing)",
+                out, len(entries), len(got), len(wanted) - len(got))
+    return out
+
+
+def read_index(path: Path) -> Tuple[dict, int]:
+    """(索引, 本体の先頭位置)。テスト・デバッグ用（クライアントは Range で同じことをする）。"""
+    with open(path, "rb") as f:
+        head = f.read(8)
+        if head[:4] != MAGIC:
+            raise ValueError("not a pack bundle")
+        (n,) = struct.unpack(">I", head[4:])
+        return json.loads(f.read(n)), 8 + n
@@ -0,0 +1,134 @@
+# backend/worker/app/services/nav/plan_status.py
+"""
+プランの進捗をゲートウェイと共有する Redis ハッシュ（plan:status:{task_id}）。
+
+ワークフローがステージの切り替わりごとに書き込み、ゲートウェイはポーリング時に
+HGETALL 1 回で状態を返す（Celery の結果ツリーを辿らない）。
+
+フィールド:
+  state      PENDING / STARTED / SUCCESS / FAILURE（Celery の状態名に合わせる）
+  stage      route / along / narrate / finalize / done
+  done/total ナレーション（describe + synthesize）を終えたスポット数 / 対象スポット数
+  pack_id    プランの pack_id
+  result_ref 最終結果を保持する Celery タスク ID
+  error      失敗時のメッセージ
+  rev        書き込みごとに増える版数（ゲートウェイの ETag に使う）
+  updated_at 最後に書き込んだ時刻（UNIX 秒）。実行中は heartbeat() が PLAN_STATUS_HEARTBEAT_S ごとに
+             進める（rev は進めないので ETag は変わらない）
+  stale_after_s updated_at がこれ以上止まった実行中プランを、ゲートウェイは Celery の状態で確かめ直す
+             （ワーカー停止で STARTED のまま残らないように）。下流サービスの最長タイムアウトから決める
+  queued     1 ならステージ間でキューに積まれて待っている（止まっていても確かめ直さない）
+
+書き込みは best-effort（Redis 障害でプラン自体は失敗させない）。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from backend.worker.app.services.nav import http_pool
+
+logger = logging.getLogger(__name__)
+
+PLAN_STATUS_URL = os.getenv("PLAN_STATUS_REDIS_URL", "redis://redis:6379/2")
+PLAN_STATUS_TTL_S = int(os.getenv("PLAN_STATUS_TTL_S", "86400"))
+PLAN_STATUS_HEARTBEAT_S = float(os.getenv("PLAN_STATUS_HEARTBEAT_S", "30"))
+_KEY_PREFIX = "plan:status:"
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(PLAN_STATUS_URL, decode_responses=True, socket_timeout=1.0)
+    return _client
+
+
+def update(plan_id: Optional[str], **fields: Any) -> None:
+    """指定フィールドを書き込み、rev を 1 進める。"""
+    if not plan_id:
+        return
+    key = _KEY_PREFIX + plan_id
+    mapping = {k: ("" if v is None else v) for k, v in fields.items()}
+    mapping["updated_at"] = int(time.time())
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        pipe.hincrby(key, "rev", 1)
+        pipe.expire(key, PLAN_STATUS_TTL_S)
+        pipe.execute()
+    except Exception:
+        logger.warning("plan status update failed for %s", plan_id, exc_info=True)
+
+
+def touch(plan_id: Optional[str], **fields: Any) -> None:
+    """updated_at（と指定フィールド）だけを書く。rev は進めない（クライアントに見せる内容は変わらない）。"""
+    if not plan_id:
+        return
+    mapping = {k: ("" if v is None else v) for k, v in fields.items()}
+    mapping["updated_at"] = int(time.time())
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.hset(_KEY_PREFIX + plan_id, mapping=mapping)
+        pipe.expire(_KEY_PREFIX + plan_id, PLAN_STATUS_TTL_S)
+        pipe.execute()
+    except Exception:
+        logger.warning("plan status update failed for %s", plan_id, exc_info=True)
+
+
+@contextmanager
+def heartbeat(plan_id: Optional[str], interval_s: float = PLAN_STATUS_HEARTBEAT_S) -> Iterator[None]:
+    """
+    ブロックの実行中、interval_s ごとに updated_at を進める（LLM・TTS の長い呼び出しの間も
+    ゲートウェイに止まったと判定させない）。ワーカーが落ちれば止まる。
+    """
+    if not plan_id or interval_s <= 0:
+        yield
+        return
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(interval_s):
+            touch(plan_id)
+
+    t = threading.Thread(target=beat, name=f"plan-heartbeat-{plan_id}", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join()
+
+
+def stale_after_s() -> int:
+    """
+    ゲートウェイが止まったとみなすまでの秒数。1 回の下流呼び出しが最長で掛かりうる時間
+    （サービスごとのタイムアウトの最大）に、ハートビート 2 回分の余裕を足す。
+    """
+    return int(http_pool.max_timeout_s() + 2 * PLAN_STATUS_HEARTBEAT_S)
+
+
+def advance(plan_id: Optional[str], done: int = 1) -> None:
+    """ナレーション済みスポット数を done だけ進める。"""
+    if not plan_id:
+        return
+    key = _KEY_PREFIX + plan_id
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.hincrby(key, "done", done)
+        pipe.hset(key, mapping={"updated_at": int(time.time())})
+        pipe.hincrby(key, "rev", 1)
+        pipe.expire(key, PLAN_STATUS_TTL_S)
+        pipe.execute()
+    except Exception:
+        logger.warning("plan status update failed for %s", plan_id, exc_info=True)
+
+
+def fail(plan_id: Optional[str], error: BaseException) -> None:
+    update(plan_id, state="FAILURE", error=f"{type(error).__name__}: {error}")
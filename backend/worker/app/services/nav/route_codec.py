@@ -0,0 +1,72 @@
+# backend/worker/app/services/nav/route_codec.py
+"""
+プラン（manifest）のコンパクト表現（format = "compact-v1"）。
+
+- polyline は Google Encoded Polyline（精度 NAV_POLYLINE_PRECISION 桁、既定 6 = OSRM と同じ）
+  ※ 文字列内の座標順は Google 仕様どおり (lat, lon)。デコード後は [lon, lat] に戻す
+- segments は [mode, start_idx, end_idx] の配列だけ
+- route（FeatureCollection）は持たない。クライアントが polyline + segments から組み直す
+  （frontend/src/lib/planCodec.js の expandCompactPlan）
+- 他のキー（legs / waypoints_info / along_pois / assets など）はそのまま
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List
+
+import polyline as gpolyline
+
+COMPACT_FORMAT = "compact-v1"
+DEFAULT_PRECISION = int(os.getenv("NAV_POLYLINE_PRECISION", "6"))
+
+
+def encode_polyline(coords: List[List[float]], precision: int = DEFAULT_PRECISION) -> str:
+    """[[lon, lat], ...] → Google Encoded Polyline。"""
+    return gpolyline.encode([(float(c[0]), float(c[1])) for c in coords or []], precision, geojson=True)
+
+
+def decode_polyline(data: str, precision: int = DEFAULT_PRECISION) -> List[List[float]]:
+    """encode_polyline の逆変換（[[lon, lat], ...]）。"""
+    return [[lon, lat] for lon, lat in gpolyline.decode(data or "", precision, geojson=True)]
+
+
+def to_compact(manifest: Dict[str, Any], precision: int = DEFAULT_PRECISION) -> Dict[str, Any]:
+    """完全形の manifest / PlanResponse をコンパクト形にする。"""
+    out = {k: v for k, v in manifest.items() if k not in ("route", "polyline", "segments")}
+    coords = manifest.get("polyline") or []
+    out["format"] = COMPACT_FORMAT
+    out["polyline"] = {
+        "encoding": "google",
+        "precision": precision,
+        "len": len(coords),
+        "data": encode_polyline(coords, precision),
+    }
+    out["segments"] = [
+        [s.get("mode"), int(s.get("start_idx", 0)), int(s.get("end_idx", 0))]
+        for s in manifest.get("segments") or []
+    ]
+    return out
+
+
+def from_compact(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """to_compact の逆変換（route はセグメントごとの LineString で組み直す）。"""
+    if doc.get("format") != COMPACT_FORMAT:
+        return doc
+    enc = doc.get("polyline") or {}
+    coords = decode_polyline(enc.get("data", ""), int(enc.get("precision", DEFAULT_PRECISION)))
+    segments = [{"mode": m, "start_idx": s, "end_idx": e} for m, s, e in doc.get("segments") or []]
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"mode": seg["mode"]},
+            "geometry": {"type": "LineString", "coordinates": coords[seg["start_idx"]:seg["end_idx"] + 1]},
+        }
+        for seg in segments
+    ]
+    out = {k: v for k, v in doc.items() if k != "format"}
+    out.update(
+        polyline=coords,
+        segments=segments,
+        route={"type": "FeatureCollection", "features": features},
+    )
+    return out
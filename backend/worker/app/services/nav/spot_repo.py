@@ -1,11 +1,9 @@
 from __future__ import annotations
 
-import os
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Optional
 
-from sqlalchemy import create_engine, text, bindparam
-from sqlalchemy.engine import Engine, Result
+from backend.common.spot_catalog import get_catalog
 
 
 @dataclass
@@ -18,64 +16,32 @@ class SpotRow:
     lon: Optional[float] = None
 
 
-_engine: Engine | None = None
-
-
-def _conn_url() -> str:
-    host = os.getenv("STATIC_DB_HOST", "static-db")
-    port = os.getenv("STATIC_DB_PORT", "5432")
-    db = os.getenv("STATIC_DB_NAME", "static-db")
-    user = os.getenv("STATIC_DB_USER", "static-db")
-    pwd = os.getenv("STATIC_DB_PASSWORD", "static-db")
-    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-
-
-def _get_engine() -> Engine:
-    global _engine
-    if _engine is None:
-        _engine = create_engine(_conn_url(), future=True)
-    return _engine
-
-
 def get_spots_by_ids(ids: Iterable[str]) -> Dict[str, SpotRow]:
     """
-    spots テーブルから spot_id 群を引き、 {spot_id: SpotRow} を返す。
-    想定カラム: spot_id (PK), name, description, md_slug
+    spot_id 群を引き、 {spot_id: SpotRow} を返す（spots のみ。facilities は対象外）。
+    インメモリのスポットカタログから解決し、未登録 ID のみカタログ側で SQL を引く。
     """
     id_list = [str(i) for i in ids if i]
     if not id_list:
         return {}
 
-    sql = text(
-        """
-        SELECT
-        spot_id::text AS spot_id,
-        official_name->>'ja' AS name,
-        description,
-        md_slug,
-        ST_Y(geom) AS lat,
-        ST_X(geom) AS lon
-        FROM spots
-        WHERE spot_id IN :ids
-        """
-    ).bindparams(bindparam("ids", expanding=True))
-
     try:
-        eng = _get_engine()
-        with eng.connect() as conn:
-            rows: Result = conn.execute(sql, {"ids": id_list})
-            out: Dict[str, SpotRow] = {}
-            for r in rows.mappings():
-                out[r["spot_id"]] = SpotRow(
-                    spot_id=r["spot_id"],
-                    name=r.get("name"),
-                    description=r.get("description"),
-                    md_slug=r.get("md_slug"),
-                    lat=r["lat"],
-                    lon=r["lon"]
-                )
-            return out
+        entries = get_catalog().get_many(id_list)
     except Exception as e:
         print(f"Error fetching spots: {e}")
         # DB 未起動などでも nav は動かしたいので、空で返す
         return {}
+
+    out: Dict[str, SpotRow] = {}
+    for sid, e in entries.items():
+        if e.kind != "spot":
+            continue
+        out[sid] = SpotRow(
+            spot_id=e.spot_id,
+            name=e.name.get("ja"),
+            description=e.description,
+            md_slug=e.md_slug,
+            lat=e.lat,
+            lon=e.lon,
+        )
+    return out
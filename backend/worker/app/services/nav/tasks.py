@@ -3,14 +3,17 @@
 from __future__ import annotations
 
 import os
+import gzip
 import uuid
+import asyncio
 import json
 from pathlib import Path
 from datetime import datetime
+from contextlib import contextmanager
 from typing import List, Literal, Optional, Dict, Any, Tuple
 
 from pydantic import BaseModel, Field
-from celery import Celery
+from celery import Celery, chain, chord, group
 
 from shapely.geometry import Point, LineString
 from shapely.ops import transform
@@ -19,16 +22,53 @@ from pyproj import Transformer
 from backend.worker.app.services.nav.celery_app import celery_app
 
 # 各サービスを呼び出すためのHTTPクライアント
-from backend.worker.app.services.nav.client_routing import post_route
-from backend.worker.app.services.nav.client_alongpoi import post_along
-from backend.worker.app.services.nav.client_llm import post_describe # 修正したLLMクライアント
-from backend.worker.app.services.nav.client_voice import post_synthesize_and_save
+from backend.worker.app.services.nav.client_routing import post_route, apost_route
+from backend.worker.app.services.nav.client_alongpoi import post_along, apost_along
+from backend.worker.app.services.nav.client_llm import post_describe, apost_describe # 修正したLLMクライアント
+from backend.worker.app.services.nav.client_voice import post_synthesize_and_save, apost_synthesize_and_save, post_build_track
+from backend.worker.app.services.nav import http_pool
+from backend.worker.app.services.nav import plan_status
+from backend.worker.app.services.nav import route_codec
+from backend.worker.app.services.nav import pack_bundle
+from backend.common import geofence
 
 from backend.worker.app.services.nav.spot_repo import get_spots_by_ids
 
 import logging
 logger = logging.getLogger(__name__)
 
+# 1 を指定すると、共有イベントループ＋AsyncClient プールでプランを実行する
+# （threads プールの多数スロットで、I/O 待ちのプランを 1 プロセスで並行させる）
+NAV_ASYNC = os.getenv("NAV_ASYNC", "0") == "1"
+
+# 1 を指定すると、nav.plan はステージ別タスク（専用キュー）のチェイン/コードに置き換わる
+NAV_STAGED = os.getenv("NAV_STAGED", "0") == "1"
+
+# 1 を指定すると、タスク結果（Celery の result backend）には pack_id などの参照だけを残し、
+# プラン本体は manifest.json（＋事前圧縮版）としてゲートウェイがディスクから返す
+NAV_RESULT_BY_REF = os.getenv("NAV_RESULT_BY_REF", "0") == "1"
+
+# 1 を指定すると、スポット別の音声をルート順に 1 本へまとめたトラック（章表付き）も作る
+NAV_NARRATION_TRACK = os.getenv("NAV_NARRATION_TRACK", "0") == "1"
+
+# NAV_STAGED の describe ステージで 1 回の LLM 呼び出しにまとめるスポット数（0 以下ならプラン全体を 1 回）
+NAV_DESCRIBE_BATCH = int(os.getenv("NAV_DESCRIBE_BATCH", "20"))
+
+try:  # 任意依存（無ければ gzip のみ事前圧縮）
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:  # 任意依存（無ければ MessagePack / CBOR 版は作らない）
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
 # =================================================================
 # ==== Schemas (スキーマ定義) - 変更なし ====
 # =================================================================
@@ -139,7 +179,7 @@ def _normalize_assets(voice_results: list[dict], llm_items: list[dict]) -> list[
         sid = vr.get("spot_id")
         if not sid: continue
         # Voiceサービスのレスポンスキー名に合わせる
-        assets.append({
+        asset = {
             "spot_id": sid,
             "text": text_by_spot.get(sid, ""),
             "audio_url": vr.get("audio_url"),
@@ -147,7 +187,16 @@ def _normalize_assets(voice_results: list[dict], llm_items: list[dict]) -> list[
             "bytes": vr.get("bytes"),
             "duration_s": vr.get("duration_s"),
             "format": vr.get("format"),
-        })
+        }
+        # ゲートウェイの Asset と同じ新形（audio）も付けておく（manifest をそのまま返せるように）
+        if asset["audio_url"] and asset["bytes"] is not None and asset["duration_s"] is not None and asset["format"]:
+            asset["audio"] = {
+                "url": asset["audio_url"],
+                "size_bytes": asset["bytes"],
+                "duration_sec": asset["duration_s"],
+                "format": asset["format"] if asset["format"] in ("mp3", "wav") else "mp3",
+            }
+        assets.append(asset)
     audio_spot_ids = {a["spot_id"] for a in assets}
     for item in (llm_items or []):
         sid = item.get("spot_id")
@@ -163,27 +212,116 @@ def _normalize_assets(voice_results: list[dict], llm_items: list[dict]) -> list[
             })
     return assets
 
-def _write_manifest(pack_id: str, language: str, route_fc: dict, polyline: list, segments: list, legs: list, waypoints_info: list, along_pois: list, assets: list) -> None:
+def _write_bytes_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _write_precompressed(path: Path, body: bytes) -> None:
+    """.gz / .br を先に置き、本体を最後に差し替える。"""
+    _write_bytes_atomic(path.with_name(path.name + ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_bytes_atomic(path.with_name(path.name + ".br"), brotli.compress(body, quality=11))
+    _write_bytes_atomic(path, body)
+
+def _write_manifest(pack_id: str, language: str, route_fc: dict, polyline: list, segments: list, legs: list, waypoints_info: list, along_pois: list, assets: list, strict: bool = False, geofence_index: Optional[dict] = None, narration_track: Optional[dict] = None) -> None:
+    """
+    manifest.json を書く。PlanResponse の全キー（polyline / manifest_url を含む）を持つので、
+    ゲートウェイはこのファイルをそのままプラン本体として返せる。
+    事前圧縮版（.gz / .br）を先に置き、manifest.json を最後に差し替える。
+    併せてコンパクト形（route_codec）の manifest.compact.json（＋圧縮版・msgpack / cbor）も書く。
+    strict=True（結果参照モード）では書き込み失敗を例外にする。
+    geofence_index を省略すると、ここで距離程の発火索引（geofence.build_index）を作る。
+    """
     root = Path(os.getenv("PACKS_ROOT") or "/packs")
     pack_dir = root / pack_id
     try:
         pack_dir.mkdir(parents=True, exist_ok=True)
         manifest = {
             "pack_id": pack_id, "language": language, "generated_at": datetime.utcnow().isoformat() + "Z",
-            "route": route_fc, "polyline_len": len(polyline or []), "segments": segments,
+            "route": route_fc, "polyline": polyline, "polyline_len": len(polyline or []), "segments": segments,
             "legs": legs, 
             "waypoints_info": waypoints_info,
             "along_pois": along_pois, 
             "assets": assets,
+            "manifest_url": f"/packs/{pack_id}/manifest.json",
+            "bundle_url": _bundle_url(pack_id),  # bundle.bin はプラン完了後に別タスクで作る（出来たら書き直す）
+            "geofence": geofence_index if geofence_index is not None else geofence.build_index(polyline, segments, waypoints_info, along_pois),
+            "narration_track": narration_track,
         }
-        p = pack_dir / "manifest.json"
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(manifest, f, ensure_ascii=False, indent=2)
-            f.flush()
-            os.fsync(f.fileno())
-        logger.info("NAV wrote manifest: %s", str(p))
+        _write_manifest_files(pack_dir, manifest)
     except Exception:
         logger.exception("NAV failed to write manifest.json for pack_id=%s", pack_id)
+        if strict:
+            raise
+
+def _write_manifest_files(pack_dir: Path, manifest: dict) -> None:
+    """manifest（完全形）から manifest.json とコンパクト形の各版を書く。"""
+    compact = route_codec.to_compact(manifest)
+    if msgpack is not None:
+        _write_bytes_atomic(pack_dir / "manifest.compact.msgpack", msgpack.packb(compact, use_bin_type=True))
+    if cbor2 is not None:
+        _write_bytes_atomic(pack_dir / "manifest.compact.cbor", cbor2.dumps(compact))
+    _write_precompressed(
+        pack_dir / "manifest.compact.json",
+        json.dumps(compact, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    )
+    p = pack_dir / "manifest.json"
+    _write_precompressed(p, json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    logger.info("NAV wrote manifest: %s", str(p))
+
+def _build_narration_track(pack_id: str, language: str, assets: list, geofence_index: dict, guide_pois: list) -> Optional[dict]:
+    """
+    音声のあるスポットをルート順（発火索引の距離程順 → 残りはガイド POI の順）に並べ、
+    voice サービスで 1 本のトラックにまとめる。失敗してもプランは返す（None）。
+    """
+    if not NAV_NARRATION_TRACK:
+        return None
+    with_audio = {a["spot_id"] for a in assets if a.get("audio_url")}
+    ordered = [t["spot_id"] for t in sorted(geofence_index.get("triggers") or [], key=lambda t: t["chainage_m"])]
+    ordered += [p.get("spot_id") for p in guide_pois] + [a["spot_id"] for a in assets]
+    spot_ids = list(dict.fromkeys(sid for sid in ordered if sid in with_audio))
+    if not spot_ids:
+        return None
+    try:
+        return post_build_track({
+            "pack_id": pack_id,
+            "language": language,
+            "spot_ids": spot_ids,
+            "format": os.getenv("VOICE_FORMAT", "mp3"),
+        })
+    except Exception:
+        logger.exception("NAV failed to build narration track for pack_id=%s", pack_id)
+        return None
+
+def _bundle_url(pack_id: str) -> Optional[str]:
+    """bundle.bin が実在するときだけその URL（無いものを案内してクライアントに 404 を踏ませない）。"""
+    path = Path(os.getenv("PACKS_ROOT") or "/packs") / pack_id / pack_bundle.BUNDLE_NAME
+    return f"/packs/{pack_id}/{pack_bundle.BUNDLE_NAME}" if path.is_file() else None
+
+def _bundle_assets(manifest: dict) -> list:
+    """一括ファイルに入れる音声・テキスト。トラックがあればスポット別の音声ではなくトラックを入れる（同じ音声を二重に運ばない）。"""
+    assets = manifest.get("assets") or []
+    track = manifest.get("narration_track")
+    if not track:
+        return assets
+    return [{"audio_url": track["url"]}] + [{"text_url": a.get("text_url")} for a in assets]
+
+
+def _enqueue_bundle(pack_id: str) -> None:
+    """
+    プラン完了（SUCCESS）後に bundle.bin を別タスク（nav_bundle キュー）で作らせる。
+    タイル取得（最大 PACK_TILE_MAX 件）をプランの応答時間に含めないため。投入に失敗してもプランは返す。
+    """
+    if not pack_bundle.NAV_PACK_BUNDLE:
+        return
+    try:
+        build_pack_bundle.delay(pack_id)
+    except Exception:
+        logger.exception("NAV failed to enqueue bundle for pack_id=%s", pack_id)
 
 def _proj() -> Transformer:
     return Transformer.from_crs(4326, 3857, always_xy=True)
@@ -244,78 +382,37 @@ def _reduce_hits_to_along_pois_local(hits: List[Dict], polyline: List[List[float
     return out
 
 # =================================================================
-# ==== Main Workflow Task (単一タスクにリファクタリング) ====
+# ==== Workflow Steps (同期/非同期で共通の組み立て) ====
 # =================================================================
-@celery_app.task(name="nav.plan", bind=True)
-def plan_workflow(self, payload: Dict[str, Any]) -> dict:
-    """
-    ナビゲーションプランを作成する単一のワークフロータスク。
-    Routing -> AlongPOI -> LLM -> Voice の順で各サービスを呼び出す。
-    """
-    pack_id = str(uuid.uuid4())
-    payload["pack_id"] = pack_id
-    req = PlanRequest(**payload)
-    logger.info(f"[{self.request.id}] Workflow started for pack_id: {pack_id}")
-
-    # --- 1. Routing Service ---
-    logger.info("Step 1: Calling Routing service...")
-    routing_req = {
+def _routing_request(req: PlanRequest) -> dict:
+    return {
         "origin": req.origin.model_dump(),
         "waypoints": [w.model_dump() for w in req.waypoints],
         "car_to_trailhead": True
     }
-    routing_result = post_route(routing_req)
-    logger.info("Routing service returned.")
-    logger.debug(f"Legs data received from routing: {json.dumps(routing_result.get('legs', []), ensure_ascii=False)}")
 
-    # --- 2. AlongPOI Service ---
-    logger.info("Step 2: Calling AlongPOI service...")
-    waypoint_ids = [w.spot_id for w in req.waypoints if w.spot_id and w.spot_id != "current"]
-    waypoint_id_set = set(waypoint_ids)
-    along_req = {
+def _along_request(req: PlanRequest, routing_result: dict) -> dict:
+    return {
         "polyline": routing_result["polyline"],
         "segments": routing_result.get("segments", []),
         "buffer": req.buffer,
-        "waypoints": waypoint_ids
+        "waypoints": [w.spot_id for w in req.waypoints if w.spot_id and w.spot_id != "current"]
     }
-    along_result = post_along(along_req)
-    along_pois = along_result.get("pois", [])
-    logger.info(f"AlongPOI service returned {len(along_pois)} POIs.")
-
-    # --- 3. LLM Service ---
-    logger.info("Step 3: Calling LLM service...")
-    uniq_ids = _collect_unique_spot_ids(req.waypoints, along_pois)
-    spot_refs = _build_spot_refs(uniq_ids, req.language)
 
-    llm_items = []
-    if spot_refs:
-        llm_req = {"language": req.language, "style": "narration", "spots": spot_refs}
-        llm_result = post_describe(llm_req) # FastAPIエンドポイントを呼び出す
-        llm_items = llm_result.get("items", [])
-        logger.info(f"LLM service returned {len(llm_items)} descriptions.")
-    else:
-        logger.info("No spots to describe, skipping LLM service.")
-
-    # --- 4. Voice Service ---
-    logger.info("Step 4: Calling Voice service...")
-    voice_results = []
-    if llm_items:
-        voice_req = {
-            "pack_id": pack_id,
-            "language": req.language,
-            "items": llm_items, # LLMの結果をそのまま渡す
-            "preferred_format": os.getenv("VOICE_FORMAT", "mp3"),
-            "bitrate_kbps": int(os.getenv("VOICE_BITRATE_KBPS", "64")),
-            "save_text": (os.getenv("VOICE_SAVE_TEXT", "1") == "1"),
-        }
-        voice_result = post_synthesize_and_save(voice_req)
-        voice_results = voice_result.get("items", [])
-        logger.info(f"Voice service synthesized {len(voice_results)} audio files.")
-    else:
-        logger.info("No text to synthesize, skipping Voice service.")
+def _voice_request(pack_id: str, language: str, llm_items: list) -> dict:
+    return {
+        "pack_id": pack_id,
+        "language": language,
+        "items": llm_items, # LLMの結果をそのまま渡す
+        "preferred_format": os.getenv("VOICE_FORMAT", "mp3"),
+        "bitrate_kbps": int(os.getenv("VOICE_BITRATE_KBPS", "64")),
+        "save_text": (os.getenv("VOICE_SAVE_TEXT", "1") == "1"),
+    }
 
-    # --- 5. Finalize & Create Response ---
+def _finalize(pack_id: str, req: PlanRequest, routing_result: dict, along_pois: list,
+              spot_refs: list, llm_items: list, voice_results: list) -> dict:
     logger.info("Step 5: Finalizing the plan...")
+    waypoint_id_set = {w.spot_id for w in req.waypoints if w.spot_id and w.spot_id != "current"}
     polyline = routing_result["polyline"]
     raw_legs = routing_result.get("legs", [])
     logger.debug(f"Legs data just before normalization: {json.dumps(raw_legs, ensure_ascii=False)}")
@@ -326,7 +423,10 @@ def plan_workflow(self, payload: Dict[str, Any]) -> dict:
     assets = _normalize_assets(voice_results, llm_items)
 
     # (A) 全ガイド対象(spot_refs [lon/latキーを含む])から、Waypointのデータのみを抽出
-    waypoint_spot_data = [s for s in spot_refs if s['spot_id'] in waypoint_id_set]
+    #     geofence は waypoint を訪問順に射影するので、リクエストの順に並べる
+    visit_order = {w.spot_id: i for i, w in reversed(list(enumerate(req.waypoints)))}
+    waypoint_spot_data = sorted((s for s in spot_refs if s['spot_id'] in waypoint_id_set),
+                                key=lambda s: visit_order[s['spot_id']])
     
     # (B) (修正点3で)ローカルにコピーしたReducerを使い、Waypointリスト [A, B, C] にルート計算情報を付与
     #     これには lon/lat が含まれているため、KeyErrorは発生しない
@@ -337,15 +437,28 @@ def plan_workflow(self, payload: Dict[str, Any]) -> dict:
     #     ルート順 (nearest_idx) にソートする
     manifest_guide_pois.sort(key=lambda p: p.get("nearest_idx", p.get("leg_index", 0)))
 
+    # (D) 距離程の発火索引（クライアントは現在地の距離程を二分探索して語りを始める）
+    geofence_index = geofence.build_index(polyline, routing_result["segments"], waypoints_info, along_pois)
+
+    # (E) 任意: 全ナレーションを 1 本にまとめたトラックと章表
+    narration_track = _build_narration_track(pack_id, req.language, assets, geofence_index, manifest_guide_pois)
+
     _write_manifest(
         pack_id, req.language, routing_result["feature_collection"],
         polyline, routing_result["segments"], legs, 
         waypoints_info,  # マニフェスト引数 (修正点6,7)
         along_pois,
-        assets
+        assets,
+        strict=NAV_RESULT_BY_REF,
+        geofence_index=geofence_index,
+        narration_track=narration_track,
     )
 
-    response = {
+    if NAV_RESULT_BY_REF:
+        # 本体は manifest.json。result backend には参照だけを残す
+        return _result_ref(pack_id)
+
+    return {
         "pack_id": pack_id,
         "route": routing_result["feature_collection"],
         "polyline": polyline,
@@ -356,7 +469,264 @@ def plan_workflow(self, payload: Dict[str, Any]) -> dict:
         "assets": assets,
         "language": req.language,
         "manifest_url": f"/packs/{pack_id}/manifest.json",
+        "bundle_url": _bundle_url(pack_id),
+        "geofence": geofence_index,
+        "narration_track": narration_track,
     }
-    
+
+@contextmanager
+def _tracked(plan_id: Optional[str]):
+    """ブロック内の例外をプラン状態（FAILURE）に記録して再送出する。"""
+    try:
+        yield
+    except Exception as e:
+        plan_status.fail(plan_id, e)
+        raise
+
+def _result_ref(pack_id: str) -> dict:
+    return {"pack_id": pack_id, "result_by_ref": True, "manifest_url": f"/packs/{pack_id}/manifest.json"}
+
+def _plan_sync(req: PlanRequest, pack_id: str, plan_id: Optional[str] = None) -> dict:
+    # --- 1. Routing Service ---
+    logger.info("Step 1: Calling Routing service...")
+    routing_result = post_route(_routing_request(req))
+    logger.info("Routing service returned.")
+    logger.debug(f"Legs data received from routing: {json.dumps(routing_result.get('legs', []), ensure_ascii=False)}")
+    plan_status.update(plan_id, stage="along")
+
+    # --- 2. AlongPOI Service ---
+    logger.info("Step 2: Calling AlongPOI service...")
+    along_result = post_along(_along_request(req, routing_result))
+    along_pois = along_result.get("pois", [])
+    logger.info(f"AlongPOI service returned {len(along_pois)} POIs.")
+
+    # --- 3. LLM Service ---
+    logger.info("Step 3: Calling LLM service...")
+    uniq_ids = _collect_unique_spot_ids(req.waypoints, along_pois)
+    spot_refs = _build_spot_refs(uniq_ids, req.language)
+    plan_status.update(plan_id, stage="narrate", total=len(spot_refs))
+
+    llm_items = []
+    if spot_refs:
+        llm_req = {"language": req.language, "style": "narration", "spots": spot_refs}
+        llm_result = post_describe(llm_req) # FastAPIエンドポイントを呼び出す
+        llm_items = llm_result.get("items", [])
+        logger.info(f"LLM service returned {len(llm_items)} descriptions.")
+    else:
+        logger.info("No spots to describe, skipping LLM service.")
+
+    # --- 4. Voice Service ---
+    logger.info("Step 4: Calling Voice service...")
+    voice_results = []
+    if llm_items:
+        voice_result = post_synthesize_and_save(_voice_request(pack_id, req.language, llm_items))
+        voice_results = voice_result.get("items", [])
+        logger.info(f"Voice service synthesized {len(voice_results)} audio files.")
+    else:
+        logger.info("No text to synthesize, skipping Voice service.")
+
+    # --- 5. Finalize & Create Response ---
+    plan_status.update(plan_id, stage="finalize", done=len(spot_refs))
+    return _finalize(pack_id, req, routing_result, along_pois, spot_refs, llm_items, voice_results)
+
+async def _plan_async(req: PlanRequest, pack_id: str, plan_id: Optional[str] = None) -> dict:
+    """
+    _plan_sync と同じ手順を、共有ループ上で非同期に実行する。
+    DB 参照・マニフェスト書き込みなどのブロッキング処理はスレッドに逃がす。
+    """
+    logger.info("Step 1: Calling Routing service (async)...")
+    routing_result = await apost_route(_routing_request(req))
+    await asyncio.to_thread(plan_status.update, plan_id, stage="along")
+
+    logger.info("Step 2: Calling AlongPOI service (async)...")
+    along_result = await apost_along(_along_request(req, routing_result))
+    along_pois = along_result.get("pois", [])
+    logger.info(f"AlongPOI service returned {len(along_pois)} POIs.")
+
+    logger.info("Step 3: Calling LLM service (async)...")
+    uniq_ids = _collect_unique_spot_ids(req.waypoints, along_pois)
+    spot_refs = await asyncio.to_thread(_build_spot_refs, uniq_ids, req.language)
+    await asyncio.to_thread(plan_status.update, plan_id, stage="narrate", total=len(spot_refs))
+
+    llm_items = []
+    if spot_refs:
+        llm_result = await apost_describe({"language": req.language, "style": "narration", "spots": spot_refs})
+        llm_items = llm_result.get("items", [])
+        logger.info(f"LLM service returned {len(llm_items)} descriptions.")
+
+    logger.info("Step 4: Calling Voice service (async)...")
+    voice_results = []
+    if llm_items:
+        voice_result = await apost_synthesize_and_save(_voice_request(pack_id, req.language, llm_items))
+        voice_results = voice_result.get("items", [])
+        logger.info(f"Voice service synthesized {len(voice_results)} audio files.")
+
+    await asyncio.to_thread(plan_status.update, plan_id, stage="finalize", done=len(spot_refs))
+    return await asyncio.to_thread(
+        _finalize, pack_id, req, routing_result, along_pois, spot_refs, llm_items, voice_results
+    )
+
+# =================================================================
+# ==== Main Workflow Task (単一タスクにリファクタリング) ====
+# =================================================================
+@celery_app.task(name="nav.plan", bind=True)
+def plan_workflow(self, payload: Dict[str, Any]) -> dict:
+    """
+    ナビゲーションプランを作成する単一のワークフロータスク。
+    Routing -> AlongPOI -> LLM -> Voice の順で各サービスを呼び出す。
+    NAV_ASYNC=1 のときは共有イベントループ上で実行し、このスロットは結果を待つだけになる。
+    NAV_STAGED=1 のときはステージ別タスクに置き換え（replace）、このタスク ID で
+    最終（nav.step.finalize）の結果を参照できるようにする。
+    """
+    plan_id = self.request.id
+    # 入力検証も含めて _tracked の中で行う（最初の状態更新より前に落ちても FAILURE が残るように）
+    with _tracked(plan_id):
+        pack_id = str(uuid.uuid4())
+        payload["pack_id"] = pack_id
+        req = PlanRequest(**payload)
+        logger.info(f"[{self.request.id}] Workflow started for pack_id: {pack_id}")
+        # replace 後も最終結果はこのタスク ID に保存される
+        # NAV_STAGED では最初のステージがキューで待つので queued=1 から始める
+        plan_status.update(plan_id, state="STARTED", stage="route", pack_id=pack_id,
+                           result_ref=plan_id, done=0, total=0,
+                           stale_after_s=plan_status.stale_after_s(), queued=int(NAV_STAGED))
+
+        if NAV_STAGED:
+            ctx = {"pack_id": pack_id, "plan_id": plan_id, "request": req.model_dump(by_alias=True)}
+            staged = chain(step_route.s(ctx), step_along.s())
+        else:
+            with plan_status.heartbeat(plan_id):
+                if NAV_ASYNC:
+                    response = http_pool.run_coroutine(_plan_async(req, pack_id, plan_id))
+                else:
+                    response = _plan_sync(req, pack_id, plan_id)
+    if NAV_STAGED:
+        # replace は Ignore を送出して終わるので _tracked の外で呼ぶ
+        return self.replace(staged)
+    plan_status.update(plan_id, state="SUCCESS", stage="done")
+    _enqueue_bundle(pack_id)
+
     logger.info(f"[{self.request.id}] Workflow finished successfully for pack_id: {pack_id}")
-    return response
\ No newline at end of file
+    return response
+
+
+# =================================================================
+# ==== Stage Tasks (NAV_STAGED=1: ステージごとの専用キュー) ====
+# =================================================================
+# route → along → describe（プラン単位）→ synthesize_spot × スポット数（chord）→ finalize
+# ステージ間は ctx（pack_id / request / 途中結果）を受け渡す。
+# LLM はプロンプトの共通部分が大きいので、スポットごとではなく NAV_DESCRIBE_BATCH 件ずつまとめて呼ぶ。
+# TTS は 1 スポット単位のタスクなので、nav_synthesize のワーカー数で独立に捌ける。
+# 各ステージは実行中だけ queued=0 にしてハートビートを打ち、次のステージへ渡すときに queued=1 に戻す
+# （キューで待っている間はゲートウェイに止まったと判定させない）。synthesize_spot の chord は
+# 一部が待ち・一部が実行中になるので、finalize が始まるまで queued=1 のままにする。
+def _ctx_request(ctx: Dict[str, Any]) -> PlanRequest:
+    return PlanRequest(**ctx["request"])
+
+@celery_app.task(name="nav.step.route")
+def step_route(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    req = _ctx_request(ctx)
+    logger.info("Step 1: Calling Routing service (pack_id=%s)...", ctx["pack_id"])
+    plan_status.touch(ctx.get("plan_id"), queued=0)
+    with _tracked(ctx.get("plan_id")), plan_status.heartbeat(ctx.get("plan_id")):
+        routing_result = post_route(_routing_request(req))
+    plan_status.update(ctx.get("plan_id"), stage="along", queued=1)
+    return {**ctx, "routing_result": routing_result}
+
+@celery_app.task(name="nav.step.along", bind=True)
+def step_along(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    req = _ctx_request(ctx)
+    logger.info("Step 2: Calling AlongPOI service (pack_id=%s)...", ctx["pack_id"])
+    plan_id = ctx.get("plan_id")
+    plan_status.touch(plan_id, queued=0)
+    with _tracked(plan_id), plan_status.heartbeat(plan_id):
+        along_result = post_along(_along_request(req, ctx["routing_result"]))
+        along_pois = along_result.get("pois", [])
+        uniq_ids = _collect_unique_spot_ids(req.waypoints, along_pois)
+        spot_refs = _build_spot_refs(uniq_ids, req.language)
+    ctx = {**ctx, "along_pois": along_pois, "spot_refs": spot_refs}
+    plan_status.update(plan_id, stage="narrate" if spot_refs else "finalize", total=len(spot_refs), queued=1)
+
+    if not spot_refs:
+        return self.replace(step_finalize.s([], ctx))
+    return self.replace(step_describe.s(ctx))
+
+@celery_app.task(name="nav.step.describe", bind=True)
+def step_describe(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    プランの全スポットの説明文を NAV_DESCRIBE_BATCH 件ずつまとめて LLM に頼み、
+    スポットごとの synthesize を並べ、全件揃ったら finalize（chord）に置き換える。
+    """
+    req = _ctx_request(ctx)
+    plan_id = ctx.get("plan_id")
+    spot_refs = ctx.get("spot_refs", [])
+    size = NAV_DESCRIBE_BATCH if NAV_DESCRIBE_BATCH > 0 else max(1, len(spot_refs))
+    llm_items: List[dict] = []
+    plan_status.touch(plan_id, queued=0)
+    with _tracked(plan_id), plan_status.heartbeat(plan_id):
+        for i in range(0, len(spot_refs), size):
+            llm_result = post_describe({"language": req.language, "style": "narration", "spots": spot_refs[i:i + size]})
+            llm_items.extend(llm_result.get("items", []))
+    logger.info("LLM service returned %d descriptions in %d call(s).", len(llm_items), -(-len(spot_refs) // size))
+    # 説明文が返らなかったスポットは合成しないので、ここで進捗を進めておく
+    if len(spot_refs) > len(llm_items):
+        plan_status.advance(plan_id, len(spot_refs) - len(llm_items))
+    plan_status.touch(plan_id, queued=1)
+    if not llm_items:
+        return self.replace(step_finalize.s([], ctx))
+    per_spot = [step_synthesize_spot.s(item, ctx["pack_id"], req.language, plan_id) for item in llm_items]
+    return self.replace(chord(group(per_spot), step_finalize.s(ctx)))
+
+@celery_app.task(name="nav.step.synthesize_spot")
+def step_synthesize_spot(llm_item: Optional[dict], pack_id: str, language: str, plan_id: Optional[str] = None) -> dict:
+    if not llm_item:
+        plan_status.advance(plan_id)
+        return {"llm": None, "voice": None}
+    with _tracked(plan_id):
+        voice_result = post_synthesize_and_save(_voice_request(pack_id, language, [llm_item]))
+    plan_status.advance(plan_id)
+    items = voice_result.get("items", [])
+    return {"llm": llm_item, "voice": items[0] if items else None}
+
+@celery_app.task(name="nav.step.finalize")
+def step_finalize(spot_results: List[dict], ctx: Dict[str, Any]) -> dict:
+    req = _ctx_request(ctx)
+    llm_items = [r["llm"] for r in (spot_results or []) if r and r.get("llm")]
+    voice_results = [r["voice"] for r in (spot_results or []) if r and r.get("voice")]
+    plan_id = ctx.get("plan_id")
+    plan_status.update(plan_id, stage="finalize", queued=0)
+    with _tracked(plan_id), plan_status.heartbeat(plan_id):
+        response = _finalize(
+            ctx["pack_id"], req, ctx["routing_result"], ctx.get("along_pois", []),
+            ctx.get("spot_refs", []), llm_items, voice_results,
+        )
+    plan_status.update(plan_id, state="SUCCESS", stage="done")
+    _enqueue_bundle(ctx["pack_id"])
+    return response
+
+
+# =================================================================
+# ==== Follow-on Task (プラン完了後のオフライン用一括ファイル) ====
+# =================================================================
+@celery_app.task(name="nav.pack.bundle")
+def build_pack_bundle(pack_id: str) -> Optional[str]:
+    """
+    書き出し済みの manifest.json から bundle.bin（manifest・音声・回廊タイル）を作り、
+    出来たら manifest の bundle_url を埋めて書き直す。クライアントは manifest を取り直して気付く。
+    """
+    pack_dir = Path(os.getenv("PACKS_ROOT") or "/packs") / pack_id
+    try:
+        manifest = json.loads((pack_dir / "manifest.json").read_bytes())
+    except (OSError, ValueError):
+        logger.exception("NAV bundle skipped: manifest.json unreadable for pack_id=%s", pack_id)
+        return None
+    try:
+        out = pack_bundle.write_bundle(pack_id, manifest.get("polyline") or [], _bundle_assets(manifest))
+    except Exception:
+        logger.exception("NAV failed to write bundle for pack_id=%s", pack_id)
+        return None
+    if out is None:
+        return None
+    manifest["bundle_url"] = _bundle_url(pack_id)
+    _write_manifest_files(pack_dir, manifest)
+    return manifest["bundle_url"]
@@ -0,0 +1,307 @@
+"""
+access_points のインメモリ索引（DB 往復なしで最寄り AP を引く）。
+
+- 任意座標: access_points 全件から組んだ 2 次元 KD-tree で k 近傍
+- カタログ上のスポット: init_static_db.py が事前計算した spot_access_points
+  （徒歩ルート距離つきの k 近傍）を「実際に歩く距離が短い順」で保持
+- 同じく事前計算した spot_car_access（車道網へのスナップ距離）から、
+  車で直接到達できないスポットを判定する
+- static_data_version が変わったら読み直す（spot_catalog と同じ方式）
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from backend.common import static_db
+from backend.common.spot_catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_S = float(os.getenv("ACCESS_POINT_INDEX_REFRESH_S", "60"))
+# 初回ロードに失敗したとき、次に DB を試すまでの間隔（リクエスト毎の再接続を避ける）
+RETRY_INTERVAL_S = float(os.getenv("ACCESS_POINT_INDEX_RETRY_S", "5"))
+_EARTH_R = 6371000.0
+
+
+@dataclass(frozen=True, slots=True)
+class IndexedAccessPoint:
+    id: int
+    lat: float
+    lon: float
+    name: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SpotAccessCandidate:
+    access_point: IndexedAccessPoint
+    straight_m: float
+    foot_distance_m: Optional[float] = None
+    foot_duration_s: Optional[float] = None
+
+
+def _coord_key(lat: float, lon: float) -> Tuple[float, float]:
+    # カタログ座標との突き合わせ用（~10cm 精度）
+    return (round(float(lat), 6), round(float(lon), 6))
+
+
+# -------------------------
+# KD-tree（2 次元・局所正距円筒図法でメートル換算）
+# -------------------------
+class _KDTree:
+    __slots__ = ("_nodes", "_root", "_cos0")
+
+    def __init__(self, points: List[IndexedAccessPoint]):
+        lat0 = sum(p.lat for p in points) / len(points) if points else 0.0
+        self._cos0 = math.cos(math.radians(lat0))
+        items = [(self._xy(p.lat, p.lon), p) for p in points]
+        # node: (xy, point, axis, left, right)
+        self._nodes: List[tuple] = []
+        self._root = self._build(items, 0)
+
+    def _xy(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (
+            _EARTH_R * math.radians(lon) * self._cos0,
+            _EARTH_R * math.radians(lat),
+        )
+
+    def _build(self, items: list, depth: int) -> int:
+        if not items:
+            return -1
+        axis = depth % 2
+        items.sort(key=lambda it: it[0][axis])
+        mid = len(items) // 2
+        idx = len(self._nodes)
+        self._nodes.append(None)  # 予約
+        left = self._build(items[:mid], depth + 1)
+        right = self._build(items[mid + 1:], depth + 1)
+        self._nodes[idx] = (items[mid][0], items[mid][1], axis, left, right)
+        return idx
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[float, IndexedAccessPoint]]:
+        """(概算距離[m], AP) を近い順に最大 k 件。"""
+        if self._root < 0 or k <= 0:
+            return []
+        q = self._xy(lat, lon)
+        heap: List[Tuple[float, int]] = []  # (-d2, node_idx) の max-heap
+        stack = [self._root]
+        while stack:
+            ni = stack.pop()
+            if ni < 0:
+                continue
+            xy, _, axis, left, right = self._nodes[ni]
+            d2 = (xy[0] - q[0]) ** 2 + (xy[1] - q[1]) ** 2
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, ni))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, ni))
+            diff = q[axis] - xy[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # 反対側は分割面までの距離が現在の k 番目より近い場合のみ探索
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                stack.append(far)
+            stack.append(near)
+        out = sorted((-nd2, ni) for nd2, ni in heap)
+        return [(math.sqrt(d2), self._nodes[ni][1]) for d2, ni in out]
+
+
+# -------------------------
+# SQL
+# -------------------------
+_SQL_ACCESS_POINTS = text(
+    """
+    SELECT id, name, ST_Y(geom)::float AS lat, ST_X(geom)::float AS lon
+    FROM access_points
+    """
+)
+
+_SQL_SPOT_ACCESS_POINTS = text(
+    """
+    SELECT spot_id, access_point_id, straight_m, foot_distance_m, foot_duration_s
+    FROM spot_access_points
+    ORDER BY spot_id, rank
+    """
+)
+
+_SQL_SPOT_CAR_ACCESS = text(
+    """
+    SELECT spot_id, car_reachable
+    FROM spot_car_access
+    """
+)
+
+
+def _fetch_access_points() -> List[IndexedAccessPoint]:
+    with static_db.get_engine().connect() as conn:
+        rows = conn.execute(_SQL_ACCESS_POINTS).mappings().all()
+    return [IndexedAccessPoint(id=int(r["id"]), lat=float(r["lat"]), lon=float(r["lon"]), name=r["name"]) for r in rows]
+
+
+def _fetch_spot_access_rows() -> List[dict]:
+    """事前計算テーブルが無い（未計算）場合は空。"""
+    try:
+        with static_db.get_engine().connect() as conn:
+            return [dict(r) for r in conn.execute(_SQL_SPOT_ACCESS_POINTS).mappings().all()]
+    except Exception:
+        logger.warning("spot_access_points is not available; using KD-tree only")
+        return []
+
+
+def _fetch_spot_car_access() -> Dict[str, bool]:
+    """事前計算テーブルが無い（未計算）場合は空（= 全スポットで car 直行を試す）。"""
+    try:
+        with static_db.get_engine().connect() as conn:
+            rows = conn.execute(_SQL_SPOT_CAR_ACCESS).mappings().all()
+        return {r["spot_id"]: bool(r["car_reachable"]) for r in rows}
+    except Exception:
+        logger.warning("spot_car_access is not available; car reachability is unknown")
+        return {}
+
+
+def _fetch_spot_coords() -> Dict[Tuple[float, float], str]:
+    return {_coord_key(e.lat, e.lon): e.spot_id for e in get_catalog().all()}
+
+
+# -------------------------
+# 索引本体
+# -------------------------
+class AccessPointIndex:
+    def __init__(self, refresh_interval_s: float = REFRESH_INTERVAL_S):
+        self.refresh_interval_s = refresh_interval_s
+        self._tree = _KDTree([])
+        self._by_spot: Dict[str, List[SpotAccessCandidate]] = {}
+        self._spot_at: Dict[Tuple[float, float], str] = {}
+        self._car_reachable: Dict[str, bool] = {}
+        self._size = 0
+        self._version: Optional[int] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def reload(self) -> None:
+        version = static_db.fetch_data_version()
+        aps = _fetch_access_points()
+        by_id = {ap.id: ap for ap in aps}
+
+        by_spot: Dict[str, List[SpotAccessCandidate]] = {}
+        for r in _fetch_spot_access_rows():
+            ap = by_id.get(int(r["access_point_id"]))
+            if ap is None:
+                continue
+            by_spot.setdefault(r["spot_id"], []).append(
+                SpotAccessCandidate(
+                    access_point=ap,
+                    straight_m=float(r["straight_m"]),
+                    foot_distance_m=r.get("foot_distance_m"),
+                    foot_duration_s=r.get("foot_duration_s"),
+                )
+            )
+        for cands in by_spot.values():
+            # 徒歩距離が取れているものを優先し、短い順（無ければ直線距離）
+            cands.sort(key=lambda c: (c.foot_distance_m is None, c.foot_distance_m or c.straight_m))
+
+        car_reachable = _fetch_spot_car_access()
+
+        try:
+            spot_at = _fetch_spot_coords()
+        except Exception:
+            logger.exception("failed to map spot coordinates; precomputed table is disabled")
+            spot_at = {}
+
+        tree = _KDTree(aps)
+        with self._lock:
+            self._tree = tree
+            self._by_spot = by_spot
+            self._spot_at = spot_at
+            self._car_reachable = car_reachable
+            self._size = len(aps)
+            self._version = version
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            self._failed_at = None
+        logger.info("access point index loaded: %d points, %d spots precomputed, %d off-road (version=%s)",
+                    len(aps), len(by_spot), sum(1 for v in car_reachable.values() if not v), version)
+
+    def warm(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("access point index warm-up failed; will retry lazily")
+
+    def maybe_refresh(self) -> None:
+        if not self._loaded:
+            now = time.monotonic()
+            if self._failed_at is not None and now - self._failed_at < RETRY_INTERVAL_S:
+                return
+            try:
+                self.reload()
+            except Exception:
+                self._failed_at = now
+                raise
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval_s:
+            return
+        self._checked_at = now
+        version = static_db.fetch_data_version()
+        if version is not None and version != self._version:
+            self.reload()
+
+    def _ensure_fresh(self) -> None:
+        try:
+            self.maybe_refresh()
+        except Exception:
+            logger.exception("access point index refresh failed; serving cached index")
+
+    def candidates_for_spot(self, lat: float, lon: float) -> List[SpotAccessCandidate]:
+        """座標がカタログ上のスポットなら、事前計算済み候補（徒歩距離の短い順）を返す。"""
+        self._ensure_fresh()
+        sid = self._spot_at.get(_coord_key(lat, lon))
+        if not sid:
+            return []
+        return list(self._by_spot.get(sid, []))
+
+    def car_reachable(self, lat: float, lon: float) -> Optional[bool]:
+        """
+        座標がカタログ上のスポットなら、車で直接到達できるか（事前計算値）を返す。
+        スポットでない・未計算なら None（呼び出し側は従来どおり car 直行を試す）。
+        """
+        self._ensure_fresh()
+        sid = self._spot_at.get(_coord_key(lat, lon))
+        if not sid:
+            return None
+        return self._car_reachable.get(sid)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, IndexedAccessPoint]]:
+        """任意座標の直線 k 近傍（概算距離[m], AP）。"""
+        self._ensure_fresh()
+        return self._tree.nearest(lat, lon, k)
+
+
+_index: AccessPointIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> AccessPointIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AccessPointIndex()
+    return _index
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-import os
 from dataclasses import dataclass
 from typing import Optional, Tuple
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import text
+
+from backend.common import static_db
 
 
 @dataclass
@@ -16,25 +16,6 @@ class AccessPoint:
     name: Optional[str] = None
 
 
-_engine: Engine | None = None
-
-
-def _conn_url() -> str:
-    host = os.getenv("STATIC_DB_HOST", "static-db")
-    port = os.getenv("STATIC_DB_PORT", "5432")
-    db = os.getenv("STATIC_DB_NAME", "nav_static")
-    user = os.getenv("STATIC_DB_USER", "nav_static")
-    pwd = os.getenv("STATIC_DB_PASSWORD", "nav_static")
-    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-
-
-def _get_engine() -> Engine:
-    global _engine
-    if _engine is None:
-        _engine = create_engine(_conn_url(), future=True)
-    return _engine
-
-
 def get_nearest_access_point(dest_lat: float, dest_lon: float) -> Optional[AccessPoint]:
     """
     PostGIS の access_points テーブルから最寄りを 1 件返す。
@@ -55,7 +36,7 @@ def get_nearest_access_point(dest_lat: float, dest_lon: float) -> Optional[Acces
         """
     )
     try:
-        eng = _get_engine()
+        eng = static_db.get_engine()
         with eng.connect() as conn:
             row = conn.execute(sql, {"lat": dest_lat, "lon": dest_lon}).first()
             if not row:
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import os
 from typing import Dict, List, Tuple, Literal
 
 from backend.worker.app.services.routing import osrm_client as oc
 from backend.worker.app.services.routing.osrm_client import OsrmRouteResult
 from backend.worker.app.services.routing import access_point_repo as ap_repo
+from backend.worker.app.services.routing import access_point_index as ap_index
+from backend.worker.app.services.routing import route_matrix as rm
 
 import logging # ファイルの先頭に追加
 logger = logging.getLogger(__name__)
 
 Coord = Tuple[float, float]  # (lat, lon)
 
+# 任意座標で徒歩距離を比べる AP 候補数（KD-tree の k）
+ACCESS_POINT_CANDIDATES = int(os.getenv("ACCESS_POINT_CANDIDATES", "3"))
+
 def _result_to_leg(
     mode: Literal["car", "foot"],
     res: OsrmRouteResult,
@@ -30,23 +36,80 @@ def _result_to_leg(
     }
 
 
+def _shortest_walk(cands: List[Tuple[float, ap_index.IndexedAccessPoint]], dest: Coord) -> Coord:
+    """
+    直線距離の近い候補 AP のうち、目的地までの徒歩ルートが最短のものを返す。
+    OSRM table が使えなければ直線最寄りを返す。
+    """
+    nearest = cands[0][1]
+    if len(cands) == 1:
+        return (nearest.lat, nearest.lon)
+    coords = [(ap.lat, ap.lon) for _, ap in cands] + [dest]
+    tbl = oc.osrm_table("foot", coords, sources=list(range(len(cands))), destinations=[len(cands)])
+    if not tbl.ok or not tbl.distances:
+        return (nearest.lat, nearest.lon)
+    best = None
+    for (_, ap), row in zip(cands, tbl.distances):
+        d = row[0] if row else None
+        if d is not None and (best is None or d < best[0]):
+            best = (d, ap)
+    ap = best[1] if best else nearest
+    return (ap.lat, ap.lon)
+
+
 def nearest_access_point(dest: Coord) -> Coord:
     """
-    目的地近傍の access_point を返す。
-    DB が使えない場合は「目的地にわずかにズラした点」を返してでも動かす。
+    目的地への徒歩が最短になる access_point を返す（DB 往復なし）。
+    1) 目的地がカタログ上のスポットなら、事前計算済みの徒歩距離順の先頭
+    2) それ以外は KD-tree の k 近傍を OSRM foot table で比較
+    3) 索引が空（DB 未起動で未ロード）なら DB の KNN、
+       それも駄目なら「目的地にわずかにズラした点」を返してでも動かす。
     """
     lat, lon = dest
+    index = ap_index.get_index()
+
+    pre = index.candidates_for_spot(lat, lon)
+    if pre:
+        ap = pre[0].access_point
+        return (ap.lat, ap.lon)
+
+    cands = index.nearest(lat, lon, k=ACCESS_POINT_CANDIDATES)
+    if cands:
+        return _shortest_walk(cands, dest)
+
     ap = ap_repo.get_nearest_access_point(lat, lon)
     if ap:
         return (ap.lat, ap.lon)
     # フォールバック（DB 非稼働時）：東に 0.01 度オフセット
+    logger.warning("No access point available for %s; falling back to a 0.01° east offset.", dest)
     return (lat, lon + 0.01)
 
 
+def _known_off_road(dest: Coord) -> bool:
+    """spot_car_access の事前計算で car 到達不可と判定済みなら True（不明なら False）。"""
+    try:
+        return ap_index.get_index().car_reachable(dest[0], dest[1]) is False
+    except Exception:
+        logger.exception("car reachability lookup failed")
+        return False
+
+
+def _precomputed_car_leg(src: Coord, dst: Coord) -> OsrmRouteResult | None:
+    try:
+        leg = rm.get_matrix().car_leg(src, dst)
+    except Exception:
+        logger.exception("route matrix lookup failed")
+        return None
+    if leg is None:
+        return None
+    return OsrmRouteResult(ok=True, distance=leg["distance"], duration=leg["duration"], geometry=leg["geometry"])
+
+
 def build_legs_with_switch(waypoints: List[Coord]) -> List[Dict]:
     """
     連続する waypoint ペアでレッグを構築。
     - car 直行が取れたら car レッグ。
+      ただし事前計算で「車道から離れている」と分かっているスポットは car 直行を試さない。
     - 取れなければ dest 近傍の access_point を経由して car(src→AP) + foot(AP→dest)。
       （car(src→AP) が失敗しても、AP→dest の foot は実施する）
     返却する leg は dict（routing.main の Pydantic と互換）。
@@ -60,11 +123,17 @@ def build_legs_with_switch(waypoints: List[Coord]) -> List[Dict]:
         src = waypoints[i]
         dst = waypoints[i + 1]
 
-        # 1) まず car 直行を試す
-        r_car_direct = oc.osrm_route("car", src, dst)
-        if getattr(r_car_direct, "ok", False):
-            legs.append(_result_to_leg("car", r_car_direct, i, i + 1))
-            continue
+        # 1) まず car 直行を試す（オフロードと分かっているスポットは省略）
+        #    スポット間で事前計算済みのレッグがあれば OSRM を呼ばない
+        if not _known_off_road(dst):
+            pre = _precomputed_car_leg(src, dst)
+            if pre is not None:
+                legs.append(_result_to_leg("car", pre, i, i + 1))
+                continue
+            r_car_direct = oc.osrm_route("car", src, dst)
+            if getattr(r_car_direct, "ok", False):
+                legs.append(_result_to_leg("car", r_car_direct, i, i + 1))
+                continue
 
         # 2) AP 経由（car: src→AP, foot: AP→dest）
         ap = nearest_access_point(dst)
@@ -3,14 +3,21 @@ from __future__ import annotations
 import os
 from typing import List, Literal, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, field_validator
 
 # logic モジュールは後で実装（integration テストで monkeypatch 前提）
 from backend.worker.app.services.routing import logic as rlogic
 from backend.worker.app.services.routing.spot_repo import SpotRepo
 from backend.worker.app.services.routing.logic import build_legs_with_switch, stitch_to_geojson
+from backend.common import static_db
+from backend.common.coord_array import CoordArray, ORJSONRoute
+from backend.common.spot_catalog import get_catalog
+from backend.worker.app.services.routing.access_point_index import get_index as get_access_point_index
+from backend.worker.app.services.routing.route_matrix import get_matrix as get_route_matrix
 
-app = FastAPI(title="routing service")
+app = FastAPI(title="routing service", default_response_class=ORJSONResponse)
+app.router.route_class = ORJSONRoute
 
 class Coord(BaseModel):
     lat: float
@@ -50,12 +57,26 @@ class Segment(BaseModel):
 class RouteResponse(BaseModel):
     feature_collection: dict
     legs: List[Leg]
-    polyline: List[list[float]]
+    polyline: CoordArray
     segments: List[Segment]
 
+@app.on_event("startup")
+def _warm_static_caches():
+    # spot 解決・最寄り AP 探索を DB 往復なしで行うため、起動時に読み込む
+    get_catalog().warm()
+    get_access_point_index().warm()
+    get_route_matrix().warm()
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    catalog = get_catalog()
+    return {
+        "status": "ok",
+        "static_db_pool": static_db.pool_metrics(),
+        "spot_catalog": {"entries": len(catalog), "version": catalog.version},
+        "access_point_index": {"entries": len(get_access_point_index())},
+        "route_matrix": {"points": len(get_route_matrix()), "car_geometries": get_route_matrix().geometry_count},
+    }
 
 @app.post("/route")
 def route(req: RouteRequest) -> RouteResponse:
@@ -69,7 +90,7 @@ def route(req: RouteRequest) -> RouteResponse:
     処理:
       1) spot_id 群を DB で (lon,lat) に解決（順序を保って再構成）
       2) (lon,lat) → (lat,lon) に変換して routing ロジックへ
-      3) OSRM を叩いて legs を構築
+      3) legs を構築（スポット間は事前計算した car レッグがあれば使い、無いペア・AP 経由・出発地からは OSRM）
       4) GeoJSON / polyline / segments を組み立てて返却
 
     出力: RouteResponse
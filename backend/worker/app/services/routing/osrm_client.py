@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import os
+import logging
 from dataclasses import dataclass
-from typing import Literal, Tuple
+from typing import List, Literal, Optional, Sequence, Tuple
 import math
 
 import httpx
 
+logger = logging.getLogger(__name__)
+
 OSRM_CAR_URL = os.getenv("OSRM_CAR_URL", "http://osrm-car:5000")
 OSRM_FOOT_URL = os.getenv("OSRM_FOOT_URL", "http://osrm-foot:5000")
 
@@ -26,6 +29,15 @@ class OsrmRouteResult:
     raw: dict | None = None
 
 
+@dataclass
+class OsrmTableResult:
+    ok: bool
+    # distances[i][j]: sources[i] → destinations[j] の距離[m]（到達不能は None）
+    distances: List[List[Optional[float]]] | None = None
+    durations: List[List[Optional[float]]] | None = None
+    raw: dict | None = None
+
+
 def _pick_base(profile: Literal["car", "foot"]) -> str:
     if profile == "foot":
         return OSRM_FOOT_URL.rstrip("/")
@@ -149,3 +161,57 @@ def osrm_route(
         )
     except Exception as e:
         return OsrmRouteResult(ok=False, raw={"error": repr(e), "url": url})
+
+
+def build_osrm_table_url(
+    profile: Literal["car", "foot"],
+    coords: Sequence[Tuple[float, float]],
+    *,
+    sources: Optional[Sequence[int]] = None,
+    destinations: Optional[Sequence[int]] = None,
+) -> str:
+    """
+    OSRM table サービスの URL を組み立てる。coords は (lat, lon) の列。
+    sources / destinations は coords のインデックス（None なら全点）。
+    """
+    base = _pick_base(profile)
+    pts = ";".join("{},{}".format(*_to_lonlat(c)) for c in coords)
+    params = ["annotations=distance,duration"]
+    if sources is not None:
+        params.append("sources=" + ";".join(str(i) for i in sources))
+    if destinations is not None:
+        params.append("destinations=" + ";".join(str(i) for i in destinations))
+    return f"{base}/table/v1/{profile}/{pts}?{'&'.join(params)}"
+
+
+def osrm_table(
+    profile: Literal["car", "foot"],
+    coords: Sequence[Tuple[float, float]],
+    *,
+    sources: Optional[Sequence[int]] = None,
+    destinations: Optional[Sequence[int]] = None,
+    timeout: float = 15.0,
+) -> OsrmTableResult:
+    """
+    OSRM table サービスで距離・所要時間の行列を取得する。
+    失敗時は ok=False の結果を返す（例外は飲み込む）。
+    """
+    if len(coords) < 2:
+        return OsrmTableResult(ok=False, raw={"error": "at least two coordinates required"})
+    url = build_osrm_table_url(profile, coords, sources=sources, destinations=destinations)
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            r = client.get(url)
+        if r.status_code != 200:
+            return OsrmTableResult(ok=False, raw={"status_code": r.status_code, "text": r.text})
+        data = r.json()
+        if data.get("code") != "Ok" or data.get("distances") is None:
+            return OsrmTableResult(ok=False, raw=data)
+        return OsrmTableResult(
+            ok=True,
+            distances=data.get("distances"),
+            durations=data.get("durations"),
+            raw=data,
+        )
+    except Exception as e:
+        return OsrmTableResult(ok=False, raw={"error": repr(e), "url": url})
@@ -0,0 +1,134 @@
+"""
+スポット間の事前計算済み car レッグ（init_static_db.py の PRECOMPUTE_ROUTING で生成）の読み込み。
+
+- ROUTE_MATRIX_DIR 配下の car_geometries.json（各地点から車で近いペアの距離・所要・ジオメトリ）を保持
+- meta.json の座標（lat,lon）と突き合わせて地点の添字を引く
+  （座標が変わった地点は一致しないので、古いデータでも誤ったレッグは返さない）
+- meta.json の mtime が変わったら読み直す（確認は ROUTE_MATRIX_REFRESH_S 秒に 1 回）
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Coord = Tuple[float, float]  # (lat, lon)
+
+DEFAULT_DIR = Path(__file__).resolve().parents[3] / "data" / "route_matrix"
+REFRESH_INTERVAL_S = float(os.getenv("ROUTE_MATRIX_REFRESH_S", "60"))
+
+
+def _coord_key(lat: float, lon: float) -> Tuple[float, float]:
+    # access_point_index と同じ丸め（~10cm 精度）
+    return (round(float(lat), 6), round(float(lon), 6))
+
+
+class RouteMatrix:
+    def __init__(self, base_dir: Optional[Path] = None, refresh_interval_s: float = REFRESH_INTERVAL_S):
+        self.base_dir = Path(base_dir or os.getenv("ROUTE_MATRIX_DIR", str(DEFAULT_DIR)))
+        self.refresh_interval_s = refresh_interval_s
+        self._index: Dict[Tuple[float, float], int] = {}
+        self._geometries: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def geometry_count(self) -> int:
+        return len(self._geometries)
+
+    def _meta_mtime(self) -> Optional[float]:
+        try:
+            return (self.base_dir / "meta.json").stat().st_mtime
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        mtime = self._meta_mtime()
+        if mtime is None:
+            with self._lock:
+                self._index, self._geometries = {}, {}
+                self._mtime = None
+            return
+        with open(self.base_dir / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = {_coord_key(lat, lon): i for i, (lat, lon) in enumerate(meta.get("coords") or [])}
+
+        geometries: Dict[str, Dict[str, Any]] = {}
+        geom_path = self.base_dir / "car_geometries.json"
+        if geom_path.exists():
+            with open(geom_path, encoding="utf-8") as f:
+                geometries = json.load(f)
+
+        with self._lock:
+            self._index = index
+            self._geometries = geometries
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+        logger.info("route matrix loaded: %d points, %d car geometries", len(index), len(geometries))
+
+    def warm(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("route matrix warm-up failed; live OSRM will be used")
+
+    def maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.refresh_interval_s:
+            return
+        self._checked_at = now
+        if self._meta_mtime() != self._mtime:
+            self.reload()
+
+    def _ensure_fresh(self) -> None:
+        try:
+            self.maybe_refresh()
+        except Exception:
+            logger.exception("route matrix refresh failed; serving cached matrix")
+
+    def _pair(self, src: Coord, dst: Coord) -> Optional[Tuple[int, int]]:
+        i = self._index.get(_coord_key(*src))
+        j = self._index.get(_coord_key(*dst))
+        if i is None or j is None:
+            return None
+        return i, j
+
+    def car_leg(self, src: Coord, dst: Coord) -> Optional[Dict[str, Any]]:
+        """
+        保存済みの car レッグ（distance, duration, geometry）。ジオメトリを持たないペアは None。
+        """
+        self._ensure_fresh()
+        ij = self._pair(src, dst)
+        if ij is None:
+            return None
+        g = self._geometries.get(f"{ij[0]},{ij[1]}")
+        if not g or not g.get("coordinates"):
+            return None
+        return {
+            "distance": float(g.get("distance") or 0.0),
+            "duration": float(g.get("duration") or 0.0),
+            "geometry": {"type": "LineString", "coordinates": g["coordinates"]},
+        }
+
+
+_matrix: RouteMatrix | None = None
+_matrix_lock = threading.Lock()
+
+
+def get_matrix() -> RouteMatrix:
+    global _matrix
+    if _matrix is None:
+        with _matrix_lock:
+            if _matrix is None:
+                _matrix = RouteMatrix()
+    return _matrix
@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import List, Optional, Literal, Dict, Any
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
 from .tts import (
@@ -18,11 +19,15 @@ from .tts import (
     try_ffprobe_duration_sec,
     VOICE_REGISTRY, DEFAULT_BY_LANG,
 )
+from .track import build_track
+
+from backend.common.coord_array import ORJSONRoute
 
 logger = logging.getLogger("svc-voice")
 logger.setLevel(logging.INFO)
 
-app = FastAPI(title="voice", version="1.0.0")
+app = FastAPI(title="voice", version="1.0.0", default_response_class=ORJSONResponse)
+app.router.route_class = ORJSONRoute
 
 # ----- 環境設定 -----
 PACKS_ROOT = Path(os.getenv("PACKS_ROOT", "/packs"))  # ★ デフォルトを /packs に
@@ -82,6 +87,32 @@ class SynthesizeAndSaveResponse(BaseModel):
     items: List[SynthesizeAndSaveItemResponse]
 
 
+class BuildTrackRequest(BaseModel):
+    pack_id: str
+    language: Literal["ja", "en", "zh"]
+    spot_ids: List[str]      # ルート順
+    format: Optional[Literal["mp3", "wav"]] = None
+    bitrate_kbps: Optional[int] = None
+
+
+class TrackChapter(BaseModel):
+    spot_id: str
+    offset_bytes: int
+    length_bytes: int
+    start_s: float
+    duration_s: float
+
+
+class BuildTrackResponse(BaseModel):
+    url: str
+    format: Literal["mp3", "wav"]
+    bytes: int
+    duration_s: float
+    sample_rate: int
+    normalized: bool
+    chapters: List[TrackChapter]
+
+
 # ----- ランタイムの初期化（モデルはプロセス内でキャッシュ） -----
 _cfg = TTSConfig.from_env()
 _runtime = TTSRuntime(_cfg)  # Coqui のモデル等を lazy に握る
@@ -240,6 +271,26 @@ def synthesize_and_save(req: SynthesizeAndSaveRequest) -> SynthesizeAndSaveRespo
     )
 
 
+# ----- 保存済みの音声をルート順に 1 本へまとめる（章表付き） -----
+@app.post("/build_track", response_model=BuildTrackResponse)
+def build_track_endpoint(req: BuildTrackRequest) -> BuildTrackResponse:
+    if not req.spot_ids:
+        raise HTTPException(status_code=400, detail="spot_ids must not be empty")
+    pack_dir = ensure_pack_dir(req.pack_id)
+    try:
+        track = build_track(
+            pack_dir, req.pack_id, req.language, req.spot_ids,
+            fmt=(req.format or DEFAULT_FORMAT).lower(),
+            bitrate_kbps=int(req.bitrate_kbps or DEFAULT_BITRATE),
+        )
+    except Exception as e:
+        logger.exception("Failed to build narration track for %s", req.pack_id)
+        raise HTTPException(status_code=500, detail=f"track build failed: {e}")
+    if track is None:
+        raise HTTPException(status_code=404, detail="no narration audio in pack")
+    return BuildTrackResponse(**track)
+
+
 def ensure_pack_dir(pack_id: str) -> Path:
     pack_dir = (PACKS_ROOT / pack_id).resolve()
     # /packs 配下チェック（path traversal 対策）
@@ -0,0 +1,271 @@
+# backend/worker/app/services/voice/track.py
+"""
+パック内のスポット別ナレーションを、ルート順に 1 本の音声（narration.{lang}.{mp3|wav}）へまとめる。
+
+スポットごとに別ファイルだと、回線の遅い端末ではファイル数ぶんの往復が掛かり、
+キャッシュ済みかどうかの確認も件数ぶん必要になる。1 本にまとめて章（chapter）表を manifest に載せれば、
+クライアントは 1 回の取得（または Range）と 1 件のキャッシュ確認で済む。
+
+- 章ごとにラウドネスを揃える
+    ffmpeg があれば loudnorm（VOICE_TRACK_LOUDNORM）で正規化し、同じ形式（モノラル・VOICE_TRACK_SAMPLE_RATE・
+    MP3 なら固定ビットレート、Xing / ID3 無し）に再エンコードする
+    ffmpeg が無ければ WAV は numpy で RMS を VOICE_TRACK_WAV_RMS_DBFS に揃え、MP3 は正規化せずそのまま繋ぐ
+- MP3 はフレーム単位で連結するので、各章のバイト範囲はそれだけで再生できる（Range で章だけ取れる）
+- 章表: [{"spot_id", "offset_bytes", "length_bytes", "start_s", "duration_s"}]（offset はファイル先頭から）
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VOICE_TRACK_LOUDNORM = os.getenv("VOICE_TRACK_LOUDNORM", "I=-16:TP=-1.5:LRA=11")
+VOICE_TRACK_SAMPLE_RATE = int(os.getenv("VOICE_TRACK_SAMPLE_RATE", "24000"))
+VOICE_TRACK_WAV_RMS_DBFS = float(os.getenv("VOICE_TRACK_WAV_RMS_DBFS", "-20"))
+VOICE_TRACK_PEAK_DBFS = float(os.getenv("VOICE_TRACK_PEAK_DBFS", "-1"))
+
+_AUDIO_EXTS = ("mp3", "wav")
+
+# MPEG Layer III
+_MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+@dataclass
+class Chapter:
+    spot_id: str
+    data: bytes       # MP3 はフレーム列、WAV は PCM
+    samples: int
+    sample_rate: int
+
+
+def track_name(language: str, fmt: str) -> str:
+    return f"narration.{language}.{fmt}"
+
+
+def _has_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+# ---------- MP3 ----------
+def _skip_id3v2(data: bytes) -> int:
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def mp3_frames(data: bytes) -> Tuple[bytes, int, int, int]:
+    """
+    ID3 タグと先頭の Xing / Info フレームを除いた Layer III フレーム列を取り出す。
+    戻り値: (フレーム列, サンプル数, サンプルレート, チャンネル数)
+    """
+    pos = _skip_id3v2(data)
+    end = len(data) - (128 if len(data) >= 128 and data[-128:-125] == b"TAG" else 0)
+    out = bytearray()
+    samples = 0
+    sample_rate = channels = 0
+    first = True
+    while pos + 4 <= end:
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            pos += 1  # 同期を探し直す
+            continue
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        br_idx, sr_idx, pad = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+        if version == 1 or layer != 1 or br_idx in (0, 15) or sr_idx == 3:
+            pos += 1
+            continue
+        mpeg1 = version == 3
+        sr = _MP3_SAMPLE_RATES[version][sr_idx]
+        br = _MP3_BITRATES[1 if mpeg1 else 2][br_idx] * 1000
+        length = (144 if mpeg1 else 72) * br // sr + pad
+        if pos + length > end:
+            break
+        frame = data[pos:pos + length]
+        if first and (b"Xing" in frame[:48] or b"Info" in frame[:48]):
+            first = False
+            pos += length
+            continue
+        first = False
+        if sample_rate and sr != sample_rate:
+            raise ValueError(f"mp3 sample rate changes mid-stream ({sample_rate} -> {sr})")
+        sample_rate = sr
+        channels = 1 if (b3 >> 6) == 3 else 2
+        samples += 1152 if mpeg1 else 576
+        out += frame
+        pos += length
+    return bytes(out), samples, sample_rate, channels
+
+
+# ---------- WAV ----------
+def _read_wav(data: bytes) -> Tuple[np.ndarray, int, int]:
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM wav is supported")
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+        return pcm, wf.getframerate(), wf.getnchannels()
+
+
+def normalize_pcm(pcm: np.ndarray, rms_dbfs: float = VOICE_TRACK_WAV_RMS_DBFS,
+                  peak_dbfs: float = VOICE_TRACK_PEAK_DBFS) -> np.ndarray:
+    """16bit PCM の RMS を rms_dbfs に揃える（ピークは peak_dbfs を超えないよう抑える）。"""
+    x = pcm.astype(np.float64) / 32768.0
+    rms = float(np.sqrt(np.mean(x * x))) if len(x) else 0.0
+    if rms <= 0.0:
+        return pcm.astype("<i2")
+    gain = 10 ** (rms_dbfs / 20) / rms
+    peak = float(np.max(np.abs(x)))
+    if peak > 0:
+        gain = min(gain, 10 ** (peak_dbfs / 20) / peak)
+    return np.clip(np.round(x * gain * 32768.0), -32768, 32767).astype("<i2")
+
+
+# ---------- ffmpeg（loudnorm） ----------
+def _ffmpeg_loudnorm(src: bytes, fmt: str, bitrate_kbps: int, sample_rate: int) -> bytes:
+    codec = (["-c:a", "libmp3lame", "-b:a", f"{bitrate_kbps}k", "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3"]
+             if fmt == "mp3" else ["-c:a", "pcm_s16le", "-f", "s16le"])
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+        "-af", f"loudnorm={VOICE_TRACK_LOUDNORM}", "-ar", str(sample_rate), "-ac", "1",
+        *codec, "pipe:1",
+    ]
+    p = subprocess.run(cmd, input=src, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg loudnorm failed: {p.stderr.decode(errors='ignore')}")
+    return p.stdout
+
+
+def _chapter(spot_id: str, src: bytes, fmt: str, use_ffmpeg: bool,
+             bitrate_kbps: int, sample_rate: int) -> Tuple[Chapter, int]:
+    """(章, チャンネル数)"""
+    if use_ffmpeg:
+        out = _ffmpeg_loudnorm(src, fmt, bitrate_kbps, sample_rate)
+        if fmt == "mp3":
+            frames, samples, sr, ch = mp3_frames(out)
+            return Chapter(spot_id, frames, samples, sr), ch
+        return Chapter(spot_id, out, len(out) // 2, sample_rate), 1
+    if fmt == "mp3":
+        frames, samples, sr, ch = mp3_frames(src)
+        return Chapter(spot_id, frames, samples, sr), ch
+    pcm, sr, ch = _read_wav(src)
+    pcm = normalize_pcm(pcm)
+    return Chapter(spot_id, pcm.tobytes(), len(pcm) // ch, sr), ch
+
+
+def _find_source(pack_dir: Path, spot_id: str, language: str) -> Optional[Tuple[Path, str]]:
+    for ext in _AUDIO_EXTS:
+        p = pack_dir / f"{spot_id}.{language}.{ext}"
+        if p.is_file():
+            return p, ext
+    return None
+
+
+def build_track(
+    pack_dir: Path,
+    pack_id: str,
+    language: str,
+    spot_ids: Sequence[str],
+    fmt: Optional[str] = None,
+    bitrate_kbps: int = 64,
+    use_ffmpeg: Optional[bool] = None,
+) -> Optional[dict]:
+    """
+    spot_ids の順（ルート順）に {spot_id}.{language}.{mp3|wav} を繋いで書き出し、章表付きの情報を返す。
+    音声が 1 件も無ければ None。ffmpeg が無い場合は元ファイルの形式のまま繋ぐ（形式の違うものは除く）。
+    """
+    use_ffmpeg = _has_ffmpeg() if use_ffmpeg is None else use_ffmpeg
+    sources = []
+    seen = set()
+    for sid in spot_ids:
+        if sid in seen:
+            continue
+        seen.add(sid)
+        found = _find_source(pack_dir, sid, language)
+        if found is None:
+            logger.info("narration track: no audio for %s/%s", pack_id, sid)
+            continue
+        sources.append((sid, *found))
+    if not sources:
+        return None
+    if not use_ffmpeg:
+        # 再エンコードできないので、最初の音声の形式に揃える
+        fmt = sources[0][2]
+        skipped = [sid for sid, _, ext in sources if ext != fmt]
+        if skipped:
+            logger.warning("narration track: skipping %s (format differs and ffmpeg is unavailable)", skipped)
+        sources = [s for s in sources if s[2] == fmt]
+    fmt = fmt if fmt in _AUDIO_EXTS else "mp3"
+
+    chapters: List[Chapter] = []
+    layout: Optional[Tuple[int, int]] = None
+    for sid, path, _ in sources:
+        ch, channels = _chapter(sid, path.read_bytes(), fmt, use_ffmpeg, bitrate_kbps, VOICE_TRACK_SAMPLE_RATE)
+        if not ch.data:
+            continue
+        if layout is None:
+            layout = (ch.sample_rate, channels)
+        elif layout != (ch.sample_rate, channels):
+            logger.warning("narration track: skipping %s (%s Hz/%sch differs from %s)", sid, ch.sample_rate, channels, layout)
+            continue
+        chapters.append(ch)
+    if not chapters or layout is None:
+        return None
+
+    body = b"".join(c.data for c in chapters)
+    if fmt == "wav":
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(layout[1])
+            wf.setsampwidth(2)
+            wf.setframerate(layout[0])
+            wf.writeframes(body)
+        data = buf.getvalue()
+        header = len(data) - len(body)
+    else:
+        data, header = body, 0
+
+    table = []
+    offset, samples = header, 0
+    for c in chapters:
+        table.append({
+            "spot_id": c.spot_id,
+            "offset_bytes": offset,
+            "length_bytes": len(c.data),
+            "start_s": round(samples / c.sample_rate, 3),
+            "duration_s": round(c.samples / c.sample_rate, 3),
+        })
+        offset += len(c.data)
+        samples += c.samples
+
+    name = track_name(language, fmt)
+    out = pack_dir / name
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, out)
+    logger.info("Wrote narration track: %s (%d chapters, %d bytes)", out, len(table), len(data))
+    return {
+        "url": f"/packs/{pack_id}/{name}",
+        "format": fmt,
+        "bytes": len(data),
+        "duration_s": round(samples / layout[0], 3),
+        "sample_rate": layout[0],
+        "normalized": use_ffmpeg or fmt == "wav",
+        "chapters": table,
+    }
@@ -1,18 +1,17 @@
 // public/sw.js
-// v2 — packs(音声)のRange対応 + OSMタイルのオフライン対応
+// v3 — packs(音声)のRange対応 + 地理院タイルのオフライン対応
 self.addEventListener('install', (e) => { self.skipWaiting(); });
 self.addEventListener('activate', (e) => { e.waitUntil(self.clients.claim()); });
 
 const PACKS_PREFIX = 'packs-';
 const TILES_CACHE  = 'tiles-v1';
+// bundle.bin から展開したルート沿いのタイル（src/lib/tiles.js の PACK_TILES_CACHE。間引かない）
+const PACK_TILES_CACHE = 'tiles-pack-v1';
 const RUNTIME      = 'runtime';
 
-// タイルの許可ホスト（OSM公式）
+// タイルの許可ホスト（地理院タイル。src/lib/tiles.js の TILE_TEMPLATE と同じホスト）
 const TILE_HOSTS = [
-  'tile.openstreetmap.org',
-  'a.tile.openstreetmap.org',
-  'b.tile.openstreetmap.org',
-  'c.tile.openstreetmap.org',
+  'cyberjapandata.gsi.go.jp',
 ];
 
 const EMPTY_TILE_PNG = (() => {
@@ -34,13 +33,18 @@ self.addEventListener('fetch', (event) => {
   const req = event.request;
   const url = new URL(req.url);
 
+  // パック一括ファイルは Range で分割取得するので素通し（中身は lib/packBundle.js がキャッシュへ展開する）
+  if (url.origin === self.location.origin && url.pathname.endsWith('/bundle.bin')) {
+    return;
+  }
+
   // 音声（/packs/…）— Range対応
   if (url.origin === self.location.origin && url.pathname.startsWith('/packs/')) {
     event.respondWith(handlePacks(req));
     return;
   }
 
-  // OSMタイル（クロスオリジン）— キャッシュ or 透過タイルでフォールバック
+  // 地図タイル（クロスオリジン）— キャッシュ or 透過タイルでフォールバック
   if (req.method === 'GET'
       && req.destination === 'image'
       && TILE_HOSTS.includes(url.host)
@@ -91,6 +95,11 @@ async function handlePacks(request) {
 }
 
 async function handleTiles(request) {
+  // パック用に展開済みのタイルがあればそれを返す（ネットには出ない）
+  const packTiles = await caches.open(PACK_TILES_CACHE);
+  const packed = await packTiles.match(request, { ignoreSearch: true });
+  if (packed) return packed;
+
   const cache = await caches.open(TILES_CACHE);
   const cached = await cache.match(request, { ignoreSearch: true });
   if (cached) {
@@ -1,4 +1,6 @@
 // src/lib/api.js
+import { expandCompactPlan } from './planCodec';
+
 const BACK_BASE = '/back';              // Nginxで /back → APIゲートウェイにリバースプロキシ
 const API_BASE  = `${BACK_BASE}/api`;
 
@@ -44,10 +46,10 @@ export async function pollPlan(taskId, onTick) {
   let attempt = 0;
   while (true) {
     const { status, body } = await apiFetch(
-      `/nav/plan/tasks/${encodeURIComponent(taskId)}?ts=${Date.now()}`
+      `/nav/plan/tasks/${encodeURIComponent(taskId)}?compact=1&ts=${Date.now()}`
     );
 
-    if (status === 200) return body;       // 最終レスポンス
+    if (status === 200) return expandCompactPlan(body);  // 最終レスポンス（コンパクト形なら展開）
     if (status === 202) {                  // 進捗
       onTick && onTick({ attempt, state: body?.state, ready: body?.ready === true });
       await sleep(Math.min(1500 + attempt * 200, 3000));
@@ -65,6 +67,23 @@ export async function pollPlan(taskId, onTick) {
   }
 }
 
+/**
+ * パックの bundle.bin はプラン完了後に別タスクで作られ、出来たら manifest の bundle_url が埋まる。
+ * manifest（コンパクト形）を間隔を空けて取り直し、bundle_url が出たらそれを返す（時間切れは null）。
+ */
+export async function waitForBundleUrl(packId, { intervalMs = 10000, tries = 30, isActive = () => true } = {}) {
+  for (let i = 0; i < tries && isActive(); i++) {
+    try {
+      const { status, body } = await apiFetch(`/nav/packs/${encodeURIComponent(packId)}/manifest.json?compact=1`, { cache: 'no-cache' });
+      if (status === 200 && body?.bundle_url) return body.bundle_url;
+    } catch (e) {
+      if (e.status === 404) return null;
+    }
+    await sleep(intervalMs);
+  }
+  return null;
+}
+
 // --- Realtime (LoRaWAN/MQTT) ---
 export async function fetchRealtimeBySpotId(spotId) {
   const { status, body } = await apiFetch(`/rt/spot/${encodeURIComponent(spotId)}`);
@@ -73,6 +92,21 @@ export async function fetchRealtimeBySpotId(spotId) {
   return body;
 }
 
+/**
+ * GET /rt/spots（複数スポットを 1 リクエストで）
+ * - since: 前回の seq。これ以降に変わったスポットだけ返る（変化なしは 304）
+ * - wait: 変化が無いとき最大何秒待つか（ロングポーリング）
+ * 返り値: { status, body }（304 のとき body は null）
+ */
+export async function fetchRealtimeSpots(spotIds, { since, wait } = {}) {
+  const params = new URLSearchParams({ ids: spotIds.join(',') });
+  if (since != null) params.set('since', String(since));
+  if (wait) params.set('wait', String(wait));
+  const { status, body } = await apiFetch(`/rt/spots?${params}`);
+  if (status === 304) return { status, body: null };
+  // 期待ペイロード: { seq, full, spots: { [spot_id]: { w, c, u?, h? } } }
+  return { status, body };
+}
 
 // 互換用エイリアス（既存コード対策）
 export const fetchPlanResult = pollPlan;
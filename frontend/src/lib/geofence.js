@@ -0,0 +1,114 @@
+// src/lib/geofence.js
+// manifest の geofence（距離程の発火索引）で、現在地から「いま語るべきスポット」を求める。
+// 形式・手順は backend/common/geofence.py と同じ:
+//   1. 現在地をルートに射影して距離程 p を求める（前回の線分の前後 MATCH_WINDOW 本だけを探す）
+//   2. triggers を start_m で二分探索し、p 以下の最後の要素から max_window_m 分だけ遡って
+//      start_m <= p <= end_m の窓を集める
+// 位置更新ごとに全 POI との距離を測る必要がなくなる。
+
+const R = 6371008.8;
+const DEG = Math.PI / 180;
+const MATCH_WINDOW = 200;
+// 前回位置からルートを外れたとみなす距離（超えたら全線分から探し直す）
+const OFF_ROUTE_M = 150;
+
+function cumulative(polyline) {
+  const cum = [0];
+  for (let i = 1; i < polyline.length; i++) {
+    const [lon1, lat1] = polyline[i - 1];
+    const [lon2, lat2] = polyline[i];
+    const dlat = (lat2 - lat1) * DEG;
+    const dlon = (lon2 - lon1) * DEG;
+    const a = Math.sin(dlat / 2) ** 2 + Math.cos(lat1 * DEG) * Math.cos(lat2 * DEG) * Math.sin(dlon / 2) ** 2;
+    cum.push(cum[i - 1] + 2 * R * Math.asin(Math.sqrt(Math.min(1, a))));
+  }
+  return cum;
+}
+
+/**
+ * 点を線分 [lo, hi) に射影する
+ * @returns {{ chainage_m: number, offset_m: number, seg_idx: number }}
+ */
+export function project(polyline, cum, lon, lat, lo = 0, hi = polyline.length - 1) {
+  const nSeg = polyline.length - 1;
+  if (nSeg < 1) return { chainage_m: 0, offset_m: 0, seg_idx: 0 };
+  lo = Math.max(0, Math.min(lo, nSeg - 1));
+  hi = Math.max(lo + 1, Math.min(hi, nSeg));
+  const kx = DEG * R * Math.cos(lat * DEG);
+  const ky = DEG * R;
+  const px = lon * kx;
+  const py = lat * ky;
+  let best = { d: Infinity, seg: lo, t: 0 };
+  for (let i = lo; i < hi; i++) {
+    const ax = polyline[i][0] * kx, ay = polyline[i][1] * ky;
+    const bx = polyline[i + 1][0] * kx, by = polyline[i + 1][1] * ky;
+    const abx = bx - ax, aby = by - ay;
+    const len2 = abx * abx + aby * aby;
+    let t = len2 > 0 ? ((px - ax) * abx + (py - ay) * aby) / len2 : 0;
+    t = Math.max(0, Math.min(1, t));
+    const d = Math.hypot(ax + abx * t - px, ay + aby * t - py);
+    if (d < best.d) best = { d, seg: i, t };
+  }
+  return {
+    chainage_m: cum[best.seg] + best.t * (cum[best.seg + 1] - cum[best.seg]),
+    offset_m: best.d,
+    seg_idx: best.seg,
+  };
+}
+
+// start_m > p となる最初の位置
+function upperBound(triggers, p) {
+  let lo = 0, hi = triggers.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (triggers[mid].start_m <= p) lo = mid + 1; else hi = mid;
+  }
+  return lo;
+}
+
+export function activeTriggers(index, p) {
+  const triggers = index?.triggers || [];
+  const floor = p - (index?.max_window_m || 0);
+  const out = [];
+  for (let k = upperBound(triggers, p) - 1; k >= 0 && triggers[k].start_m >= floor; k--) {
+    if (triggers[k].end_m >= p) out.push(triggers[k]);
+  }
+  return out.reverse();
+}
+
+export function nextTrigger(index, p) {
+  const triggers = index?.triggers || [];
+  return triggers[upperBound(triggers, p)] || null;
+}
+
+/**
+ * プランごとの追跡器。update() は新たに窓へ入ったスポットを entered で返す（同じスポットは 1 回だけ）。
+ * @param {{ polyline: number[][], geofence?: any }} plan
+ */
+export function createTracker(plan) {
+  const polyline = plan?.polyline || [];
+  const index = plan?.geofence || null;
+  const cum = index?.cum_m?.length === polyline.length ? index.cum_m : cumulative(polyline);
+  const fired = new Set();
+  let lastSeg = null;
+
+  return {
+    enabled: !!index && polyline.length >= 2,
+    update(lat, lon) {
+      if (!index || polyline.length < 2) return null;
+      let hit = lastSeg == null
+        ? project(polyline, cum, lon, lat)
+        : project(polyline, cum, lon, lat, lastSeg - MATCH_WINDOW, lastSeg + MATCH_WINDOW);
+      if (lastSeg != null && hit.offset_m > OFF_ROUTE_M) hit = project(polyline, cum, lon, lat);
+      lastSeg = hit.seg_idx;
+      const active = activeTriggers(index, hit.chainage_m);
+      const entered = active.filter(t => !fired.has(t.spot_id));
+      entered.forEach(t => fired.add(t.spot_id));
+      return { ...hit, active, entered, next: nextTrigger(index, hit.chainage_m) };
+    },
+    reset() {
+      fired.clear();
+      lastSeg = null;
+    },
+  };
+}
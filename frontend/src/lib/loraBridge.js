@@ -1,3 +1,5 @@
+import { getCode, getSpotId } from '@/lib/spotCodes';
+
 // ==========================================================
 // ★ 実行環境の自動判別 ★
 // ==========================================================
@@ -72,9 +74,18 @@ async function processLine(fullResponse) {
       const fport = parseInt(match[1], 10);
       const hexData = match[2];
       console.log(`[LoRa DATA] Port ${fport} で受信したペイロードHEX: ${hexData}`);
-      const decodedStr = hexToString(hexData);
-      console.log(`[LoRa DATA] デコードした文字列: ${decodedStr}`);
-      onDataReceived(JSON.parse(decodedStr));
+      const bytes = hexToBytes(hexData);
+      if (isBinaryFrame(bytes)) {
+        // v1 バイナリ: 1 フレームに複数スポット
+        const docs = decodeDownlink(bytes);
+        console.log(`[LoRa DATA] デコードしたスポット:`, docs);
+        for (const doc of docs) onDataReceived(doc);
+      } else {
+        // 従来の JSON
+        const decodedStr = hexToString(hexData);
+        console.log(`[LoRa DATA] デコードした文字列: ${decodedStr}`);
+        onDataReceived(JSON.parse(decodedStr));
+      }
     } catch (e) { console.error('受信データのパースに失敗:', e); }
   }
 }
@@ -346,13 +357,13 @@ export async function send(data) {
   // isAndroidの場合はネイティブの `send` がATコマンドを直接受け取るため、
   // この `send` 関数は主にアップリンクペイロードのために使われる。
   // JoinなどのATコマンドは `_write` を直接呼び出すことで送信される。
+  // data は文字列（従来の spot_id）か Uint8Array（encodeSpotRequest の結果）。
   if (!_isNetworkJoined) {
     console.warn('LoRa未接続のため送信をスキップしました。');
     return;
   }
   
-  const encoder = new TextEncoder();
-  const dataBytes = encoder.encode(data);
+  const dataBytes = (data instanceof Uint8Array) ? data : new TextEncoder().encode(data);
   const hexData = Array.from(dataBytes)
       .map(b => b.toString(16).padStart(2, '0')).join('');
   const dataLen = dataBytes.length;
@@ -375,4 +386,64 @@ function hexToString(hex) {
     str += String.fromCharCode(parseInt(hex.substr(i, 2), 16));
   }
   return str;
-}
\ No newline at end of file
+}
+
+
+// ==========================================================
+// ★ バイナリ形式 v1（backend/api/rt_codec.py と同じ） ★
+// ==========================================================
+// 状態バイト: [ w(2) | u(2) | c(3) | hbit(1) ]（rt.js の _calcEtag と同じ）。hbit=1 なら h を 1 バイト続ける
+// downlink: [0x10|n] + n × [code, 状態バイト, (h)]
+// uplink:   [0x10|n] + n × [code, 手元の状態バイト]（値を持っていなければ ETAG_NONE）
+const FRAME_VERSION = 1;
+const MAX_SPOTS_PER_FRAME = 0x0f;
+// u=0 なのに hbit=1 … 実際の状態には現れない値
+export const ETAG_NONE = 0x01;
+
+function isBinaryFrame(bytes) {
+  return bytes.length > 0 && (bytes[0] >> 4) === FRAME_VERSION && (bytes[0] & 0x0f) > 0;
+}
+
+/**
+ * downlink フレーム → RTDoc の配列（code が対応表に無いスポットは捨てる）
+ * @param {Uint8Array} bytes
+ * @returns {Array<{s: string, w: number, u: number, c: number, h?: number}>}
+ */
+export function decodeDownlink(bytes) {
+  const docs = [];
+  const n = bytes[0] & 0x0f;
+  let i = 1;
+  for (let k = 0; k < n && i + 1 < bytes.length; k++) {
+    const code = bytes[i];
+    const state = bytes[i + 1];
+    i += 2;
+    const doc = { w: (state >> 6) & 0b11, u: (state >> 4) & 0b11, c: (state >> 1) & 0b111 };
+    if (state & 1) doc.h = bytes[i++];
+    const s = getSpotId(code);
+    if (s) docs.push({ s, ...doc });
+  }
+  return docs;
+}
+
+/**
+ * uplink（スポット情報の要求）を組み立てる。code の無いスポットは入れない
+ * @param {Array<{spotId: string, etag?: number}>} entries etag は rt.js の _calcEtag（未取得なら undefined）
+ * @returns {Uint8Array|null} 1 件も入らなければ null
+ */
+export function encodeSpotRequest(entries) {
+  const body = [];
+  for (const { spotId, etag } of entries) {
+    const code = getCode(spotId);
+    if (code == null) continue;
+    body.push(code, typeof etag === 'number' ? etag & 0xff : ETAG_NONE);
+    if (body.length / 2 >= MAX_SPOTS_PER_FRAME) break;
+  }
+  if (body.length === 0) return null;
+  return Uint8Array.from([(FRAME_VERSION << 4) | (body.length / 2), ...body]);
+}
+
+function hexToBytes(hex) {
+  const out = new Uint8Array(hex.length >> 1);
+  for (let i = 0; i < out.length; i++) out[i] = parseInt(hex.substr(i * 2, 2), 16);
+  return out;
+}
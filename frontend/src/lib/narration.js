@@ -0,0 +1,60 @@
+// src/lib/narration.js
+// ルート全体のナレーションを 1 本にまとめたトラック（manifest の narration_track）を扱う。
+//   narration_track: { url, format, bytes, duration_s, chapters: [{ spot_id, offset_bytes, length_bytes, start_s, duration_s }] }
+// トラックは packs-{pack_id} に 1 件だけキャッシュし、再生は章の start_s へシークして行う
+// （Service Worker がキャッシュから Range 応答を返すので、圏外でもシークできる）。
+
+/**
+ * トラックを 1 回で取得して packs-{packId} に入れる（既にあれば何もしない）
+ * @returns {Promise<boolean>} キャッシュ済みなら true
+ */
+export async function prefetchNarrationTrack(track, packId) {
+  if (!track?.url || !('caches' in window)) return false;
+  const cache = await caches.open(`packs-${packId}`);
+  if (await cache.match(track.url)) return true;
+  const res = await fetch(track.url, { cache: 'no-store' });
+  if (!res.ok) return false;
+  await cache.put(track.url, res);
+  return true;
+}
+
+export async function isNarrationTrackCached(track, packId) {
+  if (!track?.url || !('caches' in window)) return false;
+  const cache = await caches.open(`packs-${packId}`);
+  return !!(await cache.match(track.url));
+}
+
+export function findChapter(track, spotId) {
+  return track?.chapters?.find(c => c.spot_id === spotId) || null;
+}
+
+/**
+ * 1 つの <audio> でトラックを開き、指定スポットの章だけを再生する
+ */
+export function createChapterPlayer(track) {
+  const audio = new Audio();
+  audio.preload = 'metadata';
+  let stopAt = null;
+  audio.addEventListener('timeupdate', () => {
+    if (stopAt != null && audio.currentTime >= stopAt) {
+      audio.pause();
+      stopAt = null;
+    }
+  });
+
+  return {
+    async play(spotId) {
+      const ch = findChapter(track, spotId);
+      if (!ch) return false;
+      if (!audio.src) audio.src = track.url;
+      audio.currentTime = ch.start_s;
+      stopAt = ch.start_s + ch.duration_s;
+      await audio.play();
+      return true;
+    },
+    stop() {
+      audio.pause();
+      stopAt = null;
+    },
+  };
+}
@@ -0,0 +1,105 @@
+// src/lib/packBundle.js
+// オフライン用パック一括ファイル（/packs/{pack_id}/bundle.bin）を HTTP Range で取得し、
+// 中身を Service Worker が見るキャッシュに展開する。
+//
+// 形式（backend/worker/app/services/nav/pack_bundle.py と同じ）:
+//   "GPK1"(4) | 索引の長さ uint32 BE(4) | 索引 JSON | 本体
+//   索引: { format, pack_id, entries: [{ path, type, offset, length, content_type }], tiles: {...} }
+//   offset は本体の先頭からの位置
+//
+// 展開先:
+//   manifest / 音声 / テキスト → packs-{pack_id}（/packs/{pack_id}/{path}）
+//   タイル                     → tiles-pack-v1（NavMap の L.tileLayer と同じ URL = lib/tiles.js の tileUrl）
+
+import { tileUrl, PACK_TILES_CACHE } from '@/lib/tiles';
+
+const MAGIC = 'GPK1';
+const CHUNK_BYTES = 1 << 20; // 1 回の Range で取る量
+const RETRIES = 3;
+
+async function fetchRange(url, start, end) {
+  let lastErr = null;
+  for (let i = 0; i < RETRIES; i++) {
+    try {
+      const res = await fetch(url, { headers: { Range: `bytes=${start}-${end}` }, cache: 'no-store' });
+      if (res.status === 206) return new Uint8Array(await res.arrayBuffer());
+      if (res.status === 200) {
+        // Range 非対応のサーバ → 全体から切り出す
+        return new Uint8Array(await res.arrayBuffer()).slice(start, end + 1);
+      }
+      lastErr = new Error(`HTTP ${res.status}`);
+    } catch (e) {
+      lastErr = e;
+    }
+    await new Promise(r => setTimeout(r, 500 * (i + 1)));
+  }
+  throw lastErr;
+}
+
+/**
+ * 索引だけを取得する（先頭 8 バイト → 索引）
+ * @param {string} url
+ * @returns {Promise<{ index: any, base: number }>} base = 本体の先頭位置
+ */
+export async function fetchBundleIndex(url) {
+  const head = await fetchRange(url, 0, 7);
+  if (String.fromCharCode(...head.slice(0, 4)) !== MAGIC) throw new Error('not a pack bundle');
+  const len = new DataView(head.buffer, head.byteOffset, 8).getUint32(4, false);
+  const body = await fetchRange(url, 8, 8 + len - 1);
+  return { index: JSON.parse(new TextDecoder().decode(body)), base: 8 + len };
+}
+
+/**
+ * バンドルを取得してキャッシュへ展開する
+ * @param {string} url bundle_url
+ * @param {string} packId
+ * @param {{ onProgress?: (done: number, total: number) => void }=} opts
+ * @returns {Promise<{ entries: number, tiles: number }>}
+ */
+export async function downloadPackBundle(url, packId, opts = {}) {
+  const { index, base } = await fetchBundleIndex(url);
+  const entries = index.entries || [];
+  const total = entries.reduce((n, e) => Math.max(n, e.offset + e.length), 0);
+
+  const packsCache = await caches.open(`packs-${packId}`);
+  const tilesCache = await caches.open(PACK_TILES_CACHE);
+
+  // 本体をチャンク単位で取りながら、取り終わった entry から順に展開する
+  let buf = new Uint8Array(0);
+  let bufStart = 0; // buf[0] の本体内位置
+  let next = 0;     // 次に展開する entry
+  let tiles = 0;
+  for (let pos = 0; pos < total; pos += CHUNK_BYTES) {
+    const end = Math.min(total, pos + CHUNK_BYTES) - 1;
+    const chunk = await fetchRange(url, base + pos, base + end);
+    const merged = new Uint8Array(buf.length + chunk.length);
+    merged.set(buf);
+    merged.set(chunk, buf.length);
+    buf = merged;
+
+    while (next < entries.length && entries[next].offset + entries[next].length <= bufStart + buf.length) {
+      const e = entries[next++];
+      const data = buf.slice(e.offset - bufStart, e.offset - bufStart + e.length);
+      const res = new Response(data, {
+        status: 200,
+        headers: { 'Content-Type': e.content_type, 'Content-Length': String(e.length), 'Cache-Control': 'public, max-age=31536000' },
+      });
+      if (e.type === 'tile') {
+        const m = /^tiles\/(\d+)\/(\d+)\/(\d+)\./.exec(e.path);
+        if (m) {
+          const [z, x, y] = m.slice(1).map(Number);
+          await tilesCache.put(tileUrl(z, x, y), res);
+          tiles++;
+        }
+      } else {
+        await packsCache.put(`/packs/${packId}/${e.path}`, res);
+      }
+    }
+    // 展開済みの分は捨てる
+    const keepFrom = next < entries.length ? entries[next].offset : bufStart + buf.length;
+    buf = buf.slice(keepFrom - bufStart);
+    bufStart = keepFrom;
+    opts.onProgress?.(end + 1, total);
+  }
+  return { entries: entries.length, tiles };
+}
@@ -0,0 +1,41 @@
+// src/lib/planCodec.js
+// コンパクト形プラン（format: "compact-v1"、backend/worker/app/services/nav/route_codec.py）の展開
+
+/** Google Encoded Polyline → [[lon,lat], ...]（文字列内は Google 仕様どおり lat,lon 順） */
+export function decodePolyline(str, precision = 6) {
+  const factor = Math.pow(10, precision);
+  const out = [];
+  let index = 0, lat = 0, lon = 0;
+  while (index < str.length) {
+    for (const axis of [0, 1]) {
+      let result = 0, shift = 0, b;
+      do {
+        b = str.charCodeAt(index++) - 63;
+        result |= (b & 0x1f) << shift;
+        shift += 5;
+      } while (b >= 0x20);
+      const delta = (result & 1) ? ~(result >> 1) : (result >> 1);
+      if (axis === 0) lat += delta; else lon += delta;
+    }
+    out.push([lon / factor, lat / factor]);
+  }
+  return out;
+}
+
+/**
+ * コンパクト形なら polyline / segments / route（FeatureCollection）を組み直して返す。
+ * 完全形（従来の PlanResponse）はそのまま返す。
+ */
+export function expandCompactPlan(doc) {
+  if (!doc || doc.format !== 'compact-v1') return doc;
+  const enc = doc.polyline || {};
+  const polyline = decodePolyline(enc.data || '', enc.precision ?? 6);
+  const segments = (doc.segments || []).map(([mode, start_idx, end_idx]) => ({ mode, start_idx, end_idx }));
+  const features = segments.map(seg => ({
+    type: 'Feature',
+    properties: { mode: seg.mode },
+    geometry: { type: 'LineString', coordinates: polyline.slice(seg.start_idx, seg.end_idx + 1) },
+  }));
+  const { format, ...rest } = doc;
+  return { ...rest, polyline, segments, route: { type: 'FeatureCollection', features } };
+}
@@ -2,33 +2,33 @@
 // POI一覧を取得して {spot_id, name, lat, lon, names?} の配列に正規化する。
 
 /**
- * まずフロントの /public/pois.json（配信時は /<base>/pois.json）を最優先で読みに行く。
- * 成功しなければ API 候補を順に試す。
+ * ゲートウェイのカタログ API（/back/api/pois?lang=）を最優先で読みに行く。
+ *   ETag 付きで返るので、ブラウザの HTTP キャッシュが If-None-Match で再検証する（変化なしは 304）。
+ * 取れなければフロントの /public/pois.json（配信時は /<base>/pois.json）にフォールバック。
  * 必要なら VITE_POIS_URL で固定URLを指定できる。
  */
 const FRONT_POIS =
   (import.meta.env.BASE_URL || '/') + 'pois.json';
 
-const API_CANDIDATES = [
-  '/back/api/nav/pois',
-  '/back/api/pois',
-  '/back/api/poi',
-];
+const CATALOG_API = '/back/api/pois';
 
 // 明示URLがあればそれを最優先に
 const EXPLICIT = import.meta.env.VITE_POIS_URL
   ? [import.meta.env.VITE_POIS_URL]
   : [];
 
-const CANDIDATES = [
-  ...EXPLICIT,
-  FRONT_POIS,          // ← ここを最初に試す
-  ...API_CANDIDATES,
-];
+function candidates(lang) {
+  return [
+    ...EXPLICIT,
+    `${CATALOG_API}?lang=${encodeURIComponent(lang)}`,
+    FRONT_POIS,
+  ];
+}
 
 async function tryFetchJson(url) {
   try {
-    const res = await fetch(url, { headers: { 'Accept': 'application/json' } });
+    // no-cache: キャッシュがあっても必ず再検証（304 なら本文は再ダウンロードしない）
+    const res = await fetch(url, { headers: { 'Accept': 'application/json' }, cache: 'no-cache' });
     if (!res.ok) return null;
     return await res.json();
   } catch {
@@ -36,16 +36,16 @@ async function tryFetchJson(url) {
   }
 }
 
-export async function fetchPois() {
+export async function fetchPois(lang = 'ja') {
   let raw = null, src = null;
 
-  for (const url of CANDIDATES) {
+  for (const url of candidates(lang)) {
     raw = await tryFetchJson(url);
     if (raw) { src = url; break; }
   }
 
   if (!raw) {
-    console.warn('[poi] 取得に失敗（candidates=', CANDIDATES, '）');
+    console.warn('[poi] 取得に失敗（candidates=', candidates(lang), '）');
     return [];
   }
 
@@ -58,6 +58,41 @@ export async function fetchPois() {
   return list;
 }
 
+/**
+ * bbox（[west, south, east, north]）にかかる XYZ タイルだけを取得する。
+ * タイル単位で ETag が付くので、地図を動かしても変わっていないタイルは 304 で済む。
+ * @param {[number, number, number, number]} bbox
+ * @param {{ lang?: string, z?: number }=} opts z はサーバの CATALOG_TILE_ZOOM_MIN..MAX（既定 8..16）の範囲で
+ */
+export async function fetchPoisInBBox(bbox, opts = {}) {
+  const lang = opts.lang || 'ja';
+  const z = opts.z ?? 12;
+  const [west, south, east, north] = bbox;
+  const [x0, y0] = lonLatToTile(west, north, z);
+  const [x1, y1] = lonLatToTile(east, south, z);
+
+  const urls = [];
+  for (let x = x0; x <= x1; x++) {
+    for (let y = y0; y <= y1; y++) {
+      urls.push(`${CATALOG_API}/tiles/${z}/${x}/${y}?lang=${encodeURIComponent(lang)}`);
+    }
+  }
+  const tiles = await Promise.all(urls.map(tryFetchJson));
+  return tiles
+    .flatMap(t => (t && Array.isArray(t.items)) ? t.items : [])
+    .map(normalizePoi)
+    .filter(p => p && p.lon >= west && p.lon <= east && p.lat >= south && p.lat <= north);
+}
+
+function lonLatToTile(lon, lat, z) {
+  const n = 2 ** z;
+  const rad = lat * Math.PI / 180;
+  const x = Math.floor((lon + 180) / 360 * n);
+  const y = Math.floor((1 - Math.asinh(Math.tan(rad)) / Math.PI) / 2 * n);
+  const clamp = v => Math.min(n - 1, Math.max(0, v));
+  return [clamp(x), clamp(y)];
+}
+
 // 各形式を吸収して { spot_id, name, lat, lon, names? } に統一
 function normalizePoi(p) {
   // GeoJSON Feature?
@@ -6,7 +6,7 @@
 //   - 200 の場合 RTDoc を返す
 // ので、ここで {status, body} 形式に正規化して返す。
 
-import { fetchRealtimeBySpotId } from './api' // ← apiFetch ではなく、公開関数を使用
+import { fetchRealtimeBySpotId, fetchRealtimeSpots } from './api' // ← apiFetch ではなく、公開関数を使用
 
 /**
  * @typedef {Object} RTDoc
@@ -43,4 +43,52 @@ export async function fetchSpotRT(spotId, opts = {}) {
   } catch (err) {
     return { status: 0, body: null, error: err }
   }
-}
\ No newline at end of file
+}
+
+/**
+ * 複数スポットのRT情報をまとめて取得（変更カーソル・ロングポーリング）
+ * - 200: body = { seq, full, spots: { [spot_id]: RTDoc(s なし) } }
+ * - 304: 変化なし（body は null）
+ * - 0:   オフライン / 失敗
+ * @param {string[]} spotIds
+ * @param {{ since?: number|null, wait?: number }=} opts
+ * @returns {Promise<{status:number, body: {seq:number, full:boolean, spots:Record<string, Omit<RTDoc,'s'>>}|null, error?:any}>}
+ */
+export async function fetchSpotsRT(spotIds, opts = {}) {
+  try {
+    const online = typeof navigator !== 'undefined' ? !!navigator.onLine : true
+    if (!online) {
+      return { status: 0, body: null, error: new Error('Offline') }
+    }
+    return await fetchRealtimeSpots(spotIds, opts)
+  } catch (err) {
+    return { status: 0, body: null, error: err }
+  }
+}
+
+/**
+ * WebSocket でRT情報の差分を購読する（/rt/ws）
+ * - 接続後に {op:'sub', ids, since} を送る。since に最後の seq を渡せば取りこぼしなく再開できる
+ * - onFrame には {t:'d', seq, full, spots} と {t:'hb', seq} が届く
+ * @param {string[]} spotIds
+ * @param {{ since?: number|null, onFrame: (frame:any)=>void, onOpen?: ()=>void, onClose?: (ev:any)=>void }} handlers
+ * @returns {WebSocket|null} WebSocket 非対応なら null
+ */
+export function openSpotsSocket(spotIds, { since = null, onFrame, onOpen, onClose }) {
+  if (typeof WebSocket === 'undefined' || typeof location === 'undefined') return null
+  const proto = location.protocol === 'https:' ? 'wss:' : 'ws:'
+  const ws = new WebSocket(`${proto}//${location.host}/back/api/rt/ws`)
+  ws.onopen = () => {
+    ws.send(JSON.stringify({ op: 'sub', ids: spotIds, since }))
+    onOpen && onOpen()
+  }
+  ws.onmessage = (ev) => {
+    try {
+      onFrame(JSON.parse(ev.data))
+    } catch {
+      // 壊れたフレームは無視
+    }
+  }
+  ws.onclose = (ev) => onClose && onClose(ev)
+  return ws
+}
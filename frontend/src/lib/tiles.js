@@ -1,11 +1,14 @@
 // src/lib/tiles.js
-export const TILE_TEMPLATE = 'https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png';
-export const TILE_SUBS = ['a', 'b', 'c'];
+// 地図タイルの URL はここで一元管理する（NavMap の L.tileLayer・事前取得・bundle.bin の展開先・sw.js が同じ URL を使う）。
+// サーバ側 PACK_TILE_SOURCE の既定値（backend/worker/app/services/nav/pack_bundle.py）も同じテンプレート。
+export const TILE_TEMPLATE = 'https://cyberjapandata.gsi.go.jp/xyz/std/{z}/{x}/{y}.png';
+export const TILE_ATTRIBUTION = "<a href='https://maps.gsi.go.jp/development/ichiran.html' target='_blank'>地理院タイル</a>";
+// bundle.bin から展開したタイルの置き場（sw.js の実行時キャッシュ tiles-v1 と違い、件数で間引かない）
+export const PACK_TILES_CACHE = 'tiles-pack-v1';
 
 // Leaflet のテンプレと一致するURLを生成
-export function tileUrl(z, x, y, sIdx = 0) {
-  const s = TILE_SUBS[sIdx % TILE_SUBS.length];
-  return `https://${s}.tile.openstreetmap.org/${z}/${x}/${y}.png`;
+export function tileUrl(z, x, y) {
+  return TILE_TEMPLATE.replace('{z}', z).replace('{x}', x).replace('{y}', y);
 }
 
 // ルート（polyline: [[lon,lat], ...]）の外接BBoxを元に、複数ズームのタイルを事前取得
@@ -23,14 +26,14 @@ export async function prefetchTilesForRoute(polyline, opts = {}) {
   minLat -= marginDeg; maxLat += marginDeg; minLon -= marginDeg; maxLon += marginDeg;
 
   const cache = await caches.open('tiles-v1');
-  let count = 0, s = 0;
+  let count = 0;
 
   for (const z of zooms) {
     const xMin = lon2tile(minLon, z), xMax = lon2tile(maxLon, z);
     const yMin = lat2tile(maxLat, z), yMax = lat2tile(minLat, z);
     for (let x = xMin; x <= xMax; x++) {
       for (let y = yMin; y <= yMax; y++) {
-        const url = tileUrl(z, x, y, s++);
+        const url = tileUrl(z, x, y);
         if (count >= max) return count;
         try {
           const res = await fetch(url, { mode: 'no-cors' }); // opaque OK
@@ -1,15 +1,19 @@
 // src/stores/rt.js
-// Realtime 情報のPiniaストア：1分ごとにA→B→A→B…と交互に叩き、変化時のみ通知ログに積む
+// Realtime 情報のPiniaストア：WebSocket（/rt/ws）で差分を受け取り、変化時のみ通知ログに積む
+// WebSocket が使えない・一度も繋がらない環境では GET /rt/spots のロングポーリングに切り替える
 //
 // state:
 //   - lastBySpot: 最新RTDoc（スポット別）
 //   - notifyLog: 変更イベントの履歴（トースト等の通知で使用）
 //   - timerId: setTimeout のID（nullで停止）
-//   - cursor: 現在叩くスポットのインデックス
-//   - spotOrder: ポーリング対象の spot_id 配列（ナビ plan の waypoints 由来）
+//   - seq: サーバの変更シーケンス（次回の since。null なら全件スナップショットを取る）
+//   - spotOrder: 取得対象の spot_id 配列（ナビ plan の waypoints 由来）
+//   - generation: 停止・再開ごとに増やす（古いロングポーリングの結果を捨てる）
+//   - useSocket: WebSocket を使うか（一度も接続できなければ false にしてロングポーリングへ）
 //
 // actions:
-//   - startPolling(waypoints): 60秒間隔で1スポットずつ順繰りにGET
+//   - startPolling(waypoints): WebSocket で購読。切断されたら seq から再開
+//                              （WebSocket 不可なら全スポットを 1 リクエストでロングポーリング）
 //   - stopPolling(): ポーリング停止
 //   - tick(): 実1回分のフェッチ＆差分判定
 //   - reset(): クリア
@@ -22,9 +26,18 @@
 //   - h は (u > 0) のときだけ比較対象。u=0のときは無視（undefined扱い）
 
 import { defineStore } from 'pinia'
-import { fetchSpotRT } from '@/lib/realtime' // @ は src エイリアス想定。未設定なら相対に変更: '../lib/realtime'
+import { fetchSpotsRT, openSpotsSocket } from '@/lib/realtime' // @ は src エイリアス想定。未設定なら相対に変更: '../lib/realtime'
 
+// 失敗時・オフライン時の再試行間隔
 const POLL_INTERVAL_MS = 60_000
+// サーバ側で変化を待つ秒数（プロキシのタイムアウトより短く）
+const LONG_POLL_S = 25
+// WebSocket 切断後の再接続待ち
+const RECONNECT_MS = 3_000
+
+// 購読中の WebSocket（ネイティブオブジェクトなのでリアクティブな state には置かない）
+/** @type {WebSocket|null} */
+let socket = null
 
 /**
  * @typedef {Object} RTDoc
@@ -47,10 +60,14 @@ export const useRtStore = defineStore('rt', {
     notifyLog: [],
     /** @type {number|null} */
     timerId: null,
-    /** @type {number} */
-    cursor: 0,
+    /** @type {number|null} */
+    seq: null,
     /** @type {string[]} */
-    spotOrder: []
+    spotOrder: [],
+    /** @type {number} */
+    generation: 0,
+    /** @type {boolean} */
+    useSocket: true
   }),
 
   getters: {
@@ -76,12 +93,12 @@ export const useRtStore = defineStore('rt', {
         }
       }
       this.spotOrder = order
-      // カーソルはリセット（A→B→A→B… を1から）
-      this.cursor = 0
+      // 対象が変わったら全件スナップショットから取り直す
+      this.seq = null
     },
 
     /**
-     * ポーリング開始（60秒ごとに1スポットだけ叩く）
+     * 購読開始（WebSocket。使えなければ全スポットを 1 リクエストでロングポーリング）
      * @param {WaypointRef[]} waypoints
      */
     startPolling(waypoints) {
@@ -91,6 +108,7 @@ export const useRtStore = defineStore('rt', {
       if (this.spotOrder.length === 0) {
         return
       }
+      if (this.useSocket && this._connect()) return
       // すぐに1回叩いてからスケジュール
       this._tickAndSchedule()
     },
@@ -99,63 +117,114 @@ export const useRtStore = defineStore('rt', {
      * 停止
      */
     stopPolling() {
+      this.generation++
       if (this.timerId !== null) {
         clearTimeout(this.timerId)
         this.timerId = null
       }
+      if (socket) {
+        socket.close()
+        socket = null
+      }
+    },
+
+    /**
+     * 内部：WebSocket で購読（seq があればそこから再開）
+     * @returns {boolean} 接続を開始できたか
+     */
+    _connect() {
+      const gen = this.generation
+      let opened = false
+      const ws = openSpotsSocket(this.spotOrder, {
+        since: this.seq,
+        onOpen: () => { opened = true },
+        onFrame: (frame) => {
+          if (gen !== this.generation) return
+          if (frame.t === 'd') this._applySpots(frame.spots, frame.seq)
+          // ハートビートの seq まで取りこぼしは無い（再接続時の since に使う）
+          else if (frame.t === 'hb' && frame.seq != null) this.seq = frame.seq
+        },
+        onClose: () => {
+          if (gen !== this.generation) return // stopPolling による切断
+          socket = null
+          if (!opened) {
+            // 一度も繋がらない（プロキシが Upgrade 非対応など）→ ロングポーリングへ
+            this.useSocket = false
+            this._tickAndSchedule()
+            return
+          }
+          this.timerId = setTimeout(() => {
+            this.timerId = null
+            if (gen === this.generation) this._connect()
+          }, RECONNECT_MS)
+        }
+      })
+      socket = ws
+      return ws !== null
     },
 
     /**
      * 内部：tick実行後、次回を予約
+     * - 200 / 304 はすぐ次のロングポーリングへ（待ちはサーバ側で行う）
+     * - 失敗・オフラインは POLL_INTERVAL_MS 後に再試行
      */
     _tickAndSchedule() {
-      // 実行
-      this.tick().finally(() => {
-        // ドリフトを避けるため setTimeout で逐次スケジュール
-        this.timerId = setTimeout(() => this._tickAndSchedule(), POLL_INTERVAL_MS)
-      })
+      const gen = this.generation
+      this.tick()
+        .catch(() => 0)
+        .then((status) => {
+          if (gen !== this.generation) return // 停止・再開済み
+          const delay = status === 200 || status === 304 ? 0 : POLL_INTERVAL_MS
+          this.timerId = setTimeout(() => this._tickAndSchedule(), delay)
+        })
     },
 
     /**
-     * 1スポット分の取得＆差分判定（A→B→A→B...の1ステップ）
+     * 全スポット分の取得＆差分判定（1 リクエスト）
+     * @returns {Promise<number>} HTTP ステータス（0 = 失敗）
      */
     async tick() {
-      if (this.spotOrder.length === 0) return
-      // 現在のスポット
-      const spotId = this.spotOrder[this.cursor]
-      // 次回カーソルを先に進めておく
-      this.cursor = (this.cursor + 1) % this.spotOrder.length
-
-      // ★ 追加：前回値から etag（軽ハッシュ）を作成し、fetch に渡す
-      const prev = this.lastBySpot[spotId] ?? null
-      const etag = this._calcEtag(prev)
-
-      const { status, body } = await fetchSpotRT(spotId, { etag })
-
-      if (status === 204 || status === 0) {
-        // 204=未到達 or 変更なし(null) / 0=失敗 → 何もしない（次周期へ）
-        return
-      }
+      if (this.spotOrder.length === 0) return 0
+      const gen = this.generation
+      const { status, body } = await fetchSpotsRT(this.spotOrder, {
+        since: this.seq,
+        wait: this.seq == null ? 0 : LONG_POLL_S
+      })
+      if (gen !== this.generation) return status // 待っている間に停止・再開された
       if (status !== 200 || !body) {
-        return
+        // 304=変化なし / 0=失敗 → 何もしない
+        return status
       }
 
-      // 差分判定
-      const next = /** @type {RTDoc} */ (body)
-      const changed = !this._isSame(prev, next)
+      this._applySpots(body.spots, body.seq)
+      return status
+    },
+
+    /**
+     * 受け取ったスポット群を反映し、変化があれば通知ログに積む
+     * @param {Record<string, Omit<RTDoc,'s'>>|undefined} spots
+     * @param {number} seq
+     */
+    _applySpots(spots, seq) {
+      for (const [spotId, doc] of Object.entries(spots ?? {})) {
+        const prev = this.lastBySpot[spotId] ?? null
+        const next = /** @type {RTDoc} */ ({ s: spotId, ...doc })
+        const changed = !this._isSame(prev, next)
 
-      // 最新値を更新
-      this.lastBySpot[spotId] = next
+        // 最新値を更新
+        this.lastBySpot[spotId] = next
 
-      // 変更があれば通知ログに積む
-      if (changed) {
-        this.notifyLog.push({
-          spot_id: spotId,
-          prev,
-          next,
-          at: Date.now()
-        })
+        // 変更があれば通知ログに積む
+        if (changed) {
+          this.notifyLog.push({
+            spot_id: spotId,
+            prev,
+            next,
+            at: Date.now()
+          })
+        }
       }
+      this.seq = seq
     },
 
     /**
@@ -205,7 +274,7 @@ export const useRtStore = defineStore('rt', {
       this.stopPolling()
       this.lastBySpot = {}
       this.notifyLog = []
-      this.cursor = 0
+      this.seq = null
       this.spotOrder = []
     }
   }